@@ -0,0 +1,310 @@
+"""
+Comandos de mantenimiento por línea de comandos (Flask CLI)
+
+Uso (desde app_juzgado/; app_juzgado es un paquete, por eso PYTHONPATH=.):
+    PYTHONPATH=. flask --app main recalcular-estados            # re-deriva expediente.estado
+    PYTHONPATH=. flask --app main recalcular-estados --simular  # solo reporta los cambios
+    PYTHONPATH=. flask --app main procesar-cargas --continuo    # consumidor de cargas de Excel encoladas
+    PYTHONPATH=. flask --app main migrar                        # aplica las migraciones SQL pendientes (migraciones/)
+    PYTHONPATH=. flask --app main migrar --estado               # solo lista aplicadas y pendientes
+    PYTHONPATH=. flask --app main verificar-indices             # EXPLAIN: las consultas frecuentes usan sus índices
+    PYTHONPATH=. flask --app main backfill-estadisticas-expediente  # recalcula expediente_stats
+    PYTHONPATH=. flask --app main backfill-radicado-normalizado # recalcula radicado_normalizado / radicado_sufijo
+    PYTHONPATH=. flask --app main recalcular-turnos             # renumera la cola 'Activo Pendiente'
+    PYTHONPATH=. flask --app main generar-datos --expedientes 1000000  # datos sintéticos a escala (solo base local)
+    PYTHONPATH=. flask --app main generar-datos --borrar        # elimina los datos sintéticos
+    PYTHONPATH=. flask --app main generar-excel carga.xlsx --filas 200000 --formato trimestre
+    PYTHONPATH=. flask --app main benchmark --guardar-base     # mide y guarda la línea base
+    PYTHONPATH=. flask --app main benchmark                     # mide y compara con la línea base
+"""
+
+import os
+import time
+
+import click
+from flask import current_app
+
+from modelo.configBd import conexion_bd, obtener_conexion
+from utils.estados_expediente import rederivar_estados
+from utils.indice_radicados import backfill_radicado_normalizado
+from utils.benchmark import (
+    REPETICIONES, TAMANOS_CARGA, TOLERANCIA, comparar, ejecutar_benchmarks, guardar_resultado, leer_resultado
+)
+from utils.trabajos_carga import INTERVALO_RECUPERACION, reclamar_siguiente, recuperar_trabajos
+from utils.esquema import EDAD_MAXIMA, refrescar_esquema
+from utils.datos_sinteticos import FORMATOS_LIBRO, borrar_datos_sinteticos, escribir_libro, poblar_base
+from utils.estadisticas_expediente import backfill_estadisticas
+from utils.metricas_cache import invalidar_metricas
+from utils.migraciones import aplicar_migraciones, estado_migraciones
+from utils.plan_consultas import verificar_planes
+from utils.turnos import recalcular_turnos
+
+
+def _refrescar_esquema():
+    """Relee el esquema tras una migración (los workers en marcha son otros procesos)"""
+    if not refrescar_esquema():
+        click.echo("⚠️ No se pudo releer el esquema; se relee en el próximo uso")
+        return
+    click.echo(f"🗂️ Esquema releído; los workers en marcha lo releen en {EDAD_MAXIMA} s "
+               f"o al reiniciarlos (kill -HUP al master de gunicorn)")
+
+
+@click.command('recalcular-estados')
+@click.option('--simular', is_flag=True, help='Solo reporta cuántos estados cambiarían, sin escribir.')
+def recalcular_estados(simular):
+    """Re-deriva el estado de TODOS los expedientes a partir de ingresos, actuaciones y estados"""
+    conn = obtener_conexion()
+    cursor = conn.cursor()
+    try:
+        resultado = rederivar_estados(cursor, aplicar=not simular)
+        if simular:
+            conn.rollback()
+        else:
+            conn.commit()
+            invalidar_metricas()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+    accion = 'cambiarían' if simular else 'actualizados'
+    click.echo(f"📊 {resultado['cambiados']} de {resultado['total']} expedientes {accion} "
+               f"en {resultado['duracion_ms']} ms")
+    for (anterior, nuevo), cantidad in sorted(resultado['transiciones'].items()):
+        click.echo(f"   {anterior} → {nuevo}: {cantidad}")
+    if resultado['turnos']:
+        click.echo(f"🎫 Turnos recalculados: {resultado['turnos']['actualizados']} cambiaron")
+
+
+@click.command('procesar-cargas')
+@click.option('--continuo', is_flag=True, help='Sigue esperando nuevas cargas en lugar de terminar.')
+@click.option('--intervalo', default=2.0, show_default=True, help='Segundos entre consultas sin pendientes.')
+def procesar_cargas(continuo, intervalo):
+    """Procesa las cargas de Excel pendientes (para usar con CARGAS_EJECUTOR=externo)"""
+    from vista.vistasubirexpediente import procesar_trabajo_carga
+
+    procesados = 0
+    ultima_recuperacion = 0.0
+    while True:
+        # Trabajos que quedaron 'procesando' en un consumidor o worker que terminó
+        if time.monotonic() - ultima_recuperacion >= INTERVALO_RECUPERACION:
+            recuperados = recuperar_trabajos()
+            ultima_recuperacion = time.monotonic()
+            if recuperados['reencolados'] or recuperados['fallidos']:
+                click.echo(f"♻️ Reencolados: {recuperados['reencolados']}, fallidos: {recuperados['fallidos']}")
+        trabajo_id = reclamar_siguiente(procesar_trabajo_carga)
+        if trabajo_id is not None:
+            procesados += 1
+            click.echo(f"🏁 Trabajo {trabajo_id} terminado")
+            continue
+        if not continuo:
+            break
+        time.sleep(intervalo)
+
+    click.echo(f"📨 {procesados} cargas procesadas")
+
+
+@click.command('migrar')
+@click.option('--estado', 'solo_estado', is_flag=True, help='Solo lista las migraciones aplicadas y pendientes.')
+def migrar(solo_estado):
+    """Aplica en orden las migraciones SQL pendientes de app_juzgado/migraciones/"""
+    conn = obtener_conexion()
+    try:
+        if solo_estado:
+            cursor = conn.cursor()
+            try:
+                estado = estado_migraciones(cursor)
+                conn.commit()
+            finally:
+                cursor.close()
+        else:
+            aplicadas = aplicar_migraciones(conn)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if solo_estado:
+        for migracion in estado:
+            marca = f"✅ {migracion['aplicada_en']:%Y-%m-%d %H:%M}" if migracion['aplicada_en'] else "⏳ pendiente"
+            aviso = " ⚠️ modificada después de aplicarse" if migracion['modificada'] else ""
+            click.echo(f"{migracion['version']}_{migracion['nombre']}: {marca}{aviso}")
+        return
+
+    for migracion in aplicadas:
+        click.echo(f"🗂️ {migracion['version']}_{migracion['nombre']} ({migracion['duracion_ms']} ms)")
+    if aplicadas:
+        _refrescar_esquema()
+    else:
+        click.echo("ℹ️ No hay migraciones pendientes")
+
+
+@click.command('verificar-indices')
+def verificar_indices():
+    """Comprueba con EXPLAIN que las consultas frecuentes usan los índices de las migraciones"""
+    conn = obtener_conexion()
+    cursor = conn.cursor()
+    try:
+        resultados = verificar_planes(cursor)
+    finally:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+
+    for resultado in resultados:
+        if resultado['usa_indice']:
+            click.echo(f"✅ {resultado['nombre']}: {resultado['indice']}")
+        else:
+            click.echo(f"❌ {resultado['nombre']}: no usa {resultado['indice']} "
+                       f"(plan: {', '.join(resultado['indices']) or 'sin índices'})")
+    faltantes = sum(1 for r in resultados if not r['usa_indice'])
+    if faltantes:
+        raise click.ClickException(f"{faltantes} consultas sin su índice: ejecute `flask migrar`")
+
+
+@click.command('backfill-estadisticas-expediente')
+def backfill_estadisticas_expediente():
+    """Recalcula expediente_stats para todos los expedientes (la tabla la crea `flask migrar`)"""
+    with conexion_bd(commit=True) as conn:
+        cursor = conn.cursor()
+        resultado = backfill_estadisticas(cursor)
+        cursor.close()
+
+    click.echo(f"📊 expediente_stats: {resultado['total']} expedientes en {resultado['duracion_ms']} ms")
+
+
+@click.command('backfill-radicado-normalizado')
+def backfill_radicado_normalizado_cmd():
+    """Recalcula radicado_normalizado y radicado_sufijo (las columnas las crea `flask migrar`)"""
+    with conexion_bd(commit=True) as conn:
+        cursor = conn.cursor()
+        resultado = backfill_radicado_normalizado(cursor)
+        cursor.close()
+
+    click.echo(f"🗂️ Radicado normalizado: {resultado['actualizados']} expedientes actualizados "
+               f"en {resultado['duracion_ms']} ms")
+    if resultado['repetidos']:
+        click.echo(f"⚠️ {resultado['repetidos']} radicados normalizados repetidos en más de un expediente")
+
+
+@click.command('recalcular-turnos')
+def recalcular_turnos_cmd():
+    """Renumera los turnos de la cola 'Activo Pendiente' (p. ej. después de la migración 0006)"""
+    with conexion_bd(commit=True) as conn:
+        cursor = conn.cursor()
+        resultado = recalcular_turnos(cursor)
+        cursor.close()
+
+    click.echo(f"🎫 Turnos recalculados: {resultado['actualizados']} cambiaron "
+               f"({resultado['con_turno']} con turno) en {resultado['duracion_ms']} ms")
+
+
+@click.command('generar-datos')
+@click.option('--expedientes', default=10000, show_default=True, help='Expedientes a generar.')
+@click.option('--movimientos', default=5, show_default=True,
+              help='Promedio de ingresos, estados y actuaciones por expediente.')
+@click.option('--usuarios', default=300, show_default=True, help='Usuarios ESCRIBIENTE/SUSTANCIADOR a crear.')
+@click.option('--semilla', default=42, show_default=True, help='Semilla de los datos generados.')
+@click.option('--lote', default=20000, show_default=True, help='Expedientes por COPY (un commit por lote).')
+@click.option('--borrar', is_flag=True, help='Elimina los datos sintéticos en lugar de generarlos.')
+@click.confirmation_option(prompt='Esto escribe en la base configurada (DATABASE_URL / DB_NAME). ¿Es una base local?')
+def generar_datos(expedientes, movimientos, usuarios, semilla, lote, borrar):
+    """Puebla la base con datos sintéticos a escala para pruebas de rendimiento"""
+    conn = obtener_conexion()
+    try:
+        if borrar:
+            cursor = conn.cursor()
+            try:
+                borrados = borrar_datos_sinteticos(cursor)
+                conn.commit()
+            finally:
+                cursor.close()
+        else:
+            resultado = poblar_base(conn, expedientes, movimientos=movimientos, usuarios=usuarios,
+                                    semilla=semilla, lote=lote)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    invalidar_metricas()
+    if borrar:
+        click.echo("🧹 Eliminados: " + ", ".join(f"{cantidad} {tabla}" for tabla, cantidad in borrados.items()))
+        return
+    click.echo(f"🧪 {resultado['expedientes']} expedientes, {resultado['ingresos']} ingresos, "
+               f"{resultado['estados']} estados, {resultado['actuaciones']} actuaciones y "
+               f"{resultado['usuarios']} usuarios en {resultado['duracion_ms'] / 1000:.1f} s")
+
+
+@click.command('generar-excel')
+@click.argument('ruta', type=click.Path(dir_okay=False, writable=True))
+@click.option('--formato', type=click.Choice(FORMATOS_LIBRO), default='pestañas', show_default=True,
+              help="'pestañas': Ingreso + Estados; 'trimestre': una pestaña YYYY-Qn.")
+@click.option('--filas', default=10000, show_default=True, help='Expedientes (filas de Ingreso o de la pestaña).')
+@click.option('--desde', default=0, show_default=True,
+              help='Índice del primer radicado: dentro de lo ya generado con generar-datos actualiza, fuera crea.')
+@click.option('--movimientos', default=2, show_default=True, help="Estados promedio por expediente ('pestañas').")
+@click.option('--semilla', default=42, show_default=True, help='Semilla de los datos generados.')
+@click.option('--hoja', default=None, help="Nombre de la pestaña 'YYYY-Qn' (por defecto, el trimestre actual).")
+def generar_excel(ruta, formato, filas, desde, movimientos, semilla, hoja):
+    """Escribe un libro Excel sintético con el formato que acepta la carga de expedientes"""
+    escritas = escribir_libro(ruta, formato, filas=filas, desde=desde, movimientos=movimientos,
+                              semilla=semilla, hoja_trimestre=hoja)
+    click.echo(f"🧪 {ruta}: " + ", ".join(f"{hoja_libro} ({total} filas)" for hoja_libro, total in escritas.items()))
+
+
+@click.command('benchmark')
+@click.option('--escenario', 'solo', multiple=True, help='Solo este escenario (se puede repetir).')
+@click.option('--repeticiones', default=REPETICIONES, show_default=True, help='Repeticiones por escenario.')
+@click.option('--cargas', default=','.join(str(n) for n in TAMANOS_CARGA), show_default=True,
+              help='Filas de los libros de carga, separadas por comas (vacío = sin cargas).')
+@click.option('--salida', default='benchmarks/ultimo.json', show_default=True, help='Archivo JSON del resultado.')
+@click.option('--base', 'ruta_base', default='benchmarks/base.json', show_default=True, help='Línea base.')
+@click.option('--guardar-base', is_flag=True, help='Guarda el resultado como nueva línea base.')
+@click.option('--tolerancia', default=TOLERANCIA, show_default=True, help='Aumento relativo permitido (p95 y RSS).')
+def benchmark(solo, repeticiones, cargas, salida, ruta_base, guardar_base, tolerancia):
+    """Mide latencia, consultas y memoria de los endpoints y operaciones masivas"""
+    tamanos = [int(n) for n in cargas.split(',') if n.strip()]
+    resultado = ejecutar_benchmarks(current_app, solo=set(solo) or None,
+                                    repeticiones=repeticiones, tamanos_carga=tamanos)
+
+    click.echo(f"{'escenario':32} {'p50':>9} {'p95':>9} {'p99':>9} {'consultas':>10} {'RSS MB':>8}")
+    for nombre, medicion in resultado['escenarios'].items():
+        click.echo(f"{nombre:32} {medicion['p50_ms']:>9} {medicion['p95_ms']:>9} {medicion['p99_ms']:>9} "
+                   f"{medicion['consultas_por_operacion']:>10} {medicion['rss_pico_mb']:>8}"
+                   + (f"  ❌ {medicion['errores']} errores" if medicion['errores'] else ""))
+
+    for ruta in [salida] + ([ruta_base] if guardar_base else []):
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        guardar_resultado(resultado, ruta)
+        click.echo(f"💾 {ruta}")
+    if guardar_base:
+        return
+
+    if not os.path.exists(ruta_base):
+        click.echo(f"ℹ️ Sin línea base en {ruta_base}: use --guardar-base")
+        return
+    regresiones = comparar(resultado, leer_resultado(ruta_base), tolerancia)
+    for regresion in regresiones:
+        click.echo(f"❌ {regresion}")
+    if regresiones:
+        raise click.ClickException(f"{len(regresiones)} regresiones respecto de {ruta_base}")
+    click.echo(f"✅ Sin regresiones respecto de {ruta_base}")
+
+
+def registrar_comandos(app):
+    """Registra los comandos de mantenimiento en app.cli"""
+    app.cli.add_command(recalcular_estados)
+    app.cli.add_command(procesar_cargas)
+    app.cli.add_command(migrar)
+    app.cli.add_command(verificar_indices)
+    app.cli.add_command(backfill_estadisticas_expediente)
+    app.cli.add_command(backfill_radicado_normalizado_cmd)
+    app.cli.add_command(recalcular_turnos_cmd)
+    app.cli.add_command(generar_datos)
+    app.cli.add_command(generar_excel)
+    app.cli.add_command(benchmark)
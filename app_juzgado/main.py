@@ -19,6 +19,9 @@ from vista.vistausuarios import vistausuarios
 from vista.vistasecurity import vistasecurity
 from vista.vistaconsulta import vistaconsulta
 from vista.vistatest import vistatest  # Blueprint de pruebas
+from comandos import registrar_comandos
+from utils.instrumentacion_sql import registrar_instrumentacion
+from utils.metricas_prometheus import registrar_metricas
 
 app = Flask(__name__)
 
@@ -84,6 +87,15 @@ app.register_blueprint(vistasecurity)
 app.register_blueprint(vistaconsulta)
 app.register_blueprint(vistatest)  # Blueprint de pruebas
 
+# Comandos de mantenimiento (flask --app main <comando>)
+registrar_comandos(app)
+
+# Instrumentación SQL por petición: Server-Timing, peticiones lentas y huellas de consultas
+registrar_instrumentacion(app)
+
+# Métricas de Prometheus (/metrics), sumadas entre workers
+registrar_metricas(app)
+
 # 🔒 MANEJADOR ESPECÍFICO PARA ERRORES CSRF
 from flask_wtf.csrf import CSRFError
 
@@ -0,0 +1,28 @@
+-- Índices de las consultas frecuentes de las vistas (ver utils/plan_consultas.py,
+-- que comprueba con EXPLAIN que cada consulta los usa).
+
+-- Listados y conteos por estado; selección masiva ORDER BY fecha_ingreso, id
+CREATE INDEX IF NOT EXISTS idx_expediente_estado_fecha_ingreso
+    ON expediente (estado, fecha_ingreso, id);
+
+-- Expedientes asignados a un usuario y carga por usuario (asignación por menor carga)
+CREATE INDEX IF NOT EXISTS idx_expediente_usuario_estado
+    ON expediente (usuario_asignado_id, estado);
+
+-- Expedientes por rol responsable (asignación por rol, limpieza de responsables)
+CREATE INDEX IF NOT EXISTS idx_expediente_responsable
+    ON expediente (responsable);
+
+-- Historial de cada expediente, ordenado por fecha
+CREATE INDEX IF NOT EXISTS idx_ingresos_expediente_fecha
+    ON ingresos (expediente_id, fecha_ingreso);
+
+CREATE INDEX IF NOT EXISTS idx_estados_expediente_fecha
+    ON estados (expediente_id, fecha_estado);
+
+CREATE INDEX IF NOT EXISTS idx_actuaciones_expediente_fecha
+    ON actuaciones (expediente_id, fecha_actuacion);
+
+-- Reportes de actualización más recientes y limpieza de antiguos
+CREATE INDEX IF NOT EXISTS idx_reportes_actualizacion_fecha
+    ON reportes_actualizacion (fecha_generacion);
@@ -0,0 +1,22 @@
+-- Índices de la búsqueda de radicados por subcadena (LIKE '%x%', ver
+-- utils/indice_radicados.buscar_en_bd). Requieren la extensión pg_trgm: si
+-- no se puede instalar se omiten y la búsqueda sigue funcionando sin índice.
+
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+EXCEPTION WHEN OTHERS THEN
+    RAISE NOTICE 'pg_trgm no disponible, se omiten los índices de trigramas: %', SQLERRM;
+END
+$$;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        CREATE INDEX IF NOT EXISTS idx_expediente_radicado_completo_trgm
+            ON expediente USING gin (radicado_completo gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS idx_expediente_radicado_corto_trgm
+            ON expediente USING gin (radicado_corto gin_trgm_ops);
+    END IF;
+END
+$$;
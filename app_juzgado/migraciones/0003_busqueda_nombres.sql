@@ -0,0 +1,12 @@
+-- Búsqueda de texto completo por demandante / demandado (utils/busqueda_nombres.py).
+-- La expresión del índice debe coincidir EXACTAMENTE con DOCUMENTO_NOMBRES.
+
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- unaccent() es STABLE; el envoltorio IMMUTABLE permite indexarla
+CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT AS
+$$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$;
+
+CREATE INDEX IF NOT EXISTS idx_expediente_nombres_fts
+    ON expediente USING gin ((to_tsvector('simple', f_unaccent(coalesce(demandante, '') || ' ' || coalesce(demandado, '')))));
@@ -0,0 +1,138 @@
+-- Estadísticas materializadas por expediente (utils/estadisticas_expediente.py):
+-- tabla expediente_stats, función de recálculo y triggers por sentencia sobre
+-- ingresos, estados y actuaciones. El backfill inicial va en la misma
+-- transacción para que la tabla nunca aparezca vacía a las vistas; después
+-- se puede repetir con `flask backfill-estadisticas-expediente`.
+
+CREATE TABLE IF NOT EXISTS expediente_stats (
+    expediente_id INTEGER PRIMARY KEY REFERENCES expediente(id) ON DELETE CASCADE,
+    total_ingresos INTEGER NOT NULL DEFAULT 0,
+    ultimo_ingreso DATE,
+    total_estados INTEGER NOT NULL DEFAULT 0,
+    ultimo_estado DATE,
+    total_actuaciones INTEGER NOT NULL DEFAULT 0,
+    ultima_actuacion DATE,
+    solicitud_reciente TEXT,
+    fecha_actualizacion TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Recalcula (upsert) las estadísticas de los expedientes dados. Función VOLATILE:
+-- cada sentencia toma su propia instantánea, así el recálculo ve lo confirmado
+-- mientras se esperaba el bloqueo. El bloqueo es un advisory lock por cubeta
+-- (id % 64, en orden): a lo sumo 64 por transacción aunque una carga masiva
+-- toque miles de expedientes (uno por expediente agotaría la tabla de locks
+-- compartida, ~64 × max_connections). Con bloquear = FALSE no se bloquea
+-- (backfill inicial: nadie más escribe aún en la tabla).
+DROP FUNCTION IF EXISTS refrescar_expediente_stats(INTEGER[]);
+CREATE OR REPLACE FUNCTION refrescar_expediente_stats(ids INTEGER[], bloquear BOOLEAN DEFAULT TRUE)
+RETURNS void
+LANGUAGE sql VOLATILE AS $$
+    SELECT pg_advisory_xact_lock(hashtext('expediente_stats'), cubeta)
+    FROM (SELECT DISTINCT id % 64 AS cubeta FROM unnest(ids) AS id WHERE id IS NOT NULL) bloqueo
+    WHERE bloquear
+    ORDER BY cubeta;
+
+    INSERT INTO expediente_stats (
+        expediente_id, total_ingresos, ultimo_ingreso, total_estados, ultimo_estado,
+        total_actuaciones, ultima_actuacion, solicitud_reciente, fecha_actualizacion
+    )
+    SELECT e.id,
+           COALESCE(i.total, 0), i.ultima,
+           COALESCE(s.total, 0), s.ultima,
+           COALESCE(a.total, 0), a.ultima,
+           r.solicitud, NOW()
+    FROM expediente e
+    LEFT JOIN (
+        SELECT expediente_id, COUNT(*) AS total, MAX(fecha_ingreso) AS ultima
+        FROM ingresos WHERE expediente_id = ANY(ids)
+        GROUP BY expediente_id
+    ) i ON i.expediente_id = e.id
+    LEFT JOIN (
+        SELECT expediente_id, COUNT(*) AS total, MAX(fecha_estado) AS ultima
+        FROM estados WHERE expediente_id = ANY(ids)
+        GROUP BY expediente_id
+    ) s ON s.expediente_id = e.id
+    LEFT JOIN (
+        SELECT expediente_id, COUNT(*) AS total, MAX(fecha_actuacion) AS ultima
+        FROM actuaciones WHERE expediente_id = ANY(ids)
+        GROUP BY expediente_id
+    ) a ON a.expediente_id = e.id
+    LEFT JOIN (
+        SELECT DISTINCT ON (expediente_id) expediente_id, solicitud
+        FROM ingresos WHERE expediente_id = ANY(ids)
+        ORDER BY expediente_id, fecha_ingreso DESC NULLS LAST, id DESC
+    ) r ON r.expediente_id = e.id
+    WHERE e.id = ANY(ids)
+    ON CONFLICT (expediente_id) DO UPDATE SET
+        total_ingresos = EXCLUDED.total_ingresos,
+        ultimo_ingreso = EXCLUDED.ultimo_ingreso,
+        total_estados = EXCLUDED.total_estados,
+        ultimo_estado = EXCLUDED.ultimo_estado,
+        total_actuaciones = EXCLUDED.total_actuaciones,
+        ultima_actuacion = EXCLUDED.ultima_actuacion,
+        solicitud_reciente = EXCLUDED.solicitud_reciente,
+        fecha_actualizacion = EXCLUDED.fecha_actualizacion
+$$;
+
+-- Función de trigger común: recalcula los expedientes de las filas afectadas
+CREATE OR REPLACE FUNCTION trg_expediente_stats() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refrescar_expediente_stats(ARRAY(
+            SELECT DISTINCT expediente_id FROM nuevas WHERE expediente_id IS NOT NULL));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refrescar_expediente_stats(ARRAY(
+            SELECT DISTINCT expediente_id FROM viejas WHERE expediente_id IS NOT NULL));
+    ELSE
+        PERFORM refrescar_expediente_stats(ARRAY(
+            SELECT expediente_id FROM nuevas WHERE expediente_id IS NOT NULL
+            UNION
+            SELECT expediente_id FROM viejas WHERE expediente_id IS NOT NULL));
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+-- Un trigger por tabla y evento (las tablas de transición no admiten varios eventos)
+DROP TRIGGER IF EXISTS trg_ingresos_stats_insert ON ingresos;
+CREATE TRIGGER trg_ingresos_stats_insert AFTER INSERT ON ingresos
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_expediente_stats();
+DROP TRIGGER IF EXISTS trg_ingresos_stats_update ON ingresos;
+CREATE TRIGGER trg_ingresos_stats_update AFTER UPDATE ON ingresos
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_expediente_stats();
+DROP TRIGGER IF EXISTS trg_ingresos_stats_delete ON ingresos;
+CREATE TRIGGER trg_ingresos_stats_delete AFTER DELETE ON ingresos
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_expediente_stats();
+
+DROP TRIGGER IF EXISTS trg_estados_stats_insert ON estados;
+CREATE TRIGGER trg_estados_stats_insert AFTER INSERT ON estados
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_expediente_stats();
+DROP TRIGGER IF EXISTS trg_estados_stats_update ON estados;
+CREATE TRIGGER trg_estados_stats_update AFTER UPDATE ON estados
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_expediente_stats();
+DROP TRIGGER IF EXISTS trg_estados_stats_delete ON estados;
+CREATE TRIGGER trg_estados_stats_delete AFTER DELETE ON estados
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_expediente_stats();
+
+DROP TRIGGER IF EXISTS trg_actuaciones_stats_insert ON actuaciones;
+CREATE TRIGGER trg_actuaciones_stats_insert AFTER INSERT ON actuaciones
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_expediente_stats();
+DROP TRIGGER IF EXISTS trg_actuaciones_stats_update ON actuaciones;
+CREATE TRIGGER trg_actuaciones_stats_update AFTER UPDATE ON actuaciones
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_expediente_stats();
+DROP TRIGGER IF EXISTS trg_actuaciones_stats_delete ON actuaciones;
+CREATE TRIGGER trg_actuaciones_stats_delete AFTER DELETE ON actuaciones
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_expediente_stats();
+
+-- Backfill inicial, sin bloqueos: la tabla se crea en esta misma transacción
+SELECT refrescar_expediente_stats(ARRAY(SELECT id FROM expediente), FALSE);
@@ -0,0 +1,9 @@
+-- Índices de los listados paginados por cursor (utils/paginacion.py). Las
+-- expresiones deben coincidir con CLAVES_ORDEN (sin el alias) para que se usen.
+-- Los de la clave 'turno' los crea 0006_turno_entero.sql.
+
+CREATE INDEX IF NOT EXISTS idx_expediente_estado_fecha_id
+    ON expediente (estado, (COALESCE(fecha_ingreso, DATE '9999-12-31')), id);
+
+CREATE INDEX IF NOT EXISTS idx_expediente_fecha_id
+    ON expediente ((COALESCE(fecha_ingreso, DATE '9999-12-31')), id);
@@ -0,0 +1,29 @@
+-- expediente.turno a INTEGER (utils/turnos.py) e índices parciales de la cola
+-- 'Activo Pendiente'. Los valores de texto que no son un número ('', 'N/A')
+-- quedan en NULL; los turnos se renumeran con `flask recalcular-turnos`.
+-- El ALTER TABLE reescribe la tabla con bloqueo exclusivo: aplicar fuera
+-- del horario de atención.
+
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'expediente' AND column_name = 'turno') <> 'integer' THEN
+        -- Los índices de la paginación sobre el texto se recrean con la columna entera
+        DROP INDEX IF EXISTS idx_expediente_turno_id, idx_expediente_turno_desc_id;
+        ALTER TABLE expediente ALTER COLUMN turno TYPE INTEGER
+            USING (CASE WHEN btrim(turno::text) ~ '^[0-9]{1,9}$' THEN btrim(turno::text)::integer END);
+    END IF;
+END
+$$;
+
+-- Orden del tablero y de la cola
+CREATE INDEX IF NOT EXISTS idx_expediente_cola_turno
+    ON expediente (turno, id) WHERE estado = 'Activo Pendiente';
+
+-- Clave 'turno' de la paginación: sin turno al final en los dos sentidos
+-- (TURNO_MAXIMO ascendente, -1 descendente; ver utils/paginacion.py)
+CREATE INDEX IF NOT EXISTS idx_expediente_turno_id
+    ON expediente ((COALESCE(turno, 2147483647)), id) WHERE estado = 'Activo Pendiente';
+
+CREATE INDEX IF NOT EXISTS idx_expediente_turno_desc_id
+    ON expediente ((COALESCE(turno, -1)), id) WHERE estado = 'Activo Pendiente';
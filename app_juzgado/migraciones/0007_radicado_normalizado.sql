@@ -0,0 +1,58 @@
+-- Columnas normalizadas del radicado (utils/indice_radicados.py):
+-- radicado_normalizado (solo dígitos) y radicado_sufijo (sus últimos 13
+-- dígitos), mantenidas por trigger. Las búsquedas las usan en cuanto
+-- existen, por eso el backfill va en la misma transacción; después se
+-- puede repetir con `flask backfill-radicado-normalizado`.
+
+ALTER TABLE expediente ADD COLUMN IF NOT EXISTS radicado_normalizado TEXT;
+ALTER TABLE expediente ADD COLUMN IF NOT EXISTS radicado_sufijo TEXT;
+
+CREATE OR REPLACE FUNCTION radicado_solo_digitos(radicado TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT NULLIF(regexp_replace(COALESCE(radicado, ''), '[^0-9]', '', 'g'), '')
+$$;
+
+CREATE OR REPLACE FUNCTION trg_radicado_normalizado() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.radicado_normalizado := radicado_solo_digitos(NEW.radicado_completo);
+    NEW.radicado_sufijo := CASE WHEN LENGTH(NEW.radicado_normalizado) >= 13
+                                THEN RIGHT(NEW.radicado_normalizado, 13) END;
+    RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS trg_expediente_radicado_normalizado ON expediente;
+CREATE TRIGGER trg_expediente_radicado_normalizado
+BEFORE INSERT OR UPDATE OF radicado_completo ON expediente
+FOR EACH ROW EXECUTE FUNCTION trg_radicado_normalizado();
+
+-- Backfill inicial
+UPDATE expediente
+SET radicado_normalizado = radicado_solo_digitos(radicado_completo),
+    radicado_sufijo = CASE WHEN LENGTH(radicado_solo_digitos(radicado_completo)) >= 13
+                           THEN RIGHT(radicado_solo_digitos(radicado_completo), 13) END
+WHERE radicado_normalizado IS DISTINCT FROM radicado_solo_digitos(radicado_completo);
+
+-- UNIQUE si los datos existentes lo permiten; si no, índice simple (los
+-- repetidos los informa `flask backfill-radicado-normalizado`)
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM expediente WHERE radicado_normalizado IS NOT NULL
+               GROUP BY radicado_normalizado HAVING COUNT(*) > 1) THEN
+        RAISE NOTICE 'Radicados normalizados repetidos: idx_expediente_radicado_normalizado se crea sin UNIQUE';
+        CREATE INDEX IF NOT EXISTS idx_expediente_radicado_normalizado
+            ON expediente (radicado_normalizado) WHERE radicado_normalizado IS NOT NULL;
+    ELSE
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_expediente_radicado_normalizado
+            ON expediente (radicado_normalizado) WHERE radicado_normalizado IS NOT NULL;
+    END IF;
+END
+$$;
+
+-- Radicados distintos pueden compartir sufijo: sin UNIQUE
+CREATE INDEX IF NOT EXISTS idx_expediente_radicado_sufijo
+    ON expediente (radicado_sufijo) WHERE radicado_sufijo IS NOT NULL;
+
+-- Reemplazado por idx_expediente_radicado_sufijo
+DROP INDEX IF EXISTS idx_expediente_radicado_ultimos13;
@@ -0,0 +1,29 @@
+-- Cola de las cargas de Excel (utils/trabajos_carga.py). Antes la creaba la
+-- aplicación en la primera petición; los ADD COLUMN cubren las instalaciones
+-- donde ya existía sin las columnas de recuperación de huérfanos.
+
+CREATE TABLE IF NOT EXISTS trabajos_carga (
+    id SERIAL PRIMARY KEY,
+    usuario_id INTEGER,
+    nombre_archivo TEXT,
+    modo_actualizacion BOOLEAN NOT NULL DEFAULT FALSE,
+    archivo BYTEA,
+    estado TEXT NOT NULL DEFAULT 'pendiente',
+    filas_total INTEGER NOT NULL DEFAULT 0,
+    filas_procesadas INTEGER NOT NULL DEFAULT 0,
+    errores INTEGER NOT NULL DEFAULT 0,
+    mensaje TEXT,
+    resultado JSONB,
+    reporte_id INTEGER,
+    fecha_creacion TIMESTAMP NOT NULL DEFAULT NOW(),
+    fecha_inicio TIMESTAMP,
+    fecha_actualizacion TIMESTAMP NOT NULL DEFAULT NOW(),
+    fecha_fin TIMESTAMP
+);
+
+-- Quién lo procesa (host:pid) y cuántas veces se tomó, para recuperar huérfanos
+ALTER TABLE trabajos_carga ADD COLUMN IF NOT EXISTS propietario TEXT;
+ALTER TABLE trabajos_carga ADD COLUMN IF NOT EXISTS intentos INTEGER NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS idx_trabajos_carga_pendientes
+    ON trabajos_carga (id) WHERE estado = 'pendiente';
@@ -0,0 +1,10 @@
+-- Instantáneas de las métricas de los dashboards (utils/metricas_cache.py).
+-- Antes la creaba la aplicación en la primera lectura del dashboard.
+
+CREATE TABLE IF NOT EXISTS metricas_snapshot (
+    clave TEXT PRIMARY KEY,
+    datos JSONB,
+    generacion BIGINT NOT NULL DEFAULT 0,
+    generacion_calculada BIGINT,
+    fecha_calculo TIMESTAMP
+);
@@ -0,0 +1,24 @@
+-- Contadores y bloqueos del rate limiter compartidos entre workers
+-- (utils/rate_limiter.py, RATE_LIMIT_ALMACEN=postgres). UNLOGGED: son datos
+-- efímeros, no vale la pena escribirlos en el WAL. Sin estas tablas cada
+-- worker usa su almacén en memoria.
+
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_contadores (
+    clave TEXT PRIMARY KEY,
+    ventana INTEGER NOT NULL,
+    inicio BIGINT NOT NULL,
+    actual INTEGER NOT NULL DEFAULT 0,
+    anterior INTEGER NOT NULL DEFAULT 0,
+    ultimo_uso DOUBLE PRECISION NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_rate_limit_contadores_uso
+    ON rate_limit_contadores (ultimo_uso);
+
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_bloqueos (
+    clave TEXT PRIMARY KEY,
+    hasta DOUBLE PRECISION NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_rate_limit_bloqueos_hasta
+    ON rate_limit_bloqueos (hasta);
@@ -0,0 +1,13 @@
+-- Búsqueda de radicados por subcadena sobre la columna normalizada (ver
+-- utils/indice_radicados.buscar_en_bd): la misma que indexa IndiceRadicados,
+-- así "2019-00123" y "201900123" encuentran los mismos expedientes en
+-- memoria y en la base. Como en 0002, sin pg_trgm se omite el índice.
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        CREATE INDEX IF NOT EXISTS idx_expediente_radicado_normalizado_trgm
+            ON expediente USING gin (radicado_normalizado gin_trgm_ops);
+    END IF;
+END
+$$;
@@ -1,8 +1,11 @@
 import psycopg2
 import os
+from contextlib import contextmanager
 from urllib.parse import urlparse
 from dotenv import load_dotenv
 
+from .poolConexiones import PoolConexiones, PoolAgotadoError
+
 # Cargar variables de entorno desde múltiples ubicaciones posibles
 # override=True garantiza que el .env de la raíz siempre tiene la última palabra
 load_dotenv()  # Busca .env en directorio actual
@@ -99,14 +102,17 @@ load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '..', '.en
     except Exception as e:
         raise """
 
-def obtener_conexion():
-   #Conexión que funciona tanto en desarrollo como en producción (Railway)
+def crear_conexion_directa():
+    """Abre una conexión psycopg2 nueva, fuera del pool"""
+    global _origen_informado
     try:
         # 👉 PRIORIDAD 1: Producción (Railway)
         database_url = os.environ.get('DATABASE_URL')
 
         if database_url:
-            print("🚀 Producción: Usando DATABASE_URL (Railway)")
+            if not _origen_informado:
+                print("🚀 Producción: Usando DATABASE_URL (Railway)")
+                _origen_informado = True
             url = urlparse(database_url)
             return psycopg2.connect(
                 host=url.hostname,
@@ -114,11 +120,14 @@ def obtener_conexion():
                 user=url.username,
                 password=url.password,
                 port=url.port or 5432,
-                client_encoding='utf8'
+                client_encoding='utf8',
+                cursor_factory=_fabrica_cursor
             )
 
         # 👉 PRIORIDAD 2: Desarrollo local (.env)
-        print("🏠 Desarrollo: Usando configuración local (.env)")
+        if not _origen_informado:
+            print("🏠 Desarrollo: Usando configuración local (.env)")
+            _origen_informado = True
 
         db_config = {
             'host': os.getenv('DB_HOST', 'localhost'),
@@ -134,8 +143,91 @@ def obtener_conexion():
             if not db_config[key]:
                 raise Exception(f"❌ Variable {key.upper()} no configurada")
 
-        return psycopg2.connect(**db_config)
+        return psycopg2.connect(**db_config, cursor_factory=_fabrica_cursor)
 
     except Exception as e:
         print(f"❌ Error conectando a BD: {e}")
         raise
+
+
+_origen_informado = False
+
+# Clase de cursor de las conexiones nuevas (None = la de psycopg2)
+_fabrica_cursor = None
+
+
+def definir_fabrica_cursor(fabrica):
+    """
+    Clase de cursor (subclase de psycopg2.extensions.cursor) para las
+    conexiones que se creen desde ahora, p. ej. para contar o medir consultas.
+    Cierra las conexiones libres del pool para que se vuelvan a crear con ella.
+    Devuelve la clase anterior (para restaurarla).
+    """
+    global _fabrica_cursor
+    anterior, _fabrica_cursor = _fabrica_cursor, fabrica
+    pool.cerrar()
+    return anterior
+
+
+# Pool por proceso: cada worker de gunicorn tiene el suyo (ver gunicorn.conf.py)
+POOL_HABILITADO = os.getenv('DB_POOL_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+
+pool = PoolConexiones(
+    crear_conexion_directa,
+    tamano_max=int(os.getenv('DB_POOL_MAX', '10')),
+    vida_maxima=float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+    espera_maxima=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+    verificar_tras=float(os.getenv('DB_POOL_HEALTHCHECK_IDLE', '30')),
+)
+
+
+def obtener_conexion():
+    """
+    Conexión que funciona tanto en desarrollo como en producción (Railway).
+
+    Devuelve una conexión prestada por el pool del proceso; conn.close()
+    la devuelve al pool. Con DB_POOL_ENABLED=false abre una conexión directa.
+    """
+    if not POOL_HABILITADO:
+        return crear_conexion_directa()
+    return pool.obtener()
+
+
+@contextmanager
+def conexion_bd(commit=False):
+    """
+    Context manager sobre el pool: hace rollback si hay excepción y siempre
+    devuelve la conexión. Con commit=True confirma al salir sin errores.
+
+    Uso:
+        with conexion_bd() as conn:
+            cursor = conn.cursor()
+    """
+    conn = obtener_conexion()
+    try:
+        yield conn
+        if commit:
+            conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
+        conn.close()
+
+
+def estadisticas_pool():
+    """Métricas de saturación del pool del proceso actual"""
+    return pool.estadisticas()
+
+
+def reiniciar_pool_tras_fork():
+    """Llamado desde el hook post_fork de gunicorn en cada worker"""
+    pool.reiniciar_tras_fork()
+
+
+def cerrar_pool():
+    """Cierra las conexiones libres del pool del proceso actual"""
+    pool.cerrar()
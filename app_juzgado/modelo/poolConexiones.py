@@ -0,0 +1,314 @@
+"""
+Pool de conexiones PostgreSQL por proceso (un pool por worker de gunicorn).
+
+El pool entrega conexiones envueltas en ConexionPool: el código existente sigue
+llamando a conn.close(), que ahora devuelve la conexión al pool en lugar de
+cerrar el socket. Es seguro frente a fork (preload_app = True): si el PID
+cambia, el pool descarta las conexiones heredadas del proceso padre sin
+cerrarlas y comienza de cero en el worker.
+"""
+
+import collections
+import gc
+import os
+import threading
+import time
+import weakref
+
+import psycopg2
+import psycopg2.extensions
+
+
+class PoolAgotadoError(Exception):
+    """Se lanza cuando no hay conexiones libres dentro del tiempo de espera"""
+
+
+class _EntradaPool:
+    """Conexión física junto con sus marcas de tiempo"""
+
+    __slots__ = ('conexion', 'creada_en', 'liberada_en')
+
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.creada_en = time.monotonic()
+        self.liberada_en = self.creada_en
+
+
+class ConexionPool:
+    """
+    Envoltorio de una conexión psycopg2 prestada por el pool.
+
+    Delega todo en la conexión real salvo close(), que la devuelve al pool.
+    Si el objeto se pierde sin cerrarse, un finalizador la deja en la cola de
+    huérfanas del pool, que se devuelven en el siguiente préstamo.
+    """
+
+    def __init__(self, pool, entrada):
+        self._pool = pool
+        self._entrada = entrada
+        self._devuelta = False
+        self._finalizador = weakref.finalize(self, pool._encolar_huerfana, entrada)
+
+    def __getattr__(self, nombre):
+        return getattr(self._entrada.conexion, nombre)
+
+    def __setattr__(self, nombre, valor):
+        if nombre.startswith('_'):
+            object.__setattr__(self, nombre, valor)
+        else:
+            setattr(self._entrada.conexion, nombre, valor)
+
+    @property
+    def closed(self):
+        if self._devuelta:
+            return 1
+        return self._entrada.conexion.closed
+
+    def close(self):
+        """Devuelve la conexión al pool (idempotente)"""
+        if self._devuelta:
+            return
+        self._devuelta = True
+        self._finalizador.detach()
+        self._pool._devolver(self._entrada)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Mismo contrato que psycopg2: commit/rollback sin cerrar la conexión
+        if exc_type is None:
+            self._entrada.conexion.commit()
+        else:
+            self._entrada.conexion.rollback()
+        return False
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones con verificación de salud, reciclaje por antigüedad
+    y métricas de saturación.
+
+    Args:
+        fabrica: callable sin argumentos que abre una conexión psycopg2 nueva
+        tamano_max: máximo de conexiones simultáneas por proceso
+        vida_maxima: segundos tras los cuales una conexión se recicla
+        espera_maxima: segundos a esperar una conexión libre antes de fallar
+        verificar_tras: segundos de inactividad tras los cuales se hace SELECT 1
+    """
+
+    def __init__(self, fabrica, tamano_max=10, vida_maxima=1800,
+                 espera_maxima=30, verificar_tras=30):
+        self._fabrica = fabrica
+        self.tamano_max = max(1, int(tamano_max))
+        self.vida_maxima = vida_maxima
+        self.espera_maxima = espera_maxima
+        self.verificar_tras = verificar_tras
+        self._lock = threading.Condition(threading.Lock())
+        # Devueltas por el recolector: el finalizador puede ejecutarse en un
+        # hilo que ya tiene self._lock, así que solo encola (deque es atómica)
+        self._huerfanas = collections.deque()
+        self._heredadas = []
+        self._inicializar_estado()
+
+    def _inicializar_estado(self):
+        self._pid = os.getpid()
+        self._libres = []
+        self._en_uso = 0
+        self._metricas = {
+            'prestamos': 0,
+            'conexiones_creadas': 0,
+            'conexiones_recicladas': 0,
+            'conexiones_descartadas': 0,
+            'verificaciones_fallidas': 0,
+            'esperas': 0,
+            'tiempo_espera_total': 0.0,
+            'agotamientos': 0,
+            'pico_en_uso': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Fork
+    # ------------------------------------------------------------------
+    def _verificar_pid(self):
+        """Si estamos en un proceso hijo, abandonar las conexiones del padre"""
+        if self._pid != os.getpid():
+            self.reiniciar_tras_fork()
+
+    def reiniciar_tras_fork(self):
+        """
+        Descarta el estado heredado del proceso padre.
+
+        Las conexiones heredadas NO se cierran: cerrarlas enviaría el mensaje
+        de terminación por el socket compartido con el padre. Se conservan
+        referenciadas para que el recolector tampoco las cierre.
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._heredadas.extend(e.conexion for e in self._libres)
+            while self._huerfanas:
+                self._heredadas.append(self._huerfanas.popleft().conexion)
+            self._inicializar_estado()
+
+    # ------------------------------------------------------------------
+    # Préstamo y devolución
+    # ------------------------------------------------------------------
+    def obtener(self):
+        """Presta una conexión sana del pool, creando una nueva si hace falta"""
+        self._verificar_pid()
+        self._devolver_huerfanas()
+        inicio = time.monotonic()
+        esperando = False
+        recolectado = False
+
+        with self._lock:
+            while not self._libres and self._en_uso >= self.tamano_max:
+                if not recolectado:
+                    # Conexiones olvidadas en ciclos de referencias vuelven al pool
+                    recolectado = True
+                    self._lock.release()
+                    try:
+                        gc.collect()
+                        self._devolver_huerfanas()
+                    finally:
+                        self._lock.acquire()
+                    continue
+                if not esperando:
+                    esperando = True
+                    self._metricas['esperas'] += 1
+                restante = self.espera_maxima - (time.monotonic() - inicio)
+                if restante <= 0:
+                    self._metricas['agotamientos'] += 1
+                    raise PoolAgotadoError(
+                        f"❌ Pool de conexiones agotado ({self.tamano_max} en uso)"
+                    )
+                self._lock.wait(restante)
+
+            if esperando:
+                self._metricas['tiempo_espera_total'] += time.monotonic() - inicio
+            entrada = self._libres.pop() if self._libres else None
+            self._en_uso += 1
+            self._metricas['prestamos'] += 1
+            self._metricas['pico_en_uso'] = max(self._metricas['pico_en_uso'], self._en_uso)
+
+        try:
+            if entrada is not None and not self._entrada_sana(entrada):
+                self._cerrar_entrada(entrada)
+                entrada = None
+            if entrada is None:
+                entrada = _EntradaPool(self._fabrica())
+                with self._lock:
+                    self._metricas['conexiones_creadas'] += 1
+        except Exception:
+            with self._lock:
+                self._en_uso -= 1
+                self._lock.notify()
+            raise
+
+        return ConexionPool(self, entrada)
+
+    def _entrada_sana(self, entrada):
+        """Comprueba antigüedad y, si estuvo inactiva un rato, hace SELECT 1"""
+        conexion = entrada.conexion
+        ahora = time.monotonic()
+        if conexion.closed:
+            self._contar('conexiones_descartadas')
+            return False
+        if self.vida_maxima and ahora - entrada.creada_en > self.vida_maxima:
+            self._contar('conexiones_recicladas')
+            return False
+        if self.verificar_tras is not None and ahora - entrada.liberada_en >= self.verificar_tras:
+            try:
+                cursor = conexion.cursor()
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+                cursor.close()
+                conexion.rollback()
+            except Exception:
+                self._contar('verificaciones_fallidas')
+                self._contar('conexiones_descartadas')
+                return False
+        return True
+
+    def _encolar_huerfana(self, entrada):
+        """Finalizador de ConexionPool: no toma el lock, solo encola"""
+        self._huerfanas.append(entrada)
+
+    def _devolver_huerfanas(self):
+        """Devuelve al pool las conexiones que encoló el recolector (sin tener el lock)"""
+        while True:
+            try:
+                entrada = self._huerfanas.popleft()
+            except IndexError:
+                return
+            self._devolver(entrada)
+
+    def _devolver(self, entrada):
+        """Regresa una conexión al pool dejándola limpia (sin transacción abierta)"""
+        if self._pid != os.getpid():
+            # Préstamo hecho por el proceso padre: no tocar el socket
+            self._heredadas.append(entrada.conexion)
+            return
+
+        conexion = entrada.conexion
+        reutilizable = not conexion.closed
+        if reutilizable:
+            try:
+                if conexion.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conexion.rollback()
+                if conexion.autocommit:
+                    conexion.autocommit = False
+            except Exception:
+                reutilizable = False
+
+        if reutilizable and self.vida_maxima and time.monotonic() - entrada.creada_en > self.vida_maxima:
+            self._contar('conexiones_recicladas')
+            reutilizable = False
+
+        if not reutilizable:
+            self._cerrar_entrada(entrada)
+
+        with self._lock:
+            self._en_uso -= 1
+            if reutilizable:
+                entrada.liberada_en = time.monotonic()
+                self._libres.append(entrada)
+            self._lock.notify()
+
+    def _cerrar_entrada(self, entrada):
+        try:
+            if not entrada.conexion.closed:
+                entrada.conexion.close()
+        except Exception:
+            pass
+
+    def _contar(self, metrica):
+        with self._lock:
+            self._metricas[metrica] += 1
+
+    def cerrar(self):
+        """Cierra todas las conexiones libres (p. ej. en el master antes de hacer fork)"""
+        self._verificar_pid()
+        with self._lock:
+            libres, self._libres = self._libres, []
+        for entrada in libres:
+            self._cerrar_entrada(entrada)
+
+    # ------------------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------------------
+    def estadisticas(self):
+        """Devuelve un diccionario con el estado y la saturación del pool"""
+        self._verificar_pid()
+        self._devolver_huerfanas()
+        with self._lock:
+            stats = dict(self._metricas)
+            stats.update({
+                'pid': self._pid,
+                'tamano_max': self.tamano_max,
+                'en_uso': self._en_uso,
+                'disponibles': len(self._libres),
+                'saturacion': round(self._en_uso / self.tamano_max, 3),
+            })
+        return stats
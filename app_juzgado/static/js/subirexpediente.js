@@ -111,4 +111,143 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         });
     }
-});
\ No newline at end of file
+});
+// ===== Carga de Excel en segundo plano =====
+
+const INTERVALO_CONSULTA_CARGA = 1500;
+
+function escaparHtml(texto) {
+    const div = document.createElement('div');
+    div.textContent = texto == null ? '' : String(texto);
+    return div.innerHTML;
+}
+
+function formatearSegundos(segundos) {
+    if (segundos == null) return '';
+    if (segundos < 60) return `${segundos} s`;
+    const minutos = Math.floor(segundos / 60);
+    return `${minutos} min ${segundos % 60} s`;
+}
+
+function claseAlerta(categoria) {
+    if (categoria === 'error') return 'danger';
+    return ['success', 'info', 'warning'].includes(categoria) ? categoria : 'info';
+}
+
+// Muestra el avance de un trabajo y vuelve a consultar hasta que termine
+function seguirTrabajoCarga(trabajoId) {
+    const panel = document.getElementById('panel-trabajo-carga');
+    if (!panel || !trabajoId) return;
+
+    const url = panel.dataset.urlEstado.replace(/0$/, trabajoId);
+    const titulo = document.getElementById('trabajo-titulo');
+    const barra = document.getElementById('trabajo-barra');
+    const detalle = document.getElementById('trabajo-detalle');
+    const mensajes = document.getElementById('trabajo-mensajes');
+
+    panel.style.display = 'block';
+    mensajes.innerHTML = '';
+
+    fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Error consultando el avance: ' + response.status);
+            }
+            return response.json();
+        })
+        .then(trabajo => {
+            const porcentaje = trabajo.porcentaje || 0;
+            barra.style.width = porcentaje + '%';
+            barra.textContent = porcentaje + '%';
+
+            if (trabajo.estado === 'pendiente') {
+                titulo.innerHTML = '<i class="fas fa-hourglass-half"></i> En cola...';
+                detalle.textContent = trabajo.en_cola > 0
+                    ? `${trabajo.en_cola} carga(s) antes que esta`
+                    : 'Iniciando procesamiento';
+            } else if (trabajo.estado === 'procesando') {
+                titulo.innerHTML = `<i class="fas fa-cog fa-spin"></i> Procesando ${escaparHtml(trabajo.nombre_archivo)}...`;
+                let texto = `${trabajo.filas_procesadas} de ${trabajo.filas_total} filas`;
+                texto += ` · ${trabajo.errores} errores`;
+                if (trabajo.eta_segundos != null) {
+                    texto += ` · tiempo restante aprox. ${formatearSegundos(trabajo.eta_segundos)}`;
+                }
+                detalle.textContent = texto;
+            }
+
+            if (!trabajo.terminado) {
+                setTimeout(() => seguirTrabajoCarga(trabajoId), INTERVALO_CONSULTA_CARGA);
+                return;
+            }
+
+            barra.classList.remove('progress-bar-animated', 'progress-bar-striped');
+            if (trabajo.estado === 'completado') {
+                barra.classList.add(trabajo.errores > 0 ? 'bg-warning' : 'bg-success');
+                titulo.innerHTML = `<i class="fas fa-check-circle"></i> ${escaparHtml(trabajo.nombre_archivo)} procesado`;
+                detalle.textContent = `${trabajo.filas_procesadas} filas en ${formatearSegundos(Math.round(trabajo.segundos || 0))}`;
+            } else {
+                barra.classList.add('bg-danger');
+                titulo.innerHTML = `<i class="fas fa-exclamation-triangle"></i> Error procesando ${escaparHtml(trabajo.nombre_archivo)}`;
+                detalle.textContent = '';
+                trabajo.mensajes = [[trabajo.mensaje || 'Error desconocido', 'error']];
+            }
+
+            mensajes.innerHTML = trabajo.mensajes.map(([mensaje, categoria]) => `
+                <div class="alert alert-${claseAlerta(categoria)} mb-2" style="white-space: pre-line;">${escaparHtml(mensaje)}</div>
+            `).join('');
+
+            if (typeof cargarUltimosErrores === 'function') {
+                cargarUltimosErrores();
+            }
+        })
+        .catch(error => {
+            console.error('Error consultando avance de la carga:', error);
+            detalle.textContent = error.message;
+            setTimeout(() => seguirTrabajoCarga(trabajoId), INTERVALO_CONSULTA_CARGA * 2);
+        });
+}
+
+// Envía el archivo sin recargar la página y sigue el trabajo encolado
+function enviarArchivoExcel(e) {
+    const formulario = e.target;
+    const boton = formulario.querySelector('button[type="submit"]');
+    e.preventDefault();
+
+    if (boton) boton.disabled = true;
+
+    fetch(formulario.action, {
+        method: 'POST',
+        body: new FormData(formulario),
+        headers: { 'X-Requested-With': 'XMLHttpRequest' }
+    })
+        .then(response => response.json().then(datos => ({ ok: response.ok, datos })))
+        .then(({ ok, datos }) => {
+            if (!ok || !datos.success) {
+                throw new Error(datos.error || 'Error subiendo el archivo');
+            }
+            formulario.reset();
+            window.scrollTo({ top: 0, behavior: 'smooth' });
+            seguirTrabajoCarga(datos.trabajo_id);
+        })
+        .catch(error => {
+            console.error('Error subiendo archivo Excel:', error);
+            alert(error.message);
+        })
+        .finally(() => {
+            if (boton) boton.disabled = false;
+        });
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('form[enctype="multipart/form-data"]').forEach(formulario => {
+        if (formulario.querySelector('input[name="archivo_excel"]')) {
+            formulario.addEventListener('submit', enviarArchivoExcel);
+        }
+    });
+
+    // Al volver de un envío sin JavaScript (?trabajo=<id>) se sigue el trabajo
+    const panel = document.getElementById('panel-trabajo-carga');
+    if (panel && panel.dataset.trabajoId) {
+        seguirTrabajoCarga(panel.dataset.trabajoId);
+    }
+});
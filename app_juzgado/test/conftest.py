@@ -5,12 +5,21 @@ Configuración de pytest para las pruebas del sistema de expedientes
 import pytest
 import sys
 import os
+import time
 from unittest.mock import Mock, patch
 from datetime import datetime
 
 # Agregar el directorio padre al path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+@pytest.fixture(autouse=True)
+def esquema_vacio(monkeypatch):
+    """Sin base de datos, las pruebas parten de un registro del esquema vacío y vigente"""
+    from utils import esquema
+    monkeypatch.setattr(esquema, '_tablas', {})
+    monkeypatch.setattr(esquema, '_cargado_en', time.monotonic())
+    monkeypatch.setattr(esquema, '_ultimo_fallo', None)
+
 @pytest.fixture
 def app():
     """Fixture para crear una instancia de la aplicación Flask para pruebas"""
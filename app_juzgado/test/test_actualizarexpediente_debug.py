@@ -80,19 +80,19 @@ def test_column_detection():
         cursor = conn.cursor()
         
         # Probar detección de columnas disponibles
-        available_columns = _detectar_columnas_disponibles(cursor)
+        available_columns = _detectar_columnas_disponibles()
         logger.info(f"Columnas disponibles: {available_columns}")
         
         # Probar detección de columna tipo
-        tipo_col = _detectar_columna_tipo(cursor)
+        tipo_col = _detectar_columna_tipo()
         logger.info(f"Columna tipo detectada: {tipo_col}")
         
         # Probar detección de columna ubicación
-        ubicacion_col = _detectar_columna_ubicacion(cursor)
+        ubicacion_col = _detectar_columna_ubicacion()
         logger.info(f"Columna ubicación detectada: {ubicacion_col}")
         
         # Probar construcción de SELECT
-        select_clause = _construir_select_expediente(cursor)
+        select_clause = _construir_select_expediente()
         logger.info(f"SELECT construido: {select_clause}")
         
         cursor.close()
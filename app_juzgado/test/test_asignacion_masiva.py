@@ -0,0 +1,166 @@
+"""
+Pruebas para el motor de asignación masiva (utils/asignacion_masiva.py)
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import Mock, patch
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.asignacion_masiva import (
+    aplicar_asignaciones, cargas_actuales, distribuir, distribuir_circular, distribuir_menor_carga,
+    filtro_criterio, limpiar_asignaciones, seleccionar_expedientes
+)
+
+
+class TestMotorAsignacion:
+    """Pruebas de selección, distribución y aplicación"""
+
+    def test_distribucion_circular(self):
+        ids, usuarios, responsables = distribuir_circular(
+            [10, 11, 12, 13, 14], [(1, 'ESCRIBIENTE'), (2, 'SUSTANCIADOR')])
+
+        assert ids == [10, 11, 12, 13, 14]
+        assert usuarios == [1, 2, 1, 2, 1]
+        assert responsables == ['ESCRIBIENTE', 'SUSTANCIADOR', 'ESCRIBIENTE', 'SUSTANCIADOR', 'ESCRIBIENTE']
+
+    def test_una_sola_sentencia_con_conteos(self):
+        """Miles de expedientes se aplican en un único UPDATE ... FROM unnest"""
+        cursor = Mock()
+        cursor.fetchall.return_value = [(1, 1500), (2, 1500)]
+        ids, usuarios, responsables = distribuir_circular(list(range(3000)), [(1, 'A'), (2, 'B')])
+
+        conteos = aplicar_asignaciones(cursor, ids, usuarios, responsables)
+
+        assert cursor.execute.call_count == 1
+        sql, parametros = cursor.execute.call_args[0]
+        assert 'unnest(%s::int[], %s::int[], %s::text[])' in sql
+        assert len(parametros[0]) == 3000
+        assert conteos == {1: 1500, 2: 1500}
+
+    def test_limpiar_asigna_nulos(self):
+        cursor = Mock()
+        cursor.fetchall.return_value = [(None, 2)]
+
+        assert limpiar_asignaciones(cursor, [5, 6]) == 2
+        assert cursor.execute.call_args[0][1] == ([5, 6], [None, None], [None, None])
+
+    def test_sin_expedientes_no_consulta(self):
+        cursor = Mock()
+        assert aplicar_asignaciones(cursor, [], [], []) == {}
+        cursor.execute.assert_not_called()
+
+    def test_seleccion_con_limite(self):
+        cursor = Mock()
+        cursor.fetchall.return_value = [(3,), (1,)]
+        filtro, params = filtro_criterio('estado', 'Activo Pendiente')
+
+        assert seleccionar_expedientes(cursor, filtro, params, limite=2) == [3, 1]
+        sql, parametros = cursor.execute.call_args[0]
+        assert sql.endswith('ORDER BY fecha_ingreso ASC, id ASC LIMIT %s')
+        assert parametros == ('Activo Pendiente', 2)
+
+    def test_criterio_desconocido(self):
+        with pytest.raises(ValueError):
+            filtro_criterio('otro')
+
+
+class TestMenorCarga:
+    """Pruebas de la estrategia por menor carga"""
+
+    def test_primero_el_menos_cargado(self):
+        ids, usuarios, _ = distribuir_menor_carga(
+            [10, 11, 12, 13], [(1, 'A'), (2, 'A'), (3, 'A')], {1: 5, 2: 3})
+
+        # 3 no tiene carga: recibe hasta igualar a 2, luego empatan por orden
+        assert ids == [10, 11, 12, 13]
+        assert usuarios == [3, 3, 3, 2]
+
+    def test_cargas_convergen(self):
+        """10.000 expedientes entre 20 usuarios con cargas dispares quedan equilibrados"""
+        usuarios = [(u, 'ESCRIBIENTE') for u in range(1, 21)]
+        cargas = {u: u * 37 for u in range(1, 21)}
+
+        _, asignados, _ = distribuir_menor_carga(list(range(10000)), usuarios, cargas)
+
+        finales = dict(cargas)
+        for usuario_id in asignados:
+            finales[usuario_id] += 1
+        assert len(asignados) == 10000
+        assert max(finales.values()) - min(finales.values()) <= 1
+
+    def test_consulta_agregada_excluye_redistribuidos(self):
+        cursor = Mock()
+        cursor.fetchall.return_value = [(1, 4)]
+
+        assert cargas_actuales(cursor, [1, 2], [10, 11]) == {1: 4}
+        sql, parametros = cursor.execute.call_args[0]
+        assert 'GROUP BY' in sql
+        assert parametros == ([10, 11], [1, 2], 'Activo Pendiente')
+
+    def test_estrategia_desconocida(self):
+        with pytest.raises(ValueError):
+            distribuir(Mock(), [1], [(1, 'A')], 'otra')
+
+
+class TestVistasAsignacion:
+    """Las vistas usan el motor: sin consultas por expediente"""
+
+    def test_distribucion_por_rol(self):
+        from vista.vistaactualizarexpediente import asignacion_por_rol_especifico
+
+        cursor = Mock()
+        cursor.fetchall.side_effect = [
+            [(1, 'Ana'), (2, 'Luis')],          # usuarios del rol
+            [(10,), (11,), (12,)],              # expedientes del criterio
+            [(1, 2), (2, 1)],                   # conteos del UPDATE
+        ]
+        conn = Mock()
+
+        with patch('vista.vistaactualizarexpediente.flash') as flash, \
+             patch('vista.vistaactualizarexpediente.redirect'), \
+             patch('vista.vistaactualizarexpediente.url_for'):
+            asignacion_por_rol_especifico('todos', '', 'ESCRIBIENTE', cursor, conn)
+
+        assert cursor.execute.call_count == 3
+        assert cursor.execute.call_args[0][1] == ([10, 11, 12], [1, 2, 1], ['ESCRIBIENTE'] * 3)
+        conn.commit.assert_called_once()
+        mensaje, categoria = flash.call_args[0]
+        assert categoria == 'success'
+        assert 'Distribución: Ana: 2, Luis: 1' in mensaje
+
+    def test_distribucion_por_rol_menor_carga(self):
+        from vista.vistaactualizarexpediente import asignacion_por_rol_especifico
+
+        cursor = Mock()
+        cursor.fetchall.side_effect = [
+            [(1, 'Ana'), (2, 'Luis')],          # usuarios del rol
+            [(10,), (11,), (12,)],              # expedientes del criterio
+            [(1, 2)],                           # carga actual
+            [(2, 2), (1, 1)],                   # conteos del UPDATE
+        ]
+        conn = Mock()
+
+        with patch('vista.vistaactualizarexpediente.flash') as flash, \
+             patch('vista.vistaactualizarexpediente.redirect'), \
+             patch('vista.vistaactualizarexpediente.url_for'):
+            asignacion_por_rol_especifico('todos', '', 'ESCRIBIENTE', cursor, conn, estrategia='menor_carga')
+
+        assert cursor.execute.call_count == 4
+        assert cursor.execute.call_args[0][1] == ([10, 11, 12], [2, 2, 1], ['ESCRIBIENTE'] * 3)
+        assert 'equilibrando la carga actual' in flash.call_args[0][0]
+
+    def test_limpieza_requiere_valor(self):
+        from vista.vistaactualizarexpediente import limpiar_responsables_masivo
+
+        cursor = Mock()
+        with patch('vista.vistaactualizarexpediente.flash') as flash, \
+             patch('vista.vistaactualizarexpediente.redirect'), \
+             patch('vista.vistaactualizarexpediente.url_for'):
+            limpiar_responsables_masivo('estado', '', cursor, Mock())
+
+        cursor.execute.assert_not_called()
+        assert flash.call_args[0] == ('Debe especificar un estado para el criterio seleccionado', 'error')
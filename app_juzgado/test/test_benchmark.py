@@ -0,0 +1,74 @@
+"""
+Pruebas para la suite de benchmarks (utils/benchmark.py)
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import Mock
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.benchmark as benchmark
+from utils.benchmark import comparar, medir, percentil
+
+
+def _medicion(p95=10.0, consultas=3, rss=100.0, errores=0):
+    return {'n': 10, 'errores': errores, 'p50_ms': p95 / 2, 'p95_ms': p95, 'p99_ms': p95,
+            'media_ms': p95 / 2, 'consultas_por_operacion': consultas, 'rss_pico_mb': rss}
+
+
+class TestMedir:
+    """Percentiles y conteo de consultas por operación"""
+
+    def test_percentiles_por_rango(self):
+        valores = list(range(1, 101))
+        assert (percentil(valores, 50), percentil(valores, 95), percentil(valores, 99)) == (50, 95, 99)
+        assert percentil([7], 99) == 7
+
+    def test_cuenta_consultas_y_errores(self):
+        llamadas = []
+
+        def operacion():
+            llamadas.append(1)
+            benchmark._consultas += 4
+            if len(llamadas) == 3:
+                raise RuntimeError('HTTP 500')
+
+        limpiar = Mock()
+        resultado = medir(operacion, 5, limpiar=limpiar)
+
+        assert len(llamadas) == 6  # calentamiento + 5
+        assert limpiar.call_count == 6
+        assert resultado['n'] == 5 and resultado['errores'] == 1
+        assert resultado['consultas_por_operacion'] == 4
+        assert resultado['p50_ms'] <= resultado['p95_ms'] <= resultado['p99_ms']
+
+    def test_redireccion_es_error(self):
+        cliente = Mock()
+        cliente.get.return_value = Mock(status_code=302)
+        with pytest.raises(RuntimeError, match='302'):
+            benchmark._peticion(cliente, 'get', '/home')
+
+
+class TestComparar:
+    """Regresiones contra la línea base"""
+
+    def test_sin_regresiones_dentro_de_tolerancia(self):
+        base = {'escenarios': {'home': _medicion(p95=100.0)}}
+        actual = {'escenarios': {'home': _medicion(p95=120.0), 'nuevo': _medicion()}}
+        assert comparar(actual, base) == []
+
+    def test_latencia_y_consultas(self):
+        base = {'escenarios': {'home': _medicion(p95=100.0, consultas=3)}}
+        actual = {'escenarios': {'home': _medicion(p95=200.0, consultas=12)}}
+
+        regresiones = comparar(actual, base)
+
+        assert any('p95_ms' in r for r in regresiones)
+        assert any('consultas_por_operacion' in r for r in regresiones)
+
+    def test_errores_siempre_son_regresion(self):
+        actual = {'escenarios': {'home': _medicion(errores=2)}}
+        assert comparar(actual, {}) == ['home: 2 errores']
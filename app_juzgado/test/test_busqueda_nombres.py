@@ -0,0 +1,61 @@
+"""
+Pruebas para la búsqueda por nombres (utils/busqueda_nombres.py)
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import Mock, patch
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.busqueda_nombres as busqueda
+from utils.busqueda_nombres import DOCUMENTO_NOMBRES, buscar_expedientes_por_nombre, preparar_consulta
+
+
+class TestPrepararConsulta:
+    """Pruebas de la conversión del texto del usuario a tsquery"""
+
+    def test_palabras_como_prefijos(self):
+        assert preparar_consulta('  García   LOP ') == 'garcía:* & lop:*'
+
+    def test_sin_operadores_del_usuario(self):
+        """Los caracteres especiales de tsquery no llegan a la consulta"""
+        assert preparar_consulta("o'neil & (perez | !x):*") == 'neil:* & perez:*'
+
+    def test_sin_palabras_utiles(self):
+        assert preparar_consulta('a - b') is None
+
+
+class TestBuscarExpedientes:
+    """Pruebas de la consulta paginada"""
+
+    def setup_method(self):
+        busqueda._busqueda_indexada = False
+
+    def test_consulta_indexada_y_paginada(self):
+        """Con el índice creado se usa texto completo, ordenado por relevancia"""
+        cursor = Mock()
+        filas = [(1, '1' * 23, 'ANA GARCÍA', 'LUIS', 'Activo Pendiente', None, None)]
+        cursor.fetchone.side_effect = [(True,), (25,)]
+        cursor.fetchall.return_value = filas
+
+        resultado, total, pagina = buscar_expedientes_por_nombre(cursor, 'garcia', pagina=9, por_pagina=10)
+
+        assert (resultado, total, pagina) == (filas, 25, 3)
+        sql, parametros = cursor.execute.call_args_list[-1][0]
+        assert DOCUMENTO_NOMBRES in sql and 'ts_rank' in sql
+        assert parametros == ('garcia:*', 'garcia:*', 10, 20)
+
+    def test_sin_indice_usa_ilike(self):
+        """Antes de crear el índice se mantiene la búsqueda anterior"""
+        cursor = Mock()
+        cursor.fetchone.side_effect = [(False,), (0,)]
+
+        resultado, total, pagina = buscar_expedientes_por_nombre(cursor, 'garcia', pagina=2)
+
+        assert (resultado, total, pagina) == ([], 0, 1)
+        sql, parametros = cursor.execute.call_args_list[-1][0]
+        assert 'ILIKE' in sql
+        assert parametros == ('%garcia%', '%garcia%')
@@ -0,0 +1,160 @@
+"""
+Pruebas para la carga masiva de expedientes nuevos (utils/carga_masiva.py)
+"""
+
+import pytest
+import sys
+import os
+from datetime import date, datetime
+from unittest.mock import Mock
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from utils.carga_masiva import copiar_filas_carga, insertar_desde_carga
+
+COLUMNAS_BD = {
+    'id': ('integer', None),
+    'radicado_completo': ('character varying', 23),
+    'radicado_corto': ('text', None),
+    'demandante': ('text', None),
+    'demandado': ('text', None),
+    'fecha_ingreso': ('date', None),
+    'tipo_solicitud': ('text', None),
+    'estado': ('text', None),
+    'juzgado_origen': ('integer', None),
+}
+
+
+def _fila(**valores):
+    datos = {
+        'RADICADO COMPLETO': '11001310300120210000100',
+        'DEMANDANTE': 'Ana',
+        'DEMANDADO': 'Luis',
+        'FECHA INGRESO': datetime(2024, 1, 2),
+        'SOLICITUD': 'Demanda',
+    }
+    datos.update(valores)
+    return pd.Series(datos, name=0)
+
+
+class TestValidacionEnMemoria:
+    """Pruebas de extracción y validación de filas antes del COPY"""
+
+    def test_fila_valida(self):
+        """Una fila completa no tiene motivo de rechazo y toma el estado por defecto"""
+        from vista.vistasubirexpediente import extraer_expediente_nuevo
+
+        fila = _fila(JuzgadoOrigen=12)
+        datos, categoria, _ = extraer_expediente_nuevo(fila, fila.index, COLUMNAS_BD, 1)
+
+        assert categoria is None
+        assert datos['fecha_ingreso'] == date(2024, 1, 2)
+        assert datos['estado'] == 'Activo Pendiente'
+        assert datos['juzgado_origen'] == 12
+
+    def test_rechazos_en_orden(self):
+        """Se reporta el primer problema en el mismo orden que la carga fila a fila"""
+        from vista.vistasubirexpediente import extraer_expediente_nuevo
+
+        fila = _fila(**{'RADICADO COMPLETO': '123', 'DEMANDANTE': None})
+        _, categoria, detalle = extraer_expediente_nuevo(fila, fila.index, COLUMNAS_BD, 5)
+        assert categoria == 'radicado_invalido'
+        assert detalle == '123 (3 dígitos)'
+
+        fila = _fila(DEMANDANTE=None)
+        datos, categoria, detalle = extraer_expediente_nuevo(fila, fila.index, COLUMNAS_BD, 5)
+        assert categoria == 'campos_faltantes'
+        assert detalle == 'Fila 5: Sin demandante'
+        assert datos['motivo'] == 'campos_faltantes'
+
+        fila = _fila(JuzgadoOrigen='Bogotá')
+        _, categoria, _ = extraer_expediente_nuevo(fila, fila.index, COLUMNAS_BD, 5)
+        assert categoria == 'tecnico'
+
+
+class TestCopiaYInsercion:
+    """Pruebas del COPY y de las sentencias set-based"""
+
+    def test_copy_en_formato_csv_con_nulos(self):
+        """Los valores vacíos viajan como NULL y las fechas en ISO"""
+        cursor = Mock()
+        contenido = {}
+        cursor.copy_expert.side_effect = lambda sql, buffer: contenido.update(sql=sql, datos=buffer.read())
+
+        copiadas = copiar_filas_carga(cursor, [
+            {'fila': 1, 'radicado_completo': '1' * 23, 'demandante': 'Pérez, Ana', 'fecha_ingreso': date(2024, 1, 2)},
+        ])
+
+        assert copiadas == 1
+        assert contenido['sql'].startswith('COPY carga_expedientes (fila, radicado_completo')
+        assert contenido['datos'] == '1,' + '1' * 23 + ',,"Pérez, Ana",,2024-01-02,,,,,,,\r\n'
+
+    def test_sin_filas_no_ejecuta_copy(self):
+        cursor = Mock()
+        assert copiar_filas_carga(cursor, []) == 0
+        cursor.copy_expert.assert_not_called()
+
+    def test_insercion_set_based(self):
+        """Un número fijo de sentencias sin importar la cantidad de filas"""
+        cursor = Mock()
+        cursor.rowcount = 2
+        cursor.fetchone.return_value = ('public.expediente_id_seq',)
+        insertados = [
+            (1, 101, '1' * 23, None, 'Ana', 'Luis', date(2024, 1, 2), 'Activo Pendiente'),
+            (3, 102, '2' * 23, None, 'Eva', 'Juan', date(2024, 1, 3), 'Activo Pendiente'),
+        ]
+        cursor.fetchall.side_effect = [insertados, [(2, '3' * 23, 'ultimos_13')], [(4,)], []]
+
+        resultado = insertar_desde_carga(cursor, COLUMNAS_BD)
+
+        sentencias = [llamada[0][0] for llamada in cursor.execute.call_args_list]
+        insert_expediente = next(s for s in sentencias if 'INSERT INTO expediente' in s)
+        assert 'c.juzgado_origen::integer' in insert_expediente
+        assert any('INSERT INTO ingresos' in s for s in sentencias)
+        assert any('INSERT INTO estados' in s for s in sentencias)
+        assert any('LENGTH(c.radicado_completo) > %s' in s for s in sentencias)
+        assert 'ROLLBACK TO SAVEPOINT carga_bloque' not in sentencias
+        assert len(sentencias) == 15
+        assert resultado['insertados'] == insertados
+        assert resultado['duplicados'] == [(2, '3' * 23, 'ultimos_13')]
+        assert resultado['rechazados'] == [4]
+        assert resultado['fallidos'] == []
+
+    def test_fila_rechazada_por_la_base_no_aborta_la_carga(self):
+        """Si la inserción falla, se reintenta por bloques y fila a fila"""
+        cursor = Mock()
+        cursor.fetchone.return_value = ('public.expediente_id_seq',)
+        cursor.fetchall.side_effect = [
+            [(1,), (3,)],                                  # filas con id a reintentar
+            [(1, 101, '1' * 23, None, 'Ana', 'Luis', date(2024, 1, 2), None)],
+            [], [],
+            [(3, '2' * 23, 'violates check constraint')],
+        ]
+
+        def ejecutar(sql, parametros=()):
+            # La fila 3 viola una restricción: falla todo bloque que la incluya
+            if 'INSERT INTO expediente' in sql and (not parametros or 3 in parametros[-1]):
+                raise Exception('violates check constraint\nDETAIL: fila 3')
+        cursor.execute.side_effect = ejecutar
+
+        resultado = insertar_desde_carga(cursor, COLUMNAS_BD)
+
+        llamadas = cursor.execute.call_args_list
+        sentencias = [llamada[0][0] for llamada in llamadas]
+        assert sentencias.count('ROLLBACK TO SAVEPOINT carga_bloque') == 3
+        assert sentencias.count('RELEASE SAVEPOINT carga_bloque') == 1
+        marcado = next(llamada for llamada in llamadas if 'unnest' in llamada[0][0])
+        assert marcado[0][1] == ([3], ['violates check constraint'])
+        assert resultado['fallidos'] == [(3, '2' * 23, 'violates check constraint')]
+        assert len(resultado['insertados']) == 1
+
+    def test_sin_secuencia_falla(self):
+        """Sin secuencia en expediente.id no se pueden preasignar IDs"""
+        cursor = Mock()
+        cursor.fetchone.return_value = (None,)
+
+        with pytest.raises(Exception):
+            insertar_desde_carga(cursor, COLUMNAS_BD)
@@ -0,0 +1,97 @@
+"""
+Pruebas para el generador de datos sintéticos (utils/datos_sinteticos.py)
+"""
+
+import random
+import sys
+import os
+from unittest.mock import Mock, patch
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.datos_sinteticos import (
+    MARCA, escribir_libro, generar_expediente, generar_movimientos, poblar_base, radicado_sintetico
+)
+from utils.lector_excel import LibroExcel
+
+
+class TestGeneradores:
+    """Radicados válidos y únicos, movimientos coherentes"""
+
+    def test_radicados_unicos_y_validos(self):
+        from vista.vistasubirexpediente import validar_radicado_completo
+
+        radicados = [radicado_sintetico(i) for i in range(0, 3_000_000, 11)]
+
+        assert len(set(radicados)) == len(radicados)
+        assert len({r[-13:] for r in radicados}) == len(radicados)
+        assert all(validar_radicado_completo(r)[0] for r in radicados[:1000])
+
+    def test_radicado_depende_solo_del_indice(self):
+        assert generar_expediente(random.Random(1), 77)['radicado_completo'] == \
+            generar_expediente(random.Random(2), 77)['radicado_completo']
+
+    def test_movimientos_posteriores_al_ingreso(self):
+        rng = random.Random(3)
+        expediente = generar_expediente(rng, 5)
+
+        ingresos, estados, actuaciones = generar_movimientos(rng, expediente, 4)
+
+        assert ingresos[0] == (expediente['fecha_ingreso'], expediente['tipo_solicitud'])
+        assert estados[-1][0] == expediente['estado']
+        assert all(fecha >= expediente['fecha_ingreso'] for _, fecha, _ in estados)
+        assert [n for _, n, _ in actuaciones] == list(range(1, len(actuaciones) + 1))
+
+
+class TestLibros:
+    """Los libros generados tienen el formato que acepta la carga"""
+
+    def test_pestanas_ingreso_y_estados(self, tmp_path):
+        ruta = str(tmp_path / 'carga.xlsx')
+
+        escritas = escribir_libro(ruta, 'pestañas', filas=30, movimientos=2)
+
+        with LibroExcel(ruta) as libro:
+            assert libro.sheet_names == ['Ingreso', 'Estados']
+            assert len(libro.hoja('Ingreso')) == 30
+            assert len(libro.hoja('Estados')) == escritas['Estados']
+            assert 'AUTO / ANOTACION' in libro.encabezados('Estados')
+
+    def test_trimestre_pasa_la_validacion(self, tmp_path):
+        from vista.vistasubirexpediente import extraer_expediente_nuevo
+
+        ruta = str(tmp_path / 'trimestre.xlsx')
+        escribir_libro(ruta, 'trimestre', filas=20, desde=1000, hoja_trimestre='2024-Q2')
+        columnas_bd = {c: ('text', None) for c in ('radicado_completo', 'estado', 'juzgado_origen')}
+
+        with LibroExcel(ruta) as libro:
+            hoja = libro.hoja('2024-Q2')
+            rechazos = [extraer_expediente_nuevo(fila, hoja.columns, columnas_bd)[1] for _, fila in hoja.iterrows()]
+
+        assert rechazos == [None] * 20
+
+
+class TestPoblarBase:
+    """Inserción por COPY con un commit por lote"""
+
+    def test_copy_por_lote(self):
+        cursor = Mock()
+        cursor.fetchone.side_effect = [(0,), ('expediente_id_seq',)]
+        cursor.fetchall.side_effect = [[(i,) for i in range(1, 4)], [(i,) for i in range(4, 6)]]
+        conn = Mock()
+        conn.cursor.return_value = cursor
+
+        with patch('utils.datos_sinteticos.crear_usuarios', return_value={'ESCRIBIENTE': [7], 'SUSTANCIADOR': [8]}), \
+             patch('utils.datos_sinteticos.primera_columna', return_value='tipo_solicitud'), \
+             patch('utils.datos_sinteticos.tiene_columna', return_value=False):
+            resultado = poblar_base(conn, 5, movimientos=2, usuarios=2, lote=3)
+
+        copias = [c[0][0] for c in cursor.copy_expert.call_args_list]
+        assert [sql.split()[1] for sql in copias] == ['expediente', 'ingresos', 'estados', 'actuaciones'] * 2
+        assert resultado['expedientes'] == 5 and resultado['usuarios'] == 2
+        assert resultado['ingresos'] >= 5
+        # usuarios + 2 lotes + ANALYZE
+        assert conn.commit.call_count == 4
+        primera = cursor.copy_expert.call_args_list[0][0][1].getvalue().splitlines()[0]
+        assert primera.startswith('1,' + radicado_sintetico(0)) and MARCA in primera
@@ -0,0 +1,111 @@
+"""
+Pruebas para el registro del esquema (utils/esquema.py)
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import Mock, patch
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import esquema
+
+FILAS = [
+    ('expediente', 'id', 'integer', None),
+    ('expediente', 'radicado_completo', 'character varying', 30),
+    ('expediente', 'tipo_tramite', 'text', None),
+    ('expediente', 'turno', 'integer', None),
+    ('ingresos', 'id', 'integer', None),
+]
+
+
+@pytest.fixture(autouse=True)
+def registro_limpio(monkeypatch):
+    monkeypatch.setattr(esquema, '_tablas', None)
+    monkeypatch.setattr(esquema, '_cargado_en', None)
+    monkeypatch.setattr(esquema, '_ultimo_fallo', None)
+
+
+def _cargar():
+    cursor = Mock()
+    cursor.fetchall.return_value = FILAS
+    esquema.cargar_esquema(cursor)
+    return cursor
+
+
+class TestRegistroEsquema:
+    """Una consulta por proceso; las respuestas salen de memoria"""
+
+    def test_consultas_en_memoria(self):
+        cursor = _cargar()
+
+        assert esquema.existe_tabla('ingresos')
+        assert not esquema.existe_tabla('estados')
+        assert esquema.tiene_columna('expediente', 'turno')
+        assert esquema.tipo_columna('expediente', 'turno') == 'integer'
+        assert esquema.columnas_tabla('expediente')['radicado_completo'] == ('character varying', 30)
+        assert esquema.primera_columna('expediente', ('tipo_solicitud', 'tipo_tramite')) == 'tipo_tramite'
+        assert esquema.primera_columna('expediente', ('ubicacion', 'ubicacion_actual')) is None
+        assert cursor.execute.call_count == 1
+
+    def test_carga_perezosa_una_vez(self):
+        conn = Mock()
+        conn.cursor.return_value.fetchall.return_value = FILAS
+
+        with patch.object(esquema, 'conexion_bd') as conexion_bd:
+            conexion_bd.return_value.__enter__ = Mock(return_value=conn)
+            conexion_bd.return_value.__exit__ = Mock(return_value=False)
+            assert esquema.tiene_columna('expediente', 'id')
+            assert esquema.existe_tabla('ingresos')
+
+        conexion_bd.assert_called_once()
+
+    def test_base_no_disponible_sin_registro_falla(self):
+        """Un fallo de conexión no se responde como si la tabla no existiera"""
+        with patch.object(esquema, 'conexion_bd', side_effect=Exception('sin base')) as conexion_bd:
+            with pytest.raises(esquema.EsquemaNoDisponibleError):
+                esquema.existe_tabla('expediente')
+            with pytest.raises(esquema.EsquemaNoDisponibleError):
+                esquema.tiene_columna('expediente', 'id')
+
+        assert conexion_bd.call_count == 2
+        assert not esquema.esquema_cargado()
+
+    def test_base_no_disponible_conserva_el_ultimo_registro(self, monkeypatch):
+        _cargar()
+        monkeypatch.setattr(esquema, '_cargado_en', esquema._cargado_en - esquema.EDAD_MAXIMA)
+
+        with patch.object(esquema, 'conexion_bd', side_effect=Exception('sin base')) as conexion_bd:
+            assert esquema.existe_tabla('ingresos')
+            assert esquema.tiene_columna('expediente', 'turno')
+
+        # El segundo uso cae dentro de REINTENTO_SEGUNDOS: no vuelve a intentar
+        conexion_bd.assert_called_once()
+
+    def test_refrescar_fallido_conserva_el_registro(self):
+        _cargar()
+
+        with patch.object(esquema, 'conexion_bd', side_effect=Exception('sin base')):
+            assert esquema.refrescar_esquema() is False
+            assert esquema.existe_tabla('ingresos')
+
+    def test_refrescar_con_cursor(self):
+        _cargar()
+        cursor = Mock()
+        cursor.fetchall.return_value = FILAS + [('expediente_stats', 'expediente_id', 'integer', None)]
+
+        esquema.refrescar_esquema(cursor)
+
+        assert esquema.existe_tabla('expediente_stats')
+
+    def test_vista_usa_el_registro(self):
+        from vista.vistaactualizarexpediente import _construir_select_expediente
+
+        _cargar()
+        select = _construir_select_expediente('e')
+
+        assert 'e.tipo_tramite AS tipo_solicitud' in select
+        assert 'NULL AS ubicacion' in select
+        assert 'e.turno' in select and 'NULL AS observaciones' in select
@@ -0,0 +1,169 @@
+"""
+Pruebas para las estadísticas materializadas por expediente (utils/estadisticas_expediente.py)
+"""
+
+import pytest
+import sys
+import os
+import threading
+from unittest.mock import Mock, patch
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.estadisticas_expediente as estadisticas
+from utils.estadisticas_expediente import backfill_estadisticas, estadisticas_disponibles
+from utils.migraciones import listar_migraciones
+
+
+def _migracion():
+    """SQL de migraciones/0004_estadisticas_expediente.sql"""
+    return next(sql for _, nombre, sql in listar_migraciones() if nombre == 'estadisticas_expediente')
+
+
+class TestMigracion:
+    """Pruebas de la creación de tabla, triggers y backfill"""
+
+    def setup_method(self):
+        estadisticas._estadisticas_disponibles = False
+
+    def test_triggers_por_tabla_y_evento(self):
+        creados = [s.strip() for s in _migracion().split(';') if s.strip().startswith('CREATE TRIGGER')]
+
+        assert len(creados) == 9
+        assert all('FOR EACH STATEMENT' in s for s in creados)
+        assert any('AFTER UPDATE ON ingresos\n    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas' in s
+                   for s in creados)
+        assert _migracion().rstrip().endswith(
+            'SELECT refrescar_expediente_stats(ARRAY(SELECT id FROM expediente), FALSE);')
+
+    def test_backfill(self):
+        cursor = Mock()
+        cursor.fetchone.return_value = (42,)
+
+        resultado = backfill_estadisticas(cursor)
+
+        assert 'refrescar_expediente_stats' in cursor.execute.call_args_list[0][0][0]
+        assert resultado['total'] == 42
+
+    def test_disponibilidad_se_recuerda(self):
+        with patch.object(estadisticas, 'existe_tabla', return_value=True) as existe_tabla:
+            assert estadisticas_disponibles() is True
+            assert estadisticas_disponibles() is True
+
+        existe_tabla.assert_called_once_with('expediente_stats')
+
+
+class TestConcurrencia:
+    """Dos transacciones que tocan el mismo expediente no se pisan el recálculo"""
+
+    def test_bloquea_antes_de_recalcular(self):
+        partes = _migracion().split('$$')
+        cabecera = next(i for i, parte in enumerate(partes) if 'FUNCTION refrescar_expediente_stats' in parte)
+        bloqueo, recalculo = [sentencia.strip() for sentencia in
+                              partes[cabecera + 1].split(';') if sentencia.strip()]
+
+        # Sentencia aparte (instantánea nueva para el recálculo) y en orden de cubeta (sin interbloqueos)
+        assert bloqueo.startswith('SELECT pg_advisory_xact_lock(')
+        assert f'id % {estadisticas.CUBETAS_BLOQUEO} AS cubeta' in bloqueo
+        assert bloqueo.endswith('ORDER BY cubeta')
+        assert recalculo.startswith('INSERT INTO expediente_stats')
+        assert 'VOLATILE' in partes[cabecera]
+
+    @pytest.mark.skipif(not os.getenv('PRUEBAS_DATABASE_URL'),
+                        reason='requiere PostgreSQL de pruebas (PRUEBAS_DATABASE_URL)')
+    def test_miles_de_expedientes_con_locks_acotados(self):
+        """Una carga masiva no agota la tabla de locks compartida"""
+        import psycopg2
+
+        conn = psycopg2.connect(os.environ['PRUEBAS_DATABASE_URL'])
+        try:
+            cursor = conn.cursor()
+            cursor.execute(_migracion())
+            cursor.execute("SELECT refrescar_expediente_stats(ARRAY(SELECT generate_series(1, 20000)))")
+            cursor.execute("SELECT COUNT(*) FROM pg_locks WHERE locktype = 'advisory' AND pid = pg_backend_pid()")
+            assert cursor.fetchone()[0] <= estadisticas.CUBETAS_BLOQUEO
+        finally:
+            conn.rollback()
+            conn.close()
+
+    @pytest.mark.skipif(not os.getenv('PRUEBAS_DATABASE_URL'),
+                        reason='requiere PostgreSQL de pruebas (PRUEBAS_DATABASE_URL)')
+    def test_ingresos_concurrentes_en_postgres(self):
+        import psycopg2
+
+        url = os.environ['PRUEBAS_DATABASE_URL']
+        preparar = psycopg2.connect(url)
+        cursor = preparar.cursor()
+        cursor.execute("INSERT INTO expediente (radicado_completo) VALUES ('CONCURRENCIA-STATS') RETURNING id")
+        expediente_id = cursor.fetchone()[0]
+        cursor.execute(_migracion())
+        preparar.commit()
+
+        carga, edicion = psycopg2.connect(url), psycopg2.connect(url)
+        try:
+            # La carga inserta y recalcula, pero aún no confirma
+            carga.cursor().execute("INSERT INTO ingresos (expediente_id, fecha_ingreso) VALUES (%s, '2025-01-01')",
+                                   (expediente_id,))
+
+            # La edición inserta otro ingreso: su recálculo espera el bloqueo de la carga
+            hilo = threading.Thread(target=lambda: (
+                edicion.cursor().execute(
+                    "INSERT INTO ingresos (expediente_id, fecha_ingreso) VALUES (%s, '2025-02-01')",
+                    (expediente_id,)),
+                edicion.commit()))
+            hilo.start()
+            hilo.join(1)
+            assert hilo.is_alive()
+
+            carga.commit()
+            hilo.join(10)
+
+            cursor.execute("SELECT total_ingresos, ultimo_ingreso::text FROM expediente_stats "
+                           "WHERE expediente_id = %s", (expediente_id,))
+            assert cursor.fetchone() == (2, '2025-02-01')
+        finally:
+            carga.close()
+            edicion.close()
+            cursor.execute("DELETE FROM ingresos WHERE expediente_id = %s", (expediente_id,))
+            cursor.execute("DELETE FROM expediente WHERE id = %s", (expediente_id,))
+            preparar.commit()
+            preparar.close()
+
+
+class TestVistasUsanEstadisticas:
+    """Con la tabla creada las vistas no agregan ingresos/estados"""
+
+    def setup_method(self):
+        estadisticas._estadisticas_disponibles = True
+
+    def teardown_method(self):
+        estadisticas._estadisticas_disponibles = False
+
+    @patch('vista.vistaasignacion.obtener_conexion')
+    def test_expedientes_por_usuario(self, mock_conexion):
+        from vista.vistaasignacion import obtener_expedientes_por_usuario
+
+        cursor = Mock()
+        cursor.fetchone.return_value = ('Ana Pérez', 'ana')
+        cursor.fetchall.return_value = []
+        mock_conexion.return_value.cursor.return_value = cursor
+
+        assert obtener_expedientes_por_usuario(1, 'ESCRIBIENTE') == []
+        sql = cursor.execute.call_args[0][0]
+        assert 'LEFT JOIN expediente_stats st' in sql
+        assert 'GROUP BY' not in sql and 'DISTINCT ON' not in sql
+
+    @patch('vista.vistahome.obtener_conexion')
+    def test_totales_del_dashboard(self, mock_conexion):
+        from vista.vistahome import obtener_metricas_dashboard
+
+        cursor = Mock()
+        cursor.fetchone.side_effect = [(10,), (7, 20, 5)]
+        cursor.fetchall.return_value = []
+        mock_conexion.return_value.cursor.return_value = cursor
+
+        metricas = obtener_metricas_dashboard()
+
+        assert (metricas['total_actuaciones'], metricas['total_ingresos'], metricas['total_estados']) == (7, 20, 5)
+        assert not any('FROM ingresos' in c[0][0] for c in cursor.execute.call_args_list)
@@ -0,0 +1,89 @@
+"""
+Pruebas para el cálculo masivo de estados (utils/estados_expediente.py)
+"""
+
+import pytest
+import sys
+import os
+from datetime import date
+from unittest.mock import Mock, patch
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from utils.estados_expediente import COLUMNAS, calcular_estados, rederivar_estados
+
+HOY = date(2025, 6, 1)
+
+
+def _agregados(filas):
+    return pd.DataFrame(filas, columns=COLUMNAS)
+
+
+class TestCalcularEstados:
+    """Pruebas de las reglas vectorizadas"""
+
+    def test_reglas_basicas(self):
+        """Cada combinación de movimientos produce el estado esperado"""
+        df = _agregados([
+            (1, None, 2, date(2025, 1, 1), 0, None, 0, None),
+            (2, None, 0, None, 0, None, 1, date(2025, 3, 1)),
+            (3, None, 0, None, 0, None, 1, date(2023, 1, 1)),
+            (4, None, 1, date(2025, 5, 1), 0, None, 1, date(2025, 2, 1)),
+            (5, None, 1, date(2024, 1, 1), 0, None, 1, date(2025, 2, 1)),
+            (6, None, 0, None, 0, None, 0, None),
+        ])
+
+        resultado = calcular_estados(df, hoy=HOY).set_index('id')
+
+        assert resultado.loc[1, 'estado'] == 'Activo Pendiente'
+        assert resultado.loc[2, 'estado'] == 'Activo Resuelto'
+        assert resultado.loc[3, 'estado'] == 'Inactivo Resuelto'
+        assert resultado.loc[4, 'estado'] == 'Activo Pendiente'
+        assert resultado.loc[5, 'estado'] == 'Activo Resuelto'
+        assert resultado.loc[6, 'estado'] == 'Pendiente'
+        assert resultado.loc[1, 'descripcion'] == 'En trámite - 2 ingreso(s)'
+        assert resultado.loc[6, 'descripcion'] == 'Sin movimiento registrado'
+
+    def test_dataframe_vacio(self):
+        """Sin expedientes no se produce ningún estado"""
+        resultado = calcular_estados(_agregados([]), hoy=HOY)
+        assert resultado.empty
+        assert 'estado' in resultado.columns
+
+
+class TestRederivarEstados:
+    """Pruebas de la escritura masiva de estados"""
+
+    def test_solo_escribe_filas_que_cambian(self):
+        """Un único UPDATE con unnest() y recálculo de turnos si cambia la cola"""
+        cursor = Mock()
+        cursor.fetchall.return_value = [
+            (1, 'Activo Pendiente', 1, date(2025, 1, 1), 0, None, 0, None),
+            (2, 'Activo Pendiente', 0, None, 0, None, 1, date(2025, 3, 1)),
+        ]
+        turnos = {'con_turno': 1, 'sin_fecha': 0, 'actualizados': 1, 'duracion_ms': 1.0}
+
+        with patch('utils.estados_expediente.recalcular_turnos', return_value=turnos) as motor:
+            resultado = rederivar_estados(cursor, hoy=HOY)
+
+        assert cursor.execute.call_count == 2
+        sql, params = cursor.execute.call_args[0]
+        assert 'unnest' in sql
+        assert params == ([2], ['Activo Resuelto'])
+        motor.assert_called_once_with(cursor)
+        assert resultado['cambiados'] == 1
+        assert resultado['transiciones'] == {('Activo Pendiente', 'Activo Resuelto'): 1}
+
+    def test_simulacion_no_escribe(self):
+        """Con aplicar=False solo se ejecuta la consulta agregada"""
+        cursor = Mock()
+        cursor.fetchall.return_value = [(1, None, 1, date(2025, 1, 1), 0, None, 0, None)]
+
+        resultado = rederivar_estados(cursor, aplicar=False, hoy=HOY)
+
+        assert cursor.execute.call_count == 1
+        assert resultado['cambiados'] == 1
+        assert resultado['aplicado'] is False
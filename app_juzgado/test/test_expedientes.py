@@ -109,6 +109,42 @@ class TestExpedientes:
         # Verificar que se llamó la conexión
         mock_conexion.assert_called_once()
     
+    @patch('vista.vistaexpediente.obtener_conexion')
+    def test_filtrar_por_estado_carga_relacionados_en_lote(self, mock_conexion):
+        """Los datos relacionados de toda la página se cargan con 3 consultas"""
+        from datetime import date
+        from vista.vistaexpediente import filtrar_por_estado
+
+        mock_conn = Mock()
+        mock_cursor = Mock()
+        mock_conexion.return_value = mock_conn
+        mock_conn.cursor.return_value = mock_cursor
+
+        filas = [
+            (i, f'0800140530212017{i:07d}', str(i), f'Demandante {i}', f'Demandado {i}',
+             'Juzgado 1', date(2025, 1, i), 'Activo Pendiente', i, date(2025, 1, i))
+            for i in range(1, 21)
+        ]
+        mock_cursor.fetchall.side_effect = [
+            filas,
+            # ingresos (expediente_id + columnas)
+            [(1, date(2025, 1, 1), 'obs', 'Tutela', None, None, None, None),
+             (1, date(2025, 2, 1), 'obs', 'Impulso', None, None, None, None)],
+            # estados
+            [(2, date(2025, 1, 5), 'Auto', None, None, None, None, None)],
+            # actuaciones
+            [(3, 1, 'Auto admisorio', 'MANUAL', None, date(2025, 1, 6))],
+        ]
+
+        result = filtrar_por_estado('ACTIVO PENDIENTE')
+
+        assert len(result) == 20
+        assert mock_cursor.execute.call_count == 4
+        assert [i['solicitud'] for i in result[0]['ingresos']] == ['Tutela', 'Impulso']
+        assert result[1]['estados'][0]['clase'] == 'Auto'
+        assert result[2]['actuaciones'][0]['descripcion_actuacion'] == 'Auto admisorio'
+        assert result[3]['estadisticas'] == {'total_ingresos': 0, 'total_estados': 0, 'total_actuaciones': 0}
+
     def test_paginar_resultados(self):
         """Prueba paginación de resultados"""
         from vista.vistaexpediente import paginar_resultados
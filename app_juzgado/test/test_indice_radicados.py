@@ -0,0 +1,265 @@
+"""
+Pruebas para el índice de radicados (utils/indice_radicados.py)
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import Mock
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import indice_radicados
+from utils.indice_radicados import (
+    IndiceRadicados, UMBRAL_INDICE_MEMORIA, backfill_radicado_normalizado, buscar_en_bd, buscar_exactos,
+    condicion_radicado, normalizar_radicado
+)
+
+RADICADOS = [
+    (1, '11001310300120210000100'),
+    (2, '05001310300220190012300'),
+    (3, '99999310300120210000100'),  # mismos últimos 13 dígitos que el 1
+    (4, '11001-31-03-004-2022-00456-00'),
+    (5, '7600131030052023007890'),
+]
+
+
+@pytest.fixture(autouse=True)
+def sin_columnas_normalizadas(monkeypatch):
+    """Cada prueba parte sin las columnas normalizadas en el registro del esquema"""
+    monkeypatch.setattr(indice_radicados, '_normalizado_disponible', False)
+    monkeypatch.setattr(indice_radicados, 'tiene_columna', lambda tabla, columna: False)
+
+
+def _indice():
+    return IndiceRadicados().construir(RADICADOS)
+
+
+class TestIndiceRadicados:
+    """Pruebas de las búsquedas en memoria"""
+
+    def test_sufijo_gana_el_menor_id(self):
+        """Con dos radicados con el mismo sufijo se asocia el primero"""
+        indice = _indice()
+        assert indice.buscar_sufijo('00000310300120210000100') == 1
+        assert indice.buscar_sufijo('00000000000000000000000') is None
+
+    def test_subcadena_unica_y_ambigua(self):
+        """Igual que LIKE '%x%' LIMIT 2: un candidato asocia, dos es ambiguo"""
+        resultado = _indice().buscar_subcadenas(['201900123', '2021000010', '20230078', '12345678'])
+
+        assert resultado['201900123'] == (2, 1)
+        assert resultado['2021000010'] == (None, 2)
+        assert resultado['20230078'] == (5, 1)
+        assert resultado['12345678'] == (None, 0)
+
+    def test_subcadena_no_cruza_separadores(self):
+        """Los guiones y el fin de cada radicado cortan las coincidencias"""
+        resultado = _indice().buscar_subcadenas(['00456000', '20220045', '0000100050'])
+
+        assert resultado['00456000'] == (None, 0)
+        assert resultado['20220045'] == (None, 0)
+        assert resultado['0000100050'] == (None, 0)
+
+    def test_indice_vacio(self):
+        indice = IndiceRadicados().construir([])
+        assert indice.buscar_subcadenas(['12345678']) == {'12345678': (None, 0)}
+
+
+class TestBusquedaFlexible:
+    """Pruebas de la elección entre índice en memoria y consulta a la base"""
+
+    def test_pocos_radicados_usan_la_base(self):
+        """Con pocos pendientes se hacen dos consultas set-based, sin cargar la tabla"""
+        from vista.vistasubirexpediente import buscar_expedientes_flexible
+
+        cursor = Mock()
+        cursor.fetchall.side_effect = [
+            [('0120210000100', 1)],
+            [('201900123', 2, 1), ('20210000', 1, 2)],
+        ]
+        conn = Mock()
+        conn.cursor.return_value = cursor
+
+        encontrados = buscar_expedientes_flexible(
+            ['00000310300120210000100', '201900123', '20210000', '123'], conn)
+
+        assert cursor.execute.call_count == 2
+        assert encontrados == {
+            '00000310300120210000100': (1, '13_digitos'),
+            '201900123': (2, 'like_sufijo'),
+        }
+
+    def test_indice_compartido_no_se_recarga(self):
+        """Un índice ya cargado se reutiliza sin consultar la base"""
+        from vista.vistasubirexpediente import buscar_expedientes_flexible
+
+        cursor = Mock()
+        conn = Mock()
+        conn.cursor.return_value = cursor
+        indice = _indice()
+
+        encontrados = buscar_expedientes_flexible(['201900123'], conn, indice)
+
+        cursor.execute.assert_not_called()
+        assert encontrados == {'201900123': (2, 'like_sufijo')}
+
+    def test_muchos_radicados_construyen_el_indice(self):
+        """Por encima del umbral se carga el índice con una sola consulta"""
+        from vista.vistasubirexpediente import buscar_expedientes_flexible
+
+        cursor = Mock()
+        cursor.fetchone.return_value = (120,)
+        cursor.fetchall.return_value = RADICADOS
+        conn = Mock()
+        conn.cursor.return_value = cursor
+        pendientes = [f'{i:023d}' for i in range(UMBRAL_INDICE_MEMORIA)]
+
+        indice = IndiceRadicados()
+        buscar_expedientes_flexible(pendientes, conn, indice)
+
+        # tamaño de la tabla + carga de los radicados
+        assert cursor.execute.call_count == 2
+        assert indice.cargado and indice.disponible
+
+    def test_tabla_grande_busca_en_la_base(self, monkeypatch):
+        """Por encima de MAX_POSICIONES_INDICE no se carga la tabla en memoria"""
+        from vista.vistasubirexpediente import buscar_expedientes_flexible
+
+        monkeypatch.setattr(indice_radicados, 'MAX_POSICIONES_INDICE', 100)
+        cursor = Mock()
+        cursor.fetchone.return_value = (120,)
+        cursor.fetchall.return_value = [('201900123', 2, 1)]
+        conn = Mock()
+        conn.cursor.return_value = cursor
+        indice = IndiceRadicados()
+        pendientes = ['201900123'] + [f'{i:010d}' for i in range(UMBRAL_INDICE_MEMORIA)]
+
+        encontrados = buscar_expedientes_flexible(pendientes, conn, indice)
+
+        assert indice.cargado and not indice.disponible
+        assert 'LIKE' in cursor.execute.call_args[0][0]
+        assert encontrados == {'201900123': (2, 'like_sufijo')}
+
+
+class TestRadicadoNormalizado:
+    """Pruebas de las búsquedas por radicado_normalizado / radicado_sufijo"""
+
+    def test_normalizar(self):
+        assert normalizar_radicado(' 11001-31-03 004 ') == '110013103004'
+        assert normalizar_radicado(None) == ''
+
+    def test_condicion_por_indice(self):
+        sql, params = condicion_radicado('11001-31-03-004-2022-00456-00', 'e.')
+
+        assert 'e.radicado_normalizado = %s' in sql
+        assert 'e.radicado_sufijo = %s' in sql
+        assert params == ['11001310300420220045600', '0420220045600', '%11001310300420220045600']
+
+    def test_radicado_corto_sin_condicion(self):
+        assert condicion_radicado('2022-00456') == (None, [])
+
+    def test_exactos_por_columna_normalizada(self, monkeypatch):
+        monkeypatch.setattr(indice_radicados, 'tiene_columna', lambda tabla, columna: columna == 'radicado_sufijo')
+        cursor = Mock()
+        cursor.fetchall.return_value = [('11001310300120210000100', 1)]
+
+        assert buscar_exactos(cursor, ['11001310300120210000100']) == {'11001310300120210000100': 1}
+        assert 'radicado_normalizado = ANY(%s)' in cursor.execute.call_args[0][0]
+
+    def test_exactos_sin_migracion(self):
+        cursor = Mock()
+        cursor.fetchall.return_value = []
+
+        assert buscar_exactos(cursor, ['1']) == {}
+        assert 'radicado_completo = ANY(%s)' in cursor.execute.call_args[0][0]
+
+    def test_subcadenas_en_bd_por_columna_normalizada(self, monkeypatch):
+        """buscar_en_bd busca en la misma columna que indexa IndiceRadicados.cargar"""
+        monkeypatch.setattr(indice_radicados, '_normalizado_disponible', True)
+        cursor = Mock()
+        cursor.fetchall.return_value = [('201900123', 4, 1)]
+
+        _, por_subcadena = buscar_en_bd(cursor, [], ['201900123'])
+
+        assert por_subcadena == {'201900123': (4, 1)}
+        assert "radicado_normalizado LIKE '%%' || v.valor" in cursor.execute.call_args[0][0]
+
+    def test_subcadenas_en_bd_sin_migracion(self):
+        cursor = Mock()
+        cursor.fetchall.return_value = []
+
+        buscar_en_bd(cursor, [], ['201900123'])
+
+        assert "radicado_completo LIKE '%%' || v.valor" in cursor.execute.call_args[0][0]
+
+    def test_sufijos_no_cargan_el_indice(self, monkeypatch):
+        """Con radicado_sufijo indexado, muchos radicados largos se resuelven en una consulta"""
+        from vista.vistasubirexpediente import buscar_expedientes_flexible
+
+        monkeypatch.setattr(indice_radicados, '_normalizado_disponible', True)
+        cursor = Mock()
+        cursor.fetchall.return_value = [('0000000000000', 7)]
+        conn = Mock()
+        conn.cursor.return_value = cursor
+        pendientes = [f'{i:023d}' for i in range(UMBRAL_INDICE_MEMORIA)]
+
+        indice = IndiceRadicados()
+        encontrados = buscar_expedientes_flexible(pendientes, conn, indice)
+
+        assert cursor.execute.call_count == 1
+        assert 'radicado_sufijo = ANY(%s)' in cursor.execute.call_args[0][0]
+        assert not indice.cargado
+        assert encontrados == {'0' * 23: (7, '13_digitos')}
+
+    def test_pestana_ingresos_resuelve_radicados_por_lote(self, monkeypatch):
+        """Coincide con un expediente guardado con guiones (radicado_normalizado), sin recorrer la tabla"""
+        import pandas as pd
+        from datetime import datetime
+        from vista import vistasubirexpediente
+
+        monkeypatch.setattr(indice_radicados, '_normalizado_disponible', True)
+        monkeypatch.setattr(vistasubirexpediente, 'existe_tabla', lambda tabla: True)
+        cursor = Mock()
+        cursor.fetchall.return_value = [('11001310300120210000100', 7)]
+        cursor.fetchone.return_value = None
+        conn = Mock()
+        conn.cursor.return_value = cursor
+        monkeypatch.setattr(vistasubirexpediente, 'obtener_conexion', lambda: conn)
+        df = pd.DataFrame([{
+            'RADICADO COMPLETO': ' 11001310300120210000100 ', 'DEMANDANTE': 'Ana', 'DEMANDADO': 'Luis',
+            'FECHA INGRESO': datetime(2024, 1, 2), 'SOLICITUD': 'Demanda',
+        }] * 2)
+
+        resultado = vistasubirexpediente.procesar_pestaña_ingresos(df, ['radicado_completo'])
+
+        sentencias = [llamada[0][0] for llamada in cursor.execute.call_args_list]
+        consultas = [s for s in sentencias if 'radicado_normalizado = ANY(%s)' in s]
+        assert len(consultas) == 1
+        assert cursor.execute.call_args_list[0][0][1] == (['11001310300120210000100'],)
+        assert not any('INSERT INTO expediente' in s for s in sentencias)
+        assert not any('FROM expediente WHERE radicado_completo IS NOT NULL' in s for s in sentencias)
+        assert resultado['ingresos_creados'] == 2 and resultado['procesados'] == 0
+
+    def test_backfill_informa_repetidos(self):
+        cursor = Mock()
+        cursor.rowcount = 5
+        cursor.fetchone.return_value = (2,)
+
+        resultado = backfill_radicado_normalizado(cursor)
+
+        assert cursor.execute.call_args_list[0][0][0].strip().startswith('UPDATE expediente')
+        assert resultado['actualizados'] == 5
+        assert resultado['repetidos'] == 2
+
+    def test_migracion_con_backfill_e_indices(self):
+        """Las columnas se llenan en la misma migración que las crea"""
+        from utils.migraciones import listar_migraciones
+
+        sql = next(contenido for _, nombre, contenido in listar_migraciones() if nombre == 'radicado_normalizado')
+
+        assert sql.index('ADD COLUMN IF NOT EXISTS radicado_sufijo') < sql.index(
+            indice_radicados.SQL_BACKFILL_RADICADO.strip().split('\n')[0])
+        assert 'CREATE UNIQUE INDEX IF NOT EXISTS idx_expediente_radicado_normalizado' in sql
+        assert 'CREATE INDEX IF NOT EXISTS idx_expediente_radicado_sufijo' in sql
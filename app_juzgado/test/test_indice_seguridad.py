@@ -0,0 +1,120 @@
+"""
+Pruebas para el índice incremental del log de seguridad (utils/indice_seguridad.py)
+"""
+
+import os
+import sys
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.indice_seguridad as modulo
+from utils.indice_seguridad import IndiceSeguridad
+
+AHORA = datetime(2025, 6, 10, 12, 0, 0)
+
+
+def linea(fecha, evento, nivel='INFO'):
+    return f"{fecha} | {nivel} | {evento} | IP: 10.0.0.1 | User: juan | mensaje\n"
+
+
+@pytest.fixture
+def log(tmp_path):
+    ruta = tmp_path / 'security.log'
+    ruta.write_text(
+        linea('2025-06-09 09:00:00', 'LOGIN_SUCCESS') +
+        linea('2025-06-10 11:30:00', 'LOGIN_FAILED', 'WARNING') +
+        linea('2025-06-10 11:45:00', 'CSRF_ATTACK', 'ERROR'),
+        encoding='utf-8'
+    )
+    return ruta
+
+
+def agregar(ruta, texto):
+    with open(ruta, 'a', encoding='utf-8') as f:
+        f.write(texto)
+
+
+class TestIncremental:
+    """Solo se leen las líneas nuevas"""
+
+    def test_totales_y_ventanas(self, log):
+        stats = IndiceSeguridad(str(log)).estadisticas(AHORA)
+
+        assert stats['total_events'] == 3
+        assert (stats['login_attempts'], stats['failed_logins'], stats['csrf_attacks']) == (1, 1, 1)
+        assert stats['ultima_hora']['total_events'] == 2
+        assert stats['ultimo_dia']['total_events'] == 2
+        assert stats['ultimo_dia']['login_attempts'] == 0
+
+    def test_lee_desde_el_desplazamiento(self, log):
+        indice = IndiceSeguridad(str(log))
+        indice.estadisticas(AHORA)
+        agregar(log, linea('2025-06-10 11:59:00', 'XSS_ATTEMPT', 'ERROR'))
+
+        with patch.object(modulo, 'clasificar', wraps=modulo.clasificar) as clasificar:
+            stats = indice.estadisticas(AHORA)
+
+        assert clasificar.call_count == 1
+        assert stats['total_events'] == 4 and stats['xss_attempts'] == 1
+
+    def test_linea_incompleta_espera(self, log):
+        indice = IndiceSeguridad(str(log))
+        agregar(log, '2025-06-10 11:59:00 | ERROR | SQL_INJ')
+
+        assert indice.estadisticas(AHORA)['total_events'] == 3
+        agregar(log, 'ECTION_ATTEMPT | IP: x\n')
+        assert indice.estadisticas(AHORA)['sql_injection_attempts'] == 1
+
+    def test_estado_persistido(self, log):
+        IndiceSeguridad(str(log)).estadisticas(AHORA)
+        agregar(log, linea('2025-06-10 11:59:00', 'LOGIN_BLOCKED', 'ERROR'))
+
+        # Un índice nuevo (otro worker, reinicio) sigue desde el estado guardado
+        with patch.object(modulo, 'clasificar', wraps=modulo.clasificar) as clasificar:
+            stats = IndiceSeguridad(str(log)).estadisticas(AHORA)
+
+        assert clasificar.call_count == 1
+        assert stats['total_events'] == 4 and stats['blocked_attempts'] == 1
+
+    def test_ventanas_se_podan(self, log):
+        indice = IndiceSeguridad(str(log))
+        indice.estadisticas(AHORA)
+        agregar(log, linea('2025-06-11 12:30:00', 'LOGIN_SUCCESS'))
+
+        stats = indice.estadisticas(datetime(2025, 6, 11, 12, 40))
+
+        assert stats['ultima_hora']['total_events'] == 1
+        assert stats['ultimo_dia']['total_events'] == 1
+        assert stats['total_events'] == 4
+        assert list(indice._estado['por_hora']) == ['2025-06-11 12']
+
+
+class TestRotacion:
+    """Rotación y truncado del log"""
+
+    def test_rotado(self, log):
+        indice = IndiceSeguridad(str(log))
+        indice.estadisticas(AHORA)
+        agregar(log, linea('2025-06-10 11:50:00', 'LOGIN_FAILED', 'WARNING'))
+        os.rename(log, str(log) + '.1')
+        log.write_text(linea('2025-06-10 11:55:00', 'LOGIN_FAILED', 'WARNING'), encoding='utf-8')
+
+        stats = indice.estadisticas(AHORA)
+
+        assert stats['total_events'] == 5
+        assert stats['failed_logins'] == 3
+
+    def test_truncado(self, log):
+        indice = IndiceSeguridad(str(log))
+        indice.estadisticas(AHORA)
+        log.write_text(linea('2025-06-10 11:55:00', 'LOGIN_SUCCESS'), encoding='utf-8')
+
+        assert indice.estadisticas(AHORA)['total_events'] == 4
+
+    def test_sin_log(self, tmp_path):
+        assert IndiceSeguridad(str(tmp_path / 'no.log')).estadisticas(AHORA) == {'error': 'Log file not found'}
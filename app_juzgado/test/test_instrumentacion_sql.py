@@ -0,0 +1,95 @@
+"""
+Pruebas para la instrumentación SQL por petición (utils/instrumentacion_sql.py)
+"""
+
+import logging
+import pytest
+import sys
+import os
+from unittest.mock import patch
+
+from flask import Flask
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.instrumentacion_sql as instrumentacion
+from utils.instrumentacion_sql import (
+    ConsultasPeticion, estadisticas_consultas, huella, registrar_consulta, reiniciar_estadisticas
+)
+
+
+@pytest.fixture(autouse=True)
+def huellas_limpias():
+    reiniciar_estadisticas()
+    yield
+    reiniciar_estadisticas()
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+
+    @app.route('/consulta')
+    def consulta():
+        registrar_consulta("SELECT * FROM expediente WHERE id = 7", 12.0)
+        registrar_consulta("SELECT * FROM expediente WHERE id = 8", 3.0)
+        return 'ok'
+
+    with patch('utils.instrumentacion_sql.definir_fabrica_cursor') as definir:
+        instrumentacion.registrar_instrumentacion(app)
+    definir.assert_called_once_with(instrumentacion.CursorInstrumentado)
+    return app
+
+
+class TestHuellas:
+    """Normalización y agregación de consultas"""
+
+    def test_literales_y_listas(self):
+        assert huella("SELECT id FROM expediente\n  WHERE estado = 'Activo' AND id IN (1, 2, 3) LIMIT 50") == \
+            "SELECT id FROM expediente WHERE estado = ? AND id IN (...) LIMIT ?"
+        assert huella("WHERE id = ANY(%s) AND x IN (%s, %s)") == "WHERE id = ANY(...) AND x IN (...)"
+
+    def test_agrega_por_huella(self):
+        registrar_consulta("SELECT 1 FROM t WHERE id = 1", 2.0)
+        registrar_consulta("SELECT 1 FROM t WHERE id = 2", 6.0)
+
+        fila, = estadisticas_consultas()
+        assert fila['huella'] == "SELECT ? FROM t WHERE id = ?"
+        assert (fila['llamadas'], fila['total_ms'], fila['max_ms'], fila['promedio_ms']) == (2, 8.0, 6.0, 4.0)
+
+    def test_memoria_acotada(self):
+        with patch.object(instrumentacion, 'MAX_HUELLAS', 2):
+            registrar_consulta("SELECT a FROM t", 5.0)
+            registrar_consulta("SELECT b FROM t", 1.0)
+            registrar_consulta("SELECT c FROM t", 3.0)
+
+        assert [f['huella'] for f in estadisticas_consultas()] == ["SELECT a FROM t", "SELECT c FROM t"]
+
+    def test_mas_lentas_de_la_peticion(self):
+        consultas = ConsultasPeticion()
+        for ms in (1, 9, 4, 7, 2, 8, 3):
+            consultas.agregar(f"q{ms}", float(ms))
+
+        assert consultas.cantidad == 7 and consultas.duracion_ms == 34.0
+        assert [sql for _, sql in consultas.mas_lentas()] == ['q9', 'q8', 'q7', 'q4', 'q3']
+
+
+class TestPeticiones:
+    """Server-Timing y registro de peticiones lentas"""
+
+    def test_server_timing(self, app):
+        respuesta = app.test_client().get('/consulta')
+
+        cabecera = respuesta.headers['Server-Timing']
+        assert cabecera.startswith('db;dur=15.0;desc="2 consultas", app;dur=')
+        assert estadisticas_consultas()[0]['llamadas'] == 2
+
+    def test_peticion_lenta(self, app, caplog):
+        with patch.object(instrumentacion, 'PETICION_LENTA_MS', 0), \
+             caplog.at_level(logging.WARNING, logger='utils.instrumentacion_sql'):
+            app.test_client().get('/consulta')
+
+        mensaje = caplog.records[-1].getMessage()
+        assert 'GET /consulta' in mensaje and '2 consultas' in mensaje
+        assert mensaje.index('12.0 ms') < mensaje.index('3.0 ms')
@@ -0,0 +1,124 @@
+"""
+Pruebas para el lector de Excel en streaming (utils/lector_excel.py)
+"""
+
+import pytest
+import sys
+import os
+from datetime import datetime
+from io import BytesIO
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openpyxl
+import pandas as pd
+
+from utils.lector_excel import LibroExcel
+
+
+def _archivo_prueba():
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'ingresos'
+    ws.append(['RADICADO COMPLETO', 'DEMANDANTE', 'FECHA INGRESO', 'CUANTIA', 'CUANTIA'])
+    ws.append(['11001310300120210001', 'Ana', datetime(2024, 1, 2), 1.0, 'N/A'])
+    ws.append([None, None, None, None, None])
+    ws.append(['=A2', 'Bob', datetime(2024, 1, 3), 2.5, '#DIV/0!'])
+    for i in range(5):
+        ws.append([f'1100131030012021{i:04d}', f'Persona {i}', datetime(2024, 2, 1), i, None])
+    wb.create_sheet('estados').append(['RADICADO COMPLETO', 'FECHA ESTADO'])
+
+    contenido = BytesIO()
+    wb.save(contenido)
+    contenido.seek(0)
+    return contenido
+
+
+class TestLibroExcel:
+    """Pruebas de lectura por lotes, encabezados y fórmulas"""
+
+    def test_encabezados_como_pandas(self):
+        """Los nombres de columna coinciden con los de pd.read_excel"""
+        contenido = _archivo_prueba()
+        esperado = list(pd.read_excel(contenido, sheet_name='ingresos').columns)
+
+        with LibroExcel(contenido) as libro:
+            assert libro.sheet_names == ['ingresos', 'estados']
+            assert libro.encabezados('ingresos') == esperado
+
+    def test_lotes_acotados_e_indices_de_fila(self):
+        """Las filas llegan en lotes del tamaño pedido y se omiten las vacías"""
+        with LibroExcel(_archivo_prueba(), tamano_lote=3) as libro:
+            hoja = libro.hoja('ingresos')
+            lotes = list(hoja.iterar_lotes())
+
+            assert [len(lote) for lote in lotes] == [3, 3, 1]
+            assert list(lotes[0].index) == [0, 2, 3]
+            assert len(hoja) == 7
+
+    def test_conversion_de_valores(self):
+        """Enteros sin decimales, 'N/A' y errores de Excel como nulos"""
+        with LibroExcel(_archivo_prueba()) as libro:
+            filas = dict(libro.hoja('ingresos').iterrows())
+
+        assert filas[0]['CUANTIA'] == 1 and isinstance(filas[0]['CUANTIA'], int)
+        assert filas[0]['CUANTIA.1'] is None
+        assert filas[2]['CUANTIA.1'] is None
+        assert filas[2]['FECHA INGRESO'] == datetime(2024, 1, 3)
+
+    def test_formulas_sin_calcular(self):
+        """Las fórmulas sin valor cacheado se reportan con el índice de la fila"""
+        with LibroExcel(_archivo_prueba()) as libro:
+            hoja = libro.hoja('ingresos')
+            assert hoja.formulas == {(2, 'RADICADO COMPLETO'): '=A2'}
+
+    def test_formulas_por_lote(self):
+        """Cada lote trae las fórmulas de sus filas, en la misma pasada"""
+        with LibroExcel(_archivo_prueba(), tamano_lote=3) as libro:
+            lotes = list(libro.hoja('ingresos').iterar_lotes(detectar_formulas=True))
+
+        assert lotes[0].attrs['formulas'] == {(2, 'RADICADO COMPLETO'): '=A2'}
+        assert lotes[1].attrs['formulas'] == {} and lotes[2].attrs['formulas'] == {}
+
+    def test_pestana_ingresos_en_una_pasada(self, monkeypatch):
+        """La pestaña de ingresos se recorre una sola vez (valores, fórmulas y radicados)"""
+        from unittest.mock import Mock, patch
+        from vista import vistasubirexpediente
+
+        cursor = Mock()
+        cursor.fetchall.return_value = []
+        conn = Mock()
+        conn.cursor.return_value = cursor
+        monkeypatch.setattr(vistasubirexpediente, 'obtener_conexion', lambda: conn)
+
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.append(['RADICADO COMPLETO', 'DEMANDANTE', 'DEMANDADO', 'FECHA INGRESO', 'SOLICITUD'])
+        ws.append(['=B3', 'Ana', 'Luis', datetime(2024, 1, 2), 'Demanda'])
+        for i in range(4):
+            ws.append([f'1100131030012021{i:07d}', 'Ana', 'Luis', datetime(2024, 1, 2), 'Demanda'])
+        contenido = BytesIO()
+        wb.save(contenido)
+
+        with LibroExcel(contenido, tamano_lote=3) as libro:
+            with patch.object(LibroExcel, '_lotes', autospec=True, side_effect=LibroExcel._lotes) as lotes:
+                resultado = vistasubirexpediente.procesar_pestaña_ingresos(libro.hoja(ws.title), [])
+
+        lotes.assert_called_once()
+        # Una consulta de radicados por lote, y la fórmula sin calcular reportada como error
+        assert sum('= ANY(%s)' in c[0][0] for c in cursor.execute.call_args_list) == 2
+        assert resultado['errores_detallados'][0]['fila'] == 2
+
+    def test_hoja_solo_con_encabezado(self):
+        """Una hoja sin datos tiene columnas pero ninguna fila"""
+        with LibroExcel(_archivo_prueba()) as libro:
+            hoja = libro.hoja('estados')
+            assert list(hoja.columns) == ['RADICADO COMPLETO', 'FECHA ESTADO']
+            assert len(hoja) == 0
+
+    def test_hoja_inexistente(self):
+        """Pedir una hoja que no existe lanza KeyError"""
+        with LibroExcel(_archivo_prueba()) as libro:
+            with pytest.raises(KeyError):
+                libro.hoja('no_existe')
@@ -0,0 +1,128 @@
+"""
+Pruebas para las instantáneas de métricas de los dashboards (utils/metricas_cache.py)
+"""
+
+import pytest
+import sys
+import os
+from contextlib import contextmanager
+from datetime import date, datetime
+from unittest.mock import Mock, patch
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.metricas_cache as metricas_cache
+from utils.metricas_cache import deserializar, invalidar_metricas, obtener_snapshot, serializar
+
+
+def conexion_falsa(cursor):
+    @contextmanager
+    def conexion_bd(commit=False):
+        conn = Mock()
+        conn.cursor.return_value = cursor
+        yield conn
+    return conexion_bd
+
+
+class TestSerializacion:
+    """Las métricas sobreviven al viaje por JSONB"""
+
+    def test_fechas_tuplas_y_objetos(self):
+        class Expediente:
+            def __init__(self):
+                self.id = 7
+                self.fecha_ingreso = date(2024, 5, 1)
+
+        datos = {
+            'recientes': [(1, 'Ana', datetime(2024, 5, 2, 10, 30))],
+            'por_rol': {'ESCRIBIENTE': [Expediente()]},
+        }
+
+        resultado = deserializar(serializar(datos))
+
+        assert resultado['recientes'] == [[1, 'Ana', datetime(2024, 5, 2, 10, 30)]]
+        assert resultado['por_rol']['ESCRIBIENTE'] == [{'id': 7, 'fecha_ingreso': date(2024, 5, 1)}]
+
+
+class TestObtenerSnapshot:
+    """Pruebas de vigencia e invalidación"""
+
+    def setup_method(self):
+        metricas_cache._snapshots_disponibles = True
+        metricas_cache._locales.clear()
+
+    def test_vigente_en_memoria_no_recalcula(self):
+        cursor = Mock()
+        cursor.fetchone.return_value = (3, 3, 42.0)
+        metricas_cache._locales['home'] = (3, {'total': 10})
+        calcular = Mock()
+
+        with patch('utils.metricas_cache.conexion_bd', conexion_falsa(cursor)):
+            datos, edad = obtener_snapshot('home', calcular)
+
+        assert (datos, edad) == ({'total': 10}, 42)
+        calcular.assert_not_called()
+        assert cursor.execute.call_count == 1
+
+    def test_vigente_de_otro_worker_se_lee_de_la_tabla(self):
+        cursor = Mock()
+        cursor.fetchone.side_effect = [(3, 3, 5.0), ('{"total": 11}',)]
+        calcular = Mock()
+
+        with patch('utils.metricas_cache.conexion_bd', conexion_falsa(cursor)):
+            datos, edad = obtener_snapshot('home', calcular)
+
+        assert (datos, edad) == ({'total': 11}, 5)
+        calcular.assert_not_called()
+        assert metricas_cache._locales['home'] == (3, {'total': 11})
+
+    def test_invalidada_recalcula_con_la_generacion_leida(self):
+        cursor = Mock()
+        cursor.fetchone.return_value = (4, 3, 600.0)
+
+        with patch('utils.metricas_cache.conexion_bd', conexion_falsa(cursor)):
+            datos, edad = obtener_snapshot('home', lambda: {'total': 12})
+
+        assert (datos, edad) == ({'total': 12}, 0)
+        sql, parametros = cursor.execute.call_args[0]
+        assert 'UPDATE metricas_snapshot' in sql
+        assert parametros == ('{"total": 12}', 4, 'home')
+
+    def test_sin_base_de_datos_calcula_directo(self):
+        @contextmanager
+        def sin_conexion(commit=False):
+            raise Exception('sin BD')
+            yield
+
+        with patch('utils.metricas_cache.conexion_bd', sin_conexion):
+            assert obtener_snapshot('home', lambda: {'total': 1}) == ({'total': 1}, 0)
+
+    def test_invalidar_limpia_memoria_e_incrementa_generacion(self):
+        cursor = Mock()
+        metricas_cache._locales['home'] = (1, {})
+
+        with patch('utils.metricas_cache.conexion_bd', conexion_falsa(cursor)):
+            invalidar_metricas()
+
+        assert metricas_cache._locales == {}
+        assert 'generacion = generacion + 1' in cursor.execute.call_args[0][0]
+
+    def test_sin_tabla_calcula_directo_sin_ddl(self):
+        metricas_cache._snapshots_disponibles = False
+        cursor = Mock()
+
+        with patch('utils.metricas_cache.conexion_bd', conexion_falsa(cursor)):
+            assert obtener_snapshot('home', lambda: {'total': 2}) == ({'total': 2}, 0)
+            invalidar_metricas()
+
+        cursor.execute.assert_not_called()
+
+    def test_falla_del_calculo_sin_tabla_no_se_repite(self):
+        metricas_cache._snapshots_disponibles = False
+        calcular = Mock(side_effect=RuntimeError('consulta'))
+
+        with pytest.raises(RuntimeError):
+            obtener_snapshot('home', calcular)
+
+        assert calcular.call_count == 1
@@ -0,0 +1,159 @@
+"""
+Pruebas para las métricas de Prometheus (utils/metricas_prometheus.py)
+"""
+
+import json
+import pytest
+import sys
+import os
+from unittest.mock import patch
+
+from flask import Flask, g
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.metricas_prometheus as metricas
+from utils.instrumentacion_sql import ConsultasPeticion
+from utils.metricas_prometheus import exponer, incrementar, observar, recolectar, registrar_carga, volcar
+
+
+@pytest.fixture(autouse=True)
+def directorio(tmp_path):
+    metricas._contadores.clear()
+    metricas._histogramas.clear()
+    with patch.object(metricas, 'DIRECTORIO', str(tmp_path)):
+        yield tmp_path
+    metricas._contadores.clear()
+    metricas._histogramas.clear()
+
+
+def archivo_worker(directorio, pid, contadores=(), histogramas=()):
+    with open(directorio / f'pid-{pid}.json', 'w') as f:
+        json.dump({'contadores': list(contadores), 'histogramas': list(histogramas), 'rss_bytes': 1024}, f)
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.secret_key = 'pruebas'
+
+    @app.route('/expedientes/<int:id>')
+    def expediente(id):
+        g.consultas_sql = ConsultasPeticion()
+        g.consultas_sql.agregar('SELECT 1', 30.0)
+        g.consultas_sql.agregar('SELECT 2', 20.0)
+        return 'ok'
+
+    from vista.vistasecurity import vistasecurity
+    app.register_blueprint(vistasecurity)
+    metricas.registrar_metricas(app)
+    return app
+
+
+class TestExposicion:
+    """Formato de texto y suma entre procesos"""
+
+    def test_histograma_y_contador(self):
+        observar('juzgado_turnos_recalculo_seconds', 0.3)
+        observar('juzgado_turnos_recalculo_seconds', 7.0)
+        incrementar('juzgado_rate_limit_bloqueos_total', {'tipo': 'ip'})
+
+        texto = exponer()
+
+        assert '# TYPE juzgado_turnos_recalculo_seconds histogram' in texto
+        assert 'juzgado_turnos_recalculo_seconds_bucket{le="0.1"} 0' in texto
+        assert 'juzgado_turnos_recalculo_seconds_bucket{le="0.5"} 1' in texto
+        assert 'juzgado_turnos_recalculo_seconds_bucket{le="10.0"} 2' in texto
+        assert 'juzgado_turnos_recalculo_seconds_bucket{le="+Inf"} 2' in texto
+        assert 'juzgado_turnos_recalculo_seconds_sum 7.3' in texto
+        assert 'juzgado_turnos_recalculo_seconds_count 2' in texto
+        assert 'juzgado_rate_limit_bloqueos_total{tipo="ip"} 1' in texto
+        assert f'juzgado_worker_rss_bytes{{pid="{os.getpid()}"}}' in texto
+
+    def test_escapa_etiquetas(self):
+        incrementar('juzgado_http_requests_total', {'endpoint': 'a"b\\c'})
+
+        assert 'juzgado_http_requests_total{endpoint="a\\"b\\\\c"} 1' in exponer()
+
+    def test_suma_workers(self, directorio):
+        incrementar('juzgado_carga_filas_total', {'hoja': 'estados'}, 10)
+        archivo_worker(directorio, 4242, contadores=[['juzgado_carga_filas_total', [['hoja', 'estados']], 5]])
+
+        with patch.object(metricas, '_proceso_vivo', return_value=True):
+            total = recolectar()
+
+        assert total['contadores'][('juzgado_carga_filas_total', (('hoja', 'estados'),))] == 15
+        assert set(total['rss']) == {os.getpid(), 4242}
+
+    def test_worker_terminado_se_acumula(self, directorio):
+        archivo_worker(directorio, 4242, contadores=[['juzgado_http_requests_total', [], 3]],
+                       histogramas=[['juzgado_turnos_recalculo_seconds', [], [1] + [0] * 10, 0.05]])
+        vivo = lambda pid: pid != 4242
+
+        with patch.object(metricas, '_proceso_vivo', side_effect=vivo):
+            recolectar()
+            archivo_worker(directorio, 4243, contadores=[['juzgado_http_requests_total', [], 2]])
+            with patch.object(metricas, '_proceso_vivo', side_effect=lambda pid: pid == os.getpid()):
+                total = recolectar()
+
+        assert not (directorio / 'pid-4242.json').exists()
+        assert not (directorio / 'pid-4243.json').exists()
+        assert total['contadores'][('juzgado_http_requests_total', ())] == 5
+        assert total['histogramas'][('juzgado_turnos_recalculo_seconds', ())][0][0] == 1
+        assert set(total['rss']) == {os.getpid()}
+
+    def test_volcado_limitado(self, directorio):
+        incrementar('juzgado_http_requests_total')
+        volcar(forzar=True)
+        incrementar('juzgado_http_requests_total')
+        volcar()
+
+        with open(directorio / f'pid-{os.getpid()}.json') as f:
+            assert json.load(f)['contadores'][0][2] == 1
+
+    def test_tipo_hoja(self):
+        registrar_carga('Ingresos', 100, 2.0)
+        registrar_carga('2025-Q3', 50, 1.0)
+
+        assert metricas._contadores[('juzgado_carga_filas_total', (('hoja', 'ingreso'),))] == 100
+        assert metricas._contadores[('juzgado_carga_segundos_total', (('hoja', 'trimestre'),))] == 1.0
+
+
+class TestPeticiones:
+    """Hooks por petición y acceso a /metrics"""
+
+    def test_cuenta_peticion_y_base_de_datos(self, app):
+        app.test_client().get('/expedientes/7')
+
+        assert metricas._contadores[('juzgado_http_requests_total', (
+            ('endpoint', 'expediente'), ('estado', '200'), ('metodo', 'GET')))] == 1
+        assert metricas._contadores[('juzgado_db_queries_total', (('endpoint', 'expediente'),))] == 2
+        conteos, suma = metricas._histogramas[('juzgado_db_duration_seconds', (('endpoint', 'expediente'),))]
+        assert suma == pytest.approx(0.05)
+
+    def test_sin_endpoint_agrupado(self, app):
+        app.test_client().get('/no-existe/123')
+
+        assert ('juzgado_http_requests_total', (
+            ('endpoint', 'sin_endpoint'), ('estado', '404'), ('metodo', 'GET'))) in metricas._contadores
+
+    def test_token(self, app):
+        cliente = app.test_client()
+        with patch.object(metricas, 'TOKEN', 'secreto'):
+            assert cliente.get('/metrics').status_code == 401
+            assert cliente.get('/metrics', headers={'Authorization': 'Bearer otro'}).status_code == 401
+            respuesta = cliente.get('/metrics', headers={'Authorization': 'Bearer secreto'})
+
+        assert respuesta.status_code == 200
+        assert respuesta.mimetype == 'text/plain'
+        assert '# TYPE juzgado_http_requests_total counter' in respuesta.get_data(as_text=True)
+
+    def test_sin_token_requiere_administrador(self, app):
+        cliente = app.test_client()
+        with patch.object(metricas, 'TOKEN', None):
+            assert cliente.get('/metrics').status_code == 403
+            with cliente.session_transaction() as sesion:
+                sesion['logged_in'] = True
+                sesion['administrador'] = True
+            assert cliente.get('/metrics').status_code == 200
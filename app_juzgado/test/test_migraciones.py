@@ -0,0 +1,120 @@
+"""
+Pruebas para las migraciones SQL (utils/migraciones.py) y la comprobación de planes (utils/plan_consultas.py)
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import Mock
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.migraciones import aplicar_migraciones, calcular_checksum, estado_migraciones, listar_migraciones
+from utils.plan_consultas import CONSULTAS_FRECUENTES, indices_del_plan, verificar_planes
+
+
+@pytest.fixture
+def directorio(tmp_path):
+    (tmp_path / '0002_segunda.sql').write_text('CREATE INDEX b ON t (b);')
+    (tmp_path / '0001_primera.sql').write_text('CREATE INDEX a ON t (a);')
+    (tmp_path / 'notas.txt').write_text('no es una migración')
+    return str(tmp_path)
+
+
+def _conexion(aplicadas):
+    cursor = Mock()
+    cursor.fetchall.return_value = aplicadas
+    conn = Mock()
+    conn.cursor.return_value = cursor
+    return conn, cursor
+
+
+class TestMigraciones:
+    """Orden, registro y una transacción por archivo"""
+
+    def test_listar_en_orden(self, directorio):
+        assert [(v, n) for v, n, _ in listar_migraciones(directorio)] == [('0001', 'primera'), ('0002', 'segunda')]
+
+    def test_version_repetida(self, directorio, tmp_path):
+        (tmp_path / '0001_otra.sql').write_text('SELECT 1;')
+        with pytest.raises(ValueError):
+            listar_migraciones(directorio)
+
+    def test_aplica_solo_pendientes(self, directorio):
+        conn, cursor = _conexion([('0001', calcular_checksum('CREATE INDEX a ON t (a);'), None)])
+
+        aplicadas = aplicar_migraciones(conn, directorio)
+
+        sentencias = [c[0][0] for c in cursor.execute.call_args_list]
+        assert 'CREATE INDEX b ON t (b);' in sentencias
+        assert 'CREATE INDEX a ON t (a);' not in sentencias
+        assert [m['version'] for m in aplicadas] == ['0002']
+        registro = next(c for c in cursor.execute.call_args_list if 'INSERT INTO schema_migraciones' in c[0][0])
+        assert registro[0][1][:2] == ('0002', 'segunda')
+        assert 'pg_advisory_unlock' in sentencias[-1]
+
+    def test_falla_revierte_y_detiene(self, directorio):
+        conn, cursor = _conexion([])
+        cursor.execute.side_effect = lambda sql, *a: (_ for _ in ()).throw(Exception('sintaxis')) \
+            if sql.startswith('CREATE INDEX a') else None
+
+        with pytest.raises(RuntimeError, match='0001_primera'):
+            aplicar_migraciones(conn, directorio)
+
+        sentencias = [c[0][0] for c in cursor.execute.call_args_list]
+        assert 'CREATE INDEX b ON t (b);' not in sentencias
+        conn.rollback.assert_called_once()
+        assert 'pg_advisory_unlock' in sentencias[-1]
+
+    def test_estado_marca_modificadas(self, directorio):
+        _, cursor = _conexion([('0001', 'otro-checksum', '2024-01-01')])
+
+        estado = estado_migraciones(cursor, directorio)
+
+        assert estado[0]['modificada'] and estado[0]['aplicada_en'] == '2024-01-01'
+        assert estado[1]['aplicada_en'] is None and not estado[1]['modificada']
+
+    def test_paquete_cubre_las_consultas_frecuentes(self):
+        """Cada índice esperado por la comprobación de planes lo crea alguna migración"""
+        sql = '\n'.join(contenido for _, _, contenido in listar_migraciones())
+        for nombre, _, _, indice in CONSULTAS_FRECUENTES:
+            assert f'CREATE INDEX IF NOT EXISTS {indice}' in sql, nombre
+
+    def test_indices_de_expresion_coinciden_con_las_consultas(self):
+        """Un índice de expresión solo se usa si la consulta repite la expresión exacta"""
+        from utils.busqueda_nombres import DOCUMENTO_NOMBRES
+        from utils.paginacion import CLAVES_ORDEN
+
+        migraciones = {nombre: contenido for _, nombre, contenido in listar_migraciones()}
+        fecha = CLAVES_ORDEN['fecha'][0](True).replace('e.', '')
+
+        assert f"(({DOCUMENTO_NOMBRES}))" in migraciones['busqueda_nombres']
+        assert f"(estado, ({fecha}), id)" in migraciones['indices_paginacion']
+        assert f"(({fecha}), id)" in migraciones['indices_paginacion']
+
+
+class TestPlanConsultas:
+    """Lectura de los planes de EXPLAIN (FORMAT JSON)"""
+
+    def test_indices_anidados(self):
+        plan = {'Node Type': 'Limit', 'Plans': [
+            {'Node Type': 'Index Scan', 'Index Name': 'idx_a'},
+            {'Node Type': 'Bitmap Heap Scan', 'Plans': [{'Node Type': 'Bitmap Index Scan', 'Index Name': 'idx_b'}]},
+        ]}
+        assert indices_del_plan(plan) == {'idx_a', 'idx_b'}
+
+    def test_verificar_planes(self):
+        cursor = Mock()
+        cursor.fetchone.side_effect = [
+            ([{'Plan': {'Node Type': 'Index Scan', 'Index Name': 'idx_a'}}],),
+            ('[{"Plan": {"Node Type": "Seq Scan"}}]',),
+        ]
+        consultas = [('a', 'SELECT 1', (), 'idx_a'), ('b', 'SELECT 2', (), 'idx_b')]
+
+        resultados = verificar_planes(cursor, consultas)
+
+        assert cursor.execute.call_args_list[0][0][0] == 'SET LOCAL enable_seqscan = off'
+        assert cursor.execute.call_args_list[1][0][0] == 'EXPLAIN (FORMAT JSON) SELECT 1'
+        assert [r['usa_indice'] for r in resultados] == [True, False]
+        assert resultados[1]['indices'] == []
@@ -0,0 +1,204 @@
+"""
+Pruebas para la paginación por cursor (utils/paginacion.py)
+"""
+
+import pytest
+import re
+import sqlite3
+import sys
+import os
+from datetime import date
+from unittest.mock import Mock, patch
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.paginacion import (
+    clausulas_keyset, codificar_cursor, decodificar_cursor, normalizar_por_pagina, recortar_pagina
+)
+
+
+def _fila(expediente_id, fecha):
+    """Fila del listado: id primero, clave de orden al final"""
+    return (expediente_id, 'RAD', 'CORTO', 'A', 'B', 'J', fecha, 'Activo Resuelto', None, fecha, fecha)
+
+
+class TestCursor:
+    """Codificación del cursor y cláusulas de la consulta"""
+
+    def test_ida_y_vuelta(self):
+        token = codificar_cursor(date(2024, 3, 1), 42)
+        assert decodificar_cursor(token) == ('2024-03-01', 42)
+
+    def test_cursor_invalido(self):
+        with pytest.raises(ValueError):
+            decodificar_cursor('no-es-un-cursor')
+
+    def test_primera_pagina_sin_condicion(self):
+        condicion, params, order_by, columna, hacia_atras = clausulas_keyset('fecha')
+
+        assert condicion is None and params == []
+        assert order_by.endswith('DESC, e.id DESC')
+        assert columna.endswith('AS clave_orden')
+        assert not hacia_atras
+
+    def test_siguiente_compara_filas(self):
+        token = codificar_cursor(date(2024, 3, 1), 42)
+        condicion, params, _, _, _ = clausulas_keyset('fecha', descendente=True, despues=token)
+
+        assert condicion.endswith(', e.id) < (%s::date, %s)')
+        assert params == ['2024-03-01', 42]
+
+    def test_anterior_invierte_orden(self):
+        token = codificar_cursor(7, 42)
+        condicion, _, order_by, _, hacia_atras = clausulas_keyset('turno', descendente=False, antes=token)
+
+        assert hacia_atras
+        assert '< (%s::integer, %s)' in condicion
+        assert order_by.endswith('DESC, e.id DESC')
+
+    def test_por_pagina_acotado(self):
+        assert normalizar_por_pagina('500') == 100
+        assert normalizar_por_pagina('0') == 1
+        assert normalizar_por_pagina('abc') == 10
+
+
+class TestOrdenTurno:
+    """Orden real de las filas por turno: sin turno siempre al final"""
+
+    TURNOS = [(1, 3), (2, None), (3, 1), (4, 2), (5, None), (6, 5)]
+
+    @pytest.fixture
+    def bd(self):
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE TABLE expediente (id INTEGER, turno INTEGER)")
+        conn.executemany("INSERT INTO expediente VALUES (?, ?)", self.TURNOS)
+        yield conn
+        conn.close()
+
+    def _pagina(self, bd, descendente, despues=None, antes=None, por_pagina=2):
+        with patch('utils.paginacion.turno_entero', return_value='e.turno'):
+            condicion, params, order_by, columna, hacia_atras = clausulas_keyset(
+                'turno', descendente=descendente, despues=despues, antes=antes)
+        sql = f"SELECT e.id, {columna} FROM expediente e"
+        if condicion:
+            sql += f" WHERE {condicion}"
+        sql += f" {order_by} LIMIT %s"
+        # Mismas cláusulas en SQLite: marcadores ? y CAST en lugar de ::tipo
+        sql = re.sub(r'%s::(\w+)', r'CAST(? AS \1)', sql).replace('%s', '?')
+        filas = bd.execute(sql, params + [por_pagina + 1]).fetchall()
+        return recortar_pagina(filas, por_pagina, hacia_atras, con_cursor=bool(despues or antes))
+
+    def _recorrer(self, bd, descendente):
+        ids, siguiente = [], None
+        for _ in range(len(self.TURNOS)):
+            filas, siguiente, _ = self._pagina(bd, descendente, despues=siguiente)
+            ids += [fila[0] for fila in filas]
+            if not siguiente:
+                return ids
+        pytest.fail(f"La paginación no termina: {ids}")
+
+    def test_descendente_sin_turno_al_final(self, bd):
+        assert self._recorrer(bd, descendente=True) == [6, 1, 4, 3, 5, 2]
+
+    def test_ascendente_sin_turno_al_final(self, bd):
+        assert self._recorrer(bd, descendente=False) == [3, 4, 1, 6, 2, 5]
+
+    def test_pagina_anterior_descendente(self, bd):
+        _, siguiente, _ = self._pagina(bd, True)
+        filas, _, anterior = self._pagina(bd, True, despues=siguiente)
+        assert [fila[0] for fila in filas] == [4, 3]
+
+        filas, _, _ = self._pagina(bd, True, antes=anterior)
+        assert [fila[0] for fila in filas] == [6, 1]
+
+
+class TestRecortarPagina:
+    """Cursores siguiente/anterior a partir de LIMIT por_pagina + 1"""
+
+    def test_primera_pagina_con_mas(self):
+        filas = [_fila(i, date(2024, 1, i)) for i in range(10, 0, -1)]
+
+        pagina, siguiente, anterior = recortar_pagina(filas, 3)
+
+        assert [f[0] for f in pagina] == [10, 9, 8]
+        assert decodificar_cursor(siguiente) == ('2024-01-08', 8)
+        assert anterior is None
+
+    def test_ultima_pagina(self):
+        filas = [_fila(2, date(2024, 1, 2)), _fila(1, date(2024, 1, 1))]
+
+        pagina, siguiente, anterior = recortar_pagina(filas, 3, con_cursor=True)
+
+        assert len(pagina) == 2
+        assert siguiente is None
+        assert decodificar_cursor(anterior) == ('2024-01-02', 2)
+
+    def test_hacia_atras_restaura_orden(self):
+        # Leídas en orden inverso (ascendente) desde el cursor 'antes'
+        filas = [_fila(i, date(2024, 1, i)) for i in (4, 5, 6, 7)]
+
+        pagina, siguiente, anterior = recortar_pagina(filas, 3, hacia_atras=True, con_cursor=True)
+
+        assert [f[0] for f in pagina] == [6, 5, 4]
+        assert decodificar_cursor(siguiente) == ('2024-01-04', 4)
+        assert decodificar_cursor(anterior) == ('2024-01-06', 6)
+
+
+class TestListadoPorCursor:
+    """La vista lee solo la página pedida"""
+
+    def test_pagina_por_estado(self):
+        from vista.vistaexpediente import pagina_por_estado
+
+        cursor = Mock()
+        cursor.fetchall.return_value = [_fila(i, date(2024, 1, i)) for i in range(11, 0, -1)]
+        conn = Mock()
+        conn.cursor.return_value = cursor
+        token = codificar_cursor(date(2024, 2, 1), 99)
+
+        with patch('vista.vistaexpediente.obtener_conexion', return_value=conn):
+            pagina = pagina_por_estado('ACTIVO RESUELTO', despues=token, con_relacionados=False)
+
+        sql, parametros = cursor.execute.call_args[0]
+        assert ', e.id) < (%s::date, %s)' in sql
+        assert 'OFFSET' not in sql
+        assert sql.rstrip().endswith('LIMIT %s')
+        assert parametros[-3:] == ['2024-02-01', 99, 11]
+        assert len(pagina['expedientes']) == 10
+        assert pagina['siguiente'] and pagina['anterior']
+        conn.close.assert_called_once()
+
+
+class TestApiPagina:
+    """La API JSON de páginas requiere sesión"""
+
+    @pytest.fixture
+    def cliente(self):
+        from flask import Flask
+        from vista.vistaexpediente import vistaexpediente
+        from vista.vistalogin import vistalogin
+
+        app = Flask(__name__)
+        app.secret_key = 'pruebas'
+        app.register_blueprint(vistaexpediente)
+        app.register_blueprint(vistalogin)
+        return app.test_client()
+
+    def test_anonimo_redirige_al_login(self, cliente):
+        with patch('vista.vistaexpediente.pagina_por_estado') as pagina:
+            respuesta = cliente.get('/expediente/api/pagina?estado=ACTIVO+RESUELTO')
+
+        assert respuesta.status_code == 302
+        assert '/login' in respuesta.headers['Location']
+        pagina.assert_not_called()
+
+    def test_con_sesion(self, cliente):
+        with cliente.session_transaction() as sesion:
+            sesion['logged_in'] = True
+        with patch('vista.vistaexpediente.pagina_por_estado',
+                   return_value={'expedientes': [], 'siguiente': None, 'anterior': None}):
+            respuesta = cliente.get('/expediente/api/pagina?estado=ACTIVO+RESUELTO')
+
+        assert respuesta.status_code == 200
+        assert respuesta.get_json()['expedientes'] == []
@@ -0,0 +1,167 @@
+"""
+Pruebas para el pool de conexiones por proceso
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import Mock, patch
+
+import psycopg2.extensions
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modelo.poolConexiones import PoolConexiones, PoolAgotadoError
+
+
+def _conexion_falsa():
+    conn = Mock()
+    conn.closed = 0
+    conn.autocommit = False
+    conn.get_transaction_status.return_value = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    return conn
+
+
+class TestPoolConexiones:
+    """Pruebas del préstamo, devolución y reciclaje de conexiones"""
+
+    def test_close_devuelve_conexion_al_pool(self):
+        """conn.close() no cierra el socket sino que reutiliza la conexión"""
+        fabrica = Mock(side_effect=_conexion_falsa)
+        pool = PoolConexiones(fabrica, tamano_max=2, verificar_tras=None)
+
+        conn = pool.obtener()
+        real = conn._entrada.conexion
+        conn.close()
+        conn2 = pool.obtener()
+
+        assert fabrica.call_count == 1
+        assert conn2._entrada.conexion is real
+        real.close.assert_not_called()
+        assert conn.closed == 1
+
+    def test_rollback_de_transaccion_abierta_al_devolver(self):
+        """Una transacción sin confirmar se descarta al devolver la conexión"""
+        pool = PoolConexiones(_conexion_falsa, verificar_tras=None)
+        conn = pool.obtener()
+        real = conn._entrada.conexion
+        real.get_transaction_status.return_value = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+
+        conn.close()
+
+        real.rollback.assert_called_once()
+        assert pool.estadisticas()['disponibles'] == 1
+
+    def test_conexion_olvidada_vuelve_al_pool(self):
+        """Si el envoltorio se recolecta sin close(), la conexión vuelve al pool"""
+        pool = PoolConexiones(_conexion_falsa, verificar_tras=None)
+        conn = pool.obtener()
+        del conn
+
+        stats = pool.estadisticas()
+        assert stats['en_uso'] == 0
+        assert stats['disponibles'] == 1
+
+    def test_finalizador_con_el_lock_tomado_no_bloquea(self):
+        """El recolector puede correr dentro de una sección con el lock: solo encola"""
+        pool = PoolConexiones(_conexion_falsa, verificar_tras=None)
+        conn = pool.obtener()
+
+        with pool._lock:
+            del conn
+            assert len(pool._huerfanas) == 1
+
+        stats = pool.estadisticas()
+        assert stats['en_uso'] == 0
+        assert stats['disponibles'] == 1
+        assert not pool._huerfanas
+
+    def test_huerfana_heredada_no_vuelve_al_pool_del_hijo(self):
+        """Tras fork, las conexiones encoladas por el recolector del padre se abandonan"""
+        pool = PoolConexiones(_conexion_falsa, verificar_tras=None)
+        conn = pool.obtener()
+        heredada = conn._entrada.conexion
+        del conn
+
+        with patch('modelo.poolConexiones.os.getpid', return_value=pool._pid + 1):
+            stats = pool.estadisticas()
+
+        assert stats['disponibles'] == 0
+        assert heredada in pool._heredadas
+        heredada.close.assert_not_called()
+
+    def test_reciclaje_por_vida_maxima(self):
+        """Las conexiones más viejas que vida_maxima se cierran y se reemplazan"""
+        fabrica = Mock(side_effect=_conexion_falsa)
+        pool = PoolConexiones(fabrica, vida_maxima=60, verificar_tras=None)
+
+        with patch('modelo.poolConexiones.time.monotonic', return_value=1000.0):
+            conn = pool.obtener()
+        real = conn._entrada.conexion
+        with patch('modelo.poolConexiones.time.monotonic', return_value=1100.0):
+            conn.close()
+
+        real.close.assert_called_once()
+        assert pool.estadisticas()['conexiones_recicladas'] == 1
+        assert pool.estadisticas()['disponibles'] == 0
+
+    def test_verificacion_de_salud_descarta_conexion_caida(self):
+        """Una conexión inactiva que falla SELECT 1 se reemplaza por una nueva"""
+        fabrica = Mock(side_effect=_conexion_falsa)
+        pool = PoolConexiones(fabrica, verificar_tras=0)
+
+        conn = pool.obtener()
+        caida = conn._entrada.conexion
+        conn.close()
+        caida.cursor.side_effect = psycopg2.OperationalError("server closed the connection")
+
+        conn2 = pool.obtener()
+
+        assert conn2._entrada.conexion is not caida
+        assert fabrica.call_count == 2
+        assert pool.estadisticas()['verificaciones_fallidas'] == 1
+
+    def test_pool_agotado_lanza_error(self):
+        """Sin conexiones libres se espera y luego se lanza PoolAgotadoError"""
+        pool = PoolConexiones(_conexion_falsa, tamano_max=1, espera_maxima=0.01, verificar_tras=None)
+        conn = pool.obtener()
+
+        with pytest.raises(PoolAgotadoError):
+            pool.obtener()
+
+        stats = pool.estadisticas()
+        assert stats['agotamientos'] == 1
+        assert stats['saturacion'] == 1.0
+        conn.close()
+
+    def test_reinicio_tras_fork_no_cierra_conexiones_del_padre(self):
+        """En el worker se abandonan las conexiones heredadas sin cerrarlas"""
+        fabrica = Mock(side_effect=_conexion_falsa)
+        pool = PoolConexiones(fabrica, verificar_tras=None)
+        conn = pool.obtener()
+        heredada = conn._entrada.conexion
+        conn.close()
+
+        with patch('modelo.poolConexiones.os.getpid', return_value=pool._pid + 1):
+            nueva = pool.obtener()
+            assert nueva._entrada.conexion is not heredada
+            nueva.close()
+
+        heredada.close.assert_not_called()
+        assert fabrica.call_count == 2
+
+    def test_conexion_bd_hace_rollback_ante_error(self):
+        """El context manager revierte y devuelve la conexión si hay excepción"""
+        from modelo import configBd
+
+        conn = Mock()
+        with patch.object(configBd, 'obtener_conexion', return_value=conn):
+            with pytest.raises(ValueError):
+                with configBd.conexion_bd() as c:
+                    assert c is conn
+                    raise ValueError("fallo")
+
+        conn.rollback.assert_called_once()
+        conn.close.assert_called_once()
+        conn.commit.assert_not_called()
@@ -0,0 +1,146 @@
+"""
+Pruebas para el rate limiter y sus almacenes (utils/rate_limiter.py)
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.rate_limiter as modulo
+from utils.rate_limiter import AlmacenMemoria, AlmacenPostgres, RateLimiter, crear_almacen
+
+
+class TestVentanaDeslizante:
+    """Contadores O(1) de ventana actual y anterior"""
+
+    def test_cuenta_en_la_ventana(self):
+        almacen = AlmacenMemoria()
+        for _ in range(3):
+            almacen.registrar('intentos:a', 60, 1200.0)
+
+        assert almacen.contar('intentos:a', 60, 1230.0) == 3
+
+    def test_pondera_la_ventana_anterior(self):
+        almacen = AlmacenMemoria()
+        for _ in range(4):
+            almacen.registrar('intentos:a', 60, 1210.0)
+        almacen.registrar('intentos:a', 60, 1275.0)
+
+        # a 15 s de la ventana nueva, la anterior pesa 3/4
+        assert almacen.contar('intentos:a', 60, 1275.0) == 1 + 4 * 0.75
+        # dos ventanas después ya no cuenta nada
+        assert almacen.contar('intentos:a', 60, 1400.0) == 0
+
+    def test_reiniciar(self):
+        almacen = AlmacenMemoria()
+        almacen.registrar('login:juan', 900, 1000.0)
+        almacen.reiniciar('login:juan')
+
+        assert almacen.contar('login:juan', 900, 1000.0) == 0
+
+
+class TestMemoriaAcotada:
+    """Purga de claves inactivas y límite de claves"""
+
+    def test_limite_de_claves(self):
+        almacen = AlmacenMemoria(max_claves=2)
+        almacen.registrar('intentos:a', 60, 1000.0)
+        almacen.registrar('intentos:b', 60, 1000.0)
+        almacen.registrar('intentos:a', 60, 1001.0)
+        almacen.registrar('intentos:c', 60, 1002.0)
+
+        assert list(almacen._contadores) == ['intentos:a', 'intentos:c']
+
+    def test_purga_periodica(self):
+        almacen = AlmacenMemoria(intervalo_purga=60)
+        almacen._ultima_purga = 1000.0
+        almacen.registrar('intentos:a', 60, 1000.0)
+        almacen.bloquear('ip:1.1.1.1', 1100.0)
+        almacen.registrar('intentos:b', 60, 1150.0)
+
+        almacen.registrar('intentos:b', 60, 1200.0)
+
+        assert list(almacen._contadores) == ['intentos:b']
+        assert not almacen._bloqueos
+
+    def test_bloqueo_vencido(self):
+        almacen = AlmacenMemoria()
+        almacen.bloquear('usuario:juan', 1100.0)
+
+        assert almacen.bloqueado_hasta('usuario:juan', 1050.0) == 1100.0
+        assert almacen.bloqueado_hasta('usuario:juan', 1100.0) is None
+
+
+class TestRateLimiter:
+    """API del rate limiter sobre el almacén"""
+
+    def test_login_bloquea_usuario_e_ip(self):
+        limiter = RateLimiter(AlmacenMemoria())
+        for _ in range(5):
+            limiter.record_failed_login('juan', '10.0.0.1')
+
+        assert limiter.is_user_blocked('juan')[0] is True
+        assert limiter.is_ip_blocked('10.0.0.1')[0] is True
+        assert limiter.stats() == {'blocked_ips': 1, 'blocked_users': 1, 'total_attempts': 0, 'login_attempts': 5}
+
+    def test_login_exitoso_limpia_intentos(self):
+        limiter = RateLimiter(AlmacenMemoria())
+        for _ in range(4):
+            limiter.record_failed_login('juan', '10.0.0.1')
+        limiter.clear_user_attempts('juan')
+        limiter.record_failed_login('juan', '10.0.0.1')
+
+        assert limiter.is_user_blocked('juan')[0] is False
+
+    def test_almacen_configurado(self):
+        assert isinstance(crear_almacen('postgres'), AlmacenPostgres)
+        assert isinstance(crear_almacen('memoria'), AlmacenMemoria)
+        assert isinstance(crear_almacen('redis'), AlmacenMemoria)
+
+
+class TestAlmacenPostgres:
+    """Almacén compartido entre workers"""
+
+    @pytest.fixture
+    def cursor(self):
+        cursor = MagicMock()
+        conn = MagicMock()
+        conn.cursor.return_value = cursor
+        contexto = MagicMock()
+        contexto.__enter__.return_value = conn
+        with patch.object(modulo, 'conexion_bd', return_value=contexto) as conexion:
+            yield cursor
+        conexion.assert_called_with(commit=True)
+
+    def test_registrar_en_una_sentencia(self, cursor):
+        almacen = AlmacenPostgres()
+        almacen._ultima_purga = 1e12
+        cursor.fetchone.return_value = (1260, 2, 4)
+
+        assert almacen.registrar('intentos:a', 60, 1275.0) == 2 + 4 * 0.75
+        sql, parametros = cursor.execute.call_args[0]
+        assert 'ON CONFLICT (clave) DO UPDATE' in sql
+        assert parametros == {'clave': 'intentos:a', 'ventana': 60, 'ahora': 1275.0, 'inicio': 1260}
+
+    def test_purga_sin_ddl(self, cursor):
+        almacen = AlmacenPostgres(max_claves=100)
+        cursor.fetchone.return_value = None
+
+        almacen.contar('intentos:a', 60, 1000.0)
+
+        sentencias = [llamada[0][0] for llamada in cursor.execute.call_args_list]
+        assert not any('CREATE' in s for s in sentencias)
+        assert any('OFFSET' in s for s in sentencias)
+
+    def test_sin_base_de_datos_usa_memoria(self):
+        almacen = AlmacenPostgres()
+        with patch.object(modulo, 'conexion_bd', side_effect=Exception('sin conexión')):
+            almacen.registrar('intentos:a', 60, 1000.0)
+            almacen.bloquear('ip:1.1.1.1', 2000.0)
+
+            assert almacen.contar('intentos:a', 60, 1000.0) == 1
+            assert almacen.bloqueado_hasta('ip:1.1.1.1', 1000.0) == 2000.0
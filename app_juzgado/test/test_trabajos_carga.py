@@ -0,0 +1,206 @@
+"""
+Pruebas para la cola de cargas de Excel en segundo plano (utils/trabajos_carga.py)
+"""
+
+import pytest
+import sys
+import os
+from contextlib import contextmanager
+from unittest.mock import Mock, patch
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import utils.trabajos_carga as trabajos
+from utils.trabajos_carga import (
+    ProgresoCarga, con_progreso, describir_trabajo, ejecutar_trabajo, lotes_con_progreso, reportar_progreso
+)
+
+
+def _fila_trabajo(estado='procesando', total=1000, procesadas=250, errores=3,
+                  segundos=10.0, sin_avance=1.0, resultado=None):
+    return (7, 1, 'carga.xlsx', False, estado, total, procesadas, errores, None,
+            resultado, None, segundos, sin_avance, 0)
+
+
+@contextmanager
+def _conexion_falsa(cursor):
+    conn = Mock()
+    conn.cursor.return_value = cursor
+    with patch.object(trabajos, 'conexion_bd') as conexion_bd:
+        conexion_bd.return_value.__enter__.return_value = conn
+        yield conexion_bd
+
+
+class TestDescribirTrabajo:
+    """Pruebas del estado que consulta subirexpediente.js"""
+
+    def test_porcentaje_y_eta(self):
+        trabajo = describir_trabajo(_fila_trabajo())
+
+        assert trabajo['porcentaje'] == 25
+        assert trabajo['eta_segundos'] == 30
+        assert not trabajo['terminado']
+
+    def test_completado_con_mensajes(self):
+        resultado = '{"mensajes": [["Archivo procesado", "success"]], "reporte_id": 4}'
+        trabajo = describir_trabajo(_fila_trabajo(estado='completado', procesadas=1000, resultado=resultado))
+
+        assert trabajo['porcentaje'] == 100
+        assert trabajo['eta_segundos'] is None
+        assert trabajo['terminado']
+        assert trabajo['mensajes'] == [['Archivo procesado', 'success']]
+
+    def test_sin_avance_se_da_por_interrumpido(self):
+        """Un trabajo cuyo worker murió no queda 'procesando' para siempre"""
+        trabajo = describir_trabajo(_fila_trabajo(sin_avance=trabajos.TIEMPO_MAXIMO_SIN_AVANCE + 1))
+
+        assert trabajo['estado'] == 'interrumpido'
+        assert trabajo['terminado']
+
+
+class TestProgreso:
+    """Pruebas del reporte de avance desde los procesadores"""
+
+    def test_sin_trabajo_no_hace_nada(self):
+        df = pd.DataFrame({'A': [1, 2, 3]})
+        with patch.object(trabajos, 'conexion_bd') as conexion_bd:
+            assert len(list(con_progreso(df))) == 3
+            reportar_progreso(10)
+            conexion_bd.assert_not_called()
+
+    def test_errores_acumulados_entre_hojas(self):
+        """Cada hoja tiene su propio contador; el trabajo suma ambos"""
+        progreso = ProgresoCarga(7, intervalo=3600)
+        trabajos._contexto.progreso = progreso
+        try:
+            with _conexion_falsa(Mock()):
+                for hoja in (pd.DataFrame({'A': [1, 2]}), pd.DataFrame({'A': [1, 2, 3]})):
+                    resultado = {'errores': 0}
+                    for _ in con_progreso(hoja, errores=lambda: resultado['errores']):
+                        resultado['errores'] += 1
+        finally:
+            trabajos._contexto.progreso = None
+
+        assert progreso.filas_total == 5
+        assert progreso.filas_procesadas == 5
+        assert progreso.errores == 5
+
+
+    def test_avance_por_lote(self):
+        progreso = ProgresoCarga(7, intervalo=3600)
+        trabajos._contexto.progreso = progreso
+        try:
+            with _conexion_falsa(Mock()):
+                lotes = list(lotes_con_progreso(pd.DataFrame({'A': [1, 2, 3]})))
+        finally:
+            trabajos._contexto.progreso = None
+
+        assert len(lotes) == 1
+        assert progreso.filas_procesadas == 3
+
+
+class TestEjecucion:
+    """Pruebas del ciclo de vida de un trabajo"""
+
+    def test_error_del_procesador_queda_registrado(self):
+        cursor = Mock()
+        cursor.fetchone.return_value = (7, memoryview(b'xlsx'), True, 1)
+        procesador = Mock(side_effect=Exception('Faltan columnas'))
+
+        with _conexion_falsa(cursor):
+            assert ejecutar_trabajo(7, procesador)
+
+        procesador.assert_called_once_with(b'xlsx', True)
+        sql, parametros = cursor.execute.call_args_list[-1][0]
+        assert 'archivo = NULL' in sql
+        assert parametros[:2] == ('error', 'Faltan columnas')
+
+    def test_trabajo_ya_tomado(self):
+        """Si otro worker ya lo tomó, no se procesa dos veces"""
+        cursor = Mock()
+        cursor.fetchone.return_value = None
+        procesador = Mock()
+
+        with _conexion_falsa(cursor):
+            assert not ejecutar_trabajo(7, procesador)
+
+        procesador.assert_not_called()
+
+
+class TestRecuperacion:
+    """Trabajos que dejó un worker reciclado o muerto"""
+
+    def test_huerfano_en_el_mismo_host(self):
+        host = trabajos.socket.gethostname()
+        with patch.object(trabajos, '_proceso_vivo', return_value=False):
+            assert trabajos.trabajo_huerfano(f'{host}:999999', False)
+            assert not trabajos.trabajo_huerfano(f'{host}:{os.getpid()}', True)
+        with patch.object(trabajos, '_proceso_vivo', return_value=True):
+            assert not trabajos.trabajo_huerfano(f'{host}:999999', True)
+
+    def test_otro_host_por_tiempo_sin_avance(self):
+        assert trabajos.trabajo_huerfano('otro-host:123', True)
+        assert not trabajos.trabajo_huerfano('otro-host:123', False)
+        assert trabajos.trabajo_huerfano(None, True)
+
+    def test_reencola_o_falla(self):
+        cursor = Mock()
+        cursor.fetchall.return_value = [
+            (1, 'otro-host:1', 1, True, True),    # primer intento: se reencola
+            (2, 'otro-host:2', 2, True, True),    # agotó los intentos
+            (3, 'otro-host:3', 1, False, True),   # sin archivo: no se puede reintentar
+            (4, 'otro-host:4', 1, True, False),   # sigue avanzando
+        ]
+
+        resultado = trabajos.recuperar_interrumpidos(cursor)
+
+        assert resultado == {'reencolados': [1], 'fallidos': [2, 3]}
+        consulta = cursor.execute.call_args_list[0][0][0]
+        assert 'FOR UPDATE SKIP LOCKED' in consulta
+        reencolar, fallar = cursor.execute.call_args_list[1][0], cursor.execute.call_args_list[2][0]
+        assert "estado = 'pendiente'" in reencolar[0] and reencolar[1] == ([1],)
+        assert "estado = 'error'" in fallar[0] and fallar[1] == ([2, 3],)
+
+    def test_toma_pendientes_antiguos(self):
+        cursor = Mock()
+        cursor.fetchone.return_value = None
+
+        with _conexion_falsa(cursor):
+            assert trabajos.reclamar_siguiente(Mock(), antiguedad=trabajos.GRACIA_PENDIENTE) is None
+
+        sql, parametros = cursor.execute.call_args[0]
+        assert 'FOR UPDATE SKIP LOCKED' in sql and 'fecha_creacion <=' in sql
+        assert parametros == (trabajos.propietario_actual(), trabajos.GRACIA_PENDIENTE)
+
+    def test_un_hilo_por_proceso(self):
+        with patch.object(trabajos, 'EJECUTOR_CARGAS', 'hilo'), \
+             patch.object(trabajos, '_recuperacion_pid', None), \
+             patch.object(trabajos.threading, 'Thread') as hilo:
+            assert trabajos.iniciar_recuperacion(Mock())
+            assert not trabajos.iniciar_recuperacion(Mock())
+
+        hilo.return_value.start.assert_called_once()
+
+    def test_externo_no_inicia_hilo(self):
+        with patch.object(trabajos, 'EJECUTOR_CARGAS', 'externo'):
+            assert not trabajos.iniciar_recuperacion(Mock())
+
+
+class TestMensajesResultado:
+    """Los mensajes del trabajo son los mismos que antes se mostraban con flash"""
+
+    def test_carga_de_nuevos(self):
+        from vista.vistasubirexpediente import mensajes_resultado
+
+        mensajes = mensajes_resultado({
+            'hoja_usada': 'Hoja1', 'procesados': 8, 'errores': 2, 'total_filas': 10,
+            'rechazados_detalle': {'duplicados': ['1' * 23], 'radicado_invalido': ['123'], 'campos_faltantes': []},
+        })
+
+        assert mensajes[0] == ('Archivo procesado usando hoja "Hoja1". 8 expedientes agregados exitosamente, '
+                               '2 filas omitidas por errores de validación de 10 filas procesadas.', 'warning')
+        assert mensajes[1][1] == 'info'
+        assert 'DUPLICADOS (1)' in mensajes[1][0]
@@ -0,0 +1,173 @@
+"""
+Pruebas para el motor de turnos (utils/turnos.py)
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import Mock, patch
+
+# Agregar el directorio padre al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestRecalcularTurnos:
+    """Pruebas del recálculo global de turnos"""
+
+    def test_recalculo_en_una_sola_sentencia(self):
+        """El recálculo completo usa una sola consulta set-based"""
+        from utils.turnos import recalcular_turnos
+
+        cursor = Mock()
+        cursor.fetchone.return_value = (120, 3, 7)
+
+        resultado = recalcular_turnos(cursor)
+
+        assert cursor.execute.call_count == 1
+        sql = cursor.execute.call_args[0][0]
+        assert 'ROW_NUMBER() OVER' in sql
+        assert 'IS DISTINCT FROM' in sql
+        assert resultado['con_turno'] == 120
+        assert resultado['sin_fecha'] == 3
+        assert resultado['actualizados'] == 7
+        assert resultado['duracion_ms'] >= 0
+
+    def test_recalcular_todos_los_turnos_usa_motor(self):
+        """La vista de actualización delega en el motor compartido"""
+        from vista import vistaactualizarexpediente
+
+        cursor = Mock()
+        esperado = {'con_turno': 5, 'sin_fecha': 0, 'actualizados': 2, 'duracion_ms': 1.0}
+        with patch.object(vistaactualizarexpediente, 'recalcular_turnos', return_value=esperado) as motor:
+            resultado = vistaactualizarexpediente.recalcular_todos_los_turnos(cursor)
+
+        motor.assert_called_once_with(cursor)
+        assert resultado == esperado
+        cursor.execute.assert_not_called()
+
+
+class TestTurnoIncremental:
+    """Pruebas del mantenimiento incremental de un solo expediente"""
+
+    def test_rango_desplazamiento(self):
+        """Solo se corren los turnos entre la posición anterior y la nueva"""
+        from utils.turnos import _rango_desplazamiento, TURNO_MAXIMO
+
+        assert _rango_desplazamiento(3, 3) is None
+        assert _rango_desplazamiento(None, 4) == (4, TURNO_MAXIMO, 1)
+        assert _rango_desplazamiento(4, None) == (5, TURNO_MAXIMO, -1)
+        assert _rango_desplazamiento(2, 6) == (3, 6, -1)
+        assert _rango_desplazamiento(6, 2) == (2, 5, 1)
+
+    def test_cola_consistente(self):
+        """La cola restante debe ser 1..M sin el turno anterior del expediente"""
+        from utils.turnos import _cola_consistente
+
+        # Demás expedientes con turnos 1,2,4,5 y el expediente tenía el 3
+        assert _cola_consistente(4, 0, 4, 1, 5, 12, 3)
+        # Hueco adicional en la numeración
+        assert not _cola_consistente(4, 0, 4, 1, 6, 13, 3)
+        # Turnos repetidos
+        assert not _cola_consistente(4, 0, 3, 1, 4, 10, None)
+        # Expediente fuera de la cola con turno
+        assert not _cola_consistente(4, 1, 4, 1, 4, 10, None)
+
+    def test_mueve_expediente_con_una_sola_actualizacion(self):
+        """Un cambio de posición es una lectura y un UPDATE acotado al rango"""
+        from utils.turnos import actualizar_turno_expediente
+
+        cursor = Mock()
+        # Tenía el turno 5, ahora le corresponde el 2; los demás ocupan 1..6 sin el 5
+        cursor.fetchone.return_value = ('5', 2, True, 5, 0, 5, 1, 6, 16)
+        cursor.rowcount = 4
+
+        resultado = actualizar_turno_expediente(cursor, 42)
+
+        assert cursor.execute.call_count == 2
+        params = cursor.execute.call_args[0][1]
+        assert params == {'id': 42, 'turno': 2, 'delta': 1, 'desde': 2, 'hasta': 4}
+        assert resultado['modo'] == 'incremental'
+        assert resultado['desplazados'] == 3
+
+    def test_sin_cambio_no_escribe(self):
+        """Si la posición no cambia no se ejecuta ningún UPDATE"""
+        from utils.turnos import actualizar_turno_expediente
+
+        cursor = Mock()
+        cursor.fetchone.return_value = ('2', 2, True, 2, 0, 2, 1, 3, 4)
+
+        resultado = actualizar_turno_expediente(cursor, 7)
+
+        assert cursor.execute.call_count == 1
+        assert resultado['modo'] == 'sin_cambio'
+
+    def test_cola_inconsistente_hace_recalculo_global(self):
+        """Con turnos huecos o repetidos se recurre al recálculo completo"""
+        from utils import turnos
+
+        cursor = Mock()
+        cursor.fetchone.return_value = (None, 1, True, 3, 0, 2, 1, 2, 3)
+        global_ = {'con_turno': 4, 'sin_fecha': 0, 'actualizados': 4, 'duracion_ms': 2.0}
+
+        with patch.object(turnos, 'recalcular_turnos', return_value=global_) as motor:
+            resultado = turnos.actualizar_turno_expediente(cursor, 9)
+
+        motor.assert_called_once_with(cursor)
+        assert resultado['modo'] == 'global'
+
+
+class TestTurnoEntero:
+    """Migración de la columna turno a INTEGER y compatibilidad con el texto anterior"""
+
+    def test_valores_de_texto_anteriores(self):
+        from utils.turnos import turno_a_entero
+
+        assert turno_a_entero('007') == 7
+        assert turno_a_entero(' 12 ') == 12
+        assert turno_a_entero(3) == 3
+        assert turno_a_entero('') is None
+        assert turno_a_entero('09:30') is None
+        assert turno_a_entero(None) is None
+
+    def test_expresion_segun_tipo_de_columna(self):
+        from utils import turnos
+
+        with patch.object(turnos, '_turno_es_entero', False), \
+             patch.object(turnos, 'tipo_columna', return_value='text'):
+            assert '::text::integer' in turnos.turno_entero('e.turno')
+        with patch.object(turnos, '_turno_es_entero', True):
+            assert turnos.turno_entero('e.turno') == 'e.turno'
+
+    def test_tipo_desde_el_registro_del_esquema(self):
+        from utils import turnos
+
+        with patch.object(turnos, '_turno_es_entero', False), \
+             patch.object(turnos, 'tipo_columna', return_value='integer') as tipo:
+            assert turnos.turno_entero('e.turno') == 'e.turno'
+            assert turnos.turno_entero('e.turno') == 'e.turno'
+        tipo.assert_called_once_with('expediente', 'turno')
+
+    def test_migracion_convierte_e_indexa(self):
+        """La migración 0006 convierte solo si la columna aún es texto y crea los índices de la cola"""
+        from utils.migraciones import listar_migraciones
+        from utils.paginacion import TURNO_SIN_TURNO_DESC
+        from utils.turnos import TURNO_MAXIMO
+
+        sql = next(contenido for _, nombre, contenido in listar_migraciones() if nombre == 'turno_entero')
+
+        assert "<> 'integer' THEN" in sql
+        assert 'ALTER COLUMN turno TYPE INTEGER' in sql
+        assert "ON expediente (turno, id) WHERE estado = 'Activo Pendiente'" in sql
+        # Las expresiones de la paginación por turno (utils/paginacion.CLAVES_ORDEN)
+        assert f"ON expediente ((COALESCE(turno, {TURNO_MAXIMO})), id)" in sql
+        assert f"ON expediente ((COALESCE(turno, {TURNO_SIN_TURNO_DESC})), id)" in sql
+
+    def test_compactar_en_una_sentencia(self):
+        from utils.turnos import compactar_turnos
+
+        cursor = Mock()
+        cursor.rowcount = 4
+
+        assert compactar_turnos(cursor) == 4
+        assert cursor.execute.call_count == 1
+        assert 'ROW_NUMBER() OVER' in cursor.execute.call_args[0][0]
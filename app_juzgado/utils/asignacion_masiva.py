@@ -0,0 +1,168 @@
+"""
+Motor de asignación masiva de responsables
+
+Selecciona los expedientes de un criterio con una consulta, calcula en
+memoria a qué usuario va cada uno y aplica todo con un único
+UPDATE ... FROM unnest(...), que además devuelve el conteo por usuario.
+Lo usan la distribución aleatoria, la distribución por rol y la limpieza
+de responsables (que asigna NULL).
+
+Estrategias de distribución:
+- 'circular': el i-ésimo expediente al usuario i mod n
+- 'menor_carga': cada expediente al usuario con menos expedientes
+  'Activo Pendiente' en ese momento (montículo de mínimos), de modo que
+  las cargas convergen
+"""
+
+import heapq
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+CON_ASIGNACION = "(responsable IS NOT NULL OR usuario_asignado_id IS NOT NULL)"
+
+ESTRATEGIAS = ('circular', 'menor_carga')
+ESTADO_CARGA = 'Activo Pendiente'
+
+
+def filtro_criterio(criterio, valor_criterio=None, tipo_col=None):
+    """
+    Condición WHERE de un criterio de asignación masiva.
+
+    Args:
+        criterio: 'estado', 'sin_responsable', 'tipo_solicitud', 'juzgado_origen' o 'todos'
+        valor_criterio: valor del criterio (ya validado por la vista)
+        tipo_col: columna de tipo detectada (solo para 'tipo_solicitud')
+
+    Returns:
+        tuple: (sql, params)
+    """
+    if criterio == 'estado':
+        return "estado = %s", (valor_criterio,)
+    if criterio == 'sin_responsable':
+        return "(responsable IS NULL OR responsable = '')", ()
+    if criterio == 'tipo_solicitud':
+        return f"{tipo_col} ILIKE %s", (f'%{valor_criterio}%',)
+    if criterio == 'juzgado_origen':
+        return "juzgado_origen ILIKE %s", (f'%{valor_criterio}%',)
+    if criterio == 'todos':
+        return "TRUE", ()
+    raise ValueError(f"Criterio no reconocido: {criterio}")
+
+
+def seleccionar_expedientes(cursor, filtro, params=(), limite=None):
+    """IDs de los expedientes del filtro, los más antiguos primero (hasta `limite`)"""
+    query = f"SELECT id FROM expediente WHERE {filtro} ORDER BY fecha_ingreso ASC, id ASC"
+    if limite:
+        query += " LIMIT %s"
+        params = tuple(params) + (limite,)
+    cursor.execute(query, params)
+    return [fila[0] for fila in cursor.fetchall()]
+
+
+def distribuir_circular(expedientes_ids, usuarios):
+    """
+    Reparte los expedientes en orden circular (el i-ésimo al usuario i mod n).
+
+    Args:
+        usuarios: lista de (usuario_id, responsable)
+
+    Returns:
+        tuple: (expedientes_ids, usuarios_ids, responsables) listos para aplicar_asignaciones
+    """
+    total = len(usuarios)
+    usuarios_ids = [usuarios[i % total][0] for i in range(len(expedientes_ids))]
+    responsables = [usuarios[i % total][1] for i in range(len(expedientes_ids))]
+    return list(expedientes_ids), usuarios_ids, responsables
+
+
+def cargas_actuales(cursor, usuarios_ids, excluir_ids=()):
+    """
+    Expedientes 'Activo Pendiente' de cada usuario, en una consulta agregada.
+    No cuenta los expedientes que se van a redistribuir (excluir_ids).
+
+    Returns:
+        dict: {usuario_id: cantidad} (los usuarios sin expedientes no aparecen)
+    """
+    cursor.execute("""
+        SELECT e.usuario_asignado_id, COUNT(*)
+        FROM expediente e
+        LEFT JOIN unnest(%s::int[]) AS x(id) ON x.id = e.id
+        WHERE e.usuario_asignado_id = ANY(%s)
+          AND e.estado = %s
+          AND x.id IS NULL
+        GROUP BY e.usuario_asignado_id
+    """, (list(excluir_ids), list(usuarios_ids), ESTADO_CARGA))
+    return {usuario_id: cantidad for usuario_id, cantidad in cursor.fetchall()}
+
+
+def distribuir_menor_carga(expedientes_ids, usuarios, cargas):
+    """
+    Asigna cada expediente (en orden) al usuario con menor carga acumulada.
+    Los empates se resuelven por el orden de `usuarios`.
+
+    Args:
+        usuarios: lista de (usuario_id, responsable)
+        cargas: dict {usuario_id: carga actual} de cargas_actuales()
+
+    Returns:
+        tuple: (expedientes_ids, usuarios_ids, responsables) listos para aplicar_asignaciones
+    """
+    monticulo = [(cargas.get(usuario_id, 0), orden, usuario_id, responsable)
+                 for orden, (usuario_id, responsable) in enumerate(usuarios)]
+    heapq.heapify(monticulo)
+
+    usuarios_ids = []
+    responsables = []
+    for _ in expedientes_ids:
+        carga, orden, usuario_id, responsable = monticulo[0]
+        usuarios_ids.append(usuario_id)
+        responsables.append(responsable)
+        heapq.heapreplace(monticulo, (carga + 1, orden, usuario_id, responsable))
+    return list(expedientes_ids), usuarios_ids, responsables
+
+
+def distribuir(cursor, expedientes_ids, usuarios, estrategia='circular'):
+    """Calcula la distribución según la estrategia ('circular' o 'menor_carga')"""
+    if estrategia == 'menor_carga':
+        cargas = cargas_actuales(cursor, [usuario_id for usuario_id, _ in usuarios], expedientes_ids)
+        logger.info(f"⚖️ Carga actual por usuario: {cargas}")
+        return distribuir_menor_carga(expedientes_ids, usuarios, cargas)
+    if estrategia == 'circular':
+        return distribuir_circular(expedientes_ids, usuarios)
+    raise ValueError(f"Estrategia no reconocida: {estrategia}")
+
+
+def aplicar_asignaciones(cursor, expedientes_ids, usuarios_ids, responsables):
+    """
+    Aplica todas las asignaciones con una sola sentencia. No hace commit.
+
+    Returns:
+        dict: {usuario_id: expedientes actualizados} (None = asignación limpiada)
+    """
+    if not expedientes_ids:
+        return {}
+
+    inicio = time.perf_counter()
+    cursor.execute("""
+        WITH asignados AS (
+            UPDATE expediente e
+            SET usuario_asignado_id = a.usuario_id, responsable = a.responsable
+            FROM unnest(%s::int[], %s::int[], %s::text[]) AS a(expediente_id, usuario_id, responsable)
+            WHERE e.id = a.expediente_id
+            RETURNING a.usuario_id
+        )
+        SELECT usuario_id, COUNT(*) FROM asignados GROUP BY usuario_id
+    """, (list(expedientes_ids), list(usuarios_ids), list(responsables)))
+    conteos = {usuario_id: cantidad for usuario_id, cantidad in cursor.fetchall()}
+
+    logger.info(f"📋 Asignación masiva: {sum(conteos.values())} de {len(expedientes_ids)} expedientes "
+                f"actualizados en {round((time.perf_counter() - inicio) * 1000, 1)} ms")
+    return conteos
+
+
+def limpiar_asignaciones(cursor, expedientes_ids):
+    """Quita responsable y usuario asignado a los expedientes dados. No hace commit."""
+    vacios = [None] * len(expedientes_ids)
+    return sum(aplicar_asignaciones(cursor, expedientes_ids, vacios, vacios).values())
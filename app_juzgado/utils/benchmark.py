@@ -0,0 +1,319 @@
+"""
+Suite de benchmarks de los endpoints y operaciones masivas más usados
+
+Se ejecuta contra una base local (poblada con `flask generar-datos`) con
+`flask benchmark`. Cada escenario se repite N veces y se reporta:
+
+- latencia p50 / p95 / p99 y media (ms)
+- consultas SQL por operación (CursorContador, que extiende el cursor
+  instrumentado y se instala con definir_fabrica_cursor mientras se mide)
+- RSS pico del proceso al terminar el escenario (MB; es el máximo del
+  proceso, por eso los escenarios pesados van al final)
+
+Los resultados se guardan en JSON y se comparan con una línea base
+guardada (comparar): una latencia p95, un número de consultas o un RSS por
+encima de la tolerancia, o cualquier error, es una regresión y el comando
+termina con error.
+
+Los endpoints HTTP se llaman con el cliente de pruebas de Flask y una
+sesión de administrador; las cargas de Excel usan libros sintéticos con
+radicados fuera del rango de generar-datos y se borran después de cada
+repetición; turnos y asignación masiva se revierten (rollback).
+"""
+
+import json
+import logging
+import math
+import platform
+import resource
+import sys
+import time
+from datetime import datetime
+from io import BytesIO
+from itertools import cycle
+
+from modelo.configBd import conexion_bd, definir_fabrica_cursor
+from .asignacion_masiva import aplicar_asignaciones, distribuir, seleccionar_expedientes
+from .datos_sinteticos import MARCA, escribir_libro
+from .instrumentacion_sql import CursorInstrumentado
+from .turnos import recalcular_turnos
+
+logger = logging.getLogger(__name__)
+
+VERSION_FORMATO = 1
+REPETICIONES = 30
+TAMANOS_CARGA = (1000, 10000, 50000)
+TOLERANCIA = 0.25
+# Diferencia mínima para considerar regresión (ruido de medición)
+MARGEN_MS = 5.0
+MARGEN_CONSULTAS = 0.5
+MARGEN_RSS_MB = 20.0
+
+# Fuera del rango único de radicado_sintetico usado por generar-datos
+INDICE_CARGAS = 120_000_000
+
+_consultas = 0
+
+
+class CursorContador(CursorInstrumentado):
+    """Cursor instrumentado que además cuenta las sentencias de cada operación medida"""
+
+    def execute(self, query, vars=None):
+        global _consultas
+        _consultas += 1
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        global _consultas
+        _consultas += 1
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        global _consultas
+        _consultas += 1
+        return super().copy_expert(sql, file, size)
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano (valores no vacíos)"""
+    ordenados = sorted(valores)
+    return ordenados[max(math.ceil(p / 100 * len(ordenados)) - 1, 0)]
+
+
+def rss_pico_mb():
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    return round(pico / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def medir(operacion, repeticiones, limpiar=None, calentamiento=1):
+    """
+    Ejecuta `operacion` (calentamiento + repeticiones) y resume las mediciones.
+    `limpiar` se llama después de cada ejecución, fuera del tiempo medido.
+
+    Returns:
+        dict: n, errores, p50_ms, p95_ms, p99_ms, media_ms, consultas_por_operacion, rss_pico_mb
+    """
+    global _consultas
+    tiempos, consultas, errores = [], [], 0
+    for i in range(calentamiento + repeticiones):
+        _consultas = 0
+        inicio = time.perf_counter()
+        try:
+            operacion()
+        except Exception as e:
+            errores += 1
+            logger.warning(f"⚠️ Error en benchmark: {e}")
+        duracion = (time.perf_counter() - inicio) * 1000
+        if i >= calentamiento:
+            tiempos.append(duracion)
+            consultas.append(_consultas)
+        if limpiar:
+            limpiar()
+
+    return {
+        'n': repeticiones,
+        'errores': errores,
+        'p50_ms': round(percentil(tiempos, 50), 2),
+        'p95_ms': round(percentil(tiempos, 95), 2),
+        'p99_ms': round(percentil(tiempos, 99), 2),
+        'media_ms': round(sum(tiempos) / len(tiempos), 2),
+        'consultas_por_operacion': round(sum(consultas) / len(consultas), 2),
+        'rss_pico_mb': rss_pico_mb(),
+    }
+
+
+def _muestras(cursor, cantidad=100):
+    """Radicados, apellidos y usuarios existentes para variar las peticiones"""
+    cursor.execute("SELECT COUNT(*) FROM expediente")
+    total = cursor.fetchone()[0]
+    cursor.execute("""
+        SELECT radicado_completo, demandante FROM expediente
+        WHERE radicado_completo IS NOT NULL AND demandante IS NOT NULL
+        ORDER BY random() LIMIT %s
+    """, (cantidad,))
+    filas = cursor.fetchall()
+    cursor.execute("""
+        SELECT u.id, r.nombre_rol FROM usuarios u JOIN roles r ON r.id = u.rol_id
+        WHERE u.activo AND r.nombre_rol IN ('ESCRIBIENTE', 'SUSTANCIADOR')
+        ORDER BY u.id LIMIT 200
+    """)
+    return {
+        'expedientes': total,
+        'radicados': [radicado for radicado, _ in filas],
+        'apellidos': [demandante.split()[-1] for _, demandante in filas if len(demandante.split()[-1]) >= 3],
+        'usuarios': cursor.fetchall(),
+    }
+
+
+def _peticion(cliente, metodo, url, **kwargs):
+    respuesta = getattr(cliente, metodo)(url, **kwargs)
+    # Una redirección (p. ej. al login) tampoco mide el endpoint
+    if respuesta.status_code >= 300:
+        raise RuntimeError(f"{metodo.upper()} {url}: HTTP {respuesta.status_code}")
+    return respuesta
+
+
+def _cliente_admin(app):
+    cliente = app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion.update(logged_in=True, user_id=0, usuario='benchmark', correo='benchmark@local',
+                      nombre='Benchmark', administrador=True, rol_nombre=None)
+    return cliente
+
+
+def _borrar_cargados(desde_id):
+    """Elimina lo que insertó una carga de prueba (expedientes con id > desde_id)"""
+    with conexion_bd(commit=True) as conn:
+        cursor = conn.cursor()
+        cargados = "SELECT id FROM expediente WHERE id > %s AND observaciones = %s"
+        for tabla in ('actuaciones', 'estados', 'ingresos'):
+            cursor.execute(f"DELETE FROM {tabla} WHERE expediente_id IN ({cargados})", (desde_id, MARCA))
+        cursor.execute("DELETE FROM expediente WHERE id > %s AND observaciones = %s", (desde_id, MARCA))
+        cursor.close()
+
+
+def _id_maximo():
+    with conexion_bd() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM expediente")
+        maximo = cursor.fetchone()[0]
+        cursor.close()
+    return maximo
+
+
+def _en_transaccion_revertida(funcion):
+    """Ejecuta funcion(cursor) y revierte: mide sin modificar la base"""
+    def operacion():
+        with conexion_bd() as conn:
+            cursor = conn.cursor()
+            try:
+                funcion(cursor)
+            finally:
+                conn.rollback()
+                cursor.close()
+    return operacion
+
+
+def _asignar(usuarios, limite=1000):
+    def funcion(cursor):
+        ids = seleccionar_expedientes(cursor, "estado = %s", ('Activo Pendiente',), limite)
+        aplicar_asignaciones(cursor, *distribuir(cursor, ids, usuarios, 'menor_carga'))
+    return funcion
+
+
+def escenarios(app, muestras, repeticiones=REPETICIONES, tamanos_carga=TAMANOS_CARGA, solo=None):
+    """
+    Escenarios a ejecutar (todos o los nombrados en `solo`). Los libros de
+    las cargas se generan aquí, fuera del tiempo medido.
+
+    Returns:
+        list: [(nombre, operacion, repeticiones, limpiar | None)] en orden de ejecución
+    """
+    from vista.vistasubirexpediente import procesar_carga_excel
+
+    cliente = _cliente_admin(app)
+    radicados = cycle(muestras['radicados'] or ['05001310300320120000000'])
+    apellidos = cycle(muestras['apellidos'] or ['GÓMEZ'])
+
+    lista = [
+        ('api_buscar_expediente', lambda: _peticion(
+            cliente, 'post', '/api/buscar_expediente', json={'radicado': next(radicados)}), repeticiones, None),
+        ('api_buscar_expediente_sufijo', lambda: _peticion(
+            cliente, 'post', '/api/buscar_expediente', json={'radicado': next(radicados)[-13:]}), repeticiones, None),
+        ('api_buscar_por_nombres', lambda: _peticion(
+            cliente, 'post', '/api/buscar_por_nombres', json={'nombre': next(apellidos)}), repeticiones, None),
+        ('api_turnos_publicos', lambda: _peticion(cliente, 'get', '/api/turnos_publicos'), repeticiones, None),
+        ('expediente_por_radicado', lambda: _peticion(
+            cliente, 'get', '/expediente', query_string={'radicado': next(radicados)}), repeticiones, None),
+        ('expediente_por_estado', lambda: _peticion(
+            cliente, 'get', '/expediente', query_string={'estado': 'Activo Pendiente'}), repeticiones, None),
+        ('expediente_por_solicitud', lambda: _peticion(
+            cliente, 'get', '/expediente', query_string={'solicitud': 'EJECUTIVO'}), repeticiones, None),
+        ('home', lambda: _peticion(cliente, 'get', '/home'), repeticiones, None),
+        ('admin_dashboard', lambda: _peticion(cliente, 'get', '/admin-dashboard'), repeticiones, None),
+        ('recalcular_turnos', _en_transaccion_revertida(recalcular_turnos), max(repeticiones // 6, 3), None),
+    ]
+    if muestras['usuarios']:
+        lista.append(('asignacion_masiva_1000', _en_transaccion_revertida(_asignar(muestras['usuarios'])),
+                      max(repeticiones // 6, 3), None))
+
+    for filas in sorted(tamanos_carga):
+        if solo and f'carga_excel_{filas}' not in solo:
+            continue
+        contenido = BytesIO()
+        escribir_libro(contenido, 'trimestre', filas=filas, desde=INDICE_CARGAS, hoja_trimestre='2024-Q1')
+        datos = contenido.getvalue()
+        desde_id = _id_maximo()
+        lista.append((f'carga_excel_{filas}', lambda datos=datos: procesar_carga_excel(BytesIO(datos), False),
+                      1, lambda desde_id=desde_id: _borrar_cargados(desde_id)))
+    return [escenario for escenario in lista if not solo or escenario[0] in solo]
+
+
+def ejecutar_benchmarks(app, solo=None, repeticiones=REPETICIONES, tamanos_carga=TAMANOS_CARGA):
+    """
+    Ejecuta los escenarios (todos o los nombrados en `solo`).
+
+    Returns:
+        dict: fecha, version, entorno y escenarios {nombre: resumen de medir()}
+    """
+    anterior = definir_fabrica_cursor(CursorContador)
+    try:
+        with conexion_bd() as conn:
+            cursor = conn.cursor()
+            muestras = _muestras(cursor)
+            cursor.close()
+
+        resultados = {}
+        for nombre, operacion, n, limpiar in escenarios(app, muestras, repeticiones, tamanos_carga, solo):
+            resultados[nombre] = medir(operacion, n, limpiar, calentamiento=0 if n == 1 else 1)
+            logger.info(f"⏱️ {nombre}: {resultados[nombre]}")
+    finally:
+        definir_fabrica_cursor(anterior)
+
+    return {
+        'version': VERSION_FORMATO,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'entorno': {
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'expedientes': muestras['expedientes'],
+        },
+        'escenarios': resultados,
+    }
+
+
+def comparar(actual, base, tolerancia=TOLERANCIA):
+    """
+    Regresiones de `actual` respecto de `base` (escenarios presentes en ambos).
+
+    Returns:
+        list: mensajes, vacía si no hay regresiones
+    """
+    regresiones = []
+    for nombre, medicion in actual['escenarios'].items():
+        if medicion['errores']:
+            regresiones.append(f"{nombre}: {medicion['errores']} errores")
+        referencia = base.get('escenarios', {}).get(nombre)
+        if not referencia:
+            continue
+        # Las consultas por operación no dependen de la carga de la máquina: sin tolerancia relativa
+        limites = {
+            'p95_ms': referencia['p95_ms'] * (1 + tolerancia) + MARGEN_MS,
+            'consultas_por_operacion': referencia['consultas_por_operacion'] + MARGEN_CONSULTAS,
+            'rss_pico_mb': referencia['rss_pico_mb'] * (1 + tolerancia) + MARGEN_RSS_MB,
+        }
+        for clave, limite in limites.items():
+            if medicion[clave] > limite:
+                regresiones.append(f"{nombre}: {clave} {medicion[clave]} > {referencia[clave]} (base)")
+    return regresiones
+
+
+def guardar_resultado(resultado, ruta):
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+
+
+def leer_resultado(ruta):
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,95 @@
+"""
+Búsqueda de expedientes por nombre de demandante / demandado
+
+Usa búsqueda de texto completo de PostgreSQL sobre un documento sin tildes
+(configuración 'simple': los nombres no se reducen a raíces), respaldada por
+un índice GIN de expresión. Cada palabra buscada se trata como prefijo, así
+"garcia lop" encuentra "GARCÍA LÓPEZ", y los resultados se ordenan por
+relevancia (ts_rank) y luego por fecha de ingreso.
+
+La extensión unaccent, la función f_unaccent y el índice los crea la
+migración 0003_busqueda_nombres.sql (`flask migrar`). Mientras no existan,
+la búsqueda cae al ILIKE anterior, paginado en SQL.
+"""
+
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+LONGITUD_MINIMA_PALABRA = 2
+MAXIMO_PALABRAS = 8
+
+# La expresión debe coincidir EXACTAMENTE con la del índice de la migración 0003 para que se use
+DOCUMENTO_NOMBRES = (
+    "to_tsvector('simple', f_unaccent(coalesce(demandante, '') || ' ' || coalesce(demandado, '')))"
+)
+
+COLUMNAS_RESULTADO = "id, radicado_completo, demandante, demandado, estado, fecha_ingreso, turno"
+
+_busqueda_indexada = False
+
+
+def preparar_consulta(nombre):
+    """
+    Convierte el texto del usuario en una consulta tsquery de prefijos.
+
+    Returns:
+        str | None: p. ej. 'garcía:* & lopez:*', o None si no quedan palabras útiles
+    """
+    palabras = [p for p in re.findall(r'[^\W_]+', nombre.lower()) if len(p) >= LONGITUD_MINIMA_PALABRA]
+    if not palabras:
+        return None
+    return ' & '.join(f"{palabra}:*" for palabra in palabras[:MAXIMO_PALABRAS])
+
+
+def busqueda_indexada_disponible(cursor):
+    """True si ya se aplicó la migración 0003 (se recuerda por proceso)"""
+    global _busqueda_indexada
+    if not _busqueda_indexada:
+        cursor.execute("SELECT to_regprocedure('f_unaccent(text)') IS NOT NULL")
+        _busqueda_indexada = bool(cursor.fetchone()[0])
+        if not _busqueda_indexada:
+            logger.warning("⚠️ Búsqueda por nombres sin índice: ejecute `flask migrar`")
+    return _busqueda_indexada
+
+
+def buscar_expedientes_por_nombre(cursor, nombre, pagina=1, por_pagina=10):
+    """
+    Busca una página de expedientes cuyo demandante o demandado coincide con `nombre`.
+
+    Returns:
+        tuple: (filas [(id, radicado_completo, demandante, demandado, estado,
+                fecha_ingreso, turno)], total, pagina) con la página ajustada
+                al rango válido
+    """
+    consulta = preparar_consulta(nombre)
+    if consulta and busqueda_indexada_disponible(cursor):
+        filtro = f"{DOCUMENTO_NOMBRES} @@ to_tsquery('simple', f_unaccent(%s))"
+        parametros = (consulta,)
+        orden = (f"ts_rank({DOCUMENTO_NOMBRES}, to_tsquery('simple', f_unaccent(%s))) DESC, "
+                 "fecha_ingreso DESC NULLS LAST, id DESC")
+        parametros_orden = (consulta,)
+    else:
+        patron = f"%{nombre}%"
+        filtro = "(demandante ILIKE %s OR demandado ILIKE %s)"
+        parametros = (patron, patron)
+        orden = "fecha_ingreso DESC NULLS LAST, id DESC"
+        parametros_orden = ()
+
+    cursor.execute(f"SELECT COUNT(*) FROM expediente WHERE {filtro}", parametros)
+    total = cursor.fetchone()[0]
+
+    total_paginas = max((total + por_pagina - 1) // por_pagina, 1)
+    pagina = min(max(pagina, 1), total_paginas)
+    if total == 0:
+        return [], 0, pagina
+
+    cursor.execute(f"""
+        SELECT {COLUMNAS_RESULTADO}
+        FROM expediente
+        WHERE {filtro}
+        ORDER BY {orden}
+        LIMIT %s OFFSET %s
+    """, parametros + parametros_orden + (por_pagina, (pagina - 1) * por_pagina))
+    return cursor.fetchall(), total, pagina
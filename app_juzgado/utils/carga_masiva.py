@@ -0,0 +1,338 @@
+"""
+Carga masiva de expedientes nuevos con COPY
+
+Las filas ya validadas en memoria se copian a una tabla temporal con
+COPY FROM STDIN y desde ahí se insertan expediente, ingresos y estados con
+sentencias INSERT ... SELECT. La detección de duplicados (contra la base y
+dentro del mismo archivo) también se hace en SQL.
+
+Flujo:
+1. crear_tabla_carga(cursor)
+2. copiar_filas_carga(cursor, filas)          # una o varias veces (por lotes)
+3. insertar_desde_carga(cursor, columnas_bd)  # clasifica e inserta
+
+Una fila que viola una restricción no aborta la carga: las longitudes
+máximas de las columnas se comprueban antes en SQL, y si aun así la
+inserción falla se reintenta por bloques de TAMANO_BLOQUE_REINTENTO y,
+dentro del bloque que falla, fila a fila (cada intento en un SAVEPOINT).
+Las filas rechazadas por la base se devuelven con su error.
+
+Nada hace commit: la transacción es del llamador. La tabla temporal se
+elimina sola al confirmar (ON COMMIT DROP).
+"""
+
+import csv
+import logging
+import time
+from io import StringIO
+
+logger = logging.getLogger(__name__)
+
+TABLA_CARGA = 'carga_expedientes'
+
+# (columna, tipo) de la tabla temporal, en el orden del COPY
+COLUMNAS_CARGA = [
+    ('fila', 'integer'),
+    ('radicado_completo', 'text'),
+    ('radicado_corto', 'text'),
+    ('demandante', 'text'),
+    ('demandado', 'text'),
+    ('fecha_ingreso', 'date'),
+    ('tipo_solicitud', 'text'),
+    ('estado', 'text'),
+    ('responsable', 'text'),
+    ('ubicacion', 'text'),
+    ('observaciones', 'text'),
+    ('juzgado_origen', 'text'),
+    # NULL = fila válida; si no, motivo de rechazo detectado en memoria
+    ('motivo', 'text'),
+]
+
+# Columnas de la tabla temporal que se copian a expediente (si existen allí)
+COLUMNAS_EXPEDIENTE = [
+    'radicado_completo', 'radicado_corto', 'demandante', 'demandado', 'fecha_ingreso',
+    'tipo_solicitud', 'estado', 'responsable', 'ubicacion', 'observaciones', 'juzgado_origen',
+]
+
+TIPOS_ENTEROS = ('smallint', 'integer', 'bigint')
+
+# Filas por bloque al reintentar una inserción que falló
+TAMANO_BLOQUE_REINTENTO = 500
+
+OBSERVACION_INGRESO = 'Ingreso desde Excel - Carga masiva'
+OBSERVACION_ESTADO = 'Estado inicial desde Excel - Carga masiva'
+
+
+def crear_tabla_carga(cursor):
+    """Crea la tabla temporal de carga para la transacción actual"""
+    columnas = ',\n'.join(f"{nombre} {tipo}" for nombre, tipo in COLUMNAS_CARGA)
+    cursor.execute(f"""
+        CREATE TEMP TABLE {TABLA_CARGA} (
+            {columnas},
+            duplicado text,
+            id integer,
+            error text
+        ) ON COMMIT DROP
+    """)
+
+
+def copiar_filas_carga(cursor, filas):
+    """
+    Copia filas a la tabla temporal con COPY FROM STDIN (formato CSV).
+
+    Args:
+        filas: lista de dicts con las claves de COLUMNAS_CARGA (faltantes = NULL)
+
+    Returns:
+        int: filas copiadas
+    """
+    if not filas:
+        return 0
+
+    buffer = StringIO()
+    escritor = csv.writer(buffer)
+    for fila in filas:
+        registro = []
+        for nombre, _ in COLUMNAS_CARGA:
+            valor = fila.get(nombre)
+            if valor is None or valor == '':
+                registro.append(None)  # campo vacío sin comillas = NULL
+            elif hasattr(valor, 'isoformat'):
+                registro.append(valor.isoformat())
+            else:
+                registro.append(valor)
+        escritor.writerow(registro)
+    buffer.seek(0)
+
+    nombres = ', '.join(nombre for nombre, _ in COLUMNAS_CARGA)
+    cursor.copy_expert(f"COPY {TABLA_CARGA} ({nombres}) FROM STDIN WITH (FORMAT csv)", buffer)
+    return len(filas)
+
+
+def _marcar_excedidas(cursor, columnas_bd):
+    """Marca con error las filas cuyo texto no cabe en la columna de expediente"""
+    for columna in COLUMNAS_EXPEDIENTE:
+        if columna not in columnas_bd or not columnas_bd[columna][1]:
+            continue
+        longitud = int(columnas_bd[columna][1])
+        cursor.execute(f"""
+            UPDATE {TABLA_CARGA} c SET error = %s
+            WHERE c.motivo IS NULL AND c.duplicado IS NULL AND c.error IS NULL
+              AND LENGTH(c.{columna}) > %s
+        """, (f"{columna} supera {longitud} caracteres", longitud))
+
+
+def _insertar_bloque(cursor, sentencias, filas=None):
+    """
+    Ejecuta las sentencias de inserción (todas las filas o solo `filas`) en
+    un SAVEPOINT. Si alguna falla, deshace el bloque completo.
+
+    Returns:
+        Exception | None: el error, o None si se insertó
+    """
+    filtro, extra = ("AND c.fila = ANY(%s)", (filas,)) if filas is not None else ("", ())
+    cursor.execute("SAVEPOINT carga_bloque")
+    try:
+        for sql, params in sentencias:
+            cursor.execute(sql.format(filtro=filtro), params + extra)
+    except Exception as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT carga_bloque")
+        return e
+    cursor.execute("RELEASE SAVEPOINT carga_bloque")
+    return None
+
+
+def _reintentar_por_bloques(cursor, sentencias):
+    """
+    Tras fallar la inserción completa: reintenta por bloques y, dentro del
+    bloque que falla, fila a fila. Las filas que no entran quedan sin id y
+    con el error de la base.
+    """
+    cursor.execute(f"CREATE INDEX ON {TABLA_CARGA} (fila)")
+    cursor.execute(f"SELECT fila FROM {TABLA_CARGA} WHERE id IS NOT NULL ORDER BY fila")
+    filas = [fila for fila, in cursor.fetchall()]
+
+    fallidas = {}
+    for i in range(0, len(filas), TAMANO_BLOQUE_REINTENTO):
+        bloque = filas[i:i + TAMANO_BLOQUE_REINTENTO]
+        if len(bloque) > 1 and _insertar_bloque(cursor, sentencias, bloque) is None:
+            continue
+        for fila in bloque:
+            error = _insertar_bloque(cursor, sentencias, [fila])
+            if error is not None:
+                fallidas[fila] = str(error).strip().split('\n')[0]
+
+    if fallidas:
+        cursor.execute(f"""
+            UPDATE {TABLA_CARGA} c SET id = NULL, error = f.error
+            FROM unnest(%s::integer[], %s::text[]) AS f(fila, error)
+            WHERE c.fila = f.fila
+        """, (list(fallidas), list(fallidas.values())))
+        logger.warning(f"⚠️ Carga masiva: {len(fallidas)} filas rechazadas por la base de datos")
+
+
+def insertar_desde_carga(cursor, columnas_bd, insertar_ingresos=True, insertar_estados=True):
+    """
+    Marca duplicados e inserta las filas válidas de la tabla temporal.
+
+    Duplicado (en este orden, igual que la carga fila a fila):
+    - 'completo': el radicado completo ya existe en expediente
+    - 'ultimos_13': coincide con los últimos 13 dígitos de uno existente
+    - 'completo': una fila anterior válida del mismo archivo tiene el mismo radicado
+
+    Args:
+        cursor: Cursor de la base de datos
+        columnas_bd: dict de columnas_tabla('expediente') (utils/esquema.py)
+        insertar_ingresos: crear el ingreso inicial de cada expediente
+        insertar_estados: crear el estado inicial de cada expediente con estado
+
+    Returns:
+        dict: insertados [(fila, id, radicado_completo, radicado_corto, demandante,
+              demandado, fecha_ingreso, estado)], duplicados [(fila, radicado, tipo)],
+              rechazados [fila] (motivo detectado en memoria), fallidos
+              [(fila, radicado, error)] (rechazados por la base), duracion_ms
+    """
+    inicio = time.perf_counter()
+
+    # 1. Duplicados contra la base y dentro del archivo
+    if 'radicado_sufijo' in columnas_bd:
+        # Columnas normalizadas (utils/indice_radicados.py): igualdades por índice,
+        # y sin diferencias de espacios o guiones que choquen con el índice único
+        radicado = "radicado_solo_digitos(c.radicado_completo)"
+        existe_completo = f"SELECT 1 FROM expediente e WHERE e.radicado_normalizado = {radicado}"
+        existe_sufijo = f"SELECT 1 FROM expediente e WHERE e.radicado_sufijo = RIGHT({radicado}, 13)"
+        mismo_radicado = f"radicado_solo_digitos(p.radicado_completo) = {radicado}"
+    else:
+        radicado = "c.radicado_completo"
+        existe_completo = "SELECT 1 FROM expediente e WHERE e.radicado_completo = c.radicado_completo"
+        existe_sufijo = """
+              SELECT 1 FROM expediente e
+              WHERE LENGTH(e.radicado_completo) >= 13
+                AND RIGHT(e.radicado_completo, 13) = RIGHT(c.radicado_completo, 13)
+        """
+        mismo_radicado = "p.radicado_completo = c.radicado_completo"
+
+    cursor.execute(f"""
+        UPDATE {TABLA_CARGA} c SET duplicado = 'completo'
+        WHERE c.radicado_completo IS NOT NULL
+          AND EXISTS ({existe_completo})
+    """)
+    cursor.execute(f"""
+        UPDATE {TABLA_CARGA} c SET duplicado = 'ultimos_13'
+        WHERE c.duplicado IS NULL
+          AND LENGTH({radicado}) >= 13
+          AND EXISTS ({existe_sufijo})
+    """)
+    # Restricciones conocidas antes de insertar: así una fila inválida no
+    # cuenta como la primera aparición de su radicado dentro del archivo
+    _marcar_excedidas(cursor, columnas_bd)
+
+    cursor.execute(f"""
+        UPDATE {TABLA_CARGA} c SET duplicado = 'completo'
+        WHERE c.duplicado IS NULL
+          AND c.radicado_completo IS NOT NULL
+          AND EXISTS (
+              SELECT 1 FROM {TABLA_CARGA} p
+              WHERE {mismo_radicado}
+                AND p.fila < c.fila
+                AND p.motivo IS NULL
+                AND p.duplicado IS NULL
+                AND p.error IS NULL
+          )
+    """)
+
+    # 2. IDs de la secuencia de expediente, en el orden del archivo
+    cursor.execute("SELECT pg_get_serial_sequence('expediente', 'id')")
+    secuencia = cursor.fetchone()[0]
+    if not secuencia:
+        raise Exception("La columna expediente.id no tiene secuencia asociada")
+
+    cursor.execute(f"""
+        UPDATE {TABLA_CARGA} c SET id = n.id
+        FROM (
+            SELECT o.fila, nextval(%s) AS id
+            FROM (
+                SELECT fila FROM {TABLA_CARGA}
+                WHERE motivo IS NULL AND duplicado IS NULL AND error IS NULL
+                ORDER BY fila
+            ) o
+        ) n
+        WHERE c.fila = n.fila
+    """, (secuencia,))
+
+    # 3. Expedientes, con su ingreso y estado iniciales
+    destino = ['id']
+    origen = ['c.id']
+    for columna in COLUMNAS_EXPEDIENTE:
+        if columna not in columnas_bd:
+            continue
+        destino.append(columna)
+        if columna == 'juzgado_origen' and columnas_bd[columna][0] in TIPOS_ENTEROS:
+            origen.append(f"c.{columna}::{columnas_bd[columna][0]}")
+        else:
+            origen.append(f"c.{columna}")
+
+    # {filtro} limita la sentencia a un bloque de filas en los reintentos
+    sentencias = [(f"""
+        INSERT INTO expediente ({', '.join(destino)})
+        SELECT {', '.join(origen)}
+        FROM {TABLA_CARGA} c
+        WHERE c.id IS NOT NULL {{filtro}}
+        ORDER BY c.id
+    """, ())]
+    if insertar_ingresos:
+        sentencias.append((f"""
+            INSERT INTO ingresos (expediente_id, fecha_ingreso, solicitud, observaciones)
+            SELECT c.id, c.fecha_ingreso, c.tipo_solicitud, COALESCE(c.observaciones, %s)
+            FROM {TABLA_CARGA} c
+            WHERE c.id IS NOT NULL {{filtro}}
+        """, (OBSERVACION_INGRESO,)))
+    if insertar_estados and 'estado' in columnas_bd:
+        sentencias.append((f"""
+            INSERT INTO estados (expediente_id, clase, fecha_estado, auto_anotacion, observaciones)
+            SELECT c.id, c.estado, c.fecha_ingreso, 'Estado inicial: ' || c.estado, %s
+            FROM {TABLA_CARGA} c
+            WHERE c.id IS NOT NULL AND c.estado IS NOT NULL {{filtro}}
+        """, (OBSERVACION_ESTADO,)))
+
+    if _insertar_bloque(cursor, sentencias) is not None:
+        _reintentar_por_bloques(cursor, sentencias)
+
+    # 4. Resultado para el reporte
+    cursor.execute(f"""
+        SELECT fila, id, radicado_completo, radicado_corto, demandante, demandado,
+               fecha_ingreso, estado
+        FROM {TABLA_CARGA} WHERE id IS NOT NULL ORDER BY fila
+    """)
+    insertados = cursor.fetchall()
+
+    cursor.execute(f"""
+        SELECT fila, radicado_completo, duplicado
+        FROM {TABLA_CARGA} WHERE duplicado IS NOT NULL ORDER BY fila
+    """)
+    duplicados = cursor.fetchall()
+
+    cursor.execute(f"""
+        SELECT fila FROM {TABLA_CARGA}
+        WHERE duplicado IS NULL AND motivo IS NOT NULL ORDER BY fila
+    """)
+    rechazados = [fila[0] for fila in cursor.fetchall()]
+
+    cursor.execute(f"""
+        SELECT fila, radicado_completo, error
+        FROM {TABLA_CARGA} WHERE error IS NOT NULL ORDER BY fila
+    """)
+    fallidos = cursor.fetchall()
+
+    resultado = {
+        'insertados': insertados,
+        'duplicados': duplicados,
+        'rechazados': rechazados,
+        'fallidos': fallidos,
+        'duracion_ms': round((time.perf_counter() - inicio) * 1000, 1),
+    }
+    logger.info(
+        f"📥 Carga masiva: {len(insertados)} expedientes insertados, {len(duplicados)} duplicados, "
+        f"{len(rechazados)} rechazados, {len(fallidos)} rechazados por la base en {resultado['duracion_ms']} ms"
+    )
+    return resultado
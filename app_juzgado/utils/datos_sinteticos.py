@@ -0,0 +1,379 @@
+"""
+Datos sintéticos a escala para probar rendimiento en una base local
+
+Las pruebas usan pocas filas; aquí se generan volúmenes reales (p. ej.
+1M expedientes con 5 ingresos, estados y actuaciones cada uno, cientos de
+usuarios ESCRIBIENTE/SUSTANCIADOR) y libros Excel grandes con las
+pestañas que acepta la carga (vista/vistasubirexpediente.py).
+
+- poblar_base(conn, ...): inserta con COPY FROM STDIN por lotes (commit
+  por lote) y al final recalcula turnos y ANALYZE (`flask generar-datos`).
+- escribir_libro(ruta, formato, ...): libro .xlsx en modo write_only con
+  'Ingreso' + 'Estados' o una pestaña 'YYYY-Qn' (`flask generar-excel`).
+- borrar_datos_sinteticos(cursor): elimina solo lo generado aquí.
+
+El radicado del expediente i depende solo de i (radicado_sintetico), así
+que un libro con `desde` dentro del rango ya cargado referencia expedientes
+existentes (modo actualización) y fuera de él crea nuevos. Todo lo
+generado lleva MARCA en observaciones y los usuarios el PREFIJO_USUARIO.
+"""
+
+import csv
+import logging
+import random
+import time
+from datetime import date, timedelta
+from io import StringIO
+
+import openpyxl
+
+from .auth import hash_password
+from .esquema import primera_columna, tiene_columna
+from .turnos import recalcular_turnos
+
+logger = logging.getLogger(__name__)
+
+MARCA = 'Dato sintético'
+PREFIJO_USUARIO = 'sintetico_'
+CONTRASENA_USUARIOS = 'Sintetico#2024'
+TAMANO_LOTE = 20000
+
+FECHA_FINAL = date(2025, 6, 30)
+
+# Código DANE de la ciudad (5 dígitos) de los radicados
+CIUDADES = ['05001', '08001', '11001', '13001', '17001', '25754', '41001', '54001', '66001', '68001', '73001', '76001']
+ESPECIALIDADES = ['03', '03', '03', '40', '41']  # civil (mayoría), pequeñas causas
+
+NOMBRES = [
+    'JUAN', 'MARÍA', 'CARLOS', 'ANA', 'LUIS', 'CARMEN', 'JOSÉ', 'LUZ', 'JORGE', 'SANDRA',
+    'ANDRÉS', 'PAOLA', 'DIEGO', 'CLAUDIA', 'FERNANDO', 'DIANA', 'ÓSCAR', 'MÓNICA', 'JAVIER', 'ÁNGELA',
+    'MIGUEL', 'NATALIA', 'RICARDO', 'ISABEL', 'HERNÁN', 'ROSA', 'GUSTAVO', 'PATRICIA', 'ÁLVARO', 'YOLANDA',
+]
+APELLIDOS = [
+    'GÓMEZ', 'RODRÍGUEZ', 'GONZÁLEZ', 'MARTÍNEZ', 'LÓPEZ', 'GARCÍA', 'PÉREZ', 'SÁNCHEZ', 'RAMÍREZ', 'TORRES',
+    'DÍAZ', 'VARGAS', 'MORENO', 'JIMÉNEZ', 'ROJAS', 'CASTRO', 'MUÑOZ', 'ORTIZ', 'HERRERA', 'MEDINA',
+    'AGUILAR', 'CASTAÑO', 'OSORIO', 'CARDONA', 'ZAPATA', 'QUINTERO', 'MONTOYA', 'GIRALDO', 'OSPINA', 'PATIÑO',
+]
+ENTIDADES = [
+    'BANCOLOMBIA S.A.', 'BANCO DE BOGOTÁ S.A.', 'BANCO DAVIVIENDA S.A.', 'BANCO POPULAR S.A.',
+    'COOPERATIVA FINANCIERA COTRAFA', 'CONFIAR COOPERATIVA FINANCIERA', 'FONDO NACIONAL DEL AHORRO',
+    'CONJUNTO RESIDENCIAL LOS ALMENDROS P.H.', 'EDIFICIO TORRES DEL PARQUE P.H.', 'COMFAMA',
+    'SEGUROS GENERALES SURAMERICANA S.A.', 'CREDIVALORES S.A.S.', 'RCI COLOMBIA S.A.',
+]
+SOLICITUDES = [
+    'Demanda', 'EJECUTIVO SINGULAR', 'EJECUTIVO HIPOTECARIO', 'VERBAL SUMARIO', 'RESTITUCIÓN DE INMUEBLE',
+    'SUCESIÓN', 'DESPACHO COMISORIO', 'MEMORIAL', 'SOLICITUD DE MEDIDAS CAUTELARES', 'LIQUIDACIÓN DE CRÉDITO',
+]
+CLASES_ESTADO = [
+    'AUTO ADMITE DEMANDA', 'AUTO INADMITE DEMANDA', 'AUTO LIBRA MANDAMIENTO DE PAGO', 'AUTO DECRETA MEDIDAS',
+    'AUTO DE TRÁMITE', 'AUTO INTERLOCUTORIO', 'AUTO SEGUIR ADELANTE LA EJECUCIÓN', 'SENTENCIA',
+    'AUTO APRUEBA LIQUIDACIÓN', 'AUTO TERMINA PROCESO POR PAGO',
+]
+ACTUACIONES = [
+    'Recepción memorial', 'Al despacho', 'Fijación estado', 'Notificación personal', 'Oficio librado',
+    'Traslado', 'Constancia secretarial', 'Audiencia', 'Entrega de títulos', 'Archivo',
+]
+UBICACIONES = ['DESPACHO', 'SECRETARÍA', 'ARCHIVO CENTRAL', 'ESTANTE 3', 'ESTANTE 7']
+# Proporciones aproximadas de un juzgado en operación
+ESTADOS = ['Activo Pendiente'] * 3 + ['Activo Resuelto'] * 4 + ['Inactivo Resuelto'] * 3
+ROLES = ['ESCRIBIENTE', 'SUSTANCIADOR']
+
+
+def radicado_sintetico(indice):
+    """
+    Radicado de 23 dígitos (ciudad, entidad, especialidad, despacho, año,
+    consecutivo, recurso) único para cada índice < 130.000.000, también en
+    sus últimos 13 dígitos.
+    """
+    consecutivo = indice % 100000
+    bloque = indice // 100000
+    anio = 2012 + bloque % 13
+    despacho = 100 * (indice % 7 + 1) + (bloque // 13) % 100
+    ciudad = CIUDADES[indice % len(CIUDADES)]
+    especialidad = ESPECIALIDADES[indice % len(ESPECIALIDADES)]
+    return f"{ciudad}31{especialidad}{despacho:03d}{anio}{consecutivo:05d}00"
+
+
+def radicado_corto(radicado):
+    """Año-consecutivo, p. ej. '2022-00031'"""
+    return f"{radicado[12:16]}-{radicado[16:21]}"
+
+
+def _persona(rng):
+    return (f"{rng.choice(NOMBRES)} {rng.choice(NOMBRES) + ' ' if rng.random() < 0.4 else ''}"
+            f"{rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}")
+
+
+def _parte(rng, prob_entidad):
+    return rng.choice(ENTIDADES) if rng.random() < prob_entidad else _persona(rng)
+
+
+def _fecha(rng, desde, dias):
+    return desde + timedelta(days=rng.randrange(max(dias, 1)))
+
+
+def generar_expediente(rng, indice):
+    """dict con los datos de un expediente (sin movimientos)"""
+    radicado = radicado_sintetico(indice)
+    anio = int(radicado[12:16])
+    return {
+        'radicado_completo': radicado,
+        'radicado_corto': radicado_corto(radicado),
+        'demandante': _parte(rng, 0.6),
+        'demandado': _parte(rng, 0.1),
+        'fecha_ingreso': _fecha(rng, date(anio, 1, 1), 365),
+        'tipo_solicitud': rng.choice(SOLICITUDES),
+        'estado': rng.choice(ESTADOS),
+        'responsable': rng.choice(ROLES),
+        'ubicacion': rng.choice(UBICACIONES),
+        'juzgado_origen': rng.randint(1, 40),
+    }
+
+
+def _cantidad(rng, promedio):
+    """Entre 1 y 2 * promedio - 1 (media = promedio)"""
+    return rng.randint(1, max(2 * promedio - 1, 1)) if promedio else 0
+
+
+def generar_movimientos(rng, expediente, promedio):
+    """
+    Ingresos, estados y actuaciones de un expediente, con fechas posteriores
+    a su ingreso. El último estado coincide con el estado del expediente.
+
+    Returns:
+        tuple: (ingresos [(fecha, solicitud)], estados [(clase, fecha, auto)],
+                actuaciones [(fecha, numero, descripcion)])
+    """
+    inicio = expediente['fecha_ingreso']
+    restantes = max((FECHA_FINAL - inicio).days, 1)
+
+    ingresos = [(inicio, expediente['tipo_solicitud'])]
+    ingresos += sorted((_fecha(rng, inicio, restantes), rng.choice(SOLICITUDES))
+                       for _ in range(_cantidad(rng, promedio) - 1))
+
+    fechas_estado = sorted(_fecha(rng, inicio, restantes) for _ in range(_cantidad(rng, promedio)))
+    estados = [(rng.choice(CLASES_ESTADO), fecha, f"Auto No. {rng.randint(1, 9999)}") for fecha in fechas_estado]
+    if estados:
+        estados[-1] = (expediente['estado'], estados[-1][1], estados[-1][2])
+
+    fechas_actuacion = sorted(_fecha(rng, inicio, restantes) for _ in range(_cantidad(rng, promedio)))
+    actuaciones = [(fecha, numero, rng.choice(ACTUACIONES)) for numero, fecha in enumerate(fechas_actuacion, 1)]
+    return ingresos, estados, actuaciones
+
+
+def _copiar(cursor, tabla, columnas, filas):
+    """COPY FROM STDIN (CSV) de una lista de tuplas; None = NULL"""
+    if not filas:
+        return 0
+    buffer = StringIO()
+    escritor = csv.writer(buffer)
+    for fila in filas:
+        escritor.writerow([None if v is None else v.isoformat() if hasattr(v, 'isoformat') else v for v in fila])
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    return len(filas)
+
+
+def crear_usuarios(cursor, cantidad):
+    """
+    Crea `cantidad` usuarios sintéticos repartidos entre ESCRIBIENTE y
+    SUSTANCIADOR. No hace commit.
+
+    Returns:
+        dict: {rol: [ids de usuario]}
+    """
+    cursor.execute("SELECT nombre_rol, id FROM roles WHERE nombre_rol = ANY(%s)", (ROLES,))
+    roles = dict(cursor.fetchall())
+    for rol in ROLES:
+        if rol not in roles:
+            logger.warning(f"⚠️ No existe el rol {rol}: sus usuarios sintéticos quedan sin rol")
+
+    cursor.execute("SELECT COUNT(*) FROM usuarios WHERE usuario LIKE %s", (PREFIJO_USUARIO + '%',))
+    existentes = cursor.fetchone()[0]
+    contrasena = hash_password(CONTRASENA_USUARIOS)
+    rng = random.Random(existentes)
+
+    filas = []
+    for n in range(existentes + 1, existentes + cantidad + 1):
+        usuario = f"{PREFIJO_USUARIO}{n:05d}"
+        filas.append((_persona(rng).title(), usuario, f"{usuario}@juzgado.local", contrasena,
+                      roles.get(ROLES[n % 2]), False, True, date.today()))
+    _copiar(cursor, 'usuarios',
+            ['nombre', 'usuario', 'correo', 'contrasena', 'rol_id', 'administrador', 'activo', 'fecha_registro'],
+            filas)
+
+    cursor.execute("""
+        SELECT r.nombre_rol, u.id FROM usuarios u JOIN roles r ON r.id = u.rol_id
+        WHERE u.usuario LIKE %s ORDER BY u.id
+    """, (PREFIJO_USUARIO + '%',))
+    por_rol = {rol: [] for rol in ROLES}
+    for rol, usuario_id in cursor.fetchall():
+        por_rol[rol].append(usuario_id)
+    return por_rol
+
+
+def poblar_base(conn, expedientes, movimientos=5, usuarios=300, semilla=42, desde=None, lote=TAMANO_LOTE):
+    """
+    Inserta expedientes sintéticos con sus ingresos, estados y actuaciones.
+    Cada lote va en su transacción (commit por lote).
+
+    Args:
+        conn: conexión (se hace commit)
+        expedientes: cantidad a generar
+        movimientos: promedio de ingresos, estados y actuaciones por expediente
+        usuarios: usuarios sintéticos a crear (se asignan a parte de los expedientes)
+        semilla: semilla de los datos (no de los radicados, que dependen del índice)
+        desde: índice del primer expediente (por defecto, a continuación de los sintéticos existentes)
+
+    Returns:
+        dict: expedientes, ingresos, estados, actuaciones, usuarios, duracion_ms
+    """
+    inicio = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        if desde is None:
+            cursor.execute("SELECT COUNT(*) FROM expediente WHERE observaciones = %s", (MARCA,))
+            desde = cursor.fetchone()[0]
+
+        por_rol = crear_usuarios(cursor, usuarios) if usuarios else {rol: [] for rol in ROLES}
+        conn.commit()
+
+        columna_solicitud = primera_columna('expediente', ['tipo_solicitud', 'tipo_tramite'])
+        opcionales = [c for c in ('ubicacion', 'juzgado_origen') if tiene_columna('expediente', c)]
+        asignar = tiene_columna('expediente', 'usuario_asignado_id')
+        columnas = ['id', 'radicado_completo', 'radicado_corto', 'demandante', 'demandado', 'fecha_ingreso',
+                    'estado', 'responsable', 'observaciones'] + opcionales
+        if columna_solicitud:
+            columnas.append(columna_solicitud)
+        if asignar:
+            columnas.append('usuario_asignado_id')
+
+        cursor.execute("SELECT pg_get_serial_sequence('expediente', 'id')")
+        secuencia = cursor.fetchone()[0]
+
+        rng = random.Random(semilla)
+        totales = {'expedientes': 0, 'ingresos': 0, 'estados': 0, 'actuaciones': 0}
+        for base in range(desde, desde + expedientes, lote):
+            cantidad = min(lote, desde + expedientes - base)
+            cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s)", (secuencia, cantidad))
+            ids = [fila[0] for fila in cursor.fetchall()]
+
+            filas_expediente, ingresos, estados, actuaciones = [], [], [], []
+            for expediente_id, indice in zip(ids, range(base, base + cantidad)):
+                datos = generar_expediente(rng, indice)
+                datos.update(id=expediente_id, observaciones=MARCA)
+                if columna_solicitud:
+                    datos[columna_solicitud] = datos['tipo_solicitud']
+                if asignar:
+                    candidatos = por_rol.get(datos['responsable'])
+                    datos['usuario_asignado_id'] = rng.choice(candidatos) if candidatos and rng.random() < 0.7 else None
+                filas_expediente.append(tuple(datos[c] for c in columnas))
+
+                suyos = generar_movimientos(rng, datos, movimientos)
+                ingresos += [(expediente_id, fecha, solicitud, MARCA) for fecha, solicitud in suyos[0]]
+                estados += [(expediente_id, clase, fecha, auto, MARCA) for clase, fecha, auto in suyos[1]]
+                actuaciones += [(expediente_id, fecha, numero, descripcion, 'SINTETICO')
+                                for fecha, numero, descripcion in suyos[2]]
+
+            totales['expedientes'] += _copiar(cursor, 'expediente', columnas, filas_expediente)
+            totales['ingresos'] += _copiar(cursor, 'ingresos',
+                                           ['expediente_id', 'fecha_ingreso', 'solicitud', 'observaciones'], ingresos)
+            totales['estados'] += _copiar(cursor, 'estados',
+                                          ['expediente_id', 'clase', 'fecha_estado', 'auto_anotacion', 'observaciones'],
+                                          estados)
+            totales['actuaciones'] += _copiar(cursor, 'actuaciones',
+                                              ['expediente_id', 'fecha_actuacion', 'numero_actuacion',
+                                               'descripcion_actuacion', 'tipo_origen'], actuaciones)
+            conn.commit()
+            logger.info(f"🧪 Datos sintéticos: {totales['expedientes']}/{expedientes} expedientes")
+
+        if tiene_columna('expediente', 'turno'):
+            recalcular_turnos(cursor)
+            conn.commit()
+
+        # Estadísticas del planificador al día para medir con los nuevos volúmenes
+        for tabla in ('expediente', 'ingresos', 'estados', 'actuaciones', 'usuarios'):
+            cursor.execute(f"ANALYZE {tabla}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    totales['usuarios'] = sum(len(ids) for ids in por_rol.values())
+    totales['duracion_ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+    logger.info(f"🧪 Datos sintéticos generados: {totales}")
+    return totales
+
+
+def borrar_datos_sinteticos(cursor):
+    """Elimina los expedientes (y sus movimientos) y usuarios sintéticos. No hace commit."""
+    sinteticos = "SELECT id FROM expediente WHERE observaciones = %s"
+    borrados = {}
+    for tabla in ('actuaciones', 'estados', 'ingresos'):
+        cursor.execute(f"DELETE FROM {tabla} WHERE expediente_id IN ({sinteticos})", (MARCA,))
+        borrados[tabla] = cursor.rowcount
+    cursor.execute("DELETE FROM expediente WHERE observaciones = %s", (MARCA,))
+    borrados['expedientes'] = cursor.rowcount
+    cursor.execute("DELETE FROM usuarios WHERE usuario LIKE %s", (PREFIJO_USUARIO + '%',))
+    borrados['usuarios'] = cursor.rowcount
+    logger.info(f"🧹 Datos sintéticos eliminados: {borrados}")
+    return borrados
+
+
+# Encabezados de las pestañas que reconoce vista/vistasubirexpediente.py
+ENCABEZADOS_INGRESO = ['RADICADO COMPLETO', 'DEMANDANTE', 'DEMANDADO', 'FECHA INGRESO', 'SOLICITUD',
+                       'ESTADO', 'RESPONSABLE', 'UBICACION', 'OBSERVACIONES']
+ENCABEZADOS_ESTADOS = ['RADICADO COMPLETO', 'CLASE', 'FECHA ESTADO', 'AUTO / ANOTACION', 'OBSERVACIONES']
+ENCABEZADOS_TRIMESTRE = ['RadicadoUnicoLimpio', 'RadicadoUnicoCompleto', 'DEMANDANTE_HOMOLOGADO',
+                         'DEMANDADO_HOMOLOGADO', 'FECHA INGRESO', 'SOLICITUD', 'ESTADO_EXPEDIENTE',
+                         'RESPONSABLE', 'UBICACION', 'JuzgadoOrigen', 'OBSERVACIONES']
+FORMATOS_LIBRO = ('pestañas', 'trimestre')
+
+
+def escribir_libro(ruta, formato='pestañas', filas=10000, desde=0, movimientos=2, semilla=42, hoja_trimestre=None):
+    """
+    Escribe un libro .xlsx en streaming (openpyxl write_only).
+
+    - 'pestañas': 'Ingreso' (un expediente por fila) y 'Estados'
+      (`movimientos` en promedio por expediente)
+    - 'trimestre': una pestaña 'YYYY-Qn' con el formato de la carga de expedientes nuevos
+
+    Returns:
+        dict: {pestaña: filas escritas}
+    """
+    rng = random.Random(semilla)
+    libro = openpyxl.Workbook(write_only=True)
+    escritas = {}
+
+    if formato == 'trimestre':
+        nombre = hoja_trimestre or f"{date.today().year}-Q{(date.today().month - 1) // 3 + 1}"
+        hoja = libro.create_sheet(nombre)
+        hoja.append(ENCABEZADOS_TRIMESTRE)
+        for indice in range(desde, desde + filas):
+            e = generar_expediente(rng, indice)
+            hoja.append([e['radicado_completo'], e['radicado_corto'], e['demandante'], e['demandado'],
+                         e['fecha_ingreso'], e['tipo_solicitud'], e['estado'], e['responsable'],
+                         e['ubicacion'], e['juzgado_origen'], MARCA])
+        escritas[nombre] = filas
+    elif formato == 'pestañas':
+        ingreso = libro.create_sheet('Ingreso')
+        estados = libro.create_sheet('Estados')
+        ingreso.append(ENCABEZADOS_INGRESO)
+        estados.append(ENCABEZADOS_ESTADOS)
+        escritas = {'Ingreso': 0, 'Estados': 0}
+        for indice in range(desde, desde + filas):
+            e = generar_expediente(rng, indice)
+            ingreso.append([e['radicado_completo'], e['demandante'], e['demandado'], e['fecha_ingreso'],
+                            e['tipo_solicitud'], e['estado'], e['responsable'], e['ubicacion'], MARCA])
+            escritas['Ingreso'] += 1
+            for clase, fecha, auto in generar_movimientos(rng, e, movimientos)[1]:
+                estados.append([e['radicado_completo'], clase, fecha, auto, MARCA])
+                escritas['Estados'] += 1
+    else:
+        raise ValueError(f"Formato de libro desconocido: {formato} (use {', '.join(FORMATOS_LIBRO)})")
+
+    libro.save(ruta)
+    logger.info(f"🧪 Libro sintético {ruta}: {escritas}")
+    return escritas
@@ -0,0 +1,143 @@
+"""
+Registro del esquema de la base, por proceso
+
+Las vistas y las cargas se adaptan a columnas y tablas opcionales
+(tipo_solicitud o tipo_tramite, ubicacion o ubicacion_actual, tablas
+ingresos/estados, columnas que agregan las migraciones). En lugar de
+consultar information_schema en cada petición (y dentro de los bucles por
+fila de las cargas), el registro lee una sola vez todas las columnas del
+esquema y responde en memoria.
+
+- calentar_esquema(): carga con una conexión propia del pool. Se llama en
+  el hook post_fork de gunicorn (cada worker); si no, en el primer uso.
+- refrescar_esquema(): vuelve a leer el esquema; los comandos de migración
+  lo llaman después del commit. Los workers en marcha (otros procesos) lo
+  releen al vencer EDAD_MAXIMA o al reiniciarlos (kill -HUP al master).
+- Si la base no está disponible al releer, se sigue respondiendo con el
+  último registro leído y se reintenta pasados REINTENTO_SEGUNDOS. Sin
+  ningún registro se lanza EsquemaNoDisponibleError: un fallo de conexión
+  nunca se responde como "la tabla o columna no existe" (los módulos que
+  recuerdan esas respuestas por proceso quedarían en el camino lento).
+"""
+
+import logging
+import os
+import threading
+import time
+
+from modelo.configBd import conexion_bd
+
+logger = logging.getLogger(__name__)
+
+REINTENTO_SEGUNDOS = 30
+EDAD_MAXIMA = int(os.getenv('ESQUEMA_EDAD_MAXIMA', '600'))
+
+SQL_ESQUEMA = """
+    SELECT table_name, column_name, data_type, character_maximum_length
+    FROM information_schema.columns
+    WHERE table_schema = current_schema()
+"""
+
+# {tabla: {columna: (data_type, character_maximum_length)}}
+_tablas = None
+_cargado_en = None
+_ultimo_fallo = None
+_lock = threading.Lock()
+
+
+class EsquemaNoDisponibleError(Exception):
+    """Se lanza cuando no se pudo leer el esquema y no hay un registro anterior"""
+
+
+def cargar_esquema(cursor):
+    """Lee las columnas del esquema actual con `cursor` y reemplaza el registro"""
+    global _tablas, _cargado_en, _ultimo_fallo
+    cursor.execute(SQL_ESQUEMA)
+    tablas = {}
+    for tabla, columna, tipo, longitud in cursor.fetchall():
+        tablas.setdefault(tabla, {})[columna] = (tipo, longitud)
+    with _lock:
+        _tablas = tablas
+        _cargado_en = time.monotonic()
+        _ultimo_fallo = None
+    logger.info(f"🗂️ Esquema cargado: {len(tablas)} tablas")
+    return tablas
+
+
+def calentar_esquema():
+    """
+    Carga el registro con una conexión propia. Devuelve False si la base no
+    está disponible (se conserva el registro anterior, si lo había).
+    """
+    global _ultimo_fallo
+    try:
+        with conexion_bd() as conn:
+            cursor = conn.cursor()
+            cargar_esquema(cursor)
+            cursor.close()
+        return True
+    except Exception as e:
+        _ultimo_fallo = time.monotonic()
+        logger.warning(f"⚠️ No se pudo cargar el esquema (se reintenta en {REINTENTO_SEGUNDOS} s): {e}")
+        return False
+
+
+def refrescar_esquema(cursor=None):
+    """
+    Vuelve a leer el esquema, p. ej. después de una migración. Con `cursor`
+    se lee dentro de su transacción (ve los cambios aún sin confirmar).
+    Si la lectura falla se conserva el registro anterior, marcado como
+    vencido para releerlo en el próximo uso.
+    """
+    global _cargado_en, _ultimo_fallo
+    with _lock:
+        _cargado_en = None
+        _ultimo_fallo = None
+    if cursor is not None:
+        cargar_esquema(cursor)
+        return True
+    return calentar_esquema()
+
+
+def esquema_cargado():
+    return _tablas is not None
+
+
+def _registro():
+    ahora = time.monotonic()
+    vencido = _tablas is None or _cargado_en is None or ahora - _cargado_en >= EDAD_MAXIMA
+    # Sin registro anterior se intenta siempre: no hay con qué responder
+    if vencido and (_tablas is None or _ultimo_fallo is None or ahora - _ultimo_fallo >= REINTENTO_SEGUNDOS):
+        calentar_esquema()
+    tablas = _tablas
+    if tablas is None:
+        raise EsquemaNoDisponibleError("No se pudo leer el esquema de la base de datos")
+    return tablas
+
+
+def existe_tabla(tabla):
+    return tabla in _registro()
+
+
+def columnas_tabla(tabla):
+    """
+    Returns:
+        dict: {columna: (data_type, character_maximum_length)}; vacío si la tabla no existe
+    """
+    return dict(_registro().get(tabla, {}))
+
+
+def tiene_columna(tabla, columna):
+    return columna in _registro().get(tabla, {})
+
+
+def tipo_columna(tabla, columna):
+    """data_type de la columna, o None si no existe"""
+    definicion = _registro().get(tabla, {}).get(columna)
+    return definicion[0] if definicion else None
+
+
+def primera_columna(tabla, candidatas):
+    """La primera de `candidatas` que existe en la tabla, o None"""
+    existentes = _registro().get(tabla, {})
+    return next((columna for columna in candidatas if columna in existentes), None)
@@ -0,0 +1,64 @@
+"""
+Estadísticas materializadas por expediente (tabla expediente_stats)
+
+Una fila por expediente con conteos y últimas fechas de ingresos, estados y
+actuaciones, más la solicitud del ingreso más reciente. La mantienen
+triggers por sentencia sobre las tres tablas: cada INSERT/UPDATE/DELETE
+recalcula solo los expedientes tocados (tablas de transición), así una carga
+masiva recalcula cada expediente una vez y no una por fila.
+
+El recálculo toma antes advisory locks de transacción por cubeta de
+expedientes (id % CUBETAS_BLOQUEO, en orden, en una sentencia aparte): dos
+transacciones que tocan el mismo expediente (p. ej. una carga en segundo
+plano y una edición manual) se serializan, y la segunda cuenta con una
+instantánea nueva que ya incluye las filas confirmadas por la primera, en
+lugar de sobrescribir su resultado. Las cubetas acotan los locks de una carga
+masiva (uno por expediente agotaría la tabla de locks compartida).
+
+La tabla, la función de recálculo y los triggers los crea la migración
+0004_estadisticas_expediente.sql (`flask migrar`), que también hace el
+backfill inicial; backfill_estadisticas() lo repite
+(`flask backfill-estadisticas-expediente`). Mientras no existan, las vistas
+siguen usando las subconsultas agregadas anteriores.
+"""
+
+import logging
+import time
+
+from .esquema import existe_tabla
+
+logger = logging.getLogger(__name__)
+
+# Cubetas del advisory lock del recálculo (igual que en la migración 0004)
+CUBETAS_BLOQUEO = 64
+
+_estadisticas_disponibles = False
+
+
+def estadisticas_disponibles():
+    """True si ya existe expediente_stats (registro del esquema; se recuerda por proceso)"""
+    global _estadisticas_disponibles
+    if not _estadisticas_disponibles:
+        _estadisticas_disponibles = existe_tabla('expediente_stats')
+        if not _estadisticas_disponibles:
+            logger.warning("⚠️ expediente_stats no existe: ejecute `flask migrar`")
+    return _estadisticas_disponibles
+
+
+def backfill_estadisticas(cursor):
+    """
+    Recalcula expediente_stats para todos los expedientes en una sentencia. No hace commit.
+    Toma los CUBETAS_BLOQUEO locks (la app puede estar escribiendo a la vez).
+
+    Returns:
+        dict: total (expedientes) y duracion_ms
+    """
+    inicio = time.perf_counter()
+    cursor.execute("SELECT refrescar_expediente_stats(ARRAY(SELECT id FROM expediente))")
+    cursor.execute("SELECT COUNT(*) FROM expediente_stats")
+    resultado = {
+        'total': cursor.fetchone()[0],
+        'duracion_ms': round((time.perf_counter() - inicio) * 1000, 1),
+    }
+    logger.info(f"📊 expediente_stats: {resultado['total']} expedientes en {resultado['duracion_ms']} ms")
+    return resultado
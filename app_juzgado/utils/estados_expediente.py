@@ -0,0 +1,239 @@
+"""
+Cálculo masivo del estado de los expedientes
+
+Versión vectorizada de calcular_estado_expediente (vistaexpediente.py):
+una sola consulta agregada trae conteos y últimas fechas de ingresos,
+actuaciones y estados, y las reglas se aplican con pandas/NumPy sobre
+todas las filas a la vez.
+
+Reglas:
+- Solo ingresos/actuaciones → Activo Pendiente
+- Solo estados → Activo Resuelto (≤ 365 días) o Inactivo Resuelto (> 365 días)
+- Ambos → Activo Pendiente si la actividad es posterior al último estado,
+  si no, la regla de estados
+- Sin movimiento → Pendiente
+"""
+
+import logging
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from .turnos import recalcular_turnos
+
+logger = logging.getLogger(__name__)
+
+DIAS_INACTIVIDAD = 365
+
+SQL_AGREGADOS_ESTADO = """
+    SELECT
+        e.id,
+        e.estado,
+        COALESCE(i.total, 0), i.ultima,
+        COALESCE(a.total, 0), a.ultima,
+        COALESCE(s.total, 0), s.ultima
+    FROM expediente e
+    LEFT JOIN (
+        SELECT expediente_id, COUNT(*) AS total, MAX(fecha_ingreso) AS ultima
+        FROM ingresos {filtro_hijos}
+        GROUP BY expediente_id
+    ) i ON i.expediente_id = e.id
+    LEFT JOIN (
+        SELECT expediente_id, COUNT(*) AS total, MAX(fecha_actuacion) AS ultima
+        FROM actuaciones {filtro_hijos}
+        GROUP BY expediente_id
+    ) a ON a.expediente_id = e.id
+    LEFT JOIN (
+        SELECT expediente_id, COUNT(*) AS total, MAX(fecha_estado) AS ultima
+        FROM estados {filtro_hijos}
+        GROUP BY expediente_id
+    ) s ON s.expediente_id = e.id
+    {filtro_expediente}
+"""
+
+COLUMNAS = ['id', 'estado_actual', 'ingresos', 'ultima_fecha_ingreso',
+            'actuaciones', 'ultima_fecha_actuacion', 'estados', 'ultima_fecha_estado']
+
+
+def cargar_agregados(cursor, expediente_ids=None):
+    """
+    Trae en una sola consulta los conteos y últimas fechas por expediente.
+
+    Args:
+        cursor: Cursor de la base de datos
+        expediente_ids: IDs a evaluar; None = toda la tabla
+
+    Returns:
+        pandas.DataFrame con las columnas de COLUMNAS
+    """
+    if expediente_ids is None:
+        query = SQL_AGREGADOS_ESTADO.format(filtro_hijos='', filtro_expediente='')
+        cursor.execute(query)
+    else:
+        ids = list(dict.fromkeys(int(i) for i in expediente_ids))
+        query = SQL_AGREGADOS_ESTADO.format(
+            filtro_hijos='WHERE expediente_id = ANY(%(ids)s)',
+            filtro_expediente='WHERE e.id = ANY(%(ids)s)'
+        )
+        cursor.execute(query, {'ids': ids})
+
+    return pd.DataFrame(cursor.fetchall(), columns=COLUMNAS)
+
+
+def calcular_estados(df, hoy=None):
+    """
+    Aplica las reglas de estado a todas las filas del DataFrame a la vez.
+
+    Args:
+        df: DataFrame con las columnas de COLUMNAS
+        hoy: fecha de referencia (por defecto, hoy)
+
+    Returns:
+        DataFrame con columnas añadidas 'estado' y 'descripcion'
+    """
+    df = df.copy()
+    if df.empty:
+        df['estado'] = pd.Series(dtype=object)
+        df['descripcion'] = pd.Series(dtype=object)
+        return df
+
+    hoy = pd.Timestamp(hoy or date.today())
+
+    ni = df['ingresos'].fillna(0).astype(int)
+    na = df['actuaciones'].fillna(0).astype(int)
+    ns = df['estados'].fillna(0).astype(int)
+    fi = pd.to_datetime(df['ultima_fecha_ingreso'], errors='coerce')
+    fa = pd.to_datetime(df['ultima_fecha_actuacion'], errors='coerce')
+    fs = pd.to_datetime(df['ultima_fecha_estado'], errors='coerce')
+
+    actividad = pd.concat([fi, fa], axis=1).max(axis=1)
+    dias = (hoy - fs).dt.days
+
+    tiene_actividad = (ni > 0) | (na > 0)
+    tiene_estados = ns > 0
+    con_fecha_estado = fs.notna()
+    reciente = (dias <= DIAS_INACTIVIDAD).fillna(False)
+
+    solo_actividad = tiene_actividad & ~tiene_estados
+    solo_estados = tiene_estados & ~tiene_actividad
+    ambos = tiene_actividad & tiene_estados
+    ambos_con_fechas = ambos & actividad.notna() & con_fecha_estado
+    reingreso = ambos_con_fechas & (actividad > fs)
+
+    # Textos reutilizados en las descripciones
+    txt_ingresos = ni.astype(str) + " ingreso(s)"
+    txt_actuaciones = na.astype(str) + " actuación(es)"
+    desc_actividad = pd.Series(np.select(
+        [(ni > 0) & (na > 0), ni > 0, na > 0],
+        [txt_ingresos + ", " + txt_actuaciones, txt_ingresos, txt_actuaciones],
+        default=""
+    ), index=df.index)
+    txt_estados = ns.astype(str) + " estado(s)"
+    txt_dias = "Resuelto hace " + dias.fillna(0).astype(int).astype(str) + " días"
+
+    condiciones = [
+        solo_actividad,
+        solo_estados & con_fecha_estado & reciente,
+        solo_estados & con_fecha_estado,
+        solo_estados,
+        reingreso,
+        ambos_con_fechas & reciente,
+        ambos_con_fechas,
+        ambos,
+    ]
+    estados = [
+        "Activo Pendiente",
+        "Activo Resuelto",
+        "Inactivo Resuelto",
+        "Activo Resuelto",
+        "Activo Pendiente",
+        "Activo Resuelto",
+        "Inactivo Resuelto",
+        "Activo Pendiente",
+    ]
+    descripciones = [
+        "En trámite - " + desc_actividad,
+        txt_dias + " - " + txt_estados,
+        txt_dias + " (>1 año) - " + txt_estados,
+        "Resuelto - " + txt_estados,
+        "Reingresó después del último estado - " + desc_actividad + ", " + txt_estados,
+        txt_dias + " - " + desc_actividad + ", " + txt_estados,
+        txt_dias + " (>1 año) - " + desc_actividad + ", " + txt_estados,
+        "En trámite - " + desc_actividad + ", " + txt_estados,
+    ]
+
+    df['estado'] = np.select(condiciones, estados, default="Pendiente")
+    df['descripcion'] = np.select(condiciones, descripciones, default="Sin movimiento registrado")
+    return df
+
+
+def calcular_estados_expedientes(cursor, expediente_ids=None, hoy=None):
+    """
+    Calcula estado y descripción para un conjunto de expedientes (o todos).
+
+    Returns:
+        dict: {expediente_id: (estado, descripcion)}
+    """
+    df = calcular_estados(cargar_agregados(cursor, expediente_ids), hoy=hoy)
+    return {int(fila.id): (fila.estado, fila.descripcion) for fila in df.itertuples(index=False)}
+
+
+def rederivar_estados(cursor, expediente_ids=None, aplicar=True, hoy=None):
+    """
+    Recalcula expediente.estado y escribe solo las filas que cambian, con un
+    único UPDATE ... FROM unnest(). Si algún expediente entra o sale de
+    'Activo Pendiente' se recalculan los turnos. No hace commit.
+
+    Args:
+        cursor: Cursor de la base de datos
+        expediente_ids: IDs a evaluar; None = toda la tabla
+        aplicar: False para solo reportar los cambios (simulación)
+        hoy: fecha de referencia (por defecto, hoy)
+
+    Returns:
+        dict: total, cambiados, transiciones {(anterior, nuevo): n},
+              por_estado {estado: n}, turnos (resultado del recálculo o None), duracion_ms
+    """
+    inicio = time.perf_counter()
+
+    df = calcular_estados(cargar_agregados(cursor, expediente_ids), hoy=hoy)
+    cambios = df[df['estado'] != df['estado_actual'].fillna('')]
+
+    transiciones = (
+        cambios.groupby([cambios['estado_actual'].fillna('Sin estado'), 'estado']).size().to_dict()
+        if not cambios.empty else {}
+    )
+
+    resultado_turnos = None
+    if aplicar and not cambios.empty:
+        cursor.execute("""
+            UPDATE expediente e
+            SET estado = c.estado
+            FROM unnest(%s::int[], %s::text[]) AS c(id, estado)
+            WHERE e.id = c.id
+        """, (cambios['id'].astype(int).tolist(), cambios['estado'].tolist()))
+
+        afecta_cola = (
+            (cambios['estado'] == 'Activo Pendiente') |
+            (cambios['estado_actual'] == 'Activo Pendiente')
+        ).any()
+        if afecta_cola:
+            resultado_turnos = recalcular_turnos(cursor)
+
+    resultado = {
+        'total': int(len(df)),
+        'cambiados': int(len(cambios)),
+        'transiciones': {k: int(v) for k, v in transiciones.items()},
+        'por_estado': {k: int(v) for k, v in df['estado'].value_counts().items()},
+        'aplicado': bool(aplicar),
+        'turnos': resultado_turnos,
+        'duracion_ms': round((time.perf_counter() - inicio) * 1000, 1),
+    }
+
+    logger.info(
+        f"📊 Estados re-derivados: {resultado['cambiados']} de {resultado['total']} "
+        f"{'actualizados' if aplicar else 'cambiarían (simulación)'} en {resultado['duracion_ms']} ms"
+    )
+    return resultado
@@ -0,0 +1,378 @@
+"""
+Índices para la búsqueda flexible de radicados
+
+IndiceRadicados se construye una vez por carga con una sola consulta y
+responde en memoria las dos búsquedas de buscar_expedientes_flexible:
+
+- por últimos 13 dígitos: diccionario {ultimos_13: expediente_id}
+- por subcadena (radicados de 8 a 12 dígitos): arreglo ordenado (NumPy) con
+  una clave por posición de cada radicado, que codifica los 12 caracteres
+  siguientes en base 11. Todas las apariciones de una subcadena de hasta
+  12 dígitos forman un rango contiguo que se ubica con searchsorted.
+
+Memoria: solo se indexan las posiciones seguidas de al menos 8 dígitos
+(clave int64 + fila int32 = 12 bytes por posición; unos 30 por posición
+durante la construcción). Si los radicados suman más de
+MAX_POSICIONES_INDICE caracteres (unos 72 MB con el valor por defecto) el
+índice no se construye y las subcadenas se buscan en la base con el índice
+de trigramas. Con las columnas normalizadas tampoco se carga el
+diccionario de sufijos: esas búsquedas van por radicado_sufijo.
+
+Para lotes pequeños no vale la pena cargar la tabla: buscar_en_bd() hace
+las mismas dos búsquedas en SQL (LIKE '%x%'), sobre la misma columna que
+indexa IndiceRadicados.cargar y apoyada en su índice de trigramas
+(migraciones/0011_radicado_normalizado_trgm.sql, o 0002_indices_radicado.sql
+para radicado_completo).
+
+Columnas normalizadas (migraciones/0007_radicado_normalizado.sql):
+expediente.radicado_normalizado (solo dígitos) y expediente.radicado_sufijo
+(sus últimos 13 dígitos), mantenidas por trigger y con índice. Cuando
+existen, las búsquedas exactas y por sufijo (consulta, actualización,
+cargas de Excel y duplicados) las usan primero; si no, se usan las
+comparaciones anteriores sobre radicado_completo. El backfill se puede
+repetir con backfill_radicado_normalizado() (`flask backfill-radicado-normalizado`).
+"""
+
+import logging
+import os
+import re
+import time
+
+import numpy as np
+
+from .esquema import tiene_columna
+
+logger = logging.getLogger(__name__)
+
+LONGITUD_SUFIJO = 13
+LONGITUD_MINIMA_SUBCADENA = 8
+LONGITUD_VENTANA = 12  # subcadena más larga que se busca por índice
+BASE = 11              # 0 = separador / fin de radicado, 1..10 = dígitos 0..9
+
+# Con menos radicados pendientes que esto se consulta directamente la base
+UMBRAL_INDICE_MEMORIA = 200
+
+# Tope de caracteres de radicado para construir el índice en memoria
+MAX_POSICIONES_INDICE = int(os.getenv('INDICE_RADICADOS_MAX_POSICIONES', '6000000'))
+
+SQL_BACKFILL_RADICADO = """
+    UPDATE expediente
+    SET radicado_normalizado = radicado_solo_digitos(radicado_completo),
+        radicado_sufijo = CASE WHEN LENGTH(radicado_solo_digitos(radicado_completo)) >= 13
+                               THEN RIGHT(radicado_solo_digitos(radicado_completo), 13) END
+    WHERE radicado_normalizado IS DISTINCT FROM radicado_solo_digitos(radicado_completo)
+"""
+
+_normalizado_disponible = False
+
+
+def normalizar_radicado(radicado):
+    """Solo los dígitos del radicado (igual que radicado_solo_digitos en SQL); '' si no tiene"""
+    return re.sub(r'[^0-9]', '', str(radicado or ''))
+
+
+def radicado_normalizado_disponible():
+    """True si ya existen las columnas normalizadas (registro del esquema; se recuerda por proceso)"""
+    global _normalizado_disponible
+    if not _normalizado_disponible:
+        _normalizado_disponible = tiene_columna('expediente', 'radicado_sufijo')
+    return _normalizado_disponible
+
+
+def condicion_radicado(radicado, alias=''):
+    """
+    Condición indexada para un radicado escrito con o sin espacios o guiones:
+    igualdad con radicado_normalizado, o (de 13 dígitos en adelante) radicados
+    que terminan en esos dígitos, vía radicado_sufijo. Requiere las columnas
+    normalizadas (radicado_normalizado_disponible).
+
+    Returns:
+        tuple: (sql, params) o (None, []) si el valor tiene menos de 13 dígitos
+    """
+    digitos = normalizar_radicado(radicado)
+    if len(digitos) < LONGITUD_SUFIJO:
+        return None, []
+    return (
+        f"({alias}radicado_normalizado = %s OR ({alias}radicado_sufijo = %s "
+        f"AND {alias}radicado_normalizado LIKE %s))",
+        [digitos, digitos[-LONGITUD_SUFIJO:], f"%{digitos}"],
+    )
+
+
+def valor_radicado_exacto(radicado):
+    """Valor que compara filtro_radicado_exacto (y clave de buscar_exactos)"""
+    if radicado_normalizado_disponible():
+        return normalizar_radicado(radicado)
+    return radicado
+
+
+def filtro_radicado_exacto(radicado, alias=''):
+    """Igualdad de radicado completo: por la columna normalizada si existe"""
+    columna = 'radicado_normalizado' if radicado_normalizado_disponible() else 'radicado_completo'
+    return f"{alias}{columna} = %s", valor_radicado_exacto(radicado)
+
+
+def buscar_exactos(cursor, radicados):
+    """
+    Expedientes cuyo radicado coincide exactamente con alguno de `radicados`
+    (solo dígitos), en una consulta.
+
+    Returns:
+        dict: {radicado: expediente_id}
+    """
+    if radicado_normalizado_disponible():
+        cursor.execute("""
+            SELECT radicado_normalizado, MIN(id) FROM expediente
+            WHERE radicado_normalizado = ANY(%s)
+            GROUP BY 1
+        """, (list(radicados),))
+    else:
+        cursor.execute("""
+            SELECT radicado_completo, MIN(id) FROM expediente
+            WHERE radicado_completo = ANY(%s)
+            GROUP BY 1
+        """, (list(radicados),))
+    return dict(cursor.fetchall())
+
+
+def _codificar(texto):
+    """Símbolos en base 11: dígito d → d + 1, cualquier otro carácter → 0"""
+    return [ord(c) - 47 if '0' <= c <= '9' else 0 for c in texto]
+
+
+def _clave(simbolos):
+    """Clave entera de una ventana de LONGITUD_VENTANA símbolos"""
+    clave = 0
+    for s in simbolos:
+        clave = clave * BASE + s
+    return clave
+
+
+class IndiceRadicados:
+    """
+    Índice en memoria de los radicados de expediente.
+
+    Se crea vacío y se carga la primera vez que se necesita, para poder
+    compartirlo entre las pestañas de una misma carga. Si la tabla supera
+    MAX_POSICIONES_INDICE queda cargado pero no disponible: quien lo usa
+    debe buscar en la base (buscar_en_bd).
+    """
+
+    def __init__(self):
+        self.cargado = False
+        self.disponible = False
+        self.por_sufijo = {}
+        self._ids = None
+        self._claves = None
+        self._filas = None
+
+    def cargar(self, cursor):
+        """Carga todos los radicados con una sola consulta y construye los índices"""
+        inicio = time.perf_counter()
+        normalizado = radicado_normalizado_disponible()
+        columna = 'radicado_normalizado' if normalizado else 'radicado_completo'
+        cursor.execute(f"SELECT COALESCE(SUM(LENGTH({columna})), 0) FROM expediente WHERE {columna} IS NOT NULL")
+        caracteres = cursor.fetchone()[0]
+        if caracteres > MAX_POSICIONES_INDICE:
+            logger.warning(
+                f"⚠️ Índice de radicados omitido: {caracteres} caracteres superan "
+                f"MAX_POSICIONES_INDICE ({MAX_POSICIONES_INDICE}), se busca en la base"
+            )
+            self.cargado = True
+            self.disponible = False
+            return self
+
+        cursor.execute(f"""
+            SELECT id, {columna} FROM expediente
+            WHERE {columna} IS NOT NULL
+            ORDER BY id
+        """)
+        self.construir(cursor.fetchall(), con_sufijos=not normalizado)
+        logger.info(
+            f"🗂️ Índice de radicados construido: {len(self._ids)} radicados, "
+            f"{len(self._claves)} posiciones en {round((time.perf_counter() - inicio) * 1000, 1)} ms"
+        )
+        return self
+
+    def construir(self, filas, con_sufijos=True):
+        """
+        Args:
+            filas: iterable de (expediente_id, radicado_completo) en orden de prioridad
+            con_sufijos: construir también el diccionario de últimos 13 dígitos
+        """
+        self.por_sufijo = {}
+        ids = []
+        radicados = []
+
+        for exp_id, radicado in filas:
+            if not radicado:
+                continue
+            if con_sufijos and len(radicado) >= LONGITUD_SUFIJO:
+                # El primero (menor id) gana, como el recorrido original
+                self.por_sufijo.setdefault(radicado[-LONGITUD_SUFIJO:], exp_id)
+            ids.append(exp_id)
+            radicados.append(radicado)
+
+        # Todos los radicados en un solo arreglo de símbolos, separados por 0
+        unidos = ('\x00'.join(radicados) + '\x00' * (LONGITUD_VENTANA + 1)).encode('latin-1', 'replace')
+        bytes_ = np.frombuffer(unidos, dtype=np.uint8)
+        texto = np.where((bytes_ >= 48) & (bytes_ <= 57), bytes_ - 47, 0).astype(np.uint8)
+        del unidos, bytes_
+        n = len(texto) - LONGITUD_VENTANA
+
+        # Solo posiciones seguidas de LONGITUD_MINIMA_SUBCADENA dígitos: en
+        # las demás no empieza ninguna subcadena que se busque
+        validas = np.ones(n, dtype=bool)
+        for k in range(LONGITUD_MINIMA_SUBCADENA):
+            validas &= texto[k:k + n] != 0
+        posiciones = np.flatnonzero(validas).astype(np.int32)
+        del validas
+
+        # Clave de la ventana que empieza en cada posición (vectorizado, en el sitio).
+        # Una ventana que cruza el fin de un radicado contiene un 0 en esa
+        # posición, así que nunca coincide con una consulta (solo dígitos)
+        claves = np.zeros(len(posiciones), dtype=np.int64)
+        for k in range(LONGITUD_VENTANA):
+            claves *= BASE
+            claves += texto[posiciones + k]
+
+        longitudes = np.array([len(r) + 1 for r in radicados], dtype=np.int64)
+        inicios = np.concatenate(([0], np.cumsum(longitudes)[:-1])) if radicados else np.zeros(0, dtype=np.int64)
+        filas_pos = (np.searchsorted(inicios, posiciones, side='right') - 1).astype(np.int32)
+        del posiciones, texto
+
+        orden = np.argsort(claves, kind='stable')
+        self._claves = claves[orden]
+        del claves
+        self._filas = filas_pos[orden]
+        self._ids = ids
+        self.cargado = True
+        self.disponible = True
+        return self
+
+    def buscar_sufijo(self, radicado):
+        """ID del expediente cuyo radicado termina en los mismos 13 dígitos, o None"""
+        return self.por_sufijo.get(radicado[-LONGITUD_SUFIJO:])
+
+    def buscar_subcadenas(self, valores):
+        """
+        Busca en bloque radicados que CONTIENEN cada valor (8 a 12 dígitos).
+
+        Returns:
+            dict: {valor: (expediente_id o None, candidatos)} con candidatos
+                  acotado a 2 (igual que LIMIT 2): 1 = asociación segura
+        """
+        if not valores:
+            return {}
+
+        minimos = []
+        maximos = []
+        for valor in valores:
+            simbolos = _codificar(valor[:LONGITUD_VENTANA])
+            relleno = LONGITUD_VENTANA - len(simbolos)
+            minimos.append(_clave(simbolos + [0] * relleno))
+            maximos.append(_clave(simbolos + [BASE - 1] * relleno))
+
+        desde = np.searchsorted(self._claves, np.array(minimos, dtype=np.int64), side='left')
+        hasta = np.searchsorted(self._claves, np.array(maximos, dtype=np.int64), side='right')
+
+        resultado = {}
+        for valor, i, j in zip(valores, desde, hasta):
+            if i == j:
+                resultado[valor] = (None, 0)
+                continue
+            filas = self._filas[i:j]
+            primera = filas[0]
+            if (filas != primera).any():
+                resultado[valor] = (None, 2)
+            else:
+                resultado[valor] = (self._ids[primera], 1)
+        return resultado
+
+
+def buscar_sufijos_en_bd(cursor, con_13_o_mas):
+    """
+    Búsqueda por últimos 13 dígitos en una consulta (por radicado_sufijo si existe).
+
+    Returns:
+        dict: {radicado: expediente_id}
+    """
+    if not con_13_o_mas:
+        return {}
+    sufijos = {r[-LONGITUD_SUFIJO:] for r in con_13_o_mas}
+    if radicado_normalizado_disponible():
+        cursor.execute("""
+            SELECT radicado_sufijo, MIN(id)
+            FROM expediente
+            WHERE radicado_sufijo = ANY(%s)
+            GROUP BY 1
+        """, (list(sufijos),))
+    else:
+        cursor.execute("""
+            SELECT RIGHT(radicado_completo, 13) AS sufijo, MIN(id)
+            FROM expediente
+            WHERE LENGTH(radicado_completo) >= 13
+              AND RIGHT(radicado_completo, 13) = ANY(%s)
+            GROUP BY 1
+        """, (list(sufijos),))
+    encontrados = dict(cursor.fetchall())
+    return {r: encontrados[r[-LONGITUD_SUFIJO:]] for r in con_13_o_mas
+            if r[-LONGITUD_SUFIJO:] in encontrados}
+
+
+def buscar_en_bd(cursor, con_13_o_mas, entre_8_y_12):
+    """
+    Las mismas dos búsquedas que IndiceRadicados, resueltas en SQL con una
+    consulta cada una y sobre la misma columna (radicado_normalizado si
+    existe); usa los índices de trigramas si existen.
+
+    Returns:
+        tuple: ({radicado: expediente_id} por sufijo, {valor: (expediente_id o None, candidatos)})
+    """
+    por_sufijo = buscar_sufijos_en_bd(cursor, con_13_o_mas)
+
+    por_subcadena = {}
+    if entre_8_y_12:
+        columna = 'radicado_normalizado' if radicado_normalizado_disponible() else 'radicado_completo'
+        cursor.execute(f"""
+            SELECT v.valor, MIN(e.id), COUNT(e.id)
+            FROM unnest(%s::text[]) AS v(valor)
+            LEFT JOIN LATERAL (
+                SELECT id FROM expediente
+                WHERE {columna} LIKE '%%' || v.valor || '%%'
+                LIMIT 2
+            ) e ON true
+            GROUP BY v.valor
+        """, (list(entre_8_y_12),))
+        for valor, exp_id, candidatos in cursor.fetchall():
+            por_subcadena[valor] = (exp_id if candidatos == 1 else None, candidatos)
+
+    return por_sufijo, por_subcadena
+
+
+def backfill_radicado_normalizado(cursor):
+    """
+    Recalcula radicado_normalizado y radicado_sufijo donde no coinciden con
+    radicado_completo (p. ej. filas escritas con el trigger deshabilitado).
+    Las columnas las crea la migración 0007. No hace commit.
+
+    Returns:
+        dict: actualizados, repetidos (radicados normalizados en más de un
+              expediente) y duracion_ms
+    """
+    inicio = time.perf_counter()
+    cursor.execute(SQL_BACKFILL_RADICADO)
+    actualizados = cursor.rowcount
+    cursor.execute("""
+        SELECT COUNT(*) FROM (
+            SELECT radicado_normalizado FROM expediente WHERE radicado_normalizado IS NOT NULL
+            GROUP BY radicado_normalizado HAVING COUNT(*) > 1
+        ) repetidos
+    """)
+    resultado = {
+        'actualizados': actualizados,
+        'repetidos': cursor.fetchone()[0],
+        'duracion_ms': round((time.perf_counter() - inicio) * 1000, 1),
+    }
+    logger.info(f"🗂️ Radicado normalizado: {actualizados} expedientes actualizados en {resultado['duracion_ms']} ms")
+    return resultado
@@ -0,0 +1,210 @@
+"""
+Índice incremental de logs/security.log para las estadísticas de seguridad
+
+IndiceSeguridad recuerda hasta qué byte del log ya contó y en cada consulta
+lee solo las líneas nuevas (completas). Guarda en un archivo JSON:
+
+- el desplazamiento y el inodo del log,
+- los totales por tipo de evento (los mismos de get_security_stats()),
+- contadores por minuto (última hora) y por hora (último día), que se
+  descartan al salir de su ventana, así la memoria no crece con el log.
+
+Si el log se rotó (otro inodo) se termina de leer el archivo anterior
+(security.log.1) cuando todavía es el mismo, y se sigue desde el inicio
+del nuevo; si se truncó, se sigue desde el inicio. Los workers de gunicorn
+comparten el estado: la actualización se hace con un bloqueo de archivo
+y cada worker relee el estado solo si otro lo modificó.
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows (desarrollo): sin bloqueo entre procesos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Marca del evento en la línea -> contador (el primero que coincide)
+EVENTOS = [
+    ('LOGIN_SUCCESS', 'login_attempts'),
+    ('LOGIN_FAILED', 'failed_logins'),
+    ('LOGIN_BLOCKED', 'blocked_attempts'),
+    ('CSRF_ATTACK', 'csrf_attacks'),
+    ('XSS_ATTEMPT', 'xss_attempts'),
+    ('SQL_INJECTION_ATTEMPT', 'sql_injection_attempts'),
+    ('RATE_LIMIT_EXCEEDED', 'rate_limit_exceeded'),
+]
+CONTADORES = ['total_events'] + [contador for _, contador in EVENTOS]
+
+FORMATO_MINUTO = '%Y-%m-%d %H:%M'
+FORMATO_HORA = '%Y-%m-%d %H'
+LONGITUD_FECHA = 19  # '%Y-%m-%d %H:%M:%S' del formatter del logger de seguridad
+TAMANO_BLOQUE = 1024 * 1024
+
+
+def _contadores_vacios():
+    return dict.fromkeys(CONTADORES, 0)
+
+
+def clasificar(linea):
+    """Contadores a sumar por una línea del log"""
+    for marca, contador in EVENTOS:
+        if marca in linea:
+            return ('total_events', contador)
+    return ('total_events',)
+
+
+class IndiceSeguridad:
+    """Estadísticas de un log de seguridad, actualizadas leyendo solo lo nuevo"""
+
+    def __init__(self, ruta_log, ruta_estado=None):
+        self.ruta_log = ruta_log
+        self.ruta_estado = ruta_estado or os.path.splitext(ruta_log)[0] + '_stats.json'
+        self._lock = threading.Lock()
+        self._estado = self._estado_vacio()
+        self._version_estado = None
+
+    @staticmethod
+    def _estado_vacio():
+        return {'inodo': None, 'desplazamiento': 0, 'totales': _contadores_vacios(),
+                'por_minuto': {}, 'por_hora': {}}
+
+    # ------------------------------------------------------------------
+    # Estado persistido
+    # ------------------------------------------------------------------
+
+    def _version(self):
+        try:
+            return os.stat(self.ruta_estado).st_mtime_ns
+        except OSError:
+            return None
+
+    def _cargar(self):
+        version = self._version()
+        if version is None or version == self._version_estado:
+            return
+        try:
+            with open(self.ruta_estado, encoding='utf-8') as f:
+                estado = json.load(f)
+            estado['totales'] = {**_contadores_vacios(), **estado.get('totales', {})}
+            self._estado = {**self._estado_vacio(), **estado}
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Estado del índice de seguridad ilegible, se recalcula: {e}")
+            self._estado = self._estado_vacio()
+        self._version_estado = version
+
+    def _guardar(self):
+        temporal = f'{self.ruta_estado}.{os.getpid()}.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(self._estado, f)
+        os.replace(temporal, self.ruta_estado)
+        self._version_estado = self._version()
+
+    # ------------------------------------------------------------------
+    # Lectura incremental
+    # ------------------------------------------------------------------
+
+    def _contar(self, linea):
+        claves = clasificar(linea)
+        for clave in claves:
+            self._estado['totales'][clave] += 1
+        try:
+            momento = datetime.strptime(linea[:LONGITUD_FECHA], '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            return  # línea sin fecha (p. ej. continuación de un mensaje): solo cuenta en los totales
+        for cubetas, formato in ((self._estado['por_minuto'], FORMATO_MINUTO),
+                                 (self._estado['por_hora'], FORMATO_HORA)):
+            cubeta = cubetas.setdefault(momento.strftime(formato), {})
+            for clave in claves:
+                cubeta[clave] = cubeta.get(clave, 0) + 1
+
+    def _leer_desde(self, ruta, desplazamiento):
+        """Cuenta las líneas completas desde `desplazamiento`; devuelve el nuevo desplazamiento"""
+        with open(ruta, 'rb') as f:
+            f.seek(desplazamiento)
+            pendiente = b''
+            while True:
+                bloque = f.read(TAMANO_BLOQUE)
+                if not bloque:
+                    break
+                lineas = (pendiente + bloque).split(b'\n')
+                pendiente = lineas.pop()
+                for linea in lineas:
+                    self._contar(linea.decode('utf-8', 'replace'))
+                desplazamiento = f.tell() - len(pendiente)
+        return desplazamiento
+
+    def _podar(self, ahora):
+        limite_minuto = (ahora - timedelta(hours=1)).strftime(FORMATO_MINUTO)
+        limite_hora = (ahora - timedelta(days=1)).strftime(FORMATO_HORA)
+        for cubetas, limite in ((self._estado['por_minuto'], limite_minuto),
+                                (self._estado['por_hora'], limite_hora)):
+            for clave in [c for c in cubetas if c <= limite]:
+                del cubetas[clave]
+
+    def _actualizar(self, ahora):
+        """Lee lo nuevo del log. Devuelve False si el log no existe."""
+        try:
+            info = os.stat(self.ruta_log)
+        except FileNotFoundError:
+            return False
+        estado = self._estado
+        if estado['inodo'] == info.st_ino and estado['desplazamiento'] == info.st_size:
+            return True
+
+        if estado['inodo'] is not None and estado['inodo'] != info.st_ino:
+            # Rotado: terminar el archivo anterior si sigue siendo el mismo
+            rotado = self.ruta_log + '.1'
+            try:
+                if os.stat(rotado).st_ino == estado['inodo']:
+                    self._leer_desde(rotado, estado['desplazamiento'])
+            except FileNotFoundError:
+                pass
+            logger.info("🔄 Log de seguridad rotado, se indexa el nuevo desde el inicio")
+            estado['desplazamiento'] = 0
+        elif info.st_size < estado['desplazamiento']:
+            logger.info("🔄 Log de seguridad truncado, se indexa desde el inicio")
+            estado['desplazamiento'] = 0
+
+        estado['inodo'] = info.st_ino
+        estado['desplazamiento'] = self._leer_desde(self.ruta_log, estado['desplazamiento'])
+        self._podar(ahora)
+        self._guardar()
+        return True
+
+    def _sumar(self, cubetas, desde):
+        suma = _contadores_vacios()
+        for clave, cubeta in cubetas.items():
+            if clave > desde:
+                for contador, valor in cubeta.items():
+                    suma[contador] += valor
+        return suma
+
+    def estadisticas(self, ahora=None):
+        """
+        Totales del log y conteos de la última hora y del último día.
+
+        Returns:
+            dict: contadores de CONTADORES, más 'ultima_hora' y 'ultimo_dia'
+                  con los mismos contadores (o {'error': ...} sin log)
+        """
+        ahora = ahora or datetime.now()
+        with self._lock:
+            os.makedirs(os.path.dirname(self.ruta_estado) or '.', exist_ok=True)
+            with open(self.ruta_estado + '.lock', 'a') as bloqueo:
+                if fcntl:
+                    fcntl.flock(bloqueo, fcntl.LOCK_EX)
+                self._cargar()
+                if not self._actualizar(ahora):
+                    return {'error': 'Log file not found'}
+            stats = dict(self._estado['totales'])
+            stats['ultima_hora'] = self._sumar(self._estado['por_minuto'],
+                                               (ahora - timedelta(hours=1)).strftime(FORMATO_MINUTO))
+            stats['ultimo_dia'] = self._sumar(self._estado['por_hora'],
+                                              (ahora - timedelta(days=1)).strftime(FORMATO_HORA))
+        return stats
@@ -0,0 +1,194 @@
+"""
+Instrumentación de las consultas SQL por petición
+
+CursorInstrumentado es la clase de cursor de las conexiones (se instala con
+modelo/configBd.definir_fabrica_cursor al registrar la instrumentación) y
+mide cada sentencia. Con registrar_instrumentacion(app), en cada petición:
+
+- se cuentan las sentencias y el tiempo total de base de datos, y se
+  guardan las MAS_LENTAS más lentas
+- la respuesta lleva la cabecera Server-Timing (db y app, en ms)
+- si la petición supera PETICION_LENTA_MS se registra un warning con sus
+  consultas más lentas
+
+Además se agregan en memoria, por proceso, las huellas de las consultas
+(SQL normalizado: literales como ?, listas IN colapsadas): llamadas, tiempo
+total y máximo, hasta MAX_HUELLAS (se descarta la de menor tiempo total).
+Los administradores las consultan en /api/consultas-sql.
+
+Con SQL_INSTRUMENTACION=false las conexiones usan el cursor de psycopg2.
+"""
+
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+
+import psycopg2.extensions
+from flask import g, has_request_context, request
+
+from modelo.configBd import definir_fabrica_cursor
+
+logger = logging.getLogger(__name__)
+
+HABILITADA = os.getenv('SQL_INSTRUMENTACION', 'true').lower() not in ('0', 'false', 'no')
+PETICION_LENTA_MS = float(os.getenv('SQL_PETICION_LENTA_MS', '1000'))
+MAS_LENTAS = 5
+MAX_HUELLAS = 500
+LONGITUD_SQL_LOG = 300
+
+_PATRONES_HUELLA = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),                       # cadenas
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),                    # números
+    (re.compile(r'\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\)'), '(...)'),  # listas IN (?, ?, ...)
+    (re.compile(r'\s+'), ' '),
+]
+
+_huellas = {}
+_lock = threading.Lock()
+
+
+@lru_cache(maxsize=4096)
+def huella(sql):
+    """SQL normalizado: agrupa las consultas que solo difieren en sus valores"""
+    for patron, reemplazo in _PATRONES_HUELLA:
+        sql = patron.sub(reemplazo, sql)
+    return sql.strip()
+
+
+class ConsultasPeticion:
+    """Sentencias de una petición: cantidad, tiempo total y las más lentas"""
+
+    __slots__ = ('cantidad', 'duracion_ms', 'lentas', 'inicio')
+
+    def __init__(self):
+        self.cantidad = 0
+        self.duracion_ms = 0.0
+        self.lentas = []  # montículo de mínimos (ms, orden, sql)
+        self.inicio = time.perf_counter()
+
+    def agregar(self, sql, duracion_ms):
+        self.cantidad += 1
+        self.duracion_ms += duracion_ms
+        entrada = (duracion_ms, self.cantidad, sql)
+        if len(self.lentas) < MAS_LENTAS:
+            heapq.heappush(self.lentas, entrada)
+        elif duracion_ms > self.lentas[0][0]:
+            heapq.heapreplace(self.lentas, entrada)
+
+    def mas_lentas(self):
+        """[(ms, sql)] de la más lenta a la más rápida"""
+        return [(round(ms, 1), sql) for ms, _, sql in sorted(self.lentas, reverse=True)]
+
+
+def _agregar_huella(texto, duracion_ms):
+    clave = huella(texto)
+    with _lock:
+        estadistica = _huellas.get(clave)
+        if estadistica is None:
+            if len(_huellas) >= MAX_HUELLAS:
+                del _huellas[min(_huellas, key=lambda k: _huellas[k]['total_ms'])]
+            estadistica = _huellas[clave] = {'llamadas': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+        estadistica['llamadas'] += 1
+        estadistica['total_ms'] += duracion_ms
+        estadistica['max_ms'] = max(estadistica['max_ms'], duracion_ms)
+
+
+def registrar_consulta(texto, duracion_ms):
+    """Anota una sentencia en la petición actual (si la hay) y en las huellas"""
+    if has_request_context():
+        consultas = g.get('consultas_sql')
+        if consultas is not None:
+            consultas.agregar(texto, duracion_ms)
+    _agregar_huella(texto, duracion_ms)
+
+
+def _texto(cursor, query):
+    if isinstance(query, bytes):
+        return query.decode('utf-8', 'replace')
+    if isinstance(query, str):
+        return query
+    # psycopg2.sql.Composable
+    return query.as_string(cursor)
+
+
+class CursorInstrumentado(psycopg2.extensions.cursor):
+    """Cursor que mide cada sentencia (registrar_consulta)"""
+
+    def _medir(self, query, ejecutar):
+        inicio = time.perf_counter()
+        try:
+            return ejecutar()
+        finally:
+            registrar_consulta(_texto(self, query), (time.perf_counter() - inicio) * 1000)
+
+    def execute(self, query, vars=None):
+        return self._medir(query, lambda: super(CursorInstrumentado, self).execute(query, vars))
+
+    def executemany(self, query, vars_list):
+        return self._medir(query, lambda: super(CursorInstrumentado, self).executemany(query, vars_list))
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._medir(sql, lambda: super(CursorInstrumentado, self).copy_expert(sql, file, size))
+
+
+def estadisticas_consultas(limite=50, orden='total_ms'):
+    """
+    Huellas del proceso actual ordenadas de mayor a menor `orden`
+    ('total_ms', 'max_ms', 'llamadas' o 'promedio_ms').
+
+    Returns:
+        list: [{'huella', 'llamadas', 'total_ms', 'max_ms', 'promedio_ms'}]
+    """
+    with _lock:
+        copia = [(clave, dict(valores)) for clave, valores in _huellas.items()]
+    filas = [{
+        'huella': clave,
+        'llamadas': valores['llamadas'],
+        'total_ms': round(valores['total_ms'], 1),
+        'max_ms': round(valores['max_ms'], 1),
+        'promedio_ms': round(valores['total_ms'] / valores['llamadas'], 2),
+    } for clave, valores in copia]
+    filas.sort(key=lambda fila: fila.get(orden, fila['total_ms']), reverse=True)
+    return filas[:limite]
+
+
+def reiniciar_estadisticas():
+    with _lock:
+        _huellas.clear()
+
+
+def _iniciar_peticion():
+    g.consultas_sql = ConsultasPeticion()
+
+
+def _cerrar_peticion(response):
+    consultas = g.get('consultas_sql')
+    if consultas is None:
+        return response
+    total_ms = (time.perf_counter() - consultas.inicio) * 1000
+    response.headers.add(
+        'Server-Timing',
+        f'db;dur={consultas.duracion_ms:.1f};desc="{consultas.cantidad} consultas", app;dur={total_ms:.1f}'
+    )
+    if total_ms >= PETICION_LENTA_MS:
+        detalle = '\n'.join(f"   {ms} ms: {' '.join(sql.split())[:LONGITUD_SQL_LOG]}"
+                            for ms, sql in consultas.mas_lentas())
+        logger.warning(
+            f"🐢 Petición lenta {request.method} {request.path}: {total_ms:.0f} ms, "
+            f"{consultas.cantidad} consultas ({consultas.duracion_ms:.0f} ms en base de datos)\n{detalle}"
+        )
+    return response
+
+
+def registrar_instrumentacion(app):
+    """Instala el cursor instrumentado y los hooks por petición"""
+    if not HABILITADA:
+        logger.info("ℹ️ Instrumentación SQL deshabilitada (SQL_INSTRUMENTACION=false)")
+        return
+    definir_fabrica_cursor(CursorInstrumentado)
+    app.before_request(_iniciar_peticion)
+    app.after_request(_cerrar_peticion)
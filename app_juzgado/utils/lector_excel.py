@@ -0,0 +1,257 @@
+"""
+Lectura de archivos Excel en streaming (openpyxl en modo read_only)
+
+El libro se abre una sola vez por carga. Las hojas se recorren fila a fila
+con iter_rows y se entregan en lotes de DataFrames, de modo que la memoria
+no depende del tamaño del archivo:
+
+- hojas y encabezados se obtienen leyendo solo la primera fila
+- las fórmulas sin calcular se detectan en la misma pasada que los valores
+  (dos lectores read_only recorridos en paralelo: valores y fórmulas) y
+  llegan con cada lote en lote.attrs['formulas'], así el procesador las
+  usa en el mismo recorrido que procesa las filas
+- HojaExcel imita la parte de DataFrame que usan los procesadores
+  (columns, iterrows, len), así que el código existente no cambia
+
+Los valores se convierten igual que pd.read_excel: enteros sin decimales,
+celdas vacías / 'N/A' / errores de Excel como nulos y encabezados sin nombre
+como 'Unnamed: N'.
+"""
+
+import logging
+
+import openpyxl
+import pandas as pd
+from openpyxl.cell.cell import ERROR_CODES
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 500
+
+# Mismos textos que pandas interpreta como nulos por defecto
+VALORES_NULOS = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a',
+    'nan', 'null',
+])
+
+
+def _convertir_valor(valor):
+    """Normaliza un valor de celda como lo haría pd.read_excel"""
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    if isinstance(valor, str) and (valor in VALORES_NULOS or valor in ERROR_CODES):
+        return None
+    return valor
+
+
+def _fila_vacia(valores):
+    return all(v is None or (isinstance(v, str) and not v.strip()) for v in valores)
+
+
+def _nombres_columnas(encabezados):
+    """Nombres de columna al estilo pandas: 'Unnamed: N' y duplicados con sufijo .1, .2"""
+    nombres = []
+    vistos = {}
+    for i, valor in enumerate(encabezados):
+        nombre = f"Unnamed: {i}" if valor is None or str(valor).strip() == '' else str(valor)
+        if nombre in vistos:
+            vistos[nombre] += 1
+            nombre = f"{nombre}.{vistos[nombre]}"
+        vistos.setdefault(nombre, 0)
+        nombres.append(nombre)
+    return nombres
+
+
+class HojaExcel:
+    """
+    Hoja de un LibroExcel con la interfaz mínima de DataFrame que usan los
+    procesadores de carga. Cada recorrido vuelve a leer la hoja en streaming;
+    el índice de cada fila es su posición tras el encabezado (0 = primera
+    fila de datos), igual que las claves de formulas.
+    """
+
+    def __init__(self, libro, nombre):
+        self._libro = libro
+        self.nombre = nombre
+        self._fila_encabezado, encabezados = libro._leer_encabezado(nombre)
+        self.columns = pd.Index(_nombres_columnas(encabezados))
+        self._total = None
+        self._formulas = None
+
+    @property
+    def filas_estimadas(self):
+        """Número de filas según las dimensiones declaradas en el archivo (sin recorrerlo)"""
+        return self._libro._filas_declaradas(self.nombre, self._fila_encabezado)
+
+    @property
+    def formulas(self):
+        """dict {(fila_idx, columna): formula} de celdas con fórmula y valor cacheado sospechoso"""
+        if self._formulas is None:
+            for _ in self.iterar_lotes(detectar_formulas=True):
+                pass
+        return self._formulas
+
+    def iterar_lotes(self, tamano=None, detectar_formulas=False):
+        """
+        Recorre la hoja entregando DataFrames de a lo sumo `tamano` filas.
+        Las filas completamente vacías se omiten (como pd.read_excel). Con
+        detectar_formulas, lote.attrs['formulas'] tiene las de las filas del lote.
+        """
+        tamano = tamano or self._libro.tamano_lote
+        formulas = {} if detectar_formulas else None
+        total = 0
+
+        for lote in self._libro._lotes(self.nombre, self._fila_encabezado,
+                                       self.columns, tamano, formulas):
+            total += len(lote)
+            yield lote
+
+        # Solo se llega aquí si el recorrido fue completo
+        self._total = total
+        if formulas is not None:
+            self._formulas = formulas
+
+    def iterrows(self):
+        for lote in self.iterar_lotes():
+            yield from lote.iterrows()
+
+    def __len__(self):
+        if self._total is None:
+            for _ in self.iterar_lotes():
+                pass
+        return self._total
+
+
+class LibroExcel:
+    """
+    Libro .xlsx abierto una sola vez en modo read_only.
+
+    Args:
+        origen: ruta o BytesIO con el contenido del archivo
+        tamano_lote: filas por lote al recorrer las hojas
+    """
+
+    def __init__(self, origen, tamano_lote=TAMANO_LOTE):
+        self._origen = origen
+        self.tamano_lote = tamano_lote
+        self._rebobinar()
+        self._valores = openpyxl.load_workbook(origen, read_only=True, data_only=True, keep_links=False)
+        self._formulas = None
+        self._encabezados = {}
+        # Filas declaradas en el archivo, antes de descartar las dimensiones
+        self._max_filas = {ws.title: ws.max_row for ws in self._valores.worksheets}
+
+    def _rebobinar(self):
+        if hasattr(self._origen, 'seek'):
+            self._origen.seek(0)
+
+    @property
+    def sheet_names(self):
+        return list(self._valores.sheetnames)
+
+    def _hoja_valores(self, nombre):
+        ws = self._valores[nombre]
+        # Las dimensiones declaradas pueden estar mal; pandas hace lo mismo
+        ws.reset_dimensions()
+        return ws
+
+    def _hoja_formulas(self, nombre):
+        if self._formulas is None:
+            self._rebobinar()
+            self._formulas = openpyxl.load_workbook(self._origen, read_only=True,
+                                                    data_only=False, keep_links=False)
+        ws = self._formulas[nombre]
+        ws.reset_dimensions()
+        return ws
+
+    def _leer_encabezado(self, nombre):
+        """Primera fila no vacía de la hoja: (número de fila, valores)"""
+        if nombre not in self._encabezados:
+            if nombre not in self._valores.sheetnames:
+                raise KeyError(f"La hoja '{nombre}' no existe en el archivo")
+            fila_encabezado, encabezados = None, []
+            for numero, valores in enumerate(self._hoja_valores(nombre).iter_rows(values_only=True), 1):
+                if not _fila_vacia(valores):
+                    fila_encabezado = numero
+                    encabezados = list(valores)
+                    break
+            if fila_encabezado is None:
+                raise ValueError(f"La hoja '{nombre}' está vacía")
+            # Quitar columnas vacías al final del encabezado
+            while encabezados and encabezados[-1] is None:
+                encabezados.pop()
+            self._encabezados[nombre] = (fila_encabezado, encabezados)
+        return self._encabezados[nombre]
+
+    def encabezados(self, nombre):
+        """Nombres de columna de la hoja leyendo solo la fila de encabezado"""
+        return list(_nombres_columnas(self._leer_encabezado(nombre)[1]))
+
+    def hoja(self, nombre):
+        """Devuelve la hoja como HojaExcel (lanza KeyError/ValueError si no se puede usar)"""
+        return HojaExcel(self, nombre)
+
+    def _filas_declaradas(self, nombre, fila_encabezado):
+        max_row = self._max_filas.get(nombre)
+        return max(max_row - fila_encabezado, 0) if max_row else None
+
+    def _lotes(self, nombre, fila_encabezado, columnas, tamano, formulas):
+        ancho = len(columnas)
+        filas_valores = self._hoja_valores(nombre).iter_rows(min_row=fila_encabezado + 1, values_only=True)
+        if formulas is not None:
+            filas_formulas = self._hoja_formulas(nombre).iter_rows(min_row=fila_encabezado + 1, values_only=True)
+        else:
+            filas_formulas = iter(lambda: None, object())
+
+        def lote(indices, filas, formulas_lote):
+            df = pd.DataFrame(filas, columns=columnas, index=indices, dtype=object)
+            if formulas is not None:
+                df.attrs['formulas'] = formulas_lote
+            return df
+
+        indices, filas, formulas_lote = [], [], {}
+        for idx, (valores, textos) in enumerate(zip(filas_valores, filas_formulas)):
+            valores = list(valores[:ancho]) + [None] * (ancho - len(valores))
+
+            if textos is not None:
+                for col, texto in enumerate(textos[:ancho]):
+                    if isinstance(texto, str) and texto.startswith('='):
+                        cacheado = valores[col]
+                        if cacheado is None or str(cacheado).strip() == '' or cacheado == 0:
+                            formulas[(idx, columnas[col])] = texto
+                            formulas_lote[(idx, columnas[col])] = texto
+
+            if _fila_vacia(valores):
+                continue
+
+            indices.append(idx)
+            filas.append([_convertir_valor(v) for v in valores])
+            if len(filas) >= tamano:
+                yield lote(indices, filas, formulas_lote)
+                indices, filas, formulas_lote = [], [], {}
+
+        if filas:
+            yield lote(indices, filas, formulas_lote)
+
+    def close(self):
+        for wb in (self._valores, self._formulas):
+            if wb is not None:
+                try:
+                    wb.close()
+                except Exception as e:
+                    logger.debug(f"Error cerrando libro Excel: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def abrir_libro(origen, tamano_lote=TAMANO_LOTE):
+    """Devuelve origen si ya es un LibroExcel; si no, abre uno nuevo"""
+    if isinstance(origen, LibroExcel):
+        return origen
+    return LibroExcel(origen, tamano_lote=tamano_lote)
@@ -0,0 +1,185 @@
+"""
+Instantáneas (snapshots) de las métricas de los dashboards
+
+Las métricas de /home y /admin-dashboard se calculan una vez y se guardan
+en la tabla metricas_snapshot (JSON), compartida por todos los workers de
+gunicorn, y además en memoria del proceso. Cada lectura hace solo una
+consulta por clave primaria para comprobar la generación:
+
+- invalidar_metricas() incrementa `generacion` de todas las instantáneas;
+  se llama después del commit de cargas, cambios de estado y asignaciones.
+- Si la generación calculada coincide con la actual (y no superó
+  EDAD_MAXIMA), se sirve la copia en memoria o la de la tabla.
+- Si no, se recalcula y se guarda con la generación leída ANTES de
+  calcular, así una invalidación concurrente no se pierde.
+
+La tabla la crea migraciones/0009_metricas_snapshot.sql (`flask migrar`);
+mientras no exista, o si la base de datos falla, se calcula directamente
+(sin caché).
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+
+from modelo.configBd import conexion_bd
+from .esquema import existe_tabla
+
+logger = logging.getLogger(__name__)
+
+# Red de seguridad para escrituras que no invalidan (SQL manual, etc.)
+EDAD_MAXIMA = int(os.getenv('METRICAS_EDAD_MAXIMA', '900'))
+
+_snapshots_disponibles = False
+_locales = {}
+_lock = threading.Lock()
+
+
+def snapshots_disponibles():
+    """True si ya existe metricas_snapshot (registro del esquema; se recuerda por proceso)"""
+    global _snapshots_disponibles
+    if not _snapshots_disponibles:
+        _snapshots_disponibles = existe_tabla('metricas_snapshot')
+        if not _snapshots_disponibles:
+            logger.warning("⚠️ metricas_snapshot no existe: ejecute `flask migrar`")
+    return _snapshots_disponibles
+
+
+def _a_json(valor):
+    """Serializa fechas, decimales y objetos simples (atributos → dict)"""
+    if isinstance(valor, datetime):
+        return {'__datetime__': valor.isoformat()}
+    if isinstance(valor, date):
+        return {'__date__': valor.isoformat()}
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if hasattr(valor, '__dict__'):
+        return vars(valor)
+    raise TypeError(f"No serializable en la instantánea: {type(valor).__name__}")
+
+
+def _desde_json(objeto):
+    if '__datetime__' in objeto:
+        return datetime.fromisoformat(objeto['__datetime__'])
+    if '__date__' in objeto:
+        return date.fromisoformat(objeto['__date__'])
+    return objeto
+
+
+def serializar(datos):
+    return json.dumps(datos, default=_a_json)
+
+
+def deserializar(texto):
+    return json.loads(texto, object_hook=_desde_json)
+
+
+def _leer_estado(cursor, clave):
+    cursor.execute("""
+        SELECT generacion, generacion_calculada,
+               EXTRACT(EPOCH FROM (NOW() - fecha_calculo))
+        FROM metricas_snapshot WHERE clave = %s
+    """, (clave,))
+    return cursor.fetchone()
+
+
+def obtener_snapshot(clave, calcular, forzar=False):
+    """
+    Devuelve las métricas de `clave`, recalculándolas solo si fueron invalidadas.
+
+    Args:
+        clave: nombre de la instantánea ('home', 'admin_dashboard', ...)
+        calcular: función sin argumentos que devuelve las métricas (debe lanzar si falla)
+        forzar: recalcular aunque la instantánea esté vigente
+
+    Returns:
+        tuple: (datos, edad_segundos) — edad 0 si se acaban de calcular
+    """
+    try:
+        disponible = snapshots_disponibles()
+    except Exception as e:
+        logger.warning(f"⚠️ Instantánea '{clave}' no disponible, se calcula sin caché: {e}")
+        disponible = False
+    if not disponible:
+        return calcular(), 0
+
+    try:
+        with conexion_bd(commit=True) as conn:
+            cursor = conn.cursor()
+            estado = _leer_estado(cursor, clave)
+            if estado is None:
+                # La fila debe existir antes de calcular para que una invalidación no se pierda
+                cursor.execute("INSERT INTO metricas_snapshot (clave) VALUES (%s) ON CONFLICT DO NOTHING", (clave,))
+                estado = _leer_estado(cursor, clave)
+            generacion, generacion_calculada, edad = estado
+
+            vigente = (not forzar and generacion_calculada == generacion
+                       and edad is not None and edad < EDAD_MAXIMA)
+            if vigente:
+                local = _locales.get(clave)
+                if local and local[0] == generacion:
+                    return local[1], int(edad)
+                cursor.execute("SELECT datos::text FROM metricas_snapshot WHERE clave = %s", (clave,))
+                datos = deserializar(cursor.fetchone()[0])
+                with _lock:
+                    _locales[clave] = (generacion, datos)
+                return datos, int(edad)
+            cursor.close()
+    except Exception as e:
+        logger.warning(f"⚠️ Instantánea '{clave}' no disponible, se calcula sin caché: {e}")
+        return calcular(), 0
+
+    # Calcular fuera de la transacción de lectura
+    texto = serializar(calcular())
+    datos = deserializar(texto)
+    with _lock:
+        _locales[clave] = (generacion, datos)
+    _guardar(clave, texto, generacion)
+    logger.info(f"📸 Instantánea '{clave}' recalculada (generación {generacion})")
+    return datos, 0
+
+
+def _guardar(clave, texto, generacion):
+    """Guarda la instantánea sin esperar por escritores que tengan la fila bloqueada"""
+    try:
+        with conexion_bd(commit=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SET LOCAL lock_timeout = '500ms'")
+            cursor.execute("""
+                UPDATE metricas_snapshot
+                SET datos = %s::jsonb, generacion_calculada = %s, fecha_calculo = NOW()
+                WHERE clave = %s
+            """, (texto, generacion, clave))
+            cursor.close()
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo guardar la instantánea '{clave}': {e}")
+
+
+def invalidar_metricas():
+    """
+    Marca todas las instantáneas como desactualizadas (en todos los workers).
+    Llamar después del commit de la escritura; los errores solo se registran.
+    """
+    with _lock:
+        _locales.clear()
+    try:
+        if not snapshots_disponibles():
+            return
+        with conexion_bd(commit=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE metricas_snapshot SET generacion = generacion + 1")
+            cursor.close()
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudieron invalidar las métricas: {e}")
+
+
+def describir_edad(segundos):
+    """Texto corto para la página: 'hace 3 min'"""
+    if segundos < 60:
+        return 'hace unos segundos'
+    if segundos < 3600:
+        return f'hace {segundos // 60} min'
+    return f'hace {segundos // 3600} h'
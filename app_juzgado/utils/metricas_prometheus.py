@@ -0,0 +1,320 @@
+"""
+Métricas en formato de texto de Prometheus (/metrics), sumadas entre workers
+
+Cada proceso acumula en memoria contadores, histogramas y gauges, y los
+vuelca a su archivo DIRECTORIO/pid-<pid>.json (como mucho cada
+INTERVALO_VOLCADO segundos, al terminar una petición, y al salir). Al
+exponer, se leen los archivos de todos los workers y se suman; los de
+procesos que ya terminaron (max_requests recicla workers) se incorporan a
+acumulado.json y se eliminan, así los contadores no retroceden y el
+directorio no crece. Los gauges (memoria) solo se exponen de procesos vivos.
+
+El directorio se vacía al arrancar gunicorn (hook on_starting).
+
+Métricas:
+- juzgado_http_request_duration_seconds{endpoint, metodo}   histograma
+- juzgado_http_requests_total{endpoint, metodo, estado}      contador
+- juzgado_db_duration_seconds{endpoint}                      histograma (utils/instrumentacion_sql)
+- juzgado_db_queries_total{endpoint}                         contador
+- juzgado_carga_filas_total / juzgado_carga_segundos_total{hoja}   filas/s = rate(filas) / rate(segundos)
+- juzgado_turnos_recalculo_seconds                           histograma
+- juzgado_rate_limit_bloqueos_total{tipo}                    contador
+- juzgado_worker_rss_bytes{pid}                              gauge
+"""
+
+import atexit
+import json
+import logging
+import os
+import re
+import resource
+import tempfile
+import threading
+import time
+
+from flask import g, request
+
+try:
+    import fcntl
+except ImportError:  # Windows (desarrollo): sin bloqueo entre procesos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO = os.getenv('METRICAS_DIR', os.path.join(tempfile.gettempdir(), 'app_juzgado_metricas'))
+TOKEN = os.getenv('METRICAS_TOKEN')
+INTERVALO_VOLCADO = 5.0
+
+BUCKETS_PETICION = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BUCKETS_OPERACION = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# nombre: (tipo, ayuda, buckets)
+METRICAS = {
+    'juzgado_http_request_duration_seconds': ('histogram', 'Duración de las peticiones HTTP', BUCKETS_PETICION),
+    'juzgado_http_requests_total': ('counter', 'Peticiones HTTP atendidas', None),
+    'juzgado_db_duration_seconds': ('histogram', 'Tiempo de base de datos por petición', BUCKETS_PETICION),
+    'juzgado_db_queries_total': ('counter', 'Sentencias SQL ejecutadas por las peticiones', None),
+    'juzgado_carga_filas_total': ('counter', 'Filas de Excel procesadas por tipo de hoja', None),
+    'juzgado_carga_segundos_total': ('counter', 'Segundos dedicados a procesar filas de Excel por tipo de hoja', None),
+    'juzgado_turnos_recalculo_seconds': ('histogram', 'Duración del recálculo de turnos', BUCKETS_OPERACION),
+    'juzgado_rate_limit_bloqueos_total': ('counter', 'Bloqueos del rate limiter', None),
+    'juzgado_worker_rss_bytes': ('gauge', 'Memoria residente (RSS) de cada worker', None),
+}
+
+_lock = threading.Lock()
+_contadores = {}   # (nombre, etiquetas) -> valor
+_histogramas = {}  # (nombre, etiquetas) -> [conteos por bucket..., +Inf] , suma
+_sucio = False
+_ultimo_volcado = 0.0
+
+
+def _clave(nombre, etiquetas):
+    return nombre, tuple(sorted((etiquetas or {}).items()))
+
+
+def incrementar(nombre, etiquetas=None, valor=1):
+    global _sucio
+    clave = _clave(nombre, etiquetas)
+    with _lock:
+        _contadores[clave] = _contadores.get(clave, 0) + valor
+        _sucio = True
+
+
+def observar(nombre, valor, etiquetas=None):
+    """Agrega una observación (en segundos) a un histograma"""
+    global _sucio
+    buckets = METRICAS[nombre][2]
+    clave = _clave(nombre, etiquetas)
+    with _lock:
+        conteos, suma = _histogramas.get(clave) or ([0] * (len(buckets) + 1), 0.0)
+        indice = next((i for i, limite in enumerate(buckets) if valor <= limite), len(buckets))
+        conteos[indice] += 1
+        _histogramas[clave] = (conteos, suma + valor)
+        _sucio = True
+
+
+def tipo_hoja(nombre):
+    """Tipo de hoja de una carga para las métricas: ingreso, estados, trimestre o expedientes"""
+    nombre = (nombre or '').strip().lower()
+    if nombre in ('ingreso', 'ingresos'):
+        return 'ingreso'
+    if nombre in ('estado', 'estados'):
+        return 'estados'
+    if re.match(r'^\d{4}-q[1-4]$', nombre):
+        return 'trimestre'
+    return 'expedientes'
+
+
+def registrar_carga(hoja, filas, segundos):
+    """Throughput de carga: filas procesadas de una hoja y el tiempo que tomó"""
+    etiquetas = {'hoja': tipo_hoja(hoja)}
+    incrementar('juzgado_carga_filas_total', etiquetas, filas)
+    incrementar('juzgado_carga_segundos_total', etiquetas, round(segundos, 3))
+
+
+def rss_bytes():
+    """Memoria residente actual del proceso (pico si /proc no está disponible)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# ----------------------------------------------------------------------
+# Archivos por proceso
+# ----------------------------------------------------------------------
+
+def _serializar():
+    with _lock:
+        return {
+            'contadores': [[n, list(e), v] for (n, e), v in _contadores.items()],
+            'histogramas': [[n, list(e), c, s] for (n, e), (c, s) in _histogramas.items()],
+        }
+
+
+def _ruta(pid):
+    return os.path.join(DIRECTORIO, f'pid-{pid}.json')
+
+
+def _escribir(ruta, datos):
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(datos, f)
+    os.replace(temporal, ruta)
+
+
+def volcar(forzar=False):
+    """Escribe los valores del proceso en su archivo (como mucho cada INTERVALO_VOLCADO)"""
+    global _sucio, _ultimo_volcado
+    ahora = time.monotonic()
+    if not forzar and (not _sucio or ahora - _ultimo_volcado < INTERVALO_VOLCADO):
+        return
+    try:
+        os.makedirs(DIRECTORIO, exist_ok=True)
+        datos = _serializar()
+        datos['rss_bytes'] = rss_bytes()
+        _escribir(_ruta(os.getpid()), datos)
+        _sucio = False
+        _ultimo_volcado = ahora
+    except OSError as e:
+        logger.warning(f"⚠️ No se pudieron volcar las métricas: {e}")
+
+
+def reiniciar_directorio():
+    """Vacía el directorio de métricas (al arrancar el master de gunicorn)"""
+    os.makedirs(DIRECTORIO, exist_ok=True)
+    for archivo in os.listdir(DIRECTORIO):
+        if archivo.endswith('.json') or archivo.endswith('.tmp'):
+            os.remove(os.path.join(DIRECTORIO, archivo))
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # existe pero pertenece a otro usuario
+
+
+def _sumar(total, datos):
+    for nombre, etiquetas, valor in datos.get('contadores', []):
+        clave = (nombre, tuple(map(tuple, etiquetas)))
+        total['contadores'][clave] = total['contadores'].get(clave, 0) + valor
+    for nombre, etiquetas, conteos, suma in datos.get('histogramas', []):
+        clave = (nombre, tuple(map(tuple, etiquetas)))
+        previos, suma_previa = total['histogramas'].get(clave) or ([0] * len(conteos), 0.0)
+        total['histogramas'][clave] = ([a + b for a, b in zip(previos, conteos)], suma_previa + suma)
+
+
+def _a_archivo(total):
+    return {
+        'contadores': [[n, list(e), v] for (n, e), v in total['contadores'].items()],
+        'histogramas': [[n, list(e), c, s] for (n, e), (c, s) in total['histogramas'].items()],
+    }
+
+
+def recolectar():
+    """
+    Suma los archivos de todos los procesos. Los de procesos terminados se
+    incorporan a acumulado.json.
+
+    Returns:
+        dict: contadores, histogramas y rss {pid: bytes} de los procesos vivos
+    """
+    volcar(forzar=True)
+    total = {'contadores': {}, 'histogramas': {}, 'rss': {}}
+    os.makedirs(DIRECTORIO, exist_ok=True)
+    with open(os.path.join(DIRECTORIO, '.bloqueo'), 'a') as bloqueo:
+        if fcntl:
+            fcntl.flock(bloqueo, fcntl.LOCK_EX)
+        ruta_acumulado = os.path.join(DIRECTORIO, 'acumulado.json')
+        acumulado = {'contadores': {}, 'histogramas': {}}
+        if os.path.exists(ruta_acumulado):
+            with open(ruta_acumulado, encoding='utf-8') as f:
+                _sumar(acumulado, json.load(f))
+
+        terminados = []
+        for archivo in os.listdir(DIRECTORIO):
+            coincidencia = re.match(r'^pid-(\d+)\.json$', archivo)
+            if not coincidencia:
+                continue
+            pid = int(coincidencia.group(1))
+            try:
+                with open(os.path.join(DIRECTORIO, archivo), encoding='utf-8') as f:
+                    datos = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if _proceso_vivo(pid):
+                _sumar(total, datos)
+                total['rss'][pid] = datos.get('rss_bytes', 0)
+            else:
+                _sumar(acumulado, datos)
+                terminados.append(archivo)
+
+        if terminados:
+            _escribir(ruta_acumulado, _a_archivo(acumulado))
+            for archivo in terminados:
+                os.remove(os.path.join(DIRECTORIO, archivo))
+    _sumar(total, _a_archivo(acumulado))
+    return total
+
+
+# ----------------------------------------------------------------------
+# Exposición
+# ----------------------------------------------------------------------
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(pares):
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{k}="{_escapar(v)}"' for k, v in pares) + '}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def exponer():
+    """Texto en formato de exposición de Prometheus (versión 0.0.4)"""
+    total = recolectar()
+    lineas = []
+    for nombre, (tipo, ayuda, buckets) in METRICAS.items():
+        lineas.append(f'# HELP {nombre} {ayuda}')
+        lineas.append(f'# TYPE {nombre} {tipo}')
+        if tipo == 'counter':
+            for (n, etiquetas), valor in sorted(total['contadores'].items()):
+                if n == nombre:
+                    lineas.append(f'{nombre}{_etiquetas(etiquetas)} {_numero(valor)}')
+        elif tipo == 'histogram':
+            for (n, etiquetas), (conteos, suma) in sorted(total['histogramas'].items()):
+                if n != nombre:
+                    continue
+                acumulado = 0
+                for limite, conteo in zip(list(buckets) + ['+Inf'], conteos):
+                    acumulado += conteo
+                    lineas.append(f'{nombre}_bucket{_etiquetas(etiquetas + (("le", limite),))} {acumulado}')
+                lineas.append(f'{nombre}_sum{_etiquetas(etiquetas)} {_numero(suma)}')
+                lineas.append(f'{nombre}_count{_etiquetas(etiquetas)} {acumulado}')
+        elif nombre == 'juzgado_worker_rss_bytes':
+            for pid, valor in sorted(total['rss'].items()):
+                lineas.append(f'{nombre}{_etiquetas((("pid", pid),))} {valor}')
+    return '\n'.join(lineas) + '\n'
+
+
+# ----------------------------------------------------------------------
+# Peticiones
+# ----------------------------------------------------------------------
+
+def _iniciar_peticion():
+    g.inicio_metricas = time.perf_counter()
+
+
+def _cerrar_peticion(response):
+    inicio = g.get('inicio_metricas')
+    if inicio is None:
+        return response
+    # Sin endpoint (404) se agrupa: la ruta pedida no es una etiqueta acotada
+    endpoint = request.endpoint or 'sin_endpoint'
+    observar('juzgado_http_request_duration_seconds', time.perf_counter() - inicio,
+             {'endpoint': endpoint, 'metodo': request.method})
+    incrementar('juzgado_http_requests_total',
+                {'endpoint': endpoint, 'metodo': request.method, 'estado': str(response.status_code)})
+    consultas = g.get('consultas_sql')
+    if consultas is not None:
+        observar('juzgado_db_duration_seconds', consultas.duracion_ms / 1000, {'endpoint': endpoint})
+        incrementar('juzgado_db_queries_total', {'endpoint': endpoint}, consultas.cantidad)
+    volcar()
+    return response
+
+
+def registrar_metricas(app):
+    """Hooks por petición; /metrics lo sirve vista/vistasecurity.py"""
+    app.before_request(_iniciar_peticion)
+    app.after_request(_cerrar_peticion)
+    atexit.register(volcar, True)
@@ -0,0 +1,137 @@
+"""
+Migraciones versionadas en archivos SQL (app_juzgado/migraciones/)
+
+Cada archivo NNNN_descripcion.sql se aplica una sola vez, en orden de
+versión y en su propia transacción, y queda registrado en la tabla
+schema_migraciones (versión, nombre, checksum, fecha y duración).
+
+- aplicar_migraciones(conn): aplica las pendientes (`flask migrar`).
+- estado_migraciones(cursor): lista aplicadas y pendientes (`flask migrar --estado`).
+
+Un advisory lock impide que dos procesos apliquen a la vez. Si un archivo
+ya aplicado cambia de contenido no se vuelve a aplicar: se informa como
+modificado (los cambios van en un archivo nuevo).
+"""
+
+import hashlib
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO_MIGRACIONES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migraciones')
+PATRON_ARCHIVO = re.compile(r'^(\d{4})_([a-z0-9_]+)\.sql$')
+
+# Clave del advisory lock (constante arbitraria del proyecto)
+CLAVE_BLOQUEO = 7402019
+
+DDL_MIGRACIONES = """
+    CREATE TABLE IF NOT EXISTS schema_migraciones (
+        version TEXT PRIMARY KEY,
+        nombre TEXT NOT NULL,
+        checksum TEXT NOT NULL,
+        aplicada_en TIMESTAMP NOT NULL DEFAULT NOW(),
+        duracion_ms NUMERIC
+    )
+"""
+
+
+def listar_migraciones(directorio=DIRECTORIO_MIGRACIONES):
+    """
+    Returns:
+        list: [(version, nombre, sql)] ordenada por versión
+
+    Raises:
+        ValueError: si dos archivos comparten versión
+    """
+    migraciones = {}
+    for archivo in sorted(os.listdir(directorio)):
+        coincidencia = PATRON_ARCHIVO.match(archivo)
+        if not coincidencia:
+            continue
+        version, nombre = coincidencia.groups()
+        if version in migraciones:
+            raise ValueError(f"Versión de migración repetida: {version} ({migraciones[version][0]} y {nombre})")
+        with open(os.path.join(directorio, archivo), encoding='utf-8') as f:
+            migraciones[version] = (nombre, f.read())
+    return [(version, nombre, sql) for version, (nombre, sql) in sorted(migraciones.items())]
+
+
+def calcular_checksum(sql):
+    return hashlib.sha256(sql.encode('utf-8')).hexdigest()
+
+
+def _aplicadas(cursor):
+    """{version: (checksum, aplicada_en)}"""
+    cursor.execute(DDL_MIGRACIONES)
+    cursor.execute("SELECT version, checksum, aplicada_en FROM schema_migraciones")
+    return {version: (checksum, aplicada_en) for version, checksum, aplicada_en in cursor.fetchall()}
+
+
+def estado_migraciones(cursor, directorio=DIRECTORIO_MIGRACIONES):
+    """
+    Returns:
+        list: [{'version', 'nombre', 'aplicada_en' (None si pendiente), 'modificada'}]
+    """
+    aplicadas = _aplicadas(cursor)
+    estado = []
+    for version, nombre, sql in listar_migraciones(directorio):
+        checksum, aplicada_en = aplicadas.get(version, (None, None))
+        estado.append({
+            'version': version,
+            'nombre': nombre,
+            'aplicada_en': aplicada_en,
+            'modificada': checksum is not None and checksum != calcular_checksum(sql),
+        })
+    return estado
+
+
+def aplicar_migraciones(conn, directorio=DIRECTORIO_MIGRACIONES):
+    """
+    Aplica las migraciones pendientes, cada una en su transacción (commit por
+    archivo). Si una falla, se revierte esa migración y se detiene.
+
+    Returns:
+        list: [{'version', 'nombre', 'duracion_ms'}] de las aplicadas
+
+    Raises:
+        RuntimeError: con la versión que falló (la causa queda encadenada)
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (CLAVE_BLOQUEO,))
+        aplicadas = _aplicadas(cursor)
+        conn.commit()
+
+        resultado = []
+        for version, nombre, sql in listar_migraciones(directorio):
+            if version in aplicadas:
+                if aplicadas[version][0] != calcular_checksum(sql):
+                    logger.warning(f"⚠️ Migración {version}_{nombre} modificada después de aplicarse")
+                continue
+
+            inicio = time.perf_counter()
+            try:
+                cursor.execute(sql)
+                duracion_ms = round((time.perf_counter() - inicio) * 1000, 1)
+                cursor.execute("""
+                    INSERT INTO schema_migraciones (version, nombre, checksum, duracion_ms)
+                    VALUES (%s, %s, %s, %s)
+                """, (version, nombre, calcular_checksum(sql), duracion_ms))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                raise RuntimeError(f"Falló la migración {version}_{nombre}: {e}") from e
+
+            logger.info(f"🗂️ Migración {version}_{nombre} aplicada en {duracion_ms} ms")
+            resultado.append({'version': version, 'nombre': nombre, 'duracion_ms': duracion_ms})
+        return resultado
+    finally:
+        try:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (CLAVE_BLOQUEO,))
+            conn.commit()
+        except Exception:
+            pass
+        cursor.close()
@@ -0,0 +1,128 @@
+"""
+Paginación por cursor (keyset) para los listados de expedientes
+
+En lugar de LIMIT/OFFSET sobre un orden calculado, cada página continúa
+desde la última fila de la anterior con una comparación de fila
+`(clave, id) < (valor, id_cursor)`. Las claves son expresiones inmutables
+con índice (migraciones/0005_indices_paginacion.sql; los del turno, la
+0006_turno_entero.sql), así la página N cuesta lo mismo que la 1.
+
+Claves de orden:
+- 'fecha': fecha de ingreso; sin fecha cuenta como la más reciente
+  (igual que el COALESCE(fecha_ingreso, CURRENT_DATE) anterior)
+- 'turno': turno numérico de la cola 'Activo Pendiente'; sin turno al final
+  en ambos sentidos (el valor de reemplazo depende del orden: TURNO_MAXIMO
+  ascendente, -1 descendente, cada uno con su índice)
+
+El cursor es un token opaco (base64 de [valor, id]) que se pasa en
+`despues` (página siguiente) o `antes` (página anterior).
+"""
+
+import base64
+import json
+import logging
+
+from .turnos import TURNO_MAXIMO, turno_entero
+
+logger = logging.getLogger(__name__)
+
+POR_PAGINA = 10
+MAXIMO_POR_PAGINA = 100
+
+# Sin turno va al final en los dos sentidos: por debajo de todos al ordenar descendente
+TURNO_SIN_TURNO_DESC = -1
+
+# Las claves se arman en cada consulta según el sentido del listado:
+# turno_entero() depende del tipo de la columna. Sin el alias, las expresiones
+# deben coincidir con las de los índices de las migraciones 0005 y 0006
+CLAVES_ORDEN = {
+    'fecha': (lambda descendente: "COALESCE(e.fecha_ingreso, DATE '9999-12-31')", 'date'),
+    'turno': (lambda descendente: f"COALESCE({turno_entero('e.turno')}, "
+                                  f"{TURNO_SIN_TURNO_DESC if descendente else TURNO_MAXIMO})", 'integer'),
+}
+
+
+def codificar_cursor(valor, expediente_id):
+    """Token opaco para continuar después (o antes) de una fila"""
+    texto = json.dumps([None if valor is None else str(valor), int(expediente_id)])
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(token):
+    """
+    Returns:
+        tuple: (valor, expediente_id)
+
+    Raises:
+        ValueError: si el token no es válido
+    """
+    try:
+        relleno = '=' * (-len(token) % 4)
+        valor, expediente_id = json.loads(base64.urlsafe_b64decode(token + relleno))
+        return valor, int(expediente_id)
+    except Exception:
+        raise ValueError("Cursor de paginación inválido")
+
+
+def clausulas_keyset(clave, descendente=True, despues=None, antes=None):
+    """
+    Condición, parámetros y ORDER BY de una página.
+
+    Para ir hacia atrás (`antes`) se invierte el orden; recortar_pagina()
+    devuelve luego las filas en el orden normal.
+
+    Returns:
+        tuple: (condicion | None, params, order_by, columna_clave, hacia_atras)
+    """
+    expresion, tipo = CLAVES_ORDEN[clave]
+    # La clave depende del sentido del listado, no del de la lectura (`antes` lo invierte)
+    expresion = expresion(descendente)
+    hacia_atras = bool(antes)
+    desc = descendente != hacia_atras
+
+    condicion, params = None, []
+    token = antes if hacia_atras else despues
+    if token:
+        valor, expediente_id = decodificar_cursor(token)
+        condicion = f"({expresion}, e.id) {'<' if desc else '>'} (%s::{tipo}, %s)"
+        params = [valor, expediente_id]
+
+    direccion = 'DESC' if desc else 'ASC'
+    order_by = f"ORDER BY {expresion} {direccion}, e.id {direccion}"
+    return condicion, params, order_by, f"{expresion} AS clave_orden", hacia_atras
+
+
+def recortar_pagina(filas, por_pagina, hacia_atras=False, con_cursor=False):
+    """
+    Recorta las filas leídas con LIMIT por_pagina + 1 y calcula los cursores.
+    Cada fila debe tener el id en la posición 0 y la clave de orden al final.
+
+    Returns:
+        tuple: (filas de la página, cursor siguiente | None, cursor anterior | None)
+    """
+    hay_mas = len(filas) > por_pagina
+    filas = list(filas[:por_pagina])
+    if hacia_atras:
+        filas.reverse()
+    if not filas:
+        return [], None, None
+
+    if hacia_atras:
+        siguiente = True
+        anterior = hay_mas
+    else:
+        siguiente = hay_mas
+        anterior = con_cursor
+    return (
+        filas,
+        codificar_cursor(filas[-1][-1], filas[-1][0]) if siguiente else None,
+        codificar_cursor(filas[0][-1], filas[0][0]) if anterior else None,
+    )
+
+
+def normalizar_por_pagina(valor, defecto=POR_PAGINA):
+    """Tamaño de página válido a partir de un parámetro de la petición"""
+    try:
+        return max(1, min(int(valor), MAXIMO_POR_PAGINA))
+    except (TypeError, ValueError):
+        return defecto
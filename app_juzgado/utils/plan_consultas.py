@@ -0,0 +1,123 @@
+"""
+Comprobación con EXPLAIN de que las consultas frecuentes usan sus índices
+
+CONSULTAS_FRECUENTES reproduce la forma (WHERE / ORDER BY) de las
+consultas de las vistas, con valores de ejemplo, y el índice de
+migraciones/ que cada una debe poder usar.
+
+verificar_planes() ejecuta EXPLAIN (sin ANALYZE: no corre la consulta)
+con enable_seqscan desactivado dentro de la transacción: en una base
+pequeña el planificador prefiere leer la tabla completa aunque el índice
+exista, y lo que se comprueba es que el índice sirve para la consulta.
+`flask verificar-indices` termina con error si alguna no lo usa.
+"""
+
+import json
+import logging
+
+from .busqueda_nombres import DOCUMENTO_NOMBRES
+from .paginacion import TURNO_SIN_TURNO_DESC
+from .turnos import TURNO_MAXIMO
+
+logger = logging.getLogger(__name__)
+
+# (nombre, sql, parámetros, índice esperado)
+CONSULTAS_FRECUENTES = [
+    ("expedientes_por_estado",  # utils/asignacion_masiva.seleccionar_expedientes, listados por estado
+     "SELECT id FROM expediente WHERE estado = %s ORDER BY fecha_ingreso ASC, id ASC LIMIT 50",
+     ('Activo Pendiente',), "idx_expediente_estado_fecha_ingreso"),
+    ("carga_por_usuario",  # utils/asignacion_masiva.cargas_actuales
+     "SELECT usuario_asignado_id, COUNT(*) FROM expediente "
+     "WHERE usuario_asignado_id = ANY(%s) AND estado = %s GROUP BY usuario_asignado_id",
+     ([1, 2], 'Activo Pendiente'), "idx_expediente_usuario_estado"),
+    ("expedientes_de_usuario",  # vista/vistaasignacion (asignados a un usuario)
+     "SELECT id FROM expediente WHERE usuario_asignado_id = %s",
+     (1,), "idx_expediente_usuario_estado"),
+    ("expedientes_por_responsable",  # vista/vistaactualizarexpediente (criterio por rol)
+     "SELECT id FROM expediente WHERE responsable = %s",
+     ('ESCRIBIENTE',), "idx_expediente_responsable"),
+    ("ingresos_de_expediente",  # vista/vistaactualizarexpediente, vista/vistaexpediente
+     "SELECT id, fecha_ingreso FROM ingresos WHERE expediente_id = %s ORDER BY fecha_ingreso DESC",
+     (1,), "idx_ingresos_expediente_fecha"),
+    ("estados_de_expediente",
+     "SELECT id, fecha_estado FROM estados WHERE expediente_id = %s ORDER BY fecha_estado DESC",
+     (1,), "idx_estados_expediente_fecha"),
+    ("actuaciones_de_expediente",
+     "SELECT id, fecha_actuacion FROM actuaciones WHERE expediente_id = %s ORDER BY fecha_actuacion DESC",
+     (1,), "idx_actuaciones_expediente_fecha"),
+    ("reportes_recientes",  # vista/vistasubirexpediente (historial de reportes)
+     "SELECT id FROM reportes_actualizacion ORDER BY fecha_generacion DESC LIMIT 50",
+     (), "idx_reportes_actualizacion_fecha"),
+    ("radicado_subcadena",  # utils/indice_radicados.buscar_en_bd (LIKE '%x%')
+     "SELECT id FROM expediente WHERE radicado_normalizado LIKE %s LIMIT 2",
+     ('%201900123%',), "idx_expediente_radicado_normalizado_trgm"),
+    ("radicado_completo_subcadena",  # vista/vistaexpediente, vista/vistaactualizarexpediente
+     "SELECT id FROM expediente WHERE radicado_completo LIKE %s LIMIT 2",
+     ('%2019-00123%',), "idx_expediente_radicado_completo_trgm"),
+    ("radicado_exacto",  # utils/indice_radicados.buscar_exactos, filtro_radicado_exacto
+     "SELECT radicado_normalizado, MIN(id) FROM expediente WHERE radicado_normalizado = ANY(%s) GROUP BY 1",
+     (['11001310300120210000100'],), "idx_expediente_radicado_normalizado"),
+    ("radicado_sufijo",  # utils/indice_radicados.buscar_sufijos_en_bd, condicion_radicado
+     "SELECT radicado_sufijo, MIN(id) FROM expediente WHERE radicado_sufijo = ANY(%s) GROUP BY 1",
+     (['0120210000100'],), "idx_expediente_radicado_sufijo"),
+    ("busqueda_nombres",  # utils/busqueda_nombres.buscar_expedientes_por_nombre
+     f"SELECT id FROM expediente WHERE {DOCUMENTO_NOMBRES} @@ to_tsquery('simple', f_unaccent(%s))",
+     ('garcia:*',), "idx_expediente_nombres_fts"),
+    ("pagina_por_estado_y_fecha",  # utils/paginacion (clave 'fecha' con filtro de estado)
+     "SELECT e.id FROM expediente e WHERE e.estado = %s "
+     "ORDER BY COALESCE(e.fecha_ingreso, DATE '9999-12-31') DESC, e.id DESC LIMIT 11",
+     ('Activo Pendiente',), "idx_expediente_estado_fecha_id"),
+    ("pagina_por_fecha",  # utils/paginacion (clave 'fecha' sin filtro)
+     "SELECT e.id FROM expediente e "
+     "ORDER BY COALESCE(e.fecha_ingreso, DATE '9999-12-31') DESC, e.id DESC LIMIT 11",
+     (), "idx_expediente_fecha_id"),
+    ("cola_de_turnos",  # utils/turnos, tablero de la cola
+     "SELECT id FROM expediente WHERE estado = 'Activo Pendiente' ORDER BY turno, id LIMIT 50",
+     (), "idx_expediente_cola_turno"),
+    ("pagina_por_turno",  # utils/paginacion (clave 'turno' ascendente)
+     f"SELECT e.id FROM expediente e WHERE e.estado = 'Activo Pendiente' "
+     f"ORDER BY COALESCE(e.turno, {TURNO_MAXIMO}) ASC, e.id ASC LIMIT 11",
+     (), "idx_expediente_turno_id"),
+    ("pagina_por_turno_desc",  # utils/paginacion (clave 'turno' descendente)
+     f"SELECT e.id FROM expediente e WHERE e.estado = 'Activo Pendiente' "
+     f"ORDER BY COALESCE(e.turno, {TURNO_SIN_TURNO_DESC}) DESC, e.id DESC LIMIT 11",
+     (), "idx_expediente_turno_desc_id"),
+]
+
+
+def indices_del_plan(plan):
+    """Nombres de los índices que aparecen en un plan de EXPLAIN (FORMAT JSON)"""
+    indices = set()
+    pendientes = [plan]
+    while pendientes:
+        nodo = pendientes.pop()
+        if 'Index Name' in nodo:
+            indices.add(nodo['Index Name'])
+        pendientes.extend(nodo.get('Plans', []))
+    return indices
+
+
+def verificar_planes(cursor, consultas=CONSULTAS_FRECUENTES):
+    """
+    EXPLAIN de cada consulta. No hace commit (el llamador revierte).
+
+    Returns:
+        list: [{'nombre', 'indice', 'usa_indice', 'indices' (los del plan)}]
+    """
+    cursor.execute("SET LOCAL enable_seqscan = off")
+    resultados = []
+    for nombre, sql, parametros, indice in consultas:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", parametros)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        usados = indices_del_plan(plan[0]['Plan'])
+        resultados.append({
+            'nombre': nombre,
+            'indice': indice,
+            'usa_indice': indice in usados,
+            'indices': sorted(usados),
+        })
+        if indice not in usados:
+            logger.warning(f"⚠️ {nombre} no usa {indice} (plan: {sorted(usados) or 'sin índices'})")
+    return resultados
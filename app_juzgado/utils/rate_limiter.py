@@ -1,109 +1,340 @@
 """
 Rate Limiter para prevenir ataques de fuerza bruta
+
+Los intentos se cuentan con ventanas deslizantes aproximadas (dos contadores
+por clave: ventana actual y anterior, ponderada por el tiempo transcurrido),
+así cada consulta o registro es O(1) sin guardar un timestamp por intento.
+
+El estado vive en un almacén intercambiable (RATE_LIMIT_ALMACEN):
+- 'postgres': tablas UNLOGGED compartidas por todos los workers de gunicorn
+  (por defecto en producción; las crea migraciones/0010_rate_limit.sql).
+  Si la base de datos falla o faltan las tablas, el worker sigue con un
+  almacén en memoria hasta que vuelva.
+- 'memoria': por proceso (por defecto en desarrollo y pruebas).
+
+En ambos, cada INTERVALO_PURGA segundos se eliminan las claves inactivas y
+los bloqueos vencidos, y nunca se guardan más de MAX_CLAVES contadores ni
+MAX_CLAVES bloqueos (se descartan los usados hace más tiempo).
 """
 
+import logging
+import math
+import os
+import threading
 import time
-from collections import defaultdict, deque
+from collections import OrderedDict
 from functools import wraps
 from flask import request, jsonify, flash, redirect, url_for
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
+
+from modelo.configBd import conexion_bd
+from utils.metricas_prometheus import incrementar
+
+logger = logging.getLogger(__name__)
+
+IS_PRODUCTION = os.getenv('RAILWAY_ENVIRONMENT') is not None or os.getenv('RENDER') is not None
+ALMACEN = os.getenv('RATE_LIMIT_ALMACEN', 'postgres' if IS_PRODUCTION else 'memoria').lower()
+MAX_CLAVES = int(os.getenv('RATE_LIMIT_MAX_CLAVES', '10000'))
+INTERVALO_PURGA = 60.0
+
+VENTANA_LOGIN = 900        # intentos fallidos de login: últimos 15 minutos
+MAX_FALLOS_LOGIN = 5
+
+
+def _inicio_ventana(ventana: int, ahora: float) -> int:
+    return int(ahora // ventana) * ventana
+
+
+def _estimar(ventana: int, inicio: int, actual: int, anterior: int, ahora: float) -> float:
+    """Intentos en los últimos `ventana` segundos según los dos contadores"""
+    inicio_actual = _inicio_ventana(ventana, ahora)
+    if inicio == inicio_actual:
+        return actual + anterior * (1 - (ahora - inicio_actual) / ventana)
+    if inicio == inicio_actual - ventana:
+        return actual * (1 - (ahora - inicio_actual) / ventana)
+    return 0.0
+
+
+class AlmacenMemoria:
+    """Contadores y bloqueos del proceso actual, acotados a max_claves"""
+
+    def __init__(self, max_claves: int = MAX_CLAVES, intervalo_purga: float = INTERVALO_PURGA):
+        self.max_claves = max_claves
+        self.intervalo_purga = intervalo_purga
+        self._contadores = OrderedDict()  # clave -> [ventana, inicio, actual, anterior]
+        self._bloqueos = OrderedDict()    # clave -> hasta
+        self._lock = threading.Lock()
+        self._ultima_purga = time.time()
+
+    def _purgar_si_toca(self, ahora: float):
+        if ahora - self._ultima_purga < self.intervalo_purga:
+            return
+        self._ultima_purga = ahora
+        for clave in [c for c, (ventana, inicio, _, _) in self._contadores.items()
+                      if ahora >= inicio + 2 * ventana]:
+            del self._contadores[clave]
+        for clave in [c for c, hasta in self._bloqueos.items() if hasta <= ahora]:
+            del self._bloqueos[clave]
+
+    @staticmethod
+    def _acotar(diccionario: OrderedDict, max_claves: int):
+        while len(diccionario) > max_claves:
+            diccionario.popitem(last=False)
+
+    def contar(self, clave: str, ventana: int, ahora: float) -> float:
+        with self._lock:
+            self._purgar_si_toca(ahora)
+            contador = self._contadores.get(clave)
+            return _estimar(ventana, *contador[1:], ahora) if contador else 0.0
+
+    def registrar(self, clave: str, ventana: int, ahora: float) -> float:
+        """Suma un intento y devuelve la estimación resultante"""
+        inicio_actual = _inicio_ventana(ventana, ahora)
+        with self._lock:
+            self._purgar_si_toca(ahora)
+            contador = self._contadores.get(clave)
+            if contador is None:
+                contador = self._contadores[clave] = [ventana, inicio_actual, 0, 0]
+                self._acotar(self._contadores, self.max_claves)
+            else:
+                self._contadores.move_to_end(clave)
+            _, inicio, actual, _ = contador
+            if inicio != inicio_actual:
+                contador[3] = actual if inicio == inicio_actual - ventana else 0
+                contador[1], contador[2] = inicio_actual, 0
+            contador[0] = ventana
+            contador[2] += 1
+            return _estimar(ventana, *contador[1:], ahora)
+
+    def reiniciar(self, clave: str):
+        with self._lock:
+            self._contadores.pop(clave, None)
+
+    def bloquear(self, clave: str, hasta: float):
+        with self._lock:
+            self._bloqueos[clave] = max(hasta, self._bloqueos.get(clave, 0))
+            self._bloqueos.move_to_end(clave)
+            self._acotar(self._bloqueos, self.max_claves)
+
+    def bloqueado_hasta(self, clave: str, ahora: float) -> Optional[float]:
+        with self._lock:
+            self._purgar_si_toca(ahora)
+            hasta = self._bloqueos.get(clave)
+            if hasta is not None and hasta <= ahora:
+                del self._bloqueos[clave]
+                return None
+            return hasta
+
+    def resumen(self, ahora: float) -> Dict[str, Dict[str, float]]:
+        """{'bloqueos': {tipo: cantidad}, 'intentos': {tipo: intentos estimados}}"""
+        resumen = {'bloqueos': {}, 'intentos': {}}
+        with self._lock:
+            for clave, hasta in self._bloqueos.items():
+                if hasta > ahora:
+                    tipo = clave.split(':', 1)[0]
+                    resumen['bloqueos'][tipo] = resumen['bloqueos'].get(tipo, 0) + 1
+            for clave, (ventana, inicio, actual, anterior) in self._contadores.items():
+                tipo = clave.split(':', 1)[0]
+                resumen['intentos'][tipo] = (resumen['intentos'].get(tipo, 0)
+                                             + _estimar(ventana, inicio, actual, anterior, ahora))
+        return resumen
+
+
+SQL_REGISTRAR = """
+    INSERT INTO rate_limit_contadores AS c (clave, ventana, inicio, actual, anterior, ultimo_uso)
+    VALUES (%(clave)s, %(ventana)s, %(inicio)s, 1, 0, %(ahora)s)
+    ON CONFLICT (clave) DO UPDATE SET
+        anterior = CASE WHEN c.inicio = EXCLUDED.inicio THEN c.anterior
+                        WHEN c.inicio = EXCLUDED.inicio - EXCLUDED.ventana THEN c.actual
+                        ELSE 0 END,
+        actual = CASE WHEN c.inicio = EXCLUDED.inicio THEN c.actual + 1 ELSE 1 END,
+        inicio = EXCLUDED.inicio,
+        ventana = EXCLUDED.ventana,
+        ultimo_uso = EXCLUDED.ultimo_uso
+    RETURNING inicio, actual, anterior
+"""
+
+
+class AlmacenPostgres:
+    """
+    Contadores y bloqueos en PostgreSQL, compartidos entre workers. Ante un
+    error de base de datos usa un AlmacenMemoria del proceso.
+    """
+
+    def __init__(self, max_claves: int = MAX_CLAVES, intervalo_purga: float = INTERVALO_PURGA):
+        self.max_claves = max_claves
+        self.intervalo_purga = intervalo_purga
+        self._respaldo = AlmacenMemoria(max_claves, intervalo_purga)
+        self._ultima_purga = 0.0
+        self._ultimo_aviso = 0.0
+
+    def _ejecutar(self, operacion, respaldo):
+        try:
+            with conexion_bd(commit=True) as conn:
+                cursor = conn.cursor()
+                resultado = operacion(cursor)
+                self._purgar_si_toca(cursor)
+                return resultado
+        except Exception as e:
+            if time.time() - self._ultimo_aviso > self.intervalo_purga:
+                self._ultimo_aviso = time.time()
+                logger.warning(f"⚠️ Rate limiter sin base de datos, usando memoria del proceso: {e}")
+            return respaldo()
+
+    def _purgar_si_toca(self, cursor):
+        ahora = time.time()
+        if ahora - self._ultima_purga < self.intervalo_purga:
+            return
+        self._ultima_purga = ahora
+        cursor.execute("DELETE FROM rate_limit_contadores WHERE inicio + 2 * ventana <= %s", (ahora,))
+        cursor.execute("DELETE FROM rate_limit_bloqueos WHERE hasta <= %s", (ahora,))
+        cursor.execute("""
+            DELETE FROM rate_limit_contadores WHERE clave IN (
+                SELECT clave FROM rate_limit_contadores ORDER BY ultimo_uso DESC OFFSET %s
+            )
+        """, (self.max_claves,))
+        cursor.execute("""
+            DELETE FROM rate_limit_bloqueos WHERE clave IN (
+                SELECT clave FROM rate_limit_bloqueos ORDER BY hasta DESC OFFSET %s
+            )
+        """, (self.max_claves,))
+
+    def contar(self, clave: str, ventana: int, ahora: float) -> float:
+        def operacion(cursor):
+            cursor.execute("SELECT ventana, inicio, actual, anterior FROM rate_limit_contadores WHERE clave = %s",
+                           (clave,))
+            fila = cursor.fetchone()
+            return _estimar(ventana, *fila[1:], ahora) if fila else 0.0
+        return self._ejecutar(operacion, lambda: self._respaldo.contar(clave, ventana, ahora))
+
+    def registrar(self, clave: str, ventana: int, ahora: float) -> float:
+        def operacion(cursor):
+            cursor.execute(SQL_REGISTRAR, {'clave': clave, 'ventana': ventana, 'ahora': ahora,
+                                           'inicio': _inicio_ventana(ventana, ahora)})
+            return _estimar(ventana, *cursor.fetchone(), ahora)
+        return self._ejecutar(operacion, lambda: self._respaldo.registrar(clave, ventana, ahora))
+
+    def reiniciar(self, clave: str):
+        self._respaldo.reiniciar(clave)
+        self._ejecutar(lambda cursor: cursor.execute(
+            "DELETE FROM rate_limit_contadores WHERE clave = %s", (clave,)), lambda: None)
+
+    def bloquear(self, clave: str, hasta: float):
+        self._ejecutar(lambda cursor: cursor.execute("""
+            INSERT INTO rate_limit_bloqueos AS b (clave, hasta) VALUES (%s, %s)
+            ON CONFLICT (clave) DO UPDATE SET hasta = GREATEST(b.hasta, EXCLUDED.hasta)
+        """, (clave, hasta)), lambda: self._respaldo.bloquear(clave, hasta))
+
+    def bloqueado_hasta(self, clave: str, ahora: float) -> Optional[float]:
+        def operacion(cursor):
+            cursor.execute("SELECT hasta FROM rate_limit_bloqueos WHERE clave = %s AND hasta > %s", (clave, ahora))
+            fila = cursor.fetchone()
+            return fila[0] if fila else None
+        return self._ejecutar(operacion, lambda: self._respaldo.bloqueado_hasta(clave, ahora))
+
+    def resumen(self, ahora: float) -> Dict[str, Dict[str, float]]:
+        def operacion(cursor):
+            cursor.execute("""
+                SELECT split_part(clave, ':', 1), COUNT(*)
+                FROM rate_limit_bloqueos WHERE hasta > %s
+                GROUP BY 1
+            """, (ahora,))
+            bloqueos = {tipo: cantidad for tipo, cantidad in cursor.fetchall()}
+            cursor.execute("""
+                SELECT split_part(clave, ':', 1), ventana, inicio, actual, anterior
+                FROM rate_limit_contadores WHERE inicio + 2 * ventana > %s
+            """, (ahora,))
+            intentos = {}
+            for tipo, ventana, inicio, actual, anterior in cursor.fetchall():
+                intentos[tipo] = intentos.get(tipo, 0) + _estimar(ventana, inicio, actual, anterior, ahora)
+            return {'bloqueos': bloqueos, 'intentos': intentos}
+        return self._ejecutar(operacion, lambda: self._respaldo.resumen(ahora))
+
+
+def crear_almacen(nombre: str = ALMACEN):
+    """Almacén configurado en RATE_LIMIT_ALMACEN ('postgres' o 'memoria')"""
+    if nombre == 'postgres':
+        return AlmacenPostgres()
+    if nombre != 'memoria':
+        logger.warning(f"⚠️ RATE_LIMIT_ALMACEN desconocido '{nombre}', usando memoria")
+    return AlmacenMemoria()
+
 
 class RateLimiter:
     """
-    Rate limiter simple basado en memoria
-    Para producción, usar Redis o similar
+    Rate limiter con ventanas deslizantes sobre un almacén intercambiable
+    (ver crear_almacen)
     """
-    
-    def __init__(self):
-        # Almacenar intentos por IP
-        self.attempts = defaultdict(deque)
-        # Almacenar bloqueos temporales
-        self.blocked_ips = {}
-        # Almacenar intentos de login por usuario
-        self.login_attempts = defaultdict(deque)
-        self.blocked_users = {}
-    
+
+    def __init__(self, almacen=None):
+        self.almacen = almacen if almacen is not None else crear_almacen()
+
     def is_rate_limited(self, key: str, max_attempts: int, window_seconds: int) -> Tuple[bool, int]:
         """
         Verifica si una clave está limitada por rate limiting
-        
+
         Returns:
             (is_limited, remaining_attempts)
         """
-        now = time.time()
-        
-        # Limpiar intentos antiguos
-        while self.attempts[key] and self.attempts[key][0] < now - window_seconds:
-            self.attempts[key].popleft()
-        
-        current_attempts = len(self.attempts[key])
-        
+        current_attempts = math.ceil(self.almacen.contar(f'intentos:{key}', window_seconds, time.time()))
+
         if current_attempts >= max_attempts:
             return True, 0
-        
+
         return False, max_attempts - current_attempts
-    
-    def record_attempt(self, key: str):
+
+    def record_attempt(self, key: str, window_seconds: int = 60):
         """Registra un intento"""
-        self.attempts[key].append(time.time())
-    
+        self.almacen.registrar(f'intentos:{key}', window_seconds, time.time())
+
+    def _bloqueo(self, clave: str) -> Tuple[bool, int]:
+        now = time.time()
+        block_until = self.almacen.bloqueado_hasta(clave, now)
+        if block_until is not None:
+            return True, int(block_until - now)
+        return False, 0
+
     def is_ip_blocked(self, ip: str) -> Tuple[bool, int]:
         """Verifica si una IP está bloqueada"""
-        if ip in self.blocked_ips:
-            block_until = self.blocked_ips[ip]
-            if time.time() < block_until:
-                return True, int(block_until - time.time())
-            else:
-                # Bloqueo expirado
-                del self.blocked_ips[ip]
-        
-        return False, 0
-    
+        return self._bloqueo(f'ip:{ip}')
+
     def block_ip(self, ip: str, duration_seconds: int):
         """Bloquea una IP temporalmente"""
-        self.blocked_ips[ip] = time.time() + duration_seconds
-    
+        self.almacen.bloquear(f'ip:{ip}', time.time() + duration_seconds)
+        incrementar('juzgado_rate_limit_bloqueos_total', {'tipo': 'ip'})
+
     def is_user_blocked(self, username: str) -> Tuple[bool, int]:
         """Verifica si un usuario está bloqueado"""
-        if username in self.blocked_users:
-            block_until = self.blocked_users[username]
-            if time.time() < block_until:
-                return True, int(block_until - time.time())
-            else:
-                # Bloqueo expirado
-                del self.blocked_users[username]
-        
-        return False, 0
-    
+        return self._bloqueo(f'usuario:{username}')
+
     def block_user(self, username: str, duration_seconds: int):
         """Bloquea un usuario temporalmente"""
-        self.blocked_users[username] = time.time() + duration_seconds
-    
+        self.almacen.bloquear(f'usuario:{username}', time.time() + duration_seconds)
+        incrementar('juzgado_rate_limit_bloqueos_total', {'tipo': 'usuario'})
+
     def record_failed_login(self, username: str, ip: str):
         """Registra un intento de login fallido"""
-        now = time.time()
-        
-        # Limpiar intentos antiguos (últimos 15 minutos)
-        while (self.login_attempts[username] and 
-               self.login_attempts[username][0] < now - 900):
-            self.login_attempts[username].popleft()
-        
-        # Registrar intento
-        self.login_attempts[username].append(now)
-        
-        # Verificar si debe bloquearse
-        attempts_count = len(self.login_attempts[username])
-        
-        if attempts_count >= 5:  # 5 intentos fallidos
+        attempts_count = self.almacen.registrar(f'login:{username}', VENTANA_LOGIN, time.time())
+
+        if attempts_count >= MAX_FALLOS_LOGIN:  # 5 intentos fallidos
             # Bloquear usuario por 15 minutos
             self.block_user(username, 900)
             # Bloquear IP por 5 minutos
             self.block_ip(ip, 300)
-    
+
     def clear_user_attempts(self, username: str):
         """Limpia intentos de un usuario (login exitoso)"""
-        if username in self.login_attempts:
-            self.login_attempts[username].clear()
+        self.almacen.reiniciar(f'login:{username}')
+
+    def stats(self) -> Dict[str, int]:
+        """Bloqueos vigentes e intentos recientes (para el dashboard de seguridad)"""
+        resumen = self.almacen.resumen(time.time())
+        return {
+            'blocked_ips': resumen['bloqueos'].get('ip', 0),
+            'blocked_users': resumen['bloqueos'].get('usuario', 0),
+            'total_attempts': round(resumen['intentos'].get('intentos', 0)),
+            'login_attempts': round(resumen['intentos'].get('login', 0)),
+        }
 
 # Instancia global del rate limiter
 rate_limiter = RateLimiter()
@@ -140,7 +371,7 @@ def rate_limit(max_attempts: int = 10, window_seconds: int = 60, block_duration:
                 return redirect(url_for('idvistalogin.vista_login'))
             
             # Registrar intento
-            rate_limiter.record_attempt(client_ip)
+            rate_limiter.record_attempt(client_ip, window_seconds)
             
             return func(*args, **kwargs)
         
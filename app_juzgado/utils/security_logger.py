@@ -8,6 +8,8 @@ from datetime import datetime
 from flask import request, session
 from functools import wraps
 
+from .indice_seguridad import IndiceSeguridad
+
 # Configurar logger de seguridad
 def setup_security_logger():
     """Configura el logger de seguridad"""
@@ -49,6 +51,9 @@ def setup_security_logger():
 # Instancia global del logger
 security_logger = setup_security_logger()
 
+# Índice incremental de security.log (se crea en la primera consulta)
+_indice_seguridad = None
+
 class SecurityEvent:
     """Tipos de eventos de seguridad"""
     LOGIN_SUCCESS = "LOGIN_SUCCESS"
@@ -259,46 +264,16 @@ def security_audit(func):
 
 def get_security_stats():
     """
-    Obtiene estadísticas de seguridad del log
+    Obtiene estadísticas de seguridad del log, incluidas las de la última
+    hora y el último día. Solo se leen las líneas agregadas desde la consulta
+    anterior (ver utils/indice_seguridad.py).
     """
+    global _indice_seguridad
     try:
-        logs_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
-        security_file = os.path.join(logs_dir, 'security.log')
-        
-        if not os.path.exists(security_file):
-            return {'error': 'Log file not found'}
-        
-        stats = {
-            'total_events': 0,
-            'login_attempts': 0,
-            'failed_logins': 0,
-            'blocked_attempts': 0,
-            'csrf_attacks': 0,
-            'xss_attempts': 0,
-            'sql_injection_attempts': 0,
-            'rate_limit_exceeded': 0
-        }
-        
-        with open(security_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                stats['total_events'] += 1
-                
-                if 'LOGIN_SUCCESS' in line:
-                    stats['login_attempts'] += 1
-                elif 'LOGIN_FAILED' in line:
-                    stats['failed_logins'] += 1
-                elif 'LOGIN_BLOCKED' in line:
-                    stats['blocked_attempts'] += 1
-                elif 'CSRF_ATTACK' in line:
-                    stats['csrf_attacks'] += 1
-                elif 'XSS_ATTEMPT' in line:
-                    stats['xss_attempts'] += 1
-                elif 'SQL_INJECTION_ATTEMPT' in line:
-                    stats['sql_injection_attempts'] += 1
-                elif 'RATE_LIMIT_EXCEEDED' in line:
-                    stats['rate_limit_exceeded'] += 1
-        
-        return stats
+        if _indice_seguridad is None:
+            logs_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
+            _indice_seguridad = IndiceSeguridad(os.path.join(logs_dir, 'security.log'))
+        return _indice_seguridad.estadisticas()
         
     except Exception as e:
         return {'error': f'Error reading security stats: {e}'}
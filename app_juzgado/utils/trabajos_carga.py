@@ -0,0 +1,546 @@
+"""
+Cola de trabajos para las cargas de Excel
+
+Cada carga se guarda en la tabla trabajos_carga (archivo, estado y avance) y
+se procesa fuera de la petición HTTP, para no bloquear un worker de gunicorn
+durante minutos:
+
+- por defecto, en un hilo del mismo worker que recibió el archivo
+  (MAX_CARGAS_POR_WORKER a la vez), o
+- con CARGAS_EJECUTOR=externo, las cargas solo se encolan y las consume un
+  proceso aparte: `flask --app main procesar-cargas --continuo`.
+
+Como el estado vive en PostgreSQL, cualquier worker puede responder la
+consulta de avance aunque el trabajo corra en otro. Los procesadores
+reportan su avance con con_progreso() / reportar_progreso(), que no hacen
+nada cuando no hay un trabajo en curso (carga síncrona, pruebas).
+
+Un worker reciclado (max_requests) descarta los trabajos que esperaban en
+su cola de hilos, y uno terminado por el master (timeout) deja el suyo en
+'procesando'. Por eso cada worker, al arrancar y cada INTERVALO_RECUPERACION
+segundos (iniciar_recuperacion, desde el hook post_fork), y el consumidor
+externo en su ciclo:
+
+- reencolan los trabajos 'procesando' cuyo worker ya no existe (mismo host:
+  el pid registrado en `propietario` no está vivo; otro host: sin avance en
+  TIEMPO_MAXIMO_SIN_AVANCE), o los marcan 'error' si ya se intentaron
+  MAX_INTENTOS veces (un archivo que tumba al worker no se reintenta sin fin);
+- toman los 'pendiente' que llevan más de GRACIA_PENDIENTE segundos en cola.
+
+La tabla la crea migraciones/0008_trabajos_carga.sql (`flask migrar`).
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from modelo.configBd import conexion_bd
+from utils.metricas_prometheus import registrar_carga
+
+logger = logging.getLogger(__name__)
+
+EJECUTOR_CARGAS = os.getenv('CARGAS_EJECUTOR', 'hilo').lower()
+MAX_CARGAS_POR_WORKER = int(os.getenv('CARGAS_POR_WORKER', '1'))
+
+INTERVALO_PROGRESO = 2.0            # segundos mínimos entre escrituras de avance
+TIEMPO_MAXIMO_SIN_AVANCE = 15 * 60  # un trabajo 'procesando' sin avance se da por interrumpido
+DIAS_RETENCION_TRABAJOS = 7
+INTERVALO_RECUPERACION = 60         # segundos entre revisiones de trabajos huérfanos
+GRACIA_PENDIENTE = 120              # un pendiente más antiguo que esto lo puede tomar cualquier worker
+MAX_INTENTOS = 2
+
+ESTADOS_FINALES = ('completado', 'error')
+
+_contexto = threading.local()
+_ejecutor = None
+_ejecutor_pid = None
+_lock_ejecutor = threading.Lock()
+_recuperacion_pid = None
+_toma_en_curso = threading.Event()
+
+
+class ProgresoCarga:
+    """
+    Avance de un trabajo en curso. Acumula en memoria y escribe en la tabla
+    como mucho cada INTERVALO_PROGRESO segundos, con su propia conexión
+    (la del procesamiento no confirma hasta el final).
+    """
+
+    def __init__(self, trabajo_id, usuario_id=None, intervalo=INTERVALO_PROGRESO):
+        self.trabajo_id = trabajo_id
+        self.usuario_id = usuario_id
+        self.intervalo = intervalo
+        self.filas_total = 0
+        self.filas_procesadas = 0
+        self.errores = 0
+        self._errores_base = 0
+        self._ultimo_guardado = 0.0
+
+    def iniciar_recorrido(self, filas, errores_iniciales=0):
+        """
+        Registra una hoja más por recorrer.
+
+        Args:
+            filas: filas estimadas de la hoja (None si no se conocen)
+            errores_iniciales: valor del contador de errores del procesador al empezar
+        """
+        self.filas_total += filas or 0
+        self._errores_base = self.errores - errores_iniciales
+        self.guardar()
+
+    def avanzar(self, filas=1, errores=None):
+        """
+        Args:
+            filas: filas procesadas desde el último aviso
+            errores: valor actual del contador de errores del procesador
+        """
+        self.filas_procesadas += filas
+        if errores is not None:
+            self.errores = self._errores_base + errores
+        if time.monotonic() - self._ultimo_guardado >= self.intervalo:
+            self.guardar()
+
+    def guardar(self):
+        self._ultimo_guardado = time.monotonic()
+        try:
+            with conexion_bd(commit=True) as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE trabajos_carga
+                    SET filas_total = %s, filas_procesadas = %s, errores = %s,
+                        fecha_actualizacion = NOW()
+                    WHERE id = %s
+                """, (max(self.filas_total, self.filas_procesadas), self.filas_procesadas,
+                      self.errores, self.trabajo_id))
+                cursor.close()
+        except Exception as e:
+            # El avance es informativo: nunca debe detener la carga
+            logger.warning(f"⚠️ No se pudo guardar el avance del trabajo {self.trabajo_id}: {e}")
+
+
+def progreso_actual():
+    """ProgresoCarga del trabajo que corre en este hilo, o None"""
+    return getattr(_contexto, 'progreso', None)
+
+
+def iniciar_progreso(filas, errores_iniciales=0):
+    """Registra una hoja por recorrer en el trabajo en curso (no hace nada sin trabajo)"""
+    progreso = progreso_actual()
+    if progreso is not None:
+        progreso.iniciar_recorrido(filas, errores_iniciales)
+
+
+def reportar_progreso(filas=1, errores=None):
+    """Avisa filas procesadas al trabajo en curso (no hace nada sin trabajo)"""
+    progreso = progreso_actual()
+    if progreso is not None:
+        progreso.avanzar(filas, errores)
+
+
+def con_progreso(hoja, errores=None):
+    """
+    Recorre hoja.iterrows() reportando el avance de cada fila al trabajo en curso.
+
+    Args:
+        hoja: HojaExcel (o DataFrame) a recorrer
+        errores: función sin argumentos que devuelve el contador de errores del
+                 procesador, p. ej. lambda: resultado['errores']
+
+    Las filas recorridas y su tiempo se registran en las métricas de carga
+    (utils/metricas_prometheus.py), haya o no un trabajo en curso.
+    """
+    progreso = progreso_actual()
+    inicio = time.perf_counter()
+    recorridas = 0
+    try:
+        if progreso is None:
+            for fila in hoja.iterrows():
+                yield fila
+                recorridas += 1
+            return
+
+        filas = hoja.filas_estimadas if hasattr(hoja, 'filas_estimadas') else len(hoja)
+        progreso.iniciar_recorrido(filas, errores() if errores else 0)
+        for fila in hoja.iterrows():
+            yield fila
+            recorridas += 1
+            progreso.avanzar(1, errores() if errores else None)
+    finally:
+        registrar_carga(getattr(hoja, 'nombre', None), recorridas, time.perf_counter() - inicio)
+
+
+def lotes_con_progreso(hoja, errores=None, detectar_formulas=False):
+    """
+    Como con_progreso, pero entrega la hoja por lotes (DataFrames de
+    HojaExcel.iterar_lotes, o el DataFrame completo) para que el procesador
+    resuelva cada lote con una consulta. El avance se reporta al terminar
+    cada lote. Con detectar_formulas, cada lote trae en lote.attrs['formulas']
+    las fórmulas sin calcular de sus filas.
+    """
+    progreso = progreso_actual()
+    inicio = time.perf_counter()
+    recorridas = 0
+    if hasattr(hoja, 'iterar_lotes'):
+        lotes = hoja.iterar_lotes(detectar_formulas=detectar_formulas)
+    else:
+        lotes = [hoja]
+    try:
+        if progreso is not None:
+            filas = hoja.filas_estimadas if hasattr(hoja, 'filas_estimadas') else len(hoja)
+            progreso.iniciar_recorrido(filas, errores() if errores else 0)
+        for lote in lotes:
+            yield lote
+            recorridas += len(lote)
+            if progreso is not None:
+                progreso.avanzar(len(lote), errores() if errores else None)
+    finally:
+        registrar_carga(getattr(hoja, 'nombre', None), recorridas, time.perf_counter() - inicio)
+
+
+def crear_trabajo(cursor, contenido, nombre_archivo, modo_actualizacion, usuario_id=None):
+    """Guarda una carga pendiente y devuelve su ID. No hace commit."""
+    cursor.execute("""
+        INSERT INTO trabajos_carga (usuario_id, nombre_archivo, modo_actualizacion, archivo)
+        VALUES (%s, %s, %s, %s)
+        RETURNING id
+    """, (usuario_id, nombre_archivo, modo_actualizacion, contenido))
+    return cursor.fetchone()[0]
+
+
+def _obtener_ejecutor():
+    """Pool de hilos del proceso actual (se recrea tras un fork)"""
+    global _ejecutor, _ejecutor_pid
+    with _lock_ejecutor:
+        if _ejecutor is None or _ejecutor_pid != os.getpid():
+            _ejecutor = ThreadPoolExecutor(max_workers=MAX_CARGAS_POR_WORKER,
+                                           thread_name_prefix='carga-excel')
+            _ejecutor_pid = os.getpid()
+        return _ejecutor
+
+
+def encolar_carga(contenido, nombre_archivo, modo_actualizacion, usuario_id, procesador):
+    """
+    Encola una carga y, salvo con CARGAS_EJECUTOR=externo, la inicia en un
+    hilo de este worker.
+
+    Args:
+        contenido: bytes del archivo Excel
+        procesador: función(contenido, modo_actualizacion) -> dict con 'mensajes'
+                    [(mensaje, categoria)] y 'reporte_id'
+
+    Returns:
+        int: ID del trabajo
+    """
+    with conexion_bd(commit=True) as conn:
+        cursor = conn.cursor()
+        trabajo_id = crear_trabajo(cursor, contenido, nombre_archivo, modo_actualizacion, usuario_id)
+        cursor.close()
+
+    logger.info(f"📨 Carga encolada: trabajo {trabajo_id} ({nombre_archivo}, {len(contenido)} bytes)")
+    if EJECUTOR_CARGAS != 'externo':
+        _obtener_ejecutor().submit(ejecutar_trabajo, trabajo_id, procesador)
+    return trabajo_id
+
+
+def ejecutar_trabajo(trabajo_id, procesador):
+    """
+    Toma un trabajo pendiente concreto y lo procesa en este hilo.
+
+    Returns:
+        bool: False si el trabajo ya no estaba pendiente
+    """
+    with conexion_bd(commit=True) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE trabajos_carga
+            SET estado = 'procesando', fecha_inicio = NOW(), fecha_actualizacion = NOW(),
+                propietario = %s, intentos = intentos + 1
+            WHERE id = %s AND estado = 'pendiente'
+            RETURNING id, archivo, modo_actualizacion, usuario_id
+        """, (propietario_actual(), trabajo_id))
+        fila = cursor.fetchone()
+        cursor.close()
+
+    if fila is None:
+        logger.warning(f"⚠️ El trabajo {trabajo_id} ya no está pendiente")
+        return False
+    _procesar(*fila, procesador)
+    return True
+
+
+def reclamar_siguiente(procesador, antiguedad=0):
+    """
+    Toma el trabajo pendiente más antiguo (SKIP LOCKED: varios consumidores
+    pueden correr a la vez) y lo procesa.
+
+    Args:
+        antiguedad: solo toma pendientes encolados hace más de estos segundos
+
+    Returns:
+        int | None: ID del trabajo procesado, o None si no había pendientes
+    """
+    with conexion_bd(commit=True) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE trabajos_carga
+            SET estado = 'procesando', fecha_inicio = NOW(), fecha_actualizacion = NOW(),
+                propietario = %s, intentos = intentos + 1
+            WHERE id = (
+                SELECT id FROM trabajos_carga
+                WHERE estado = 'pendiente'
+                  AND fecha_creacion <= NOW() - make_interval(secs => %s)
+                ORDER BY id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id, archivo, modo_actualizacion, usuario_id
+        """, (propietario_actual(), antiguedad))
+        fila = cursor.fetchone()
+        cursor.close()
+
+    if fila is None:
+        return None
+    _procesar(*fila, procesador)
+    return fila[0]
+
+
+def propietario_actual():
+    """Identificador del proceso que toma un trabajo: host:pid"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # existe pero pertenece a otro usuario
+
+
+def trabajo_huerfano(propietario, sin_avance_vencido):
+    """
+    Si un trabajo 'procesando' ya no tiene quien lo procese. En el mismo host
+    se comprueba el pid; en otro (o sin propietario registrado) solo se puede
+    juzgar por el tiempo sin avance.
+    """
+    host, _, pid = (propietario or '').rpartition(':')
+    if host == socket.gethostname() and pid.isdigit():
+        return int(pid) != os.getpid() and not _proceso_vivo(int(pid))
+    return bool(sin_avance_vencido)
+
+
+def recuperar_interrumpidos(cursor):
+    """
+    Reencola los trabajos 'procesando' huérfanos o, si ya agotaron
+    MAX_INTENTOS (o no conservan el archivo), los marca 'error'. Los que
+    otra transacción tiene bloqueados se saltan. No hace commit.
+
+    Returns:
+        dict: reencolados y fallidos (listas de IDs)
+    """
+    cursor.execute("""
+        SELECT id, propietario, intentos, archivo IS NOT NULL,
+               fecha_actualizacion < NOW() - make_interval(secs => %s)
+        FROM trabajos_carga
+        WHERE estado = 'procesando'
+        ORDER BY id
+        FOR UPDATE SKIP LOCKED
+    """, (TIEMPO_MAXIMO_SIN_AVANCE,))
+    reencolados, fallidos = [], []
+    for trabajo_id, propietario, intentos, con_archivo, vencido in cursor.fetchall():
+        if not trabajo_huerfano(propietario, vencido):
+            continue
+        if con_archivo and intentos < MAX_INTENTOS:
+            reencolados.append(trabajo_id)
+        else:
+            fallidos.append(trabajo_id)
+
+    if reencolados:
+        cursor.execute("""
+            UPDATE trabajos_carga
+            SET estado = 'pendiente', propietario = NULL, fecha_inicio = NULL,
+                filas_total = 0, filas_procesadas = 0, errores = 0, fecha_actualizacion = NOW()
+            WHERE id = ANY(%s)
+        """, (reencolados,))
+        logger.warning(f"♻️ Trabajos de carga reencolados (su worker terminó): {reencolados}")
+    if fallidos:
+        cursor.execute("""
+            UPDATE trabajos_carga
+            SET estado = 'error', archivo = NULL, fecha_fin = NOW(), fecha_actualizacion = NOW(),
+                mensaje = 'El procesamiento se interrumpió varias veces (el worker terminó). '
+                          'Revise el archivo o divídalo y vuelva a subirlo.'
+            WHERE id = ANY(%s)
+        """, (fallidos,))
+        logger.error(f"❌ Trabajos de carga interrumpidos sin más reintentos: {fallidos}")
+    return {'reencolados': reencolados, 'fallidos': fallidos}
+
+
+def recuperar_trabajos():
+    """recuperar_interrumpidos() en su propia transacción"""
+    with conexion_bd(commit=True) as conn:
+        cursor = conn.cursor()
+        resultado = recuperar_interrumpidos(cursor)
+        cursor.close()
+    return resultado
+
+
+def _tomar_pendientes_antiguos(procesador):
+    """En el hilo de cargas: procesa los pendientes que nadie tomó a tiempo"""
+    try:
+        while reclamar_siguiente(procesador, antiguedad=GRACIA_PENDIENTE) is not None:
+            pass
+    finally:
+        _toma_en_curso.clear()
+
+
+def _ciclo_recuperacion(procesador, intervalo):
+    while True:
+        try:
+            recuperar_trabajos()
+            if not _toma_en_curso.is_set():
+                _toma_en_curso.set()
+                _obtener_ejecutor().submit(_tomar_pendientes_antiguos, procesador)
+        except Exception as e:
+            _toma_en_curso.clear()
+            logger.warning(f"⚠️ No se pudieron revisar los trabajos de carga huérfanos: {e}")
+        time.sleep(intervalo)
+
+
+def iniciar_recuperacion(procesador, intervalo=INTERVALO_RECUPERACION):
+    """
+    Revisa los trabajos huérfanos ahora y cada `intervalo` segundos, en un
+    hilo del worker actual (una vez por proceso). Con CARGAS_EJECUTOR=externo
+    no hace nada: lo hace el consumidor.
+
+    Returns:
+        bool: True si se inició el hilo
+    """
+    global _recuperacion_pid
+    if EJECUTOR_CARGAS == 'externo' or _recuperacion_pid == os.getpid():
+        return False
+    _recuperacion_pid = os.getpid()
+    threading.Thread(target=_ciclo_recuperacion, args=(procesador, intervalo),
+                     name='recuperacion-cargas', daemon=True).start()
+    return True
+
+
+def _procesar(trabajo_id, archivo, modo_actualizacion, usuario_id, procesador):
+    progreso = ProgresoCarga(trabajo_id, usuario_id)
+    _contexto.progreso = progreso
+    inicio = time.perf_counter()
+    logger.info(f"⚙️ Procesando trabajo de carga {trabajo_id}")
+
+    resultado = None
+    mensaje = None
+    try:
+        resultado = procesador(bytes(archivo), modo_actualizacion)
+        estado = 'completado'
+    except Exception as e:
+        logger.exception(f"❌ Error en trabajo de carga {trabajo_id}: {e}")
+        estado = 'error'
+        mensaje = str(e)
+    finally:
+        _contexto.progreso = None
+
+    try:
+        with conexion_bd(commit=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE trabajos_carga
+                SET estado = %s, mensaje = %s, resultado = %s, reporte_id = %s,
+                    filas_total = GREATEST(%s, %s), filas_procesadas = %s, errores = %s,
+                    archivo = NULL, fecha_fin = NOW(), fecha_actualizacion = NOW()
+                WHERE id = %s
+            """, (
+                estado, mensaje,
+                json.dumps(resultado, default=str) if resultado is not None else None,
+                (resultado or {}).get('reporte_id'),
+                progreso.filas_total, progreso.filas_procesadas, progreso.filas_procesadas,
+                progreso.errores, trabajo_id,
+            ))
+            cursor.close()
+    except Exception as e:
+        logger.error(f"❌ No se pudo guardar el resultado del trabajo {trabajo_id}: {e}")
+
+    logger.info(f"🏁 Trabajo de carga {trabajo_id} {estado}: {progreso.filas_procesadas} filas, "
+                f"{progreso.errores} errores en {round(time.perf_counter() - inicio, 1)} s")
+
+
+def obtener_trabajo(cursor, trabajo_id):
+    """
+    Estado de un trabajo para la consulta de avance.
+
+    Returns:
+        dict | None
+    """
+    cursor.execute("""
+        SELECT t.id, t.usuario_id, t.nombre_archivo, t.modo_actualizacion, t.estado,
+               t.filas_total, t.filas_procesadas, t.errores, t.mensaje, t.resultado, t.reporte_id,
+               EXTRACT(EPOCH FROM (COALESCE(t.fecha_fin, NOW()) - t.fecha_inicio)),
+               EXTRACT(EPOCH FROM (NOW() - t.fecha_actualizacion)),
+               (SELECT COUNT(*) FROM trabajos_carga p WHERE p.estado = 'pendiente' AND p.id < t.id)
+        FROM trabajos_carga t
+        WHERE t.id = %s
+    """, (trabajo_id,))
+    fila = cursor.fetchone()
+    return describir_trabajo(fila) if fila else None
+
+
+def describir_trabajo(fila):
+    """Convierte una fila de obtener_trabajo en el dict de la API, con porcentaje y ETA"""
+    (trabajo_id, usuario_id, nombre_archivo, modo_actualizacion, estado, filas_total,
+     filas_procesadas, errores, mensaje, resultado, reporte_id, segundos, sin_avance, en_cola) = fila
+
+    segundos = float(segundos) if segundos is not None else None
+    if estado == 'procesando' and sin_avance is not None and float(sin_avance) > TIEMPO_MAXIMO_SIN_AVANCE:
+        # El worker que lo procesaba se reinició o murió
+        estado = 'interrumpido'
+        mensaje = 'El procesamiento se interrumpió. Vuelva a subir el archivo.'
+
+    porcentaje = None
+    eta_segundos = None
+    if estado == 'completado':
+        porcentaje = 100
+    elif filas_total:
+        porcentaje = min(99, int(filas_procesadas * 100 / filas_total))
+        if estado == 'procesando' and filas_procesadas and segundos:
+            restantes = max(filas_total - filas_procesadas, 0)
+            eta_segundos = round(segundos / filas_procesadas * restantes)
+
+    if isinstance(resultado, str):
+        resultado = json.loads(resultado)
+
+    return {
+        'id': trabajo_id,
+        'usuario_id': usuario_id,
+        'nombre_archivo': nombre_archivo,
+        'modo_actualizacion': modo_actualizacion,
+        'estado': estado,
+        'terminado': estado in ESTADOS_FINALES or estado == 'interrumpido',
+        'filas_total': filas_total,
+        'filas_procesadas': filas_procesadas,
+        'errores': errores,
+        'porcentaje': porcentaje,
+        'eta_segundos': eta_segundos,
+        'segundos': round(segundos, 1) if segundos is not None else None,
+        'en_cola': en_cola if estado == 'pendiente' else 0,
+        'mensaje': mensaje,
+        'mensajes': (resultado or {}).get('mensajes', []),
+        'reporte_id': reporte_id,
+    }
+
+
+def limpiar_trabajos_antiguos(cursor, dias=DIAS_RETENCION_TRABAJOS):
+    """Elimina trabajos terminados hace más de `dias` días. No hace commit."""
+    cursor.execute("""
+        DELETE FROM trabajos_carga
+        WHERE estado IN ('completado', 'error')
+          AND fecha_fin < NOW() - make_interval(days => %s)
+    """, (dias,))
+    return cursor.rowcount
@@ -0,0 +1,313 @@
+"""
+Motor de turnos para expedientes 'Activo Pendiente'
+
+Calcula y escribe todos los turnos en una sola sentencia (ROW_NUMBER sobre
+el orden de la cola) y solo toca las filas cuyo turno realmente cambia.
+
+Criterios de ordenamiento (en orden de prioridad):
+1. Fecha de ingreso sin salida (más antigua)
+   - "Sin salida" = ingreso que NO tiene estado en la misma fecha o posterior
+2. Fecha de ingreso del expediente (más antigua)
+3. Última actuación (más antigua; expedientes SIN estados al final)
+4. ID del expediente
+
+La columna expediente.turno es INTEGER desde la migración
+0006_turno_entero.sql (`flask migrar`), con índices parciales sobre la cola
+'Activo Pendiente'. Mientras una base siga con la columna en texto,
+turno_entero() convierte los valores anteriores ('', '007') al vuelo.
+"""
+
+import logging
+import re
+import time
+
+from .esquema import tipo_columna
+from .metricas_prometheus import observar
+
+logger = logging.getLogger(__name__)
+
+# Tope para rangos abiertos de turnos (INTEGER de PostgreSQL)
+TURNO_MAXIMO = 2147483647
+
+_turno_es_entero = False
+
+
+def turno_es_entero():
+    """True si expediente.turno ya es INTEGER (registro del esquema; se recuerda por proceso)"""
+    global _turno_es_entero
+    if not _turno_es_entero:
+        _turno_es_entero = tipo_columna('expediente', 'turno') == 'integer'
+    return _turno_es_entero
+
+
+def turno_entero(columna='turno'):
+    """
+    Expresión SQL del turno como entero. Con la columna ya migrada (ver
+    turno_es_entero) es la columna misma, así las consultas usan los índices
+    de la cola; si no, convierte el texto sin fallar con valores no numéricos.
+    """
+    if turno_es_entero():
+        return columna
+    return f"(CASE WHEN {columna}::text ~ '^[0-9]+$' THEN {columna}::text::integer END)"
+
+
+def turno_a_entero(valor):
+    """Turno como int a partir de un valor leído (acepta los textos anteriores); None si no es numérico"""
+    if valor is None or isinstance(valor, int):
+        return valor
+    texto = str(valor).strip()
+    return int(texto) if re.fullmatch(r'[0-9]{1,9}', texto) else None
+
+
+# CTEs con los datos que determinan el orden de la cola
+SQL_BASE_TURNOS = """
+    expedientes_activos AS (
+        SELECT e.id, e.turno, e.fecha_ingreso AS fecha_ingreso_expediente
+        FROM expediente e
+        WHERE e.estado = 'Activo Pendiente'
+    ),
+    fecha_ingreso_mas_antigua_sin_salida AS (
+        SELECT ie.expediente_id, MIN(ie.fecha_ingreso) AS fecha_ingreso_sin_salida
+        FROM ingresos ie
+        WHERE ie.fecha_ingreso IS NOT NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM estados est
+              WHERE est.expediente_id = ie.expediente_id
+                AND est.fecha_estado >= ie.fecha_ingreso
+          )
+        GROUP BY ie.expediente_id
+    ),
+    ultima_actuacion_expediente AS (
+        SELECT expediente_id, MAX(fecha_estado) AS ultima_actuacion
+        FROM estados
+        WHERE fecha_estado IS NOT NULL
+        GROUP BY expediente_id
+    )
+"""
+
+# Orden completo de la cola: (id, nuevo_turno) para los expedientes
+# 'Activo Pendiente' que tienen alguna fecha con la cual ordenarse
+SQL_RANKING_TURNOS = SQL_BASE_TURNOS + """,
+    ranking AS (
+        SELECT
+            ea.id,
+            ROW_NUMBER() OVER (
+                ORDER BY
+                    COALESCE(fimass.fecha_ingreso_sin_salida, ea.fecha_ingreso_expediente) ASC,
+                    ea.fecha_ingreso_expediente ASC,
+                    uae.ultima_actuacion ASC NULLS LAST,
+                    ea.id ASC
+            ) AS nuevo_turno
+        FROM expedientes_activos ea
+        LEFT JOIN fecha_ingreso_mas_antigua_sin_salida fimass ON ea.id = fimass.expediente_id
+        LEFT JOIN ultima_actuacion_expediente uae ON ea.id = uae.expediente_id
+        WHERE COALESCE(fimass.fecha_ingreso_sin_salida, ea.fecha_ingreso_expediente) IS NOT NULL
+    )
+"""
+
+
+def recalcular_turnos(cursor):
+    """
+    Recalcula todos los turnos de expedientes 'Activo Pendiente' en una sola
+    sentencia. Los expedientes activos sin ninguna fecha quedan sin turno.
+    No hace commit: la transacción es del llamador.
+
+    Args:
+        cursor: Cursor de la base de datos
+
+    Returns:
+        dict: con_turno, sin_fecha, actualizados (filas escritas) y duracion_ms
+    """
+    inicio = time.perf_counter()
+
+    # La comparación se hace como texto para no depender del tipo de la columna turno
+    cursor.execute(f"""
+        WITH {SQL_RANKING_TURNOS},
+        objetivo AS (
+            SELECT ea.id, r.nuevo_turno
+            FROM expedientes_activos ea
+            LEFT JOIN ranking r ON r.id = ea.id
+        ),
+        actualizados AS (
+            UPDATE expediente e
+            SET turno = o.nuevo_turno
+            FROM objetivo o
+            WHERE e.id = o.id
+              AND e.turno::text IS DISTINCT FROM o.nuevo_turno::text
+            RETURNING e.id
+        )
+        SELECT
+            (SELECT COUNT(*) FROM ranking),
+            (SELECT COUNT(*) FROM objetivo WHERE nuevo_turno IS NULL),
+            (SELECT COUNT(*) FROM actualizados)
+    """)
+    con_turno, sin_fecha, actualizados = cursor.fetchone()
+
+    resultado = {
+        'con_turno': con_turno,
+        'sin_fecha': sin_fecha,
+        'actualizados': actualizados,
+        'duracion_ms': round((time.perf_counter() - inicio) * 1000, 1),
+    }
+    observar('juzgado_turnos_recalculo_seconds', resultado['duracion_ms'] / 1000)
+
+    logger.info(
+        f"🎫 Turnos recalculados: {con_turno} en cola, {actualizados} cambiaron, "
+        f"{sin_fecha} sin fecha (excluidos) en {resultado['duracion_ms']} ms"
+    )
+    return resultado
+
+
+def _rango_desplazamiento(turno_anterior, turno_nuevo):
+    """
+    Rango de turnos de los DEMÁS expedientes que se corre al mover uno
+    de turno_anterior a turno_nuevo (None = fuera de la cola).
+
+    Returns:
+        tuple: (desde, hasta, delta) o None si nadie se mueve
+    """
+    if turno_anterior == turno_nuevo:
+        return None
+    if turno_anterior is None:
+        return (turno_nuevo, TURNO_MAXIMO, 1)
+    if turno_nuevo is None:
+        return (turno_anterior + 1, TURNO_MAXIMO, -1)
+    if turno_anterior < turno_nuevo:
+        return (turno_anterior + 1, turno_nuevo, -1)
+    return (turno_nuevo, turno_anterior - 1, 1)
+
+
+def _cola_consistente(n, desajustes, distintos, minimo, maximo, suma, turno_anterior):
+    """
+    Verifica que los demás expedientes de la cola ocupen exactamente
+    {1..M} sin el turno anterior del expediente (M = n + 1 si lo tenía),
+    y que ningún expediente fuera de la cola conserve turno.
+    """
+    if desajustes or distintos != n:
+        return False
+    if n == 0:
+        return True
+    m = n + (1 if turno_anterior is not None else 0)
+    if minimo < 1 or maximo > m:
+        return False
+    return suma == m * (m + 1) // 2 - (turno_anterior or 0)
+
+
+def actualizar_turno_expediente(cursor, expediente_id):
+    """
+    Mantenimiento incremental del turno de UN expediente cuya clave de
+    orden cambió (estado, fecha de ingreso, ingresos o estados).
+
+    Calcula su nueva posición en la cola y, en una sola sentencia, le
+    asigna el turno y corre solo los turnos entre la posición anterior y
+    la nueva. Si la cola no está numerada de forma consecutiva hace un
+    recálculo global con recalcular_turnos(). No hace commit.
+
+    Returns:
+        dict: modo ('incremental', 'sin_cambio' o 'global'), turno_anterior,
+              turno_nuevo, desplazados y duracion_ms
+    """
+    inicio = time.perf_counter()
+
+    cursor.execute(f"""
+        WITH {SQL_BASE_TURNOS},
+        claves AS (
+            SELECT
+                ea.id,
+                {turno_entero('ea.turno')} AS turno,
+                ea.turno IS NOT NULL AS tiene_turno,
+                COALESCE(fimass.fecha_ingreso_sin_salida, ea.fecha_ingreso_expediente) AS k1,
+                COALESCE(ea.fecha_ingreso_expediente, 'infinity') AS k2,
+                COALESCE(uae.ultima_actuacion, 'infinity') AS k3
+            FROM expedientes_activos ea
+            LEFT JOIN fecha_ingreso_mas_antigua_sin_salida fimass ON ea.id = fimass.expediente_id
+            LEFT JOIN ultima_actuacion_expediente uae ON ea.id = uae.expediente_id
+        ),
+        objetivo AS (
+            SELECT * FROM claves WHERE id = %(id)s AND k1 IS NOT NULL
+        ),
+        demas AS (
+            SELECT * FROM claves WHERE id <> %(id)s
+        )
+        SELECT
+            (SELECT turno::text FROM expediente WHERE id = %(id)s),
+            (SELECT 1 + COUNT(*) FROM demas d, objetivo o
+              WHERE d.k1 IS NOT NULL
+                AND (d.k1, d.k2, d.k3, d.id) < (o.k1, o.k2, o.k3, o.id)),
+            EXISTS (SELECT 1 FROM objetivo),
+            (SELECT COUNT(*) FROM demas WHERE k1 IS NOT NULL),
+            (SELECT COUNT(*) FROM demas WHERE tiene_turno <> (k1 IS NOT NULL)),
+            (SELECT COUNT(DISTINCT turno) FROM demas),
+            (SELECT MIN(turno) FROM demas),
+            (SELECT MAX(turno) FROM demas),
+            (SELECT COALESCE(SUM(turno), 0) FROM demas)
+    """, {'id': expediente_id})
+
+    fila = cursor.fetchone()
+    if not fila:
+        logger.warning(f"⚠️ Expediente {expediente_id} no encontrado para actualizar turno")
+        return {'modo': 'sin_cambio', 'turno_anterior': None, 'turno_nuevo': None,
+                'desplazados': 0, 'duracion_ms': round((time.perf_counter() - inicio) * 1000, 1)}
+
+    turno_texto, posicion, en_cola, n, desajustes, distintos, minimo, maximo, suma = fila
+
+    turno_anterior = turno_a_entero(turno_texto)
+    turno_valido = turno_texto in (None, '') or turno_anterior is not None
+
+    if not turno_valido or not _cola_consistente(
+            n, desajustes, distintos, minimo, maximo, suma, turno_anterior):
+        logger.info("⚠️ La cola de turnos no es consecutiva - recálculo global")
+        resultado = recalcular_turnos(cursor)
+        return {'modo': 'global', 'turno_anterior': turno_anterior, 'turno_nuevo': None,
+                'desplazados': resultado['actualizados'], 'duracion_ms': resultado['duracion_ms']}
+
+    turno_nuevo = posicion if en_cola else None
+    rango = _rango_desplazamiento(turno_anterior, turno_nuevo)
+
+    if rango is None and (turno_texto is None) == (turno_nuevo is None):
+        duracion = round((time.perf_counter() - inicio) * 1000, 1)
+        logger.info(f"ℹ️ Turno del expediente {expediente_id} sin cambios ({turno_nuevo})")
+        return {'modo': 'sin_cambio', 'turno_anterior': turno_anterior, 'turno_nuevo': turno_nuevo,
+                'desplazados': 0, 'duracion_ms': duracion}
+
+    desde, hasta, delta = rango or (1, 0, 0)
+    cursor.execute(f"""
+        UPDATE expediente
+        SET turno = CASE WHEN id = %(id)s THEN %(turno)s
+                         ELSE {turno_entero()} + %(delta)s END
+        WHERE id = %(id)s
+           OR (estado = 'Activo Pendiente'
+               AND {turno_entero()} BETWEEN %(desde)s AND %(hasta)s)
+    """, {'id': expediente_id, 'turno': turno_nuevo, 'delta': delta,
+          'desde': desde, 'hasta': hasta})
+
+    desplazados = max(cursor.rowcount - 1, 0)
+    duracion = round((time.perf_counter() - inicio) * 1000, 1)
+    logger.info(
+        f"🎫 Turno incremental expediente {expediente_id}: {turno_anterior} → {turno_nuevo}, "
+        f"{desplazados} turnos desplazados en {duracion} ms"
+    )
+    return {'modo': 'incremental', 'turno_anterior': turno_anterior, 'turno_nuevo': turno_nuevo,
+            'desplazados': desplazados, 'duracion_ms': duracion}
+
+
+def compactar_turnos(cursor):
+    """
+    Renumera 1..N la cola conservando su orden actual (p. ej. tras eliminar
+    un expediente), en una sola sentencia. No hace commit.
+
+    Returns:
+        int: expedientes cuyo turno cambió
+    """
+    cursor.execute(f"""
+        UPDATE expediente e
+        SET turno = c.nuevo_turno
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (ORDER BY {turno_entero()}, id) AS nuevo_turno
+            FROM expediente
+            WHERE estado = 'Activo Pendiente' AND {turno_entero()} IS NOT NULL
+        ) c
+        WHERE e.id = c.id
+          AND {turno_entero('e.turno')} IS DISTINCT FROM c.nuevo_turno
+    """)
+    return cursor.rowcount
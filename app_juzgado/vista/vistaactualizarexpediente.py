@@ -13,6 +13,14 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from modelo.configBd import obtener_conexion
 from utils.auth import login_required
+from utils.esquema import columnas_tabla, existe_tabla, primera_columna, tiene_columna
+from utils.indice_radicados import condicion_radicado, radicado_normalizado_disponible
+from utils.turnos import recalcular_turnos, actualizar_turno_expediente, compactar_turnos, turno_entero
+from utils.metricas_cache import invalidar_metricas
+from utils.asignacion_masiva import (
+    CON_ASIGNACION, ESTRATEGIAS, filtro_criterio, seleccionar_expedientes, distribuir,
+    aplicar_asignaciones, limpiar_asignaciones
+)
 
 # Crear un Blueprint
 vistaactualizarexpediente = Blueprint('idvistaactualizarexpediente', __name__, template_folder='templates')
@@ -44,52 +52,17 @@ def obtener_roles_activos():
         logger.error(f"ERROR en obtener_roles_activos: {str(e)}")
         return []
 
-def _detectar_columnas_disponibles(cursor):
-    """Detecta las columnas disponibles en la tabla expediente"""
-    try:
-        cursor.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'expediente'
-        """)
-        columns = [row[0] for row in cursor.fetchall()]
-        logger.info(f"Columnas disponibles en tabla expediente: {columns}")
-        return columns
-    except Exception as e:
-        logger.error(f"Error detectando columnas: {str(e)}")
-        return []
+def _detectar_columnas_disponibles():
+    """Columnas disponibles en la tabla expediente (registro del esquema, ver utils/esquema.py)"""
+    return list(columnas_tabla('expediente'))
 
-def _detectar_columna_tipo(cursor):
+def _detectar_columna_tipo():
     """Retorna el nombre de la columna existente entre 'tipo_solicitud' y 'tipo_tramite', o None"""
-    try:
-        cursor.execute("""
-            SELECT column_name FROM information_schema.columns
-            WHERE table_name = 'expediente' AND column_name IN ('tipo_solicitud', 'tipo_tramite')
-        """)
-        cols = [r[0] for r in cursor.fetchall()]
-        if 'tipo_solicitud' in cols:
-            return 'tipo_solicitud'
-        if 'tipo_tramite' in cols:
-            return 'tipo_tramite'
-        return None
-    except Exception:
-        return None
+    return primera_columna('expediente', ('tipo_solicitud', 'tipo_tramite'))
 
-def _detectar_columna_ubicacion(cursor):
+def _detectar_columna_ubicacion():
     """Retorna el nombre de la columna existente entre 'ubicacion' y 'ubicacion_actual', o None"""
-    try:
-        cursor.execute("""
-            SELECT column_name FROM information_schema.columns
-            WHERE table_name = 'expediente' AND column_name IN ('ubicacion', 'ubicacion_actual')
-        """)
-        cols = [r[0] for r in cursor.fetchall()]
-        if 'ubicacion' in cols:
-            return 'ubicacion'
-        if 'ubicacion_actual' in cols:
-            return 'ubicacion_actual'
-        return None
-    except Exception:
-        return None
+    return primera_columna('expediente', ('ubicacion', 'ubicacion_actual'))
 
 def obtener_siguiente_turno(cursor):
     """Obtiene el siguiente número de turno disponible para expedientes en estado 'Activo Pendiente'"""
@@ -97,10 +70,10 @@ def obtener_siguiente_turno(cursor):
         logger.info("=== INICIO obtener_siguiente_turno ===")
         
         # Obtener el último turno asignado para expedientes en estado 'Activo Pendiente'
-        cursor.execute("""
-            SELECT MAX(turno) 
+        cursor.execute(f"""
+            SELECT MAX({turno_entero()}) 
             FROM expediente 
-            WHERE estado = 'Activo Pendiente' AND turno IS NOT NULL
+            WHERE estado = 'Activo Pendiente'
         """)
         
         resultado = cursor.fetchone()
@@ -135,15 +108,7 @@ def manejar_cambio_estado_turno(cursor, expediente_id, estado_anterior, estado_n
         logger.info(f"Estado nuevo: '{estado_nuevo}'")
         
         # Verificar si la columna turno existe
-        cursor.execute("""
-            SELECT EXISTS (
-                SELECT 1 FROM information_schema.columns 
-                WHERE table_name = 'expediente' AND column_name = 'turno'
-            )
-        """)
-        
-        turno_existe = cursor.fetchone()[0]
-        if not turno_existe:
+        if not tiene_columna('expediente', 'turno'):
             logger.warning("La columna 'turno' no existe en la tabla expediente")
             return
         
@@ -153,16 +118,10 @@ def manejar_cambio_estado_turno(cursor, expediente_id, estado_anterior, estado_n
             
         # Caso 2: Cambio DESDE "Activo Pendiente" a otro estado - Quitar turno
         elif estado_anterior == 'Activo Pendiente' and estado_nuevo != 'Activo Pendiente':
-            cursor.execute("""
-                UPDATE expediente 
-                SET turno = NULL 
-                WHERE id = %s
-            """, (expediente_id,))
+            # Quita el turno y corre una posición los turnos posteriores
+            actualizar_turno_expediente(cursor, expediente_id)
             
             logger.info(f"🗑️ Turno removido del expediente {expediente_id} (cambió de 'Activo Pendiente' a '{estado_nuevo}')")
-            
-            # Recalcular turnos de todos los expedientes 'Activo Pendiente'
-            recalcular_todos_los_turnos(cursor)
         
         # Caso 3: No hay cambio relevante para turno
         else:
@@ -177,8 +136,8 @@ def manejar_cambio_estado_turno(cursor, expediente_id, estado_anterior, estado_n
 def manejar_cambio_fecha_ingreso(cursor, expediente_id, fecha_anterior, fecha_nueva):
     """
     Maneja la actualización de turnos cuando cambia la fecha de ingreso
-    LÓGICA FINAL: Recalcula si el expediente está en 'Activo Pendiente' y tiene fecha de ingreso
-    (ya sea en expediente.fecha_ingreso O en tabla ingresos)
+    Si el expediente está en 'Activo Pendiente' se reubica solo ese expediente
+    en la cola (mantenimiento incremental, ver utils.turnos)
     
     Args:
         cursor: Cursor de la base de datos
@@ -193,7 +152,7 @@ def manejar_cambio_fecha_ingreso(cursor, expediente_id, fecha_anterior, fecha_nu
         logger.info(f"Fecha nueva: {fecha_nueva}")
         
         # Verificar si el expediente está en estado 'Activo Pendiente'
-        cursor.execute("SELECT estado, fecha_ingreso FROM expediente WHERE id = %s", (expediente_id,))
+        cursor.execute("SELECT estado FROM expediente WHERE id = %s", (expediente_id,))
         resultado = cursor.fetchone()
         
         if not resultado:
@@ -201,32 +160,10 @@ def manejar_cambio_fecha_ingreso(cursor, expediente_id, fecha_anterior, fecha_nu
             return
         
         estado_actual = resultado[0]
-        fecha_ingreso_expediente = resultado[1]
         
         if estado_actual == 'Activo Pendiente':
-            # Verificar si tiene fecha de ingreso (en expediente O en tabla ingresos)
-            cursor.execute("""
-                SELECT EXISTS(SELECT 1 FROM ingresos WHERE expediente_id = %s)
-            """, (expediente_id,))
-            
-            tiene_ingresos = cursor.fetchone()[0]
-            
-            logger.info(f"📊 Verificación:")
-            logger.info(f"   - Estado: {estado_actual}")
-            logger.info(f"   - Fecha ingreso en expediente: {fecha_ingreso_expediente}")
-            logger.info(f"   - Tiene registros en tabla ingresos: {tiene_ingresos}")
-            
-            # LÓGICA FINAL: Si tiene fecha_ingreso en expediente O registros en tabla ingresos
-            tiene_fecha_para_turno = fecha_ingreso_expediente is not None or tiene_ingresos
-            
-            logger.info(f"   - Tiene fecha para turno: {tiene_fecha_para_turno}")
-            
-            if tiene_fecha_para_turno:
-                logger.info(f"📅 Expediente cumple criterios para turno - recalculando todos los turnos")
-                # Recalcular todos los turnos porque el orden puede haber cambiado
-                recalcular_todos_los_turnos(cursor)
-            else:
-                logger.info(f"ℹ️ Expediente NO tiene fecha de ingreso (ni en expediente ni en tabla ingresos)")
+            logger.info(f"📅 Expediente en 'Activo Pendiente' - reubicando su turno")
+            actualizar_turno_expediente(cursor, expediente_id)
         else:
             logger.info(f"ℹ️ Expediente no está en 'Activo Pendiente' (estado: {estado_actual}) - no se recalculan turnos")
         
@@ -239,28 +176,14 @@ def manejar_cambio_fecha_ingreso(cursor, expediente_id, fecha_anterior, fecha_nu
 def asignar_turno_por_fecha_ingreso(cursor, expediente_id):
     """
     Asigna turno a un expediente específico basándose en su fecha de ingreso
-    en relación con otros expedientes 'Activo Pendiente'
+    en relación con otros expedientes 'Activo Pendiente'.
+    Solo se corren los turnos posteriores a la posición que le corresponde.
     """
     try:
         logger.info(f"🎫 Asignando turno por fecha de ingreso para expediente {expediente_id}")
         
-        # Obtener la fecha de ingreso del expediente
-        cursor.execute("""
-            SELECT fecha_ingreso 
-            FROM expediente 
-            WHERE id = %s
-        """, (expediente_id,))
-        
-        resultado = cursor.fetchone()
-        if not resultado:
-            logger.error(f"Expediente {expediente_id} no encontrado")
-            return
-        
-        fecha_expediente = resultado[0]
-        logger.info(f"📅 Fecha de ingreso del expediente: {fecha_expediente}")
-        
-        # Recalcular todos los turnos para mantener consistencia
-        recalcular_todos_los_turnos(cursor)
+        resultado = actualizar_turno_expediente(cursor, expediente_id)
+        logger.info(f"📅 Turno asignado: {resultado['turno_nuevo']} (modo {resultado['modo']})")
         
     except Exception as e:
         logger.error(f"Error asignando turno por fecha de ingreso: {str(e)}")
@@ -279,169 +202,29 @@ def recalcular_todos_los_turnos(cursor):
     3. Última actuación (más antigua, sin actuación al final) - Desempate 2
        - Expedientes SIN estados quedan de ÚLTIMOS (NULLS LAST)
     4. ID del expediente - Desempate final
+    
+    El cálculo y la escritura se hacen en una sola sentencia (utils.turnos).
     """
     try:
         logger.info("🔄 RECALCULANDO TODOS LOS TURNOS (LÓGICA COMPLEJA)...")
         logger.info("📋 Criterios: fecha sin salida → antigüedad expediente → última actuación → ID")
         
-        # Paso 1: Limpiar todos los turnos de expedientes 'Activo Pendiente'
-        cursor.execute("""
-            UPDATE expediente 
-            SET turno = NULL 
-            WHERE estado = 'Activo Pendiente'
-        """)
-        
-        limpiados = cursor.rowcount
-        logger.info(f"🧹 Turnos limpiados: {limpiados}")
-        
-        # Paso 2: Obtener TODOS los expedientes 'Activo Pendiente' con lógica compleja
-        # Esta es la MISMA lógica que usa el script actualizar_turnos.py
-        cursor.execute("""
-            WITH expedientes_activos AS (
-                SELECT 
-                    e.id,
-                    e.radicado_completo,
-                    e.fecha_ingreso as fecha_ingreso_expediente
-                FROM expediente e
-                WHERE e.estado = 'Activo Pendiente'
-            ),
-            ingresos_expedientes AS (
-                SELECT 
-                    i.expediente_id,
-                    i.fecha_ingreso
-                FROM ingresos i
-                WHERE i.fecha_ingreso IS NOT NULL
-            ),
-            ingresos_sin_salida AS (
-                -- Identificar qué ingresos NO tienen estado posterior
-                SELECT 
-                    ie.expediente_id,
-                    ie.fecha_ingreso
-                FROM ingresos_expedientes ie
-                WHERE NOT EXISTS (
-                    SELECT 1 FROM estados est 
-                    WHERE est.expediente_id = ie.expediente_id 
-                      AND est.fecha_estado >= ie.fecha_ingreso
-                )
-            ),
-            fecha_ingreso_mas_antigua_sin_salida AS (
-                -- Para cada expediente, obtener la fecha de ingreso MÁS ANTIGUA sin salida
-                SELECT 
-                    expediente_id,
-                    MIN(fecha_ingreso) as fecha_ingreso_sin_salida
-                FROM ingresos_sin_salida
-                GROUP BY expediente_id
-            ),
-            ultima_actuacion_expediente AS (
-                -- Para cada expediente, obtener la fecha de la última actuación
-                SELECT 
-                    expediente_id,
-                    MAX(fecha_estado) as ultima_actuacion
-                FROM estados
-                WHERE fecha_estado IS NOT NULL
-                GROUP BY expediente_id
-            )
-            SELECT 
-                ea.id,
-                ea.radicado_completo,
-                COALESCE(fimass.fecha_ingreso_sin_salida, ea.fecha_ingreso_expediente) as fecha_para_turno,
-                ea.fecha_ingreso_expediente,
-                uae.ultima_actuacion
-            FROM expedientes_activos ea
-            LEFT JOIN fecha_ingreso_mas_antigua_sin_salida fimass ON ea.id = fimass.expediente_id
-            LEFT JOIN ultima_actuacion_expediente uae ON ea.id = uae.expediente_id
-            WHERE COALESCE(fimass.fecha_ingreso_sin_salida, ea.fecha_ingreso_expediente) IS NOT NULL
-            ORDER BY 
-                COALESCE(fimass.fecha_ingreso_sin_salida, ea.fecha_ingreso_expediente) ASC,
-                ea.fecha_ingreso_expediente ASC,
-                uae.ultima_actuacion ASC NULLS LAST,
-                ea.id ASC
-        """)
-        
-        expedientes = cursor.fetchall()
-        logger.info(f"📋 Expedientes que deben tener turno: {len(expedientes)}")
-        logger.info(f"   (Criterio: 'Activo Pendiente' + lógica compleja de ordenamiento)")
-        
-        if not expedientes:
-            logger.info("ℹ️ No hay expedientes que cumplan los criterios para asignar turnos")
-            return
-        
-        # Paso 3: Asignar turnos secuenciales
-        turnos_asignados = 0
-        
-        for turno, (exp_id, radicado, fecha_para_turno, fecha_ing_exp, ultima_act) in enumerate(expedientes, 1):
-            cursor.execute("""
-                UPDATE expediente 
-                SET turno = %s 
-                WHERE id = %s
-            """, (turno, exp_id))
-            
-            if cursor.rowcount == 1:
-                turnos_asignados += 1
-                if turnos_asignados <= 5:  # Log de los primeros 5
-                    fecha_str = fecha_para_turno.strftime('%Y-%m-%d') if fecha_para_turno else 'Sin fecha'
-                    fecha_exp_str = fecha_ing_exp.strftime('%Y-%m-%d') if fecha_ing_exp else 'Sin fecha'
-                    ultima_act_str = ultima_act.strftime('%Y-%m-%d') if ultima_act else 'Sin estados'
-                    logger.info(f"   ✅ Turno {turno}: {radicado}")
-                    logger.info(f"      Fecha para turno: {fecha_str}, Fecha exp: {fecha_exp_str}, Última act: {ultima_act_str}")
-                elif turnos_asignados % 100 == 0:  # Progreso cada 100
-                    logger.info(f"   📈 Procesados {turnos_asignados} expedientes...")
-        
-        logger.info(f"✅ Turnos recalculados: {turnos_asignados}")
-        logger.info(f"   Criterios aplicados:")
-        logger.info(f"   1. Fecha de ingreso sin salida (más antigua)")
-        logger.info(f"   2. Fecha de ingreso del expediente (más antigua)")
-        logger.info(f"   3. Última actuación (más antigua, sin actuación al final)")
-        logger.info(f"   4. ID del expediente")
-        
-        # Verificación rápida
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM expediente 
-            WHERE estado = 'Activo Pendiente' AND turno IS NOT NULL
-        """)
-        
-        verificacion = cursor.fetchone()[0]
-        
-        if verificacion == turnos_asignados:
-            logger.info(f"🎯 Verificación exitosa: {verificacion} turnos asignados correctamente")
-        else:
-            logger.error(f"❌ Error en verificación: esperados {turnos_asignados}, encontrados {verificacion}")
-        
-        # Log de estadísticas adicionales
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM expediente e
-            WHERE e.estado = 'Activo Pendiente'
-              AND e.fecha_ingreso IS NULL
-              AND NOT EXISTS (SELECT 1 FROM ingresos i WHERE i.expediente_id = e.id)
-        """)
-        
-        sin_fechas = cursor.fetchone()[0]
-        
-        # Contar expedientes sin estados (que quedan de últimos)
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM expediente e
-            WHERE e.estado = 'Activo Pendiente'
-              AND e.turno IS NOT NULL
-              AND NOT EXISTS (SELECT 1 FROM estados est WHERE est.expediente_id = e.id)
-        """)
-        
-        sin_estados = cursor.fetchone()[0]
+        resultado = recalcular_turnos(cursor)
         
         logger.info(f"📊 Estadísticas de asignación:")
-        logger.info(f"   - Expedientes con turno asignado: {turnos_asignados}")
-        logger.info(f"   - Expedientes sin estados (quedan de últimos): {sin_estados}")
-        logger.info(f"   - Expedientes 'Activo Pendiente' sin fecha (excluidos): {sin_fechas}")
+        logger.info(f"   - Expedientes con turno asignado: {resultado['con_turno']}")
+        logger.info(f"   - Turnos modificados: {resultado['actualizados']}")
+        logger.info(f"   - Expedientes 'Activo Pendiente' sin fecha (excluidos): {resultado['sin_fecha']}")
+        
+        return resultado
         
     except Exception as e:
         logger.error(f"Error recalculando turnos: {str(e)}")
         raise e
 
-def _construir_select_expediente(cursor, alias=''):
+def _construir_select_expediente(alias=''):
     """Construye la parte SELECT para consultas de expediente basado en columnas disponibles"""
-    available_columns = _detectar_columnas_disponibles(cursor)
+    available_columns = _detectar_columnas_disponibles()
     
     # Si no se proporciona alias, no usar prefijo
     prefix = f"{alias}." if alias else ""
@@ -465,7 +248,7 @@ def _construir_select_expediente(cursor, alias=''):
         base_select.append("NULL AS ubicacion")
     
     # Tipo de solicitud
-    tipo_col = _detectar_columna_tipo(cursor)
+    tipo_col = _detectar_columna_tipo()
     if tipo_col:
         base_select.append(f"{prefix}{tipo_col} AS tipo_solicitud")
     else:
@@ -481,12 +264,12 @@ def _construir_select_expediente(cursor, alias=''):
     
     return ", ".join(base_select)
 
-def _fragmento_tipo_select(cursor, alias='e'):
+def _fragmento_tipo_select(alias='e'):
     """Devuelve (tipo_expr, tipo_select) donde tipo_expr es la expresión para GROUP/WHERE y tipo_select es la parte SELECT con alias.
     Ejemplos: ('e.tipo_solicitud', 'e.tipo_solicitud AS tipo_solicitud') o
     ('COALESCE(e.tipo_solicitud, e.tipo_tramite)', 'COALESCE(e.tipo_solicitud, e.tipo_tramite) AS tipo_solicitud')
     Si no existe ninguna columna devuelve ("''", "'' AS tipo_solicitud")."""
-    col = _detectar_columna_tipo(cursor)
+    col = _detectar_columna_tipo()
     if col == 'tipo_solicitud':
         expr = f"{alias}.tipo_solicitud"
         return expr, f"{expr} AS tipo_solicitud"
@@ -513,7 +296,7 @@ def buscar_expediente_por_radicado(radicado):
         logger.info(f"Es radicado completo: {es_radicado_completo}")
         
         # Construir SELECT dinámico
-        select_clause = _construir_select_expediente(cursor)
+        select_clause = _construir_select_expediente()
         logger.info(f"SELECT construido: {select_clause}")
         
         if es_radicado_completo:
@@ -536,17 +319,30 @@ def buscar_expediente_por_radicado(radicado):
             """
             params = (radicado_limpio,)
         
-        logger.info(f"Query: {query}")
-        logger.info(f"Parámetros: {params}")
+        # Radicado completo: primero por el índice del radicado normalizado
+        result = None
+        condicion, parametros = condicion_radicado(radicado_limpio)
+        if es_radicado_completo and condicion and radicado_normalizado_disponible():
+            cursor.execute(f"""
+                SELECT {select_clause}
+                FROM expediente 
+                WHERE {condicion}
+                LIMIT 1
+            """, parametros)
+            result = cursor.fetchone()
         
-        cursor.execute(query, params)
-        result = cursor.fetchone()
+        if result is None:
+            logger.debug(f"Query: {query}")
+            logger.info(f"Parámetros: {params}")
+            
+            cursor.execute(query, params)
+            result = cursor.fetchone()
         
         if result:
             logger.info(f"Expediente encontrado: {result}")
             
             # Mapear resultado dinámicamente
-            available_columns = _detectar_columnas_disponibles(cursor)
+            available_columns = _detectar_columnas_disponibles()
             
             expediente = {
                 'id': result[0],
@@ -570,12 +366,7 @@ def buscar_expediente_por_radicado(radicado):
             logger.info(f"Expediente mapeado: {expediente}")
             
             # Verificar si existen tablas relacionadas
-            cursor.execute("""
-                SELECT table_name 
-                FROM information_schema.tables 
-                WHERE table_name IN ('ingresos', 'estados', 'actuaciones')
-            """)
-            tablas_relacionadas = [row[0] for row in cursor.fetchall()]
+            tablas_relacionadas = [t for t in ('ingresos', 'estados', 'actuaciones') if existe_tabla(t)]
             logger.info(f"Tablas relacionadas encontradas: {tablas_relacionadas}")
             
             # Obtener ingresos si la tabla existe
@@ -645,7 +436,7 @@ def buscar_expediente_por_id(expediente_id):
         cursor = conn.cursor()
         
         # Construir SELECT dinámico
-        select_clause = _construir_select_expediente(cursor)
+        select_clause = _construir_select_expediente()
         
         query = f"""
             SELECT {select_clause}
@@ -653,7 +444,7 @@ def buscar_expediente_por_id(expediente_id):
             WHERE id = %s
         """
         
-        logger.info(f"Query: {query}")
+        logger.debug(f"Query: {query}")
         cursor.execute(query, (expediente_id,))
         
         result = cursor.fetchone()
@@ -681,12 +472,7 @@ def buscar_expediente_por_id(expediente_id):
             }
             
             # Verificar si existen tablas relacionadas
-            cursor.execute("""
-                SELECT table_name 
-                FROM information_schema.tables 
-                WHERE table_name IN ('ingresos', 'estados', 'actuaciones')
-            """)
-            tablas_relacionadas = [row[0] for row in cursor.fetchall()]
+            tablas_relacionadas = [t for t in ('ingresos', 'estados', 'actuaciones') if existe_tabla(t)]
             
             # Obtener ingresos si la tabla existe
             if 'ingresos' in tablas_relacionadas:
@@ -870,7 +656,7 @@ def buscar_expediente_para_actualizar():
         logger.info(f"Es radicado completo: {es_radicado_completo}")
         
         # Construir SELECT dinámico
-        select_clause = _construir_select_expediente(cursor)
+        select_clause = _construir_select_expediente()
         
         if es_radicado_completo:
             # Búsqueda mejorada para radicado completo
@@ -891,11 +677,24 @@ def buscar_expediente_para_actualizar():
             """
             params = (radicado_limpio,)
         
-        logger.info(f"Query: {query}")
-        logger.info(f"Parámetros: {params}")
+        # Radicado completo: primero por el índice del radicado normalizado
+        result = None
+        condicion, parametros = condicion_radicado(radicado_limpio)
+        if es_radicado_completo and condicion and radicado_normalizado_disponible():
+            cursor.execute(f"""
+                SELECT {select_clause}
+                FROM expediente 
+                WHERE {condicion}
+                LIMIT 1
+            """, parametros)
+            result = cursor.fetchone()
         
-        cursor.execute(query, params)
-        result = cursor.fetchone()
+        if result is None:
+            logger.debug(f"Query: {query}")
+            logger.info(f"Parámetros: {params}")
+            
+            cursor.execute(query, params)
+            result = cursor.fetchone()
         
         if result:
             logger.info("Expediente encontrado")
@@ -920,12 +719,7 @@ def buscar_expediente_para_actualizar():
             }
             
             # Verificar si existen tablas relacionadas
-            cursor.execute("""
-                SELECT table_name 
-                FROM information_schema.tables 
-                WHERE table_name IN ('ingresos', 'estados', 'actuaciones')
-            """)
-            tablas_relacionadas = [row[0] for row in cursor.fetchall()]
+            tablas_relacionadas = [t for t in ('ingresos', 'estados', 'actuaciones') if existe_tabla(t)]
             
             # Obtener ingresos si la tabla existe
             if 'ingresos' in tablas_relacionadas:
@@ -1031,7 +825,7 @@ def actualizar_expediente():
         logger.info(f"Fecha anterior del expediente: '{fecha_anterior}'")
         
         # Detectar columnas disponibles
-        available_columns = _detectar_columnas_disponibles(cursor)
+        available_columns = _detectar_columnas_disponibles()
         
         # Procesar fecha de ingreso si se proporciona
         fecha_ingreso_obj = None
@@ -1072,12 +866,12 @@ def actualizar_expediente():
         optional_fields = {}
         
         # Ubicación
-        ubicacion_col = _detectar_columna_ubicacion(cursor)
+        ubicacion_col = _detectar_columna_ubicacion()
         if ubicacion_col and ubicacion_actual:
             optional_fields[ubicacion_col] = ubicacion_actual
         
         # Tipo de solicitud
-        tipo_col = _detectar_columna_tipo(cursor)
+        tipo_col = _detectar_columna_tipo()
         if tipo_col and tipo_solicitud:
             optional_fields[tipo_col] = tipo_solicitud
         
@@ -1103,7 +897,7 @@ def actualizar_expediente():
                 WHERE id = %s
             """
             
-            logger.info(f"Query UPDATE: {query}")
+            logger.debug(f"Query UPDATE: {query}")
             logger.info(f"Valores: {update_values}")
             
             cursor.execute(query, update_values)
@@ -1120,6 +914,7 @@ def actualizar_expediente():
                 logger.info("ℹ️ No hay cambios relevantes para turno (estado o fecha de ingreso)")
             
             conn.commit()
+            invalidar_metricas()
             logger.info("Expediente actualizado correctamente")
             flash('Expediente actualizado exitosamente', 'success')
         else:
@@ -1179,14 +974,15 @@ def agregar_ingreso():
             VALUES (%s, %s, %s, %s)
         """, (expediente_id, fecha_ingreso_obj, observaciones_ingreso, motivo_ingreso))
         
-        # Si el expediente está en 'Activo Pendiente', recalcular turnos
+        # Si el expediente está en 'Activo Pendiente', reubicar su turno
         if estado_actual == 'Activo Pendiente':
-            logger.info(f"🔄 Expediente en 'Activo Pendiente' - recalculando turnos después de agregar ingreso")
-            recalcular_todos_los_turnos(cursor)
+            logger.info(f"🔄 Expediente en 'Activo Pendiente' - reubicando su turno después de agregar ingreso")
+            actualizar_turno_expediente(cursor, expediente_id)
         else:
             logger.info(f"ℹ️ Expediente no está en 'Activo Pendiente' (estado: {estado_actual}) - no se recalculan turnos")
         
         conn.commit()
+        invalidar_metricas()
         cursor.close()
         conn.close()
         
@@ -1254,6 +1050,7 @@ def agregar_estado():
             logger.info("ℹ️ No hay cambio de estado en agregar_estado, no se modifica turno")
         
         conn.commit()
+        invalidar_metricas()
         cursor.close()
         conn.close()
         
@@ -1297,6 +1094,7 @@ def eliminar_ingreso():
         """, (ingreso_id, expediente_id))
         
         conn.commit()
+        invalidar_metricas()
         cursor.close()
         conn.close()
         
@@ -1340,6 +1138,7 @@ def eliminar_estado():
         """, (estado_id, expediente_id))
         
         conn.commit()
+        invalidar_metricas()
         cursor.close()
         conn.close()
         
@@ -1371,6 +1170,7 @@ def quitar_responsable():
         """, (expediente_id,))
         
         conn.commit()
+        invalidar_metricas()
         cursor.close()
         conn.close()
         
@@ -1421,6 +1221,7 @@ def asignar_persona_especifica():
         
         if cursor.rowcount > 0:
             conn.commit()
+            invalidar_metricas()
             logger.info(f"✓ UPDATE ejecutado: {cursor.rowcount} fila(s) afectada(s)")
             
             # Verificar que se guardó correctamente
@@ -1463,6 +1264,7 @@ def asignacion_masiva():
         valor_criterio = request.form.get('valor_criterio', '').strip()
         rol_asignar = request.form.get('rol_masivo', '').strip()
         cantidad_limite = request.form.get('cantidad_limite', '').strip()
+        estrategia = request.form.get('estrategia_masiva', '').strip() or 'circular'
         
         # Logging para debug
         logger.info("=== INICIO asignacion_masiva ===")
@@ -1470,6 +1272,7 @@ def asignacion_masiva():
         logger.info(f"Valor criterio recibido: '{valor_criterio}'")
         logger.info(f"Rol a asignar: '{rol_asignar}'")
         logger.info(f"Cantidad límite: '{cantidad_limite}'")
+        logger.info(f"Estrategia: '{estrategia}'")
         logger.info(f"Todos los datos del formulario: {dict(request.form)}")
         
         if not criterio or not rol_asignar:
@@ -1477,6 +1280,10 @@ def asignacion_masiva():
             flash('Debe seleccionar un criterio y un rol para la asignación masiva', 'error')
             return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
         
+        if estrategia not in ESTRATEGIAS:
+            flash(f'Estrategia de distribución no reconocida: {estrategia}', 'error')
+            return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
+        
         # Convertir cantidad_limite a entero si se proporciona
         limite = None
         if cantidad_limite and cantidad_limite.isdigit():
@@ -1492,7 +1299,7 @@ def asignacion_masiva():
         # Manejar asignación aleatoria
         if rol_asignar == 'ALEATORIO':
             logger.info("Ejecutando asignación aleatoria")
-            return asignacion_aleatoria_masiva(criterio, valor_criterio, cursor, conn, limite)
+            return asignacion_aleatoria_masiva(criterio, valor_criterio, cursor, conn, limite, estrategia)
         
         # Manejar limpieza de responsables
         if rol_asignar == 'LIMPIAR':
@@ -1503,7 +1310,7 @@ def asignacion_masiva():
         # Ahora distribuye entre usuarios de ese rol
         if rol_asignar in ['ESCRIBIENTE', 'SUSTANCIADOR']:
             logger.info(f"Ejecutando distribución por rol específico: {rol_asignar}")
-            return asignacion_por_rol_especifico(criterio, valor_criterio, rol_asignar, cursor, conn, limite)
+            return asignacion_por_rol_especifico(criterio, valor_criterio, rol_asignar, cursor, conn, limite, estrategia)
         
         # Si llegamos aquí, es un rol no reconocido
         flash(f'Rol no reconocido: {rol_asignar}', 'error')
@@ -1513,114 +1320,53 @@ def asignacion_masiva():
         flash(f'Error en asignación masiva: {str(e)}', 'error')
         return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
 
+def _filtro_criterio_masivo(criterio, valor_criterio, cursor):
+    """
+    Valida el criterio de una operación masiva y devuelve su filtro.
+
+    Returns:
+        tuple: (filtro, params) o (None, (mensaje, categoria)) si no es válido
+    """
+    if criterio in ('estado', 'tipo_solicitud', 'juzgado_origen') and not valor_criterio:
+        nombres = {'estado': 'un estado', 'tipo_solicitud': 'un tipo de trámite', 'juzgado_origen': 'un juzgado de origen'}
+        return None, (f'Debe especificar {nombres[criterio]} para el criterio seleccionado', 'error')
+
+    tipo_col = None
+    if criterio == 'tipo_solicitud':
+        tipo_col = _detectar_columna_tipo()
+        if not tipo_col:
+            return None, ('No existe columna `tipo_solicitud` ni `tipo_tramite` en la BD', 'warning')
+
+    return filtro_criterio(criterio, valor_criterio, tipo_col)
+
 def limpiar_responsables_masivo(criterio, valor_criterio, cursor, conn, limite=None):
     """Limpia responsables y asignaciones específicas de manera masiva según criterios"""
     try:
         logger.info("=== INICIO limpiar_responsables_masivo ===")
         logger.info(f"Criterio: '{criterio}', Valor: '{valor_criterio}', Límite: {limite}")
-        
-        expedientes_actualizados = 0
-        
-        if criterio == 'estado':
-            if not valor_criterio:
-                flash('Debe especificar un estado para el criterio seleccionado', 'error')
-                return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-            
-            # Contar expedientes antes de limpiar
-            cursor.execute("""
-                SELECT COUNT(*) FROM expediente 
-                WHERE estado = %s AND (responsable IS NOT NULL OR usuario_asignado_id IS NOT NULL)
-            """, (valor_criterio,))
-            count_antes = cursor.fetchone()[0]
-            logger.info(f"📊 Expedientes con estado '{valor_criterio}' y asignaciones: {count_antes}")
-            
-            query = """
-                UPDATE expediente 
-                SET responsable = NULL, usuario_asignado_id = NULL
-                WHERE estado = %s AND (responsable IS NOT NULL OR usuario_asignado_id IS NOT NULL)
-            """
-            params = (valor_criterio,)
-            
-            # Agregar límite si se especifica
-            if limite:
-                query += " AND id IN (SELECT id FROM expediente WHERE estado = %s AND (responsable IS NOT NULL OR usuario_asignado_id IS NOT NULL) ORDER BY fecha_ingreso ASC LIMIT %s)"
-                params = (valor_criterio, valor_criterio, limite)
-                logger.info(f"🔢 Aplicando límite de {limite} expedientes")
-            
-            logger.info(f"🔄 Ejecutando limpieza...")
-            cursor.execute(query, params)
-            expedientes_actualizados = cursor.rowcount
-            logger.info(f"✅ Expedientes actualizados: {expedientes_actualizados}")
-            
-        elif criterio == 'sin_responsable':
+
+        if criterio == 'sin_responsable':
             # En el sistema híbrido, esto limpia expedientes que ya no tienen ninguna asignación
             flash('Los expedientes sin responsable ni usuario asignado ya no tienen asignaciones', 'warning')
             return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-            
-        elif criterio == 'tipo_solicitud':
-            if not valor_criterio:
-                flash('Debe especificar un tipo de trámite para el criterio seleccionado', 'error')
-                return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-            tipo_col = _detectar_columna_tipo(cursor)
-            if not tipo_col:
-                flash('No existe columna `tipo_solicitud` ni `tipo_tramite` en la BD', 'error')
-                return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-            
-            query = f"""
-                UPDATE expediente 
-                SET responsable = NULL, usuario_asignado_id = NULL
-                WHERE {tipo_col} ILIKE %s AND (responsable IS NOT NULL OR usuario_asignado_id IS NOT NULL)
-            """
-            params = (f'%{valor_criterio}%',)
-            
-            # Agregar límite si se especifica
-            if limite:
-                query += f" AND id IN (SELECT id FROM expediente WHERE {tipo_col} ILIKE %s AND (responsable IS NOT NULL OR usuario_asignado_id IS NOT NULL) ORDER BY fecha_ingreso ASC LIMIT %s)"
-                params = (f'%{valor_criterio}%', f'%{valor_criterio}%', limite)
-            
-            cursor.execute(query, params)
-            expedientes_actualizados = cursor.rowcount
-            
-        elif criterio == 'juzgado_origen':
-            if not valor_criterio:
-                flash('Debe especificar un juzgado de origen para el criterio seleccionado', 'error')
-                return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-            
-            query = """
-                UPDATE expediente 
-                SET responsable = NULL, usuario_asignado_id = NULL
-                WHERE juzgado_origen ILIKE %s AND (responsable IS NOT NULL OR usuario_asignado_id IS NOT NULL)
-            """
-            params = (f'%{valor_criterio}%',)
-            
-            # Agregar límite si se especifica
-            if limite:
-                query += " AND id IN (SELECT id FROM expediente WHERE juzgado_origen ILIKE %s AND (responsable IS NOT NULL OR usuario_asignado_id IS NOT NULL) ORDER BY fecha_ingreso ASC LIMIT %s)"
-                params = (f'%{valor_criterio}%', f'%{valor_criterio}%', limite)
-            
-            cursor.execute(query, params)
-            expedientes_actualizados = cursor.rowcount
-            
-        elif criterio == 'todos':
-            query = """
-                UPDATE expediente 
-                SET responsable = NULL, usuario_asignado_id = NULL
-                WHERE (responsable IS NOT NULL OR usuario_asignado_id IS NOT NULL)
-            """
-            params = ()
-            
-            # Agregar límite si se especifica
-            if limite:
-                query += " AND id IN (SELECT id FROM expediente WHERE (responsable IS NOT NULL OR usuario_asignado_id IS NOT NULL) ORDER BY fecha_ingreso ASC LIMIT %s)"
-                params = (limite,)
-            
-            cursor.execute(query, params)
-            expedientes_actualizados = cursor.rowcount
-        
+
+        filtro, params = _filtro_criterio_masivo(criterio, valor_criterio, cursor)
+        if filtro is None:
+            flash(*params)
+            return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
+
+        # Solo expedientes que tienen alguna asignación, los más antiguos primero
+        expedientes_ids = seleccionar_expedientes(cursor, f"{filtro} AND {CON_ASIGNACION}", params, limite)
+        logger.info(f"📊 Expedientes con asignaciones que cumplen el criterio: {len(expedientes_ids)}")
+
+        expedientes_actualizados = limpiar_asignaciones(cursor, expedientes_ids)
+        logger.info(f"✅ Expedientes actualizados: {expedientes_actualizados}")
+
         conn.commit()
+        invalidar_metricas()
         cursor.close()
         conn.close()
-        
+
         if expedientes_actualizados > 0:
             mensaje = f'Limpieza masiva exitosa: Se removieron las asignaciones (responsable y usuario específico) de {expedientes_actualizados} expediente(s)'
             if limite:
@@ -1628,95 +1374,34 @@ def limpiar_responsables_masivo(criterio, valor_criterio, cursor, conn, limite=N
             flash(mensaje, 'success')
         else:
             flash('No se encontraron expedientes con asignaciones que cumplan con el criterio especificado', 'warning')
-        
+
         return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-        
+
     except Exception as e:
         flash(f'Error en limpieza masiva: {str(e)}', 'error')
         return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
 
-def asignacion_aleatoria_masiva(criterio, valor_criterio, cursor, conn, limite=None):
+def asignacion_aleatoria_masiva(criterio, valor_criterio, cursor, conn, limite=None, estrategia='circular'):
     """Distribuye expedientes aleatoriamente entre usuarios específicos de cada rol"""
     import random
-    
+
     try:
         logger.info("=== INICIO asignacion_aleatoria_masiva (distribución por usuarios) ===")
-        
+
         # Obtener los expedientes que cumplen el criterio
-        expedientes_ids = []
-        
-        if criterio == 'estado':
-            if not valor_criterio:
-                flash('Debe especificar un estado para el criterio seleccionado', 'error')
-                return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-            
-            query = "SELECT id FROM expediente WHERE estado = %s ORDER BY fecha_ingreso ASC"
-            params = (valor_criterio,)
-            if limite:
-                query += " LIMIT %s"
-                params = (valor_criterio, limite)
-            
-            cursor.execute(query, params)
-            expedientes_ids = [row[0] for row in cursor.fetchall()]
-            
-        elif criterio == 'sin_responsable':
-            query = "SELECT id FROM expediente WHERE responsable IS NULL OR responsable = '' ORDER BY fecha_ingreso ASC"
-            params = ()
-            if limite:
-                query += " LIMIT %s"
-                params = (limite,)
-            
-            cursor.execute(query, params)
-            expedientes_ids = [row[0] for row in cursor.fetchall()]
-            
-        elif criterio == 'tipo_solicitud':
-            if not valor_criterio:
-                flash('Debe especificar un tipo de trámite para el criterio seleccionado', 'error')
-                return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-            tipo_col = _detectar_columna_tipo(cursor)
-            if not tipo_col:
-                flash('No existe columna `tipo_solicitud` ni `tipo_tramite` en la BD', 'warning')
-                return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-            
-            query = f"SELECT id FROM expediente WHERE {tipo_col} ILIKE %s ORDER BY fecha_ingreso ASC"
-            params = (f'%{valor_criterio}%',)
-            if limite:
-                query += " LIMIT %s"
-                params = (f'%{valor_criterio}%', limite)
-            
-            cursor.execute(query, params)
-            expedientes_ids = [row[0] for row in cursor.fetchall()]
-            
-        elif criterio == 'juzgado_origen':
-            if not valor_criterio:
-                flash('Debe especificar un juzgado de origen para el criterio seleccionado', 'error')
-                return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-            
-            query = "SELECT id FROM expediente WHERE juzgado_origen ILIKE %s ORDER BY fecha_ingreso ASC"
-            params = (f'%{valor_criterio}%',)
-            if limite:
-                query += " LIMIT %s"
-                params = (f'%{valor_criterio}%', limite)
-            
-            cursor.execute(query, params)
-            expedientes_ids = [row[0] for row in cursor.fetchall()]
-            
-        elif criterio == 'todos':
-            query = "SELECT id FROM expediente ORDER BY fecha_ingreso ASC"
-            params = ()
-            if limite:
-                query += " LIMIT %s"
-                params = (limite,)
-            
-            cursor.execute(query, params)
-            expedientes_ids = [row[0] for row in cursor.fetchall()]
-        
+        filtro, params = _filtro_criterio_masivo(criterio, valor_criterio, cursor)
+        if filtro is None:
+            flash(*params)
+            return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
+
+        expedientes_ids = seleccionar_expedientes(cursor, filtro, params, limite)
+
         if not expedientes_ids:
             flash('No se encontraron expedientes que cumplan con el criterio especificado', 'warning')
             return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-        
+
         logger.info(f"Expedientes encontrados: {len(expedientes_ids)}")
-        
+
         # Obtener usuarios activos por rol (solo usuarios con rol asignado)
         cursor.execute("""
             SELECT u.id, u.nombre, r.nombre_rol
@@ -1725,146 +1410,70 @@ def asignacion_aleatoria_masiva(criterio, valor_criterio, cursor, conn, limite=N
             WHERE u.activo = TRUE AND r.nombre_rol IS NOT NULL
             ORDER BY r.nombre_rol, u.nombre
         """)
-        usuarios_activos = cursor.fetchall()
-        
-        if not usuarios_activos:
-            flash('No hay usuarios activos con roles asignados', 'error')
-            return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-        
-        logger.info(f"👥 Usuarios activos con rol encontrados: {len(usuarios_activos)}")
-        for user_id, nombre, rol in usuarios_activos:
-            logger.info(f"   - {nombre} (ID: {user_id}, Rol: {rol})")
-        
-        # Agrupar usuarios por rol
-        usuarios_por_rol = {}
-        for user_id, nombre, rol in usuarios_activos:
-            if rol not in usuarios_por_rol:
-                usuarios_por_rol[rol] = []
-            usuarios_por_rol[rol].append({
-                'id': user_id,
-                'nombre': nombre,
-                'rol': rol
-            })
-        
-        logger.info(f"Usuarios por rol: {[(rol, len(users)) for rol, users in usuarios_por_rol.items()]}")
-        
-        # Crear lista de todos los usuarios disponibles para distribución aleatoria
-        todos_usuarios = []
-        for rol, usuarios in usuarios_por_rol.items():
-            todos_usuarios.extend(usuarios)
-        
+        todos_usuarios = cursor.fetchall()
+
         if not todos_usuarios:
-            flash('No hay usuarios disponibles para asignación', 'error')
+            flash('No hay usuarios activos con roles asignados', 'error')
             return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-        
-        # Mezclar la lista de usuarios para distribución aleatoria
+
+        logger.info(f"👥 Usuarios activos con rol encontrados: {len(todos_usuarios)}")
+
+        # Mezclar la lista de usuarios: define el orden circular, o el desempate
+        # entre usuarios con la misma carga
         random.shuffle(todos_usuarios)
-        
-        # Distribuir expedientes entre usuarios
-        contador_por_usuario = {}
-        total_usuarios = len(todos_usuarios)
-        
+
         logger.info(f"🔄 INICIANDO DISTRIBUCIÓN:")
         logger.info(f"   - Total expedientes a distribuir: {len(expedientes_ids)}")
-        logger.info(f"   - Total usuarios disponibles: {total_usuarios}")
-        logger.info(f"   - Usuarios disponibles: {[u['nombre'] + ' (' + u['rol'] + ')' for u in todos_usuarios]}")
-        
-        for i, expediente_id in enumerate(expedientes_ids):
-            # Seleccionar usuario usando distribución circular para equidad
-            usuario_seleccionado = todos_usuarios[i % total_usuarios]
-            user_id = usuario_seleccionado['id']
-            nombre = usuario_seleccionado['nombre']
-            rol = usuario_seleccionado['rol']
-            
-            logger.info(f"📋 Expediente {i+1}/{len(expedientes_ids)} (ID: {expediente_id}):")
-            logger.info(f"   - Asignando a: {nombre} (ID: {user_id}, Rol: {rol})")
-            
-            # Verificar estado actual del expediente antes de actualizar
-            cursor.execute("SELECT responsable, usuario_asignado_id FROM expediente WHERE id = %s", (expediente_id,))
-            estado_anterior = cursor.fetchone()
-            logger.info(f"   - Estado anterior: responsable='{estado_anterior[0]}', usuario_asignado_id={estado_anterior[1]}")
-            
-            # Actualizar expediente con asignación específica
-            cursor.execute("""
-                UPDATE expediente 
-                SET usuario_asignado_id = %s, responsable = %s
-                WHERE id = %s
-            """, (user_id, rol, expediente_id))
-            
-            # Verificar que la actualización fue exitosa
-            if cursor.rowcount == 1:
-                logger.info(f"   ✅ Actualización exitosa")
-                
-                # Verificar estado después de actualizar
-                cursor.execute("SELECT responsable, usuario_asignado_id FROM expediente WHERE id = %s", (expediente_id,))
-                estado_posterior = cursor.fetchone()
-                logger.info(f"   - Estado posterior: responsable='{estado_posterior[0]}', usuario_asignado_id={estado_posterior[1]}")
-            else:
-                logger.error(f"   ❌ Error: No se actualizó ningún registro (rowcount: {cursor.rowcount})")
-            
-            # Contar asignaciones por usuario
-            if nombre not in contador_por_usuario:
-                contador_por_usuario[nombre] = {'count': 0, 'rol': rol}
-            contador_por_usuario[nombre]['count'] += 1
-        
-        logger.info(f"💾 FINALIZANDO TRANSACCIÓN:")
-        logger.info(f"   - Realizando commit de {len(expedientes_ids)} actualizaciones")
-        
+        logger.info(f"   - Usuarios disponibles: {[f'{nombre} ({rol})' for _, nombre, rol in todos_usuarios]}")
+
+        asignaciones = distribuir(cursor, expedientes_ids, [(user_id, rol) for user_id, _, rol in todos_usuarios], estrategia)
+        conteos = aplicar_asignaciones(cursor, *asignaciones)
+
         conn.commit()
-        
-        logger.info(f"   ✅ Commit exitoso")
-        
-        # Verificar algunas asignaciones después del commit
-        logger.info(f"🔍 VERIFICACIÓN POST-COMMIT (muestra de 3 expedientes):")
-        for i, expediente_id in enumerate(expedientes_ids[:3]):
-            cursor.execute("""
-                SELECT id, responsable, usuario_asignado_id 
-                FROM expediente 
-                WHERE id = %s
-            """, (expediente_id,))
-            verificacion = cursor.fetchone()
-            if verificacion:
-                logger.info(f"   - Expediente {verificacion[0]}: responsable='{verificacion[1]}', usuario_asignado_id={verificacion[2]}")
-            else:
-                logger.error(f"   - ❌ No se encontró expediente {expediente_id} después del commit")
-        
+        invalidar_metricas()
         cursor.close()
         conn.close()
-        
+
+        # Conteo por usuario en el orden de la distribución
+        contador_por_usuario = {}
+        for user_id, nombre, rol in todos_usuarios:
+            if conteos.get(user_id):
+                contador_por_usuario[nombre] = {'count': conteos[user_id], 'rol': rol}
+
         # Crear mensaje de resultado
-        total_asignados = len(expedientes_ids)
+        total_asignados = sum(conteos.values())
         mensaje = f'Distribución aleatoria exitosa: {total_asignados} expediente(s) distribuidos entre {len(contador_por_usuario)} usuarios'
-        
+        if estrategia == 'menor_carga':
+            mensaje += ' equilibrando la carga actual'
+
         # Agregar detalles de distribución
         detalles = []
         for nombre, info in contador_por_usuario.items():
             detalles.append(f"{nombre} ({info['rol']}): {info['count']}")
-        
+
         if len(detalles) <= 5:  # Si son pocos usuarios, mostrar todos
             mensaje += f". Distribución: {', '.join(detalles)}"
         else:  # Si son muchos, mostrar resumen
             mensaje += f". Ejemplo: {', '.join(detalles[:3])}, ..."
-        
+
         if limite:
             mensaje += f' (limitado a {limite} expedientes)'
-        
+
         flash(mensaje, 'success')
         logger.info(f"Distribución completada: {contador_por_usuario}")
-        
+
         return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-        
+
     except Exception as e:
         logger.error(f"Error en asignacion_aleatoria_masiva: {str(e)}")
         flash(f'Error en distribución aleatoria: {str(e)}', 'error')
         return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
 
-def asignacion_por_rol_especifico(criterio, valor_criterio, rol_asignar, cursor, conn, limite=None):
+def asignacion_por_rol_especifico(criterio, valor_criterio, rol_asignar, cursor, conn, limite=None, estrategia='circular'):
     """Distribuye expedientes entre usuarios específicos de un rol determinado"""
-    import random
-    
     try:
         logger.info(f"=== INICIO asignacion_por_rol_especifico - Rol: {rol_asignar} ===")
-        
+
         # Obtener usuarios activos del rol específico
         cursor.execute("""
             SELECT u.id, u.nombre
@@ -1873,182 +1482,72 @@ def asignacion_por_rol_especifico(criterio, valor_criterio, rol_asignar, cursor,
             WHERE r.nombre_rol = %s AND u.activo = TRUE
             ORDER BY u.nombre
         """, (rol_asignar,))
-        
+
         usuarios_rol = cursor.fetchall()
-        
+
         if not usuarios_rol:
             flash(f'No hay usuarios activos con el rol {rol_asignar}', 'error')
             return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-        
+
         logger.info(f"Usuarios encontrados para {rol_asignar}: {len(usuarios_rol)}")
-        for user_id, nombre in usuarios_rol:
-            logger.info(f"  - {nombre} (ID: {user_id})")
-        
+
         # Obtener expedientes que cumplen el criterio
-        expedientes_ids = []
-        
-        if criterio == 'estado':
-            if not valor_criterio:
-                flash('Debe especificar un estado para el criterio seleccionado', 'error')
-                return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-            
-            query = "SELECT id FROM expediente WHERE estado = %s ORDER BY fecha_ingreso ASC"
-            params = (valor_criterio,)
-            if limite:
-                query += " LIMIT %s"
-                params = (valor_criterio, limite)
-            
-            cursor.execute(query, params)
-            expedientes_ids = [row[0] for row in cursor.fetchall()]
-            
-        elif criterio == 'sin_responsable':
-            query = "SELECT id FROM expediente WHERE responsable IS NULL OR responsable = '' ORDER BY fecha_ingreso ASC"
-            params = ()
-            if limite:
-                query += " LIMIT %s"
-                params = (limite,)
-            
-            cursor.execute(query, params)
-            expedientes_ids = [row[0] for row in cursor.fetchall()]
-            
-        elif criterio == 'tipo_solicitud':
-            if not valor_criterio:
-                flash('Debe especificar un tipo de trámite para el criterio seleccionado', 'error')
-                return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-            tipo_col = _detectar_columna_tipo(cursor)
-            if not tipo_col:
-                flash('No existe columna `tipo_solicitud` ni `tipo_tramite` en la BD', 'warning')
-                return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-            
-            query = f"SELECT id FROM expediente WHERE {tipo_col} ILIKE %s ORDER BY fecha_ingreso ASC"
-            params = (f'%{valor_criterio}%',)
-            if limite:
-                query += " LIMIT %s"
-                params = (f'%{valor_criterio}%', limite)
-            
-            cursor.execute(query, params)
-            expedientes_ids = [row[0] for row in cursor.fetchall()]
-            
-        elif criterio == 'juzgado_origen':
-            if not valor_criterio:
-                flash('Debe especificar un juzgado de origen para el criterio seleccionado', 'error')
-                return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-            
-            query = "SELECT id FROM expediente WHERE juzgado_origen ILIKE %s ORDER BY fecha_ingreso ASC"
-            params = (f'%{valor_criterio}%',)
-            if limite:
-                query += " LIMIT %s"
-                params = (f'%{valor_criterio}%', limite)
-            
-            cursor.execute(query, params)
-            expedientes_ids = [row[0] for row in cursor.fetchall()]
-            
-        elif criterio == 'todos':
-            query = "SELECT id FROM expediente ORDER BY fecha_ingreso ASC"
-            params = ()
-            if limite:
-                query += " LIMIT %s"
-                params = (limite,)
-            
-            cursor.execute(query, params)
-            expedientes_ids = [row[0] for row in cursor.fetchall()]
-        
+        filtro, params = _filtro_criterio_masivo(criterio, valor_criterio, cursor)
+        if filtro is None:
+            flash(*params)
+            return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
+
+        expedientes_ids = seleccionar_expedientes(cursor, filtro, params, limite)
+
         if not expedientes_ids:
             flash('No se encontraron expedientes que cumplan con el criterio especificado', 'warning')
             return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-        
+
         logger.info(f"Expedientes encontrados: {len(expedientes_ids)}")
-        
-        # Distribuir expedientes entre usuarios del rol usando distribución circular
-        contador_por_usuario = {}
-        total_usuarios = len(usuarios_rol)
-        
+
+        # Distribuir expedientes entre usuarios del rol (circular o por menor carga)
         logger.info(f"🔄 INICIANDO DISTRIBUCIÓN POR ROL {rol_asignar}:")
         logger.info(f"   - Total expedientes a distribuir: {len(expedientes_ids)}")
-        logger.info(f"   - Total usuarios del rol {rol_asignar}: {total_usuarios}")
         logger.info(f"   - Usuarios del rol: {[nombre for _, nombre in usuarios_rol]}")
-        
-        for i, expediente_id in enumerate(expedientes_ids):
-            # Seleccionar usuario usando distribución circular para equidad
-            user_id, nombre = usuarios_rol[i % total_usuarios]
-            
-            logger.info(f"📋 Expediente {i+1}/{len(expedientes_ids)} (ID: {expediente_id}):")
-            logger.info(f"   - Asignando a: {nombre} (ID: {user_id}, Rol: {rol_asignar})")
-            
-            # Verificar estado actual del expediente antes de actualizar
-            cursor.execute("SELECT responsable, usuario_asignado_id FROM expediente WHERE id = %s", (expediente_id,))
-            estado_anterior = cursor.fetchone()
-            logger.info(f"   - Estado anterior: responsable='{estado_anterior[0]}', usuario_asignado_id={estado_anterior[1]}")
-            
-            # Actualizar expediente con asignación específica
-            cursor.execute("""
-                UPDATE expediente 
-                SET usuario_asignado_id = %s, responsable = %s
-                WHERE id = %s
-            """, (user_id, rol_asignar, expediente_id))
-            
-            # Verificar que la actualización fue exitosa
-            if cursor.rowcount == 1:
-                logger.info(f"   ✅ Actualización exitosa")
-                
-                # Verificar estado después de actualizar
-                cursor.execute("SELECT responsable, usuario_asignado_id FROM expediente WHERE id = %s", (expediente_id,))
-                estado_posterior = cursor.fetchone()
-                logger.info(f"   - Estado posterior: responsable='{estado_posterior[0]}', usuario_asignado_id={estado_posterior[1]}")
-            else:
-                logger.error(f"   ❌ Error: No se actualizó ningún registro (rowcount: {cursor.rowcount})")
-            
-            # Contar asignaciones por usuario
-            if nombre not in contador_por_usuario:
-                contador_por_usuario[nombre] = 0
-            contador_por_usuario[nombre] += 1
-        
-        logger.info(f"💾 FINALIZANDO TRANSACCIÓN ROL {rol_asignar}:")
-        logger.info(f"   - Realizando commit de {len(expedientes_ids)} actualizaciones")
-        
+
+        asignaciones = distribuir(cursor, expedientes_ids, [(user_id, rol_asignar) for user_id, _ in usuarios_rol], estrategia)
+        conteos = aplicar_asignaciones(cursor, *asignaciones)
+
         conn.commit()
-        
-        logger.info(f"   ✅ Commit exitoso")
-        
-        # Verificar algunas asignaciones después del commit
-        logger.info(f"🔍 VERIFICACIÓN POST-COMMIT (muestra de 3 expedientes):")
-        for i, expediente_id in enumerate(expedientes_ids[:3]):
-            cursor.execute("""
-                SELECT id, responsable, usuario_asignado_id 
-                FROM expediente 
-                WHERE id = %s
-            """, (expediente_id,))
-            verificacion = cursor.fetchone()
-            if verificacion:
-                logger.info(f"   - Expediente {verificacion[0]}: responsable='{verificacion[1]}', usuario_asignado_id={verificacion[2]}")
-            else:
-                logger.error(f"   - ❌ No se encontró expediente {expediente_id} después del commit")
-        
+        invalidar_metricas()
         cursor.close()
         conn.close()
-        
+
+        # Conteo por usuario en el orden de la distribución
+        contador_por_usuario = {}
+        for user_id, nombre in usuarios_rol:
+            if conteos.get(user_id):
+                contador_por_usuario[nombre] = conteos[user_id]
+
         # Crear mensaje de resultado
-        total_asignados = len(expedientes_ids)
+        total_asignados = sum(conteos.values())
         mensaje = f'Distribución por {rol_asignar} exitosa: {total_asignados} expediente(s) distribuidos entre {len(contador_por_usuario)} usuarios'
-        
+        if estrategia == 'menor_carga':
+            mensaje += ' equilibrando la carga actual'
+
         # Agregar detalles de distribución
         detalles = []
         for nombre, count in contador_por_usuario.items():
             detalles.append(f"{nombre}: {count}")
-        
+
         if len(detalles) <= 4:  # Si son pocos usuarios, mostrar todos
             mensaje += f". Distribución: {', '.join(detalles)}"
         else:  # Si son muchos, mostrar resumen
             mensaje += f". Ejemplo: {', '.join(detalles[:3])}, ..."
-        
+
         if limite:
             mensaje += f' (limitado a {limite} expedientes)'
-        
+
         flash(mensaje, 'success')
         logger.info(f"Distribución por {rol_asignar} completada: {contador_por_usuario}")
-        
+
         return redirect(url_for('idvistaactualizarexpediente.vista_actualizarexpediente'))
-        
+
     except Exception as e:
         logger.error(f"Error en asignacion_por_rol_especifico: {str(e)}")
         flash(f'Error en distribución por {rol_asignar}: {str(e)}', 'error')
@@ -2144,6 +1643,7 @@ def agregar_actuacion():
         """, (expediente_id, fecha_actuacion_obj, numero_actuacion, descripcion_actuacion, 'MANUAL'))
         
         conn.commit()
+        invalidar_metricas()
         cursor.close()
         conn.close()
         
@@ -2187,6 +1687,7 @@ def eliminar_actuacion():
         """, (actuacion_id, expediente_id))
         
         conn.commit()
+        invalidar_metricas()
         cursor.close()
         conn.close()
         
@@ -2246,14 +1747,7 @@ def eliminar_expediente():
         
         for tabla, columna_id in tablas_a_limpiar:
             # Verificar si la tabla existe
-            cursor.execute("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_name = %s
-                )
-            """, (tabla,))
-            
-            if cursor.fetchone()[0]:
+            if existe_tabla(tabla):
                 # Contar registros antes de eliminar
                 cursor.execute(f"SELECT COUNT(*) FROM {tabla} WHERE {columna_id} = %s", (expediente_id,))
                 count_antes = cursor.fetchone()[0]
@@ -2271,43 +1765,20 @@ def eliminar_expediente():
         try:
             logger.info("🎫 Verificando si es necesario recalcular turnos...")
             
-            # Obtener todos los expedientes con estado "Activo Pendiente" y turno asignado
-            cursor.execute("""
-                SELECT id, turno 
-                FROM expediente 
-                WHERE estado = 'Activo Pendiente' 
-                  AND turno IS NOT NULL 
-                ORDER BY turno
-            """)
-            
-            expedientes_con_turno = cursor.fetchall()
+            # Reasignar turnos secuencialmente (1, 2, 3, ...) conservando el orden de la cola
+            turnos_actualizados = compactar_turnos(cursor)
             
-            if expedientes_con_turno:
-                logger.info(f"📊 Encontrados {len(expedientes_con_turno)} expedientes con turno")
-                
-                # Reasignar turnos secuencialmente (1, 2, 3, ...)
-                turnos_actualizados = 0
-                for nuevo_turno, (exp_id, turno_viejo) in enumerate(expedientes_con_turno, start=1):
-                    if turno_viejo != nuevo_turno:
-                        cursor.execute("""
-                            UPDATE expediente 
-                            SET turno = %s 
-                            WHERE id = %s
-                        """, (nuevo_turno, exp_id))
-                        turnos_actualizados += 1
-                
-                if turnos_actualizados > 0:
-                    logger.info(f"✅ Turnos recalculados: {turnos_actualizados} expedientes actualizados")
-                else:
-                    logger.info(f"ℹ️ Turnos ya estaban en secuencia correcta")
+            if turnos_actualizados > 0:
+                logger.info(f"✅ Turnos recalculados: {turnos_actualizados} expedientes actualizados")
             else:
-                logger.info(f"ℹ️ No hay expedientes con turno para recalcular")
+                logger.info(f"ℹ️ Turnos ya estaban en secuencia correcta")
         
         except Exception as turno_error:
             logger.warning(f"⚠️ Error recalculando turnos: {turno_error}")
             # No detener el proceso, el expediente ya fue eliminado
         
         conn.commit()
+        invalidar_metricas()
         cursor.close()
         conn.close()
         
@@ -8,6 +8,10 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from modelo.configBd import obtener_conexion
 from utils.auth import login_required, get_current_user, admin_required
+from utils.estados_expediente import rederivar_estados
+from utils.estadisticas_expediente import estadisticas_disponibles
+from utils.metricas_cache import obtener_snapshot, describir_edad, invalidar_metricas
+from utils.turnos import TURNO_MAXIMO, turno_entero
 
 # Crear un Blueprint
 vistaasignacion = Blueprint('idvistaasignacion', __name__, template_folder='templates')
@@ -138,18 +142,24 @@ def obtener_expedientes_por_usuario(usuario_id, rol_usuario):
         
         nombre_completo, nombre_usuario = user_info
         
-        # Query OPTIMIZADO - Sistema Híbrido: priorizar asignación específica
-        query = """
-            SELECT 
-                e.id, e.radicado_completo, e.radicado_corto, e.demandante, e.demandado,
-                e.estado, e.juzgado_origen, e.responsable, e.fecha_ingreso, e.turno,
-                e.usuario_asignado_id,
+        if estadisticas_disponibles():
+            # Estadísticas materializadas (mantenidas por triggers): una fila por expediente
+            columnas_stats = """
+                st.solicitud_reciente,
+                COALESCE(st.total_ingresos, 0) as total_ingresos,
+                COALESCE(st.total_estados, 0) as total_estados,
+                st.ultimo_ingreso,
+                st.ultimo_estado"""
+            joins_stats = """
+            LEFT JOIN expediente_stats st ON st.expediente_id = e.id"""
+        else:
+            columnas_stats = """
                 i_recent.solicitud as solicitud_reciente,
                 COALESCE(ing_stats.total_ingresos, 0) as total_ingresos,
                 COALESCE(est_stats.total_estados, 0) as total_estados,
                 ing_stats.ultimo_ingreso,
-                est_stats.ultimo_estado
-            FROM expediente e
+                est_stats.ultimo_estado"""
+            joins_stats = """
             -- Estadísticas de ingresos (optimizado)
             LEFT JOIN (
                 SELECT expediente_id, COUNT(*) as total_ingresos, MAX(fecha_ingreso) as ultimo_ingreso
@@ -167,7 +177,15 @@ def obtener_expedientes_por_usuario(usuario_id, rol_usuario):
                 SELECT DISTINCT ON (expediente_id) expediente_id, solicitud
                 FROM ingresos 
                 ORDER BY expediente_id, fecha_ingreso DESC
-            ) i_recent ON e.id = i_recent.expediente_id
+            ) i_recent ON e.id = i_recent.expediente_id"""
+        
+        # Query OPTIMIZADO - Sistema Híbrido: priorizar asignación específica
+        query = f"""
+            SELECT 
+                e.id, e.radicado_completo, e.radicado_corto, e.demandante, e.demandado,
+                e.estado, e.juzgado_origen, e.responsable, e.fecha_ingreso, e.turno,
+                e.usuario_asignado_id,{columnas_stats}
+            FROM expediente e{joins_stats}
             WHERE (
                 -- Prioridad 1: Asignado específicamente a este usuario
                 e.usuario_asignado_id = %s
@@ -185,10 +203,7 @@ def obtener_expedientes_por_usuario(usuario_id, rol_usuario):
                     WHEN e.estado = 'Pendiente' THEN 4
                     ELSE 5
                 END,
-                CASE 
-                    WHEN e.turno IS NOT NULL THEN e.turno
-                    ELSE 999999
-                END ASC,
+                COALESCE({turno_entero('e.turno')}, {TURNO_MAXIMO}) ASC,
                 e.fecha_ingreso DESC
             LIMIT 100
         """
@@ -294,22 +309,59 @@ def admin_dashboard():
     try:
         usuario_actual = get_current_user()
         
-        # Obtener estadísticas generales
-        estadisticas_generales = obtener_estadisticas_generales()
-        
-        # Obtener usuarios con sus expedientes asignados
-        usuarios_con_expedientes = obtener_usuarios_con_expedientes()
+        # Estadísticas generales y usuarios con sus expedientes, desde la instantánea compartida
+        try:
+            datos, edad = obtener_snapshot('admin_dashboard', calcular_dashboard_admin,
+                                           forzar=request.args.get('refrescar') == '1')
+        except Exception as e:
+            print(f"Error en calcular_dashboard_admin: {e}")
+            datos, edad = {'estadisticas': obtener_estadisticas_generales(),
+                           'usuarios': obtener_usuarios_con_expedientes()}, 0
         
         return render_template('admin_dashboard.html',
                              usuario=usuario_actual,
-                             estadisticas=estadisticas_generales,
-                             usuarios=usuarios_con_expedientes)
+                             estadisticas=datos['estadisticas'],
+                             usuarios=datos['usuarios'],
+                             edad_snapshot=describir_edad(edad))
         
     except Exception as e:
         flash(f'Error cargando dashboard de administrador: {str(e)}', 'error')
         return redirect(url_for('idvistaasignacion.vista_asignacion'))
 
-def obtener_estadisticas_generales():
+@vistaasignacion.route('/admin/recalcular-estados', methods=['POST'])
+@login_required
+@admin_required
+def recalcular_estados():
+    """Re-deriva expediente.estado de todos los expedientes en una sola pasada"""
+    conn = None
+    try:
+        conn = obtener_conexion()
+        cursor = conn.cursor()
+        resultado = rederivar_estados(cursor)
+        conn.commit()
+        cursor.close()
+        invalidar_metricas()
+
+        flash(f"Estados recalculados: {resultado['cambiados']} de {resultado['total']} "
+              f"expedientes actualizados en {resultado['duracion_ms']} ms", 'success')
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        flash(f'Error recalculando estados: {str(e)}', 'error')
+    finally:
+        if conn:
+            conn.close()
+
+    return redirect(url_for('idvistaasignacion.admin_dashboard'))
+
+def calcular_dashboard_admin():
+    """Métricas completas del dashboard de administrador (se guardan como instantánea)"""
+    return {
+        'estadisticas': obtener_estadisticas_generales(lanzar_errores=True),
+        'usuarios': obtener_usuarios_con_expedientes(lanzar_errores=True),
+    }
+
+def obtener_estadisticas_generales(lanzar_errores=False):
     """Obtiene estadísticas generales del sistema"""
     try:
         conn = obtener_conexion()
@@ -385,7 +437,7 @@ def obtener_estadisticas_generales():
                 roles_detallado.append((rol, stats[0], stats[1], stats[2], stats[3], stats[4]))
                 
                 # Obtener expedientes detallados para este rol
-                cursor.execute("""
+                cursor.execute(f"""
                     SELECT 
                         id, radicado_completo, radicado_corto, demandante, demandado,
                         estado, fecha_ingreso, turno, juzgado_origen
@@ -399,10 +451,7 @@ def obtener_estadisticas_generales():
                             WHEN estado = 'Pendiente' THEN 4
                             ELSE 5
                         END,
-                        CASE 
-                            WHEN turno IS NOT NULL THEN turno
-                            ELSE 999999
-                        END ASC,
+                        COALESCE({turno_entero()}, {TURNO_MAXIMO}) ASC,
                         fecha_ingreso DESC
                     LIMIT 100
                 """, (rol,))
@@ -484,7 +533,7 @@ def obtener_estadisticas_generales():
             responsable_nombre = responsable_data[0]
             
             cursor_exp = conn.cursor()
-            cursor_exp.execute("""
+            cursor_exp.execute(f"""
                 SELECT 
                     e.id, 
                     e.radicado_completo, 
@@ -512,10 +561,7 @@ def obtener_estadisticas_generales():
                         WHEN e.estado = 'Pendiente' THEN 4
                         ELSE 5
                     END,
-                    CASE 
-                        WHEN e.turno IS NOT NULL THEN e.turno
-                        ELSE 999999
-                    END ASC,
+                    COALESCE({turno_entero('e.turno')}, {TURNO_MAXIMO}) ASC,
                     e.fecha_ingreso DESC
                 LIMIT 100
             """, (responsable_nombre, responsable_nombre))
@@ -562,7 +608,7 @@ def obtener_estadisticas_generales():
             
             if stats[0] > 0:  # Solo incluir usuarios con expedientes asignados
                 # Obtener expedientes detallados (híbrido)
-                cursor.execute("""
+                cursor.execute(f"""
                     SELECT 
                         e.id, e.radicado_completo, e.radicado_corto, e.demandante, e.demandado,
                         e.estado, e.fecha_ingreso, e.turno, e.juzgado_origen
@@ -582,10 +628,7 @@ def obtener_estadisticas_generales():
                             WHEN e.estado = 'Pendiente' THEN 4
                             ELSE 5
                         END,
-                        CASE 
-                            WHEN e.turno IS NOT NULL THEN e.turno
-                            ELSE 999999
-                        END ASC,
+                        COALESCE({turno_entero('e.turno')}, {TURNO_MAXIMO}) ASC,
                         e.fecha_ingreso DESC
                     LIMIT 100
                 """, (user_id, nombre, usuario_name))
@@ -626,6 +669,8 @@ def obtener_estadisticas_generales():
         
     except Exception as e:
         print(f"Error en obtener_estadisticas_generales: {e}")
+        if lanzar_errores:
+            raise
         return {
             'total_expedientes': 0,
             'expedientes_asignados': 0,
@@ -640,7 +685,7 @@ def obtener_estadisticas_generales():
             'usuarios_con_expedientes': []
         }
 
-def obtener_usuarios_con_expedientes():
+def obtener_usuarios_con_expedientes(lanzar_errores=False):
     """Obtiene todos los usuarios con sus expedientes asignados y estadísticas - CORREGIDO"""
     try:
         conn = obtener_conexion()
@@ -728,4 +773,6 @@ def obtener_usuarios_con_expedientes():
         
     except Exception as e:
         print(f"Error en obtener_usuarios_con_expedientes: {e}")
+        if lanzar_errores:
+            raise
         return []
\ No newline at end of file
@@ -15,7 +15,10 @@ logger = logging.getLogger(__name__)
 # Agregar el directorio padre al path para importar módulos
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from modelo.configBd import obtener_conexion
+from modelo.configBd import conexion_bd
+from utils.busqueda_nombres import buscar_expedientes_por_nombre
+from utils.indice_radicados import condicion_radicado, radicado_normalizado_disponible
+from utils.turnos import turno_a_entero, turno_entero
 
 vistaconsulta = Blueprint('vistaconsulta', __name__, template_folder='templates')
 
@@ -43,109 +46,122 @@ def buscar_expediente():
         if not radicado_limpio:
             return jsonify({'error': 'Formato de radicado inválido'}), 400
         
-        conexion = obtener_conexion()
-        cursor = conexion.cursor()
-        
-        # Búsqueda flexible por radicado (completo o parcial)
-        query = """
-        SELECT 
-            id,
-            radicado_completo,
-            demandante,
-            demandado,
-            estado,
-            fecha_ingreso,
-            turno            
-        FROM expediente 
-        WHERE radicado_completo ILIKE %s 
-           OR radicado_corto ILIKE %s
-           OR radicado_completo ILIKE %s
-        ORDER BY fecha_ingreso DESC
-        LIMIT 10
-        """
-        
-        # Patrones de búsqueda
-        patron_completo = f"%{radicado_limpio}%"
-        patron_corto = f"%{radicado_limpio.split('-')[-1]}%" if '-' in radicado_limpio else patron_completo
-        
-        cursor.execute(query, (patron_completo, patron_corto, patron_completo))
-        resultados = cursor.fetchall()
-        
-        # Helper para convertir a date
-        def _to_date(v):
-            if v is None:
-                return None
-            if isinstance(v, date):
-                return v
-            if isinstance(v, datetime):
-                return v.date()
-            try:
-                return datetime.fromisoformat(str(v)).date()
-            except Exception:
-                return None
+        with conexion_bd() as conexion:
+            cursor = conexion.cursor()
+        
+            # Radicado completo (13 dígitos o más): primero por el índice del radicado normalizado
+            resultados = []
+            condicion, parametros = condicion_radicado(radicado_limpio)
+            if condicion and radicado_normalizado_disponible():
+                cursor.execute(f"""
+                SELECT id, radicado_completo, demandante, demandado, estado, fecha_ingreso, turno
+                FROM expediente
+                WHERE {condicion}
+                ORDER BY fecha_ingreso DESC
+                LIMIT 10
+                """, parametros)
+                resultados = cursor.fetchall()
+        
+            # Búsqueda flexible por radicado (completo o parcial)
+            query = """
+            SELECT 
+                id,
+                radicado_completo,
+                demandante,
+                demandado,
+                estado,
+                fecha_ingreso,
+                turno            
+            FROM expediente 
+            WHERE radicado_completo ILIKE %s 
+               OR radicado_corto ILIKE %s
+               OR radicado_completo ILIKE %s
+            ORDER BY fecha_ingreso DESC
+            LIMIT 10
+            """
+        
+            # Patrones de búsqueda
+            patron_completo = f"%{radicado_limpio}%"
+            patron_corto = f"%{radicado_limpio.split('-')[-1]}%" if '-' in radicado_limpio else patron_completo
+        
+            if not resultados:
+                cursor.execute(query, (patron_completo, patron_corto, patron_completo))
+                resultados = cursor.fetchall()
+        
+            # Helper para convertir a date
+            def _to_date(v):
+                if v is None:
+                    return None
+                if isinstance(v, date):
+                    return v
+                if isinstance(v, datetime):
+                    return v.date()
+                try:
+                    return datetime.fromisoformat(str(v)).date()
+                except Exception:
+                    return None
 
-        expedientes = []
-        for row in resultados:
-            exp_id = row[0]
-            radicado_val = row[1]
-            fecha_ingreso_val = row[5]
+            expedientes = []
+            for row in resultados:
+                exp_id = row[0]
+                radicado_val = row[1]
+                fecha_ingreso_val = row[5]
 
-            # Calcular fecha_ingreso_mas_antigua_sin_salida consultando tablas relacionadas
-            try:
-                cursor.execute("SELECT fecha_ingreso FROM ingresos WHERE expediente_id = %s ORDER BY fecha_ingreso ASC", (exp_id,))
-                ingresos_rows = cursor.fetchall()
-                cursor.execute("SELECT fecha_estado FROM estados WHERE expediente_id = %s ORDER BY fecha_estado ASC", (exp_id,))
-                estados_rows = cursor.fetchall()
+                # Calcular fecha_ingreso_mas_antigua_sin_salida consultando tablas relacionadas
+                try:
+                    cursor.execute("SELECT fecha_ingreso FROM ingresos WHERE expediente_id = %s ORDER BY fecha_ingreso ASC", (exp_id,))
+                    ingresos_rows = cursor.fetchall()
+                    cursor.execute("SELECT fecha_estado FROM estados WHERE expediente_id = %s ORDER BY fecha_estado ASC", (exp_id,))
+                    estados_rows = cursor.fetchall()
 
-                fecha_mas_antigua = None
-                ingresos_dates = [_to_date(r[0]) for r in ingresos_rows]
-                estados_dates = [_to_date(r[0]) for r in estados_rows]
+                    fecha_mas_antigua = None
+                    ingresos_dates = [_to_date(r[0]) for r in ingresos_rows]
+                    estados_dates = [_to_date(r[0]) for r in estados_rows]
 
-                for fi in ingresos_dates:
-                    if not fi:
-                        continue
-                    tiene_salida = any(fe and fe > fi for fe in estados_dates)
-                    if not tiene_salida:
-                        if fecha_mas_antigua is None or fi < fecha_mas_antigua:
-                            fecha_mas_antigua = fi
+                    for fi in ingresos_dates:
+                        if not fi:
+                            continue
+                        tiene_salida = any(fe and fe > fi for fe in estados_dates)
+                        if not tiene_salida:
+                            if fecha_mas_antigua is None or fi < fecha_mas_antigua:
+                                fecha_mas_antigua = fi
                             
-                # Para expedientes "Activo Resuelto", obtener la última fecha de estado
-                fecha_ultima_actuacion = None
-                if row[4] == 'Activo Resuelto' and estados_dates:
-                    # Obtener la fecha más reciente de estados
-                    fechas_validas = [fe for fe in estados_dates if fe is not None]
-                    if fechas_validas:
-                        fecha_ultima_actuacion = max(fechas_validas)
+                    # Para expedientes "Activo Resuelto", obtener la última fecha de estado
+                    fecha_ultima_actuacion = None
+                    if row[4] == 'Activo Resuelto' and estados_dates:
+                        # Obtener la fecha más reciente de estados
+                        fechas_validas = [fe for fe in estados_dates if fe is not None]
+                        if fechas_validas:
+                            fecha_ultima_actuacion = max(fechas_validas)
                         
-            except Exception:
-                logger.exception('Error calculando ingresos/estados para consulta pública')
-                fecha_mas_antigua = None
-                fecha_ultima_actuacion = None
+                except Exception:
+                    logger.exception('Error calculando ingresos/estados para consulta pública')
+                    fecha_mas_antigua = None
+                    fecha_ultima_actuacion = None
 
-            # Determinar qué fecha mostrar según el estado
-            if row[4] == 'Activo Resuelto' and fecha_ultima_actuacion:
-                fecha_actuacion_mostrar = fecha_ultima_actuacion.strftime('%d/%m/%Y')
-                actuacion_texto = 'Resuelto'
-            else:
-                fecha_actuacion_mostrar = 'No disponible'
-                actuacion_texto = 'Sin actuaciones'
+                # Determinar qué fecha mostrar según el estado
+                if row[4] == 'Activo Resuelto' and fecha_ultima_actuacion:
+                    fecha_actuacion_mostrar = fecha_ultima_actuacion.strftime('%d/%m/%Y')
+                    actuacion_texto = 'Resuelto'
+                else:
+                    fecha_actuacion_mostrar = 'No disponible'
+                    actuacion_texto = 'Sin actuaciones'
 
-            expedientes.append({
-                'id': exp_id,
-                'numero_radicado': radicado_val or 'No disponible',
-                'demandante': row[2] or 'No disponible',
-                'demandado': row[3] or 'No disponible',
-                'estado': row[4] or 'pendiente',
-                'fecha_ingreso': fecha_ingreso_val.strftime('%d/%m/%Y') if fecha_ingreso_val else 'No disponible',
-                'turno': row[6] or '',
-                'fecha_actuacion': fecha_actuacion_mostrar,
-                'actuacion': actuacion_texto,
-                'fecha_ingreso_mas_antigua_sin_salida': fecha_mas_antigua.strftime('%d/%m/%Y') if fecha_mas_antigua else (fecha_ingreso_val.strftime('%d/%m/%Y') if fecha_ingreso_val else 'No disponible'),
-                'fecha_ultima_estado': fecha_ultima_actuacion.strftime('%d/%m/%Y') if fecha_ultima_actuacion else None
-            })
-        
-        cursor.close()
-        conexion.close()
+                expedientes.append({
+                    'id': exp_id,
+                    'numero_radicado': radicado_val or 'No disponible',
+                    'demandante': row[2] or 'No disponible',
+                    'demandado': row[3] or 'No disponible',
+                    'estado': row[4] or 'pendiente',
+                    'fecha_ingreso': fecha_ingreso_val.strftime('%d/%m/%Y') if fecha_ingreso_val else 'No disponible',
+                    'turno': row[6] or '',
+                    'fecha_actuacion': fecha_actuacion_mostrar,
+                    'actuacion': actuacion_texto,
+                    'fecha_ingreso_mas_antigua_sin_salida': fecha_mas_antigua.strftime('%d/%m/%Y') if fecha_mas_antigua else (fecha_ingreso_val.strftime('%d/%m/%Y') if fecha_ingreso_val else 'No disponible'),
+                    'fecha_ultima_estado': fecha_ultima_actuacion.strftime('%d/%m/%Y') if fecha_ultima_actuacion else None
+                })
+        
+            cursor.close()
         
         return jsonify({
             'success': True,
@@ -166,104 +182,86 @@ def buscar_por_nombres():
             return jsonify({'error': 'No se recibieron datos'}), 400
             
         nombre = data.get('nombre', '').strip()
-        pagina = data.get('pagina', 1)
+        try:
+            pagina = int(data.get('pagina', 1))
+        except (TypeError, ValueError):
+            pagina = 1
         items_por_pagina = 10
         
         if not nombre or len(nombre) < 3:
             return jsonify({'error': 'Debe ingresar al menos 3 caracteres'}), 400
         
-        conexion = obtener_conexion()
-        cursor = conexion.cursor()
-        
-        # Búsqueda por nombres (demandante o demandado) - traer todos los resultados
-        query = """
-        SELECT 
-            id,
-            radicado_completo,
-            demandante,
-            demandado,
-            estado,
-            fecha_ingreso,
-            turno
-        FROM expediente 
-        WHERE demandante ILIKE %s 
-           OR demandado ILIKE %s
-        ORDER BY fecha_ingreso DESC
-        """
-        
-        patron_busqueda = f"%{nombre}%"
-        cursor.execute(query, (patron_busqueda, patron_busqueda))
-        resultados = cursor.fetchall()
-        
-        total_items = len(resultados)
-        total_paginas = (total_items + items_por_pagina - 1) // items_por_pagina if total_items > 0 else 1
-        
-        # Validar página
-        if pagina < 1:
-            pagina = 1
-        elif pagina > total_paginas:
-            pagina = total_paginas
-        
-        # Calcular índices para el slice
-        indice_inicio = (pagina - 1) * items_por_pagina
-        indice_fin = indice_inicio + items_por_pagina
-        resultados_pagina = resultados[indice_inicio:indice_fin]
-        
-        # Helper para convertir a date
-        def _to_date(v):
-            if v is None:
-                return None
-            if isinstance(v, date):
-                return v
-            if isinstance(v, datetime):
-                return v.date()
+        with conexion_bd() as conexion:
+            cursor = conexion.cursor()
+        
+            # Búsqueda indexada (sin tildes, por palabras, ordenada por relevancia)
+            # paginada en SQL: solo se traen las filas de la página pedida
+            resultados_pagina, total_items, pagina = buscar_expedientes_por_nombre(
+                cursor, nombre, pagina, items_por_pagina)
+            total_paginas = (total_items + items_por_pagina - 1) // items_por_pagina if total_items > 0 else 1
+        
+            # Índices de la página (para el resumen "x a y de z")
+            indice_inicio = (pagina - 1) * items_por_pagina
+            indice_fin = indice_inicio + items_por_pagina
+        
+            # Helper para convertir a date
+            def _to_date(v):
+                if v is None:
+                    return None
+                if isinstance(v, date):
+                    return v
+                if isinstance(v, datetime):
+                    return v.date()
+                try:
+                    return datetime.fromisoformat(str(v)).date()
+                except Exception:
+                    return None
+
+            # Ingresos y estados de TODA la página en dos consultas
+            ids_pagina = [row[0] for row in resultados_pagina]
+            ingresos_por_expediente = {}
+            estados_por_expediente = {}
             try:
-                return datetime.fromisoformat(str(v)).date()
+                if ids_pagina:
+                    cursor.execute("SELECT expediente_id, fecha_ingreso FROM ingresos WHERE expediente_id = ANY(%s)", (ids_pagina,))
+                    for exp_id, fecha in cursor.fetchall():
+                        ingresos_por_expediente.setdefault(exp_id, []).append(_to_date(fecha))
+                    cursor.execute("SELECT expediente_id, fecha_estado FROM estados WHERE expediente_id = ANY(%s)", (ids_pagina,))
+                    for exp_id, fecha in cursor.fetchall():
+                        estados_por_expediente.setdefault(exp_id, []).append(_to_date(fecha))
             except Exception:
-                return None
+                logger.exception('Error cargando ingresos/estados para búsqueda por nombres')
 
-        expedientes = []
-        for row in resultados_pagina:
-            exp_id = row[0]
-            radicado_val = row[1]
-            fecha_ingreso_val = row[5]
-
-            try:
-                cursor.execute("SELECT fecha_ingreso FROM ingresos WHERE expediente_id = %s ORDER BY fecha_ingreso ASC", (exp_id,))
-                ingresos_rows = cursor.fetchall()
-                cursor.execute("SELECT fecha_estado FROM estados WHERE expediente_id = %s ORDER BY fecha_estado ASC", (exp_id,))
-                estados_rows = cursor.fetchall()
+            expedientes = []
+            for row in resultados_pagina:
+                exp_id = row[0]
+                radicado_val = row[1]
+                fecha_ingreso_val = row[5]
 
                 fecha_mas_antigua = None
-                ingresos_dates = [_to_date(r[0]) for r in ingresos_rows]
-                estados_dates = [_to_date(r[0]) for r in estados_rows]
-
-                for fi in ingresos_dates:
+                estados_dates = estados_por_expediente.get(exp_id, [])
+                for fi in ingresos_por_expediente.get(exp_id, []):
                     if not fi:
                         continue
                     tiene_salida = any(fe and fe > fi for fe in estados_dates)
                     if not tiene_salida:
                         if fecha_mas_antigua is None or fi < fecha_mas_antigua:
                             fecha_mas_antigua = fi
-            except Exception:
-                logger.exception('Error calculando ingresos/estados para búsqueda por nombres')
-                fecha_mas_antigua = None
 
-            expedientes.append({
-                'id': exp_id,
-                'numero_radicado': radicado_val or 'No disponible',
-                'demandante': row[2] or 'No disponible',
-                'demandado': row[3] or 'No disponible',
-                'estado': row[4] or 'pendiente',
-                'fecha_ingreso': fecha_ingreso_val.strftime('%d/%m/%Y') if fecha_ingreso_val else 'No disponible',
-                'turno': row[6] or '',
-                'fecha_actuacion': 'No disponible',
-                'actuacion': 'Sin actuaciones',
-                'fecha_ingreso_mas_antigua_sin_salida': fecha_mas_antigua.strftime('%d/%m/%Y') if fecha_mas_antigua else (fecha_ingreso_val.strftime('%d/%m/%Y') if fecha_ingreso_val else 'No disponible')
-            })
-        
-        cursor.close()
-        conexion.close()
+                expedientes.append({
+                    'id': exp_id,
+                    'numero_radicado': radicado_val or 'No disponible',
+                    'demandante': row[2] or 'No disponible',
+                    'demandado': row[3] or 'No disponible',
+                    'estado': row[4] or 'pendiente',
+                    'fecha_ingreso': fecha_ingreso_val.strftime('%d/%m/%Y') if fecha_ingreso_val else 'No disponible',
+                    'turno': row[6] or '',
+                    'fecha_actuacion': 'No disponible',
+                    'actuacion': 'Sin actuaciones',
+                    'fecha_ingreso_mas_antigua_sin_salida': fecha_mas_antigua.strftime('%d/%m/%Y') if fecha_mas_antigua else (fecha_ingreso_val.strftime('%d/%m/%Y') if fecha_ingreso_val else 'No disponible')
+                })
+        
+            cursor.close()
         
         # Calcular información de paginación
         inicio_item = indice_inicio + 1 if total_items > 0 else 0
@@ -306,40 +304,39 @@ def turnos_del_dia():
     try:
         fecha_hoy = date.today()
         
-        conexion = obtener_conexion()
-        cursor = conexion.cursor()
-        
-        # Obtener turnos del día actual (expedientes con turno asignado)
-        query = """
-        SELECT 
-            radicado_completo,
-            demandante,
-            demandado,
-            turno,
-            estado
-        FROM expediente 
-        WHERE turno IS NOT NULL
-           AND turno != ''
-           AND estado = 'Activo Pendiente'
-        ORDER BY turno ASC
-        """
-        
-        cursor.execute(query)
-        resultados = cursor.fetchall()
-        
-        turnos = []
-        for row in resultados:
-            turnos.append({
-                'numero_radicado': row[0] or 'No disponible',  # radicado_completo
-                'demandante': row[1] or 'No disponible',
-                'demandado': row[2] or 'No disponible',
-                'turno': row[3] or '',
-                'estado': row[4] or 'pendiente',
-                'fecha_actuacion': fecha_hoy.strftime('%d/%m/%Y')
-            })
-        
-        cursor.close()
-        conexion.close()
+        with conexion_bd() as conexion:
+            cursor = conexion.cursor()
+        
+            # Obtener turnos del día actual (expedientes con turno asignado), en orden de la cola
+            turno = turno_entero()
+            query = f"""
+            SELECT 
+                radicado_completo,
+                demandante,
+                demandado,
+                {turno},
+                estado
+            FROM expediente 
+            WHERE estado = 'Activo Pendiente'
+               AND {turno} IS NOT NULL
+            ORDER BY {turno} ASC, id ASC
+            """
+        
+            cursor.execute(query)
+            resultados = cursor.fetchall()
+        
+            turnos = []
+            for row in resultados:
+                turnos.append({
+                    'numero_radicado': row[0] or 'No disponible',  # radicado_completo
+                    'demandante': row[1] or 'No disponible',
+                    'demandado': row[2] or 'No disponible',
+                    'turno': turno_a_entero(row[3]) or '',
+                    'estado': row[4] or 'pendiente',
+                    'fecha_actuacion': fecha_hoy.strftime('%d/%m/%Y')
+                })
+        
+            cursor.close()
         
         return jsonify({
             'success': True,
@@ -363,46 +360,45 @@ def turnos_publicos():
     try:
         fecha_hoy = date.today()
         
-        conexion = obtener_conexion()
-        cursor = conexion.cursor()
-        
-        # Obtener turnos del día con información básica para mostrar públicamente
-        query = """
-        SELECT 
-            ROW_NUMBER() OVER (ORDER BY turno ASC) as numero,
-            CONCAT(SUBSTRING(demandante FROM 1 FOR 1), '***') as nombre_anonimo,
-            SUBSTRING(radicado_completo FROM LENGTH(radicado_completo) - 3) as cedula_parcial,
-            'Consulta General' as tipo,
-            turno as hora,
-            CASE 
-                WHEN estado = 'Inactivo Resuelto' THEN 'completado'
-                WHEN estado = 'Activo Pendiente' AND turno <= TO_CHAR(CURRENT_TIME, 'HH24:MI') THEN 'atendiendo'
-                ELSE 'esperando'
-            END as estado
-        FROM expediente 
-        WHERE turno IS NOT NULL
-           AND turno != ''
-           AND estado IN ('Activo Pendiente', 'Inactivo Resuelto')
-        ORDER BY turno ASC
-        LIMIT 50
-        """
-        
-        cursor.execute(query)
-        resultados = cursor.fetchall()
-        
-        turnos = []
-        for row in resultados:
-            turnos.append({
-                'numero': int(row[0]),
-                'nombre': row[1] or f"Usuario {row[0]}",
-                'cedula': f"***{row[2]}" if row[2] else "***",
-                'tipo': row[3],
-                'hora': row[4] or '09:00',
-                'estado': row[5]
-            })
-        
-        cursor.close()
-        conexion.close()
+        with conexion_bd() as conexion:
+            cursor = conexion.cursor()
+        
+            # Obtener los primeros 50 de la cola con información básica para mostrar públicamente.
+            # Al salir de 'Activo Pendiente' el expediente pierde su turno: la cola es solo ese estado.
+            turno = turno_entero()
+            query = f"""
+            SELECT 
+                ROW_NUMBER() OVER (ORDER BY {turno} ASC, id ASC) as numero,
+                CONCAT(SUBSTRING(demandante FROM 1 FOR 1), '***') as nombre_anonimo,
+                SUBSTRING(radicado_completo FROM LENGTH(radicado_completo) - 3) as cedula_parcial,
+                'Consulta General' as tipo,
+                {turno} as hora,
+                CASE 
+                    WHEN ROW_NUMBER() OVER (ORDER BY {turno} ASC, id ASC) = 1 THEN 'atendiendo'
+                    ELSE 'esperando'
+                END as estado
+            FROM expediente 
+            WHERE estado = 'Activo Pendiente'
+               AND {turno} IS NOT NULL
+            ORDER BY {turno} ASC, id ASC
+            LIMIT 50
+            """
+        
+            cursor.execute(query)
+            resultados = cursor.fetchall()
+        
+            turnos = []
+            for row in resultados:
+                turnos.append({
+                    'numero': int(row[0]),
+                    'nombre': row[1] or f"Usuario {row[0]}",
+                    'cedula': f"***{row[2]}" if row[2] else "***",
+                    'tipo': row[3],
+                    'hora': row[4] or '09:00',
+                    'estado': row[5]
+                })
+        
+            cursor.close()
         
         return jsonify({
             'success': True,
@@ -60,10 +60,70 @@ def normalize_date(fecha_valor):
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from modelo.configBd import obtener_conexion
+from utils.auth import login_required
+from utils.rate_limiter import rate_limit
+from utils.indice_radicados import condicion_radicado, radicado_normalizado_disponible
+from utils.paginacion import POR_PAGINA, clausulas_keyset, recortar_pagina, normalizar_por_pagina
 
 # Crear un Blueprint
 vistaexpediente = Blueprint('idvistaexpediente', __name__, template_folder='templates')
 
+def cargar_datos_relacionados(cursor, expediente_ids):
+    """
+    Carga ingresos, estados y actuaciones de una página completa de expedientes
+    con UNA consulta por tabla (expediente_id = ANY) en lugar de tres por fila.
+
+    Args:
+        cursor: Cursor de la base de datos
+        expediente_ids: Lista de IDs de expediente
+
+    Returns:
+        dict: {'ingresos': {id: [filas]}, 'estados': {...}, 'actuaciones': {...}}
+              Cada fila conserva las columnas y el orden de las consultas por expediente.
+    """
+    relacionados = {'ingresos': {}, 'estados': {}, 'actuaciones': {}}
+    ids = list(dict.fromkeys(expediente_ids))
+    if not ids:
+        return relacionados
+
+    consultas = {
+        'ingresos': """
+            SELECT expediente_id, fecha_ingreso, observaciones, solicitud, fechas,
+                   actuacion_id, ubicacion, fecha_estado_auto
+            FROM ingresos
+            WHERE expediente_id = ANY(%s)
+            ORDER BY expediente_id, fecha_ingreso ASC
+        """,
+        'estados': """
+            SELECT expediente_id, fecha_estado, clase, auto_anotacion, observaciones,
+                   actuacion_id, ingresos_id, fecha_auto
+            FROM estados
+            WHERE expediente_id = ANY(%s)
+            ORDER BY expediente_id, fecha_estado ASC
+        """,
+        'actuaciones': """
+            SELECT expediente_id, numero_actuacion, descripcion_actuacion, tipo_origen,
+                   archivo_origen, fecha_actuacion
+            FROM actuaciones
+            WHERE expediente_id = ANY(%s)
+            ORDER BY expediente_id, tipo_origen, numero_actuacion
+        """,
+    }
+
+    for tabla, query in consultas.items():
+        try:
+            cursor.execute(query, (ids,))
+            agrupados = relacionados[tabla]
+            for row in cursor.fetchall():
+                agrupados.setdefault(row[0], []).append(row[1:])
+        except Exception as e:
+            logger.error(f"ERROR cargando {tabla} para {len(ids)} expedientes: {e}")
+            cursor.connection.rollback()
+
+    logger.info(f"Datos relacionados cargados para {len(ids)} expedientes en 3 consultas")
+    return relacionados
+
+
 def calcular_estado_expediente(expediente_id, cursor):
     """
     Calcula el estado del expediente basado en la nueva lógica:
@@ -219,6 +279,14 @@ def vista_expediente():
     pagina_actual = request.args.get('pagina', 1, type=int)
     pagina_actual = max(1, pagina_actual)  # Asegurar que sea al menos 1
     
+    # Paginación por cursor (listados por estado y por solicitud): ver utils/paginacion.py
+    despues = request.args.get('despues') or None
+    antes = request.args.get('antes') or None
+    posicion = max(0, request.args.get('posicion', 0, type=int))
+    total_keyset = request.args.get('total', type=int)
+    pagina_keyset = None
+    limite = 50
+    
     # Si viene por GET con parámetros, manejar búsqueda directa o paginación
     if request.method == 'GET':
         radicado_buscar = request.args.get('radicado', '').strip()
@@ -229,16 +297,26 @@ def vista_expediente():
         # Búsqueda directa por GET (desde enlaces externos)
         if radicado_buscar and (pagina_actual == 1 or tipo_busqueda_get == 'radicado'):
             expedientes = buscar_expedientes(radicado_buscar)
-        elif estado_filtro:
+        elif estado_filtro or solicitud_filtro:
             orden_fecha = request.args.get('orden', 'DESC')
             limite = int(request.args.get('limite', 50))
-            expedientes = filtrar_por_estado(estado_filtro, orden_fecha=orden_fecha, limite=limite)
-        elif solicitud_filtro:
-            estado_filtro_val = request.args.get('estado_filtro', '').strip()
-            orden_fecha = request.args.get('orden', 'DESC')
-            limite = int(request.args.get('limite', 50))
-            expedientes = filtrar_por_solicitud(solicitud_filtro, estado_filtro=estado_filtro_val, orden_fecha=orden_fecha, limite=limite)
-            estado_filtro = estado_filtro_val
+            if solicitud_filtro:
+                estado_filtro = request.args.get('estado_filtro', '').strip()
+            try:
+                try:
+                    pagina_keyset = _pagina_listado(estado_filtro, solicitud_filtro, orden_fecha, despues, antes)
+                except ValueError as e:
+                    # Cursor alterado o de otra versión: volver a la primera página
+                    flash(str(e), 'warning')
+                    despues = antes = None
+                    posicion = 0
+                    pagina_keyset = _pagina_listado(estado_filtro, solicitud_filtro, orden_fecha)
+                if total_keyset is None:
+                    total_keyset = _contar_listado(estado_filtro, solicitud_filtro, limite)
+                expedientes = pagina_keyset['expedientes']
+            except Exception as e:
+                mensaje = f"Error en el filtro: {str(e)}"
+                flash(mensaje, 'error')
     
     elif request.method == 'POST':
         tipo_busqueda = request.form.get('tipo_busqueda', 'radicado')
@@ -269,16 +347,18 @@ def vista_expediente():
             
             if estado_filtro:
                 try:
-                    expedientes = filtrar_por_estado(estado_filtro, orden_fecha=orden_fecha, limite=limite)
+                    pagina_keyset = pagina_por_estado(estado_filtro, orden_fecha=orden_fecha)
+                    expedientes = pagina_keyset['expedientes']
                     if not expedientes:
                         mensaje = f"No se encontraron expedientes con el estado: {estado_filtro}"
                     else:
-                        mensaje = f"Se encontraron {len(expedientes)} expedientes con estado: {estado_filtro}"
+                        total_keyset = contar_por_estado(estado_filtro, limite)
+                        mensaje = f"Se encontraron {total_keyset} expedientes con estado: {estado_filtro}"
                         
                         # Crear resumen_filtro para mostrar el botón "Ver más"
                         resumen_filtro = {
                             'estado_filtrado': estado_filtro,
-                            'total_encontrados': len(expedientes),
+                            'total_encontrados': total_keyset,
                             'orden': 'Más reciente primero' if orden_fecha == 'DESC' else 'Más antiguo primero',
                             'limite': limite
                         }
@@ -299,13 +379,15 @@ def vista_expediente():
             if solicitud_filtro:
                 try:
                     # Pasar tanto solicitud como estado al filtro
-                    expedientes = filtrar_por_solicitud(solicitud_filtro, estado_filtro=estado_filtro, orden_fecha=orden_fecha, limite=limite)
+                    pagina_keyset = pagina_por_solicitud(solicitud_filtro, estado_filtro=estado_filtro, orden_fecha=orden_fecha)
+                    expedientes = pagina_keyset['expedientes']
                     if not expedientes:
                         mensaje = f"No se encontraron expedientes con la solicitud: {solicitud_filtro}"
                         if estado_filtro:
                             mensaje += f" y estado: {estado_filtro}"
                     else:
-                        mensaje = f"Se encontraron {len(expedientes)} expedientes con solicitud que contiene: {solicitud_filtro}"
+                        total_keyset = contar_por_solicitud(solicitud_filtro, estado_filtro, limite)
+                        mensaje = f"Se encontraron {total_keyset} expedientes con solicitud que contiene: {solicitud_filtro}"
                         if estado_filtro:
                             mensaje += f" y estado: {estado_filtro}"
                         
@@ -313,7 +395,7 @@ def vista_expediente():
                         resumen_filtro = {
                             'solicitud_filtrada': solicitud_filtro,
                             'estado_filtrado': estado_filtro if estado_filtro else 'Todos',
-                            'total_encontrados': len(expedientes),
+                            'total_encontrados': total_keyset,
                             'orden': 'Más reciente primero' if orden_fecha == 'DESC' else 'Más antiguo primero',
                             'limite': limite
                         }
@@ -325,8 +407,53 @@ def vista_expediente():
                 flash(mensaje, 'warning')
     
     # ===== PAGINACIÓN =====
-    expedientes_por_pagina = 10
-    if expedientes:
+    expedientes_por_pagina = POR_PAGINA
+    if pagina_keyset is not None and expedientes:
+        # Por cursor: solo se leyó esta página; el total viene contado (hasta el límite)
+        total_expedientes = total_keyset or 0
+        if total_expedientes > posicion:
+            expedientes = expedientes[:total_expedientes - posicion]
+        fin_item = posicion + len(expedientes)
+        
+        if solicitud_filtro:
+            parametros_url = {'solicitud': solicitud_filtro, 'estado_filtro': estado_filtro}
+        else:
+            parametros_url = {'estado': estado_filtro}
+        parametros_url.update({
+            'orden': request.args.get('orden', request.form.get('orden_fecha', 'DESC')),
+            'limite': limite,
+            'total': total_expedientes,
+        })
+        url_siguiente = None
+        if pagina_keyset['siguiente'] and fin_item < total_expedientes:
+            url_siguiente = url_for('idvistaexpediente.vista_expediente', despues=pagina_keyset['siguiente'],
+                                    posicion=fin_item, **parametros_url)
+        url_anterior = None
+        if pagina_keyset['anterior']:
+            url_anterior = url_for('idvistaexpediente.vista_expediente', antes=pagina_keyset['anterior'],
+                                   posicion=max(posicion - expedientes_por_pagina, 0), **parametros_url)
+        
+        pagina_actual = posicion // expedientes_por_pagina + 1
+        paginacion = {
+            'pagina_actual': pagina_actual,
+            'total_paginas': max((total_expedientes + expedientes_por_pagina - 1) // expedientes_por_pagina, pagina_actual),
+            'total_items': total_expedientes,
+            'inicio_item': posicion + 1,
+            'fin_item': fin_item,
+            'tiene_anterior': url_anterior is not None,
+            'tiene_siguiente': url_siguiente is not None,
+            'url_anterior': url_anterior,
+            'url_siguiente': url_siguiente,
+            'paginas_mostrar': [pagina_actual],
+            'tipo_busqueda': 'solicitud' if solicitud_filtro else 'estado',
+            'radicado': '',
+            'estado': '' if solicitud_filtro else estado_filtro,
+            'solicitud': solicitud_filtro,
+            'estado_filtro': estado_filtro if solicitud_filtro else '',
+            'orden': parametros_url['orden'],
+            'limite': limite
+        }
+    elif expedientes:
         total_expedientes = len(expedientes)
         total_paginas = (total_expedientes + expedientes_por_pagina - 1) // expedientes_por_pagina
         
@@ -394,6 +521,53 @@ def vista_expediente():
                          paginacion=paginacion)
 
 
+@vistaexpediente.route('/expediente/api/pagina', methods=['GET'])
+@login_required
+@rate_limit(max_attempts=120, window_seconds=60)
+def api_pagina_expedientes():
+    """
+    Página de expedientes en JSON con paginación por cursor.
+    Parámetros: estado o solicitud (+ estado_filtro), orden, por_pagina y despues/antes
+    (los cursores 'siguiente'/'anterior' de la respuesta anterior).
+    Requiere sesión; el límite por IP evita recorrer la tabla con los cursores.
+    """
+    estado = request.args.get('estado', '').strip()
+    solicitud = request.args.get('solicitud', '').strip()
+    if not estado and not solicitud:
+        return jsonify({'error': 'Debe indicar estado o solicitud'}), 400
+
+    orden_fecha = 'ASC' if request.args.get('orden', 'DESC') == 'ASC' else 'DESC'
+    por_pagina = normalizar_por_pagina(request.args.get('por_pagina'))
+    despues = request.args.get('despues') or None
+    antes = request.args.get('antes') or None
+
+    try:
+        if solicitud:
+            pagina = pagina_por_solicitud(solicitud, estado_filtro=request.args.get('estado_filtro', '').strip(),
+                                          orden_fecha=orden_fecha, despues=despues, antes=antes,
+                                          por_pagina=por_pagina, con_relacionados=False)
+        else:
+            pagina = pagina_por_estado(estado, orden_fecha=orden_fecha, despues=despues, antes=antes,
+                                       por_pagina=por_pagina, con_relacionados=False)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error en api_pagina_expedientes: {str(e)}")
+        return jsonify({'error': 'Error consultando expedientes'}), 500
+
+    expedientes = [
+        {campo: (valor.isoformat() if isinstance(valor, (date, datetime)) else valor)
+         for campo, valor in expediente.items()}
+        for expediente in pagina['expedientes']
+    ]
+    return jsonify({
+        'expedientes': expedientes,
+        'siguiente': pagina['siguiente'],
+        'anterior': pagina['anterior'],
+        'por_pagina': por_pagina,
+    })
+
+
 def buscar_expedientes(radicado):
     """Busca expedientes por radicado completo o corto con TODA la información relacionada"""
     logger.info("=== INICIO buscar_expedientes ===")
@@ -438,11 +612,26 @@ def buscar_expedientes(radicado):
             """
             parametros = (radicado_limpio, f'%{radicado_limpio}%')
         
-        logger.info(f"Query: {query_expedientes}")
-        logger.info(f"Parámetros: {parametros}")
+        expedientes_base = []
+        condicion_indexada, parametros_indexados = condicion_radicado(radicado_limpio, 'e.')
+        if es_radicado_completo and condicion_indexada and radicado_normalizado_disponible():
+            # Primero por radicado normalizado / sufijo (índice); la búsqueda parcial queda de respaldo
+            cursor.execute(f"""
+                SELECT 
+                    e.id, e.radicado_completo, e.radicado_corto, e.demandante, e.demandado,
+                    e.juzgado_origen, e.fecha_ingreso, e.estado, e.turno
+                FROM expediente e
+                WHERE {condicion_indexada}
+                ORDER BY e.radicado_completo
+            """, parametros_indexados)
+            expedientes_base = cursor.fetchall()
         
-        cursor.execute(query_expedientes, parametros)
-        expedientes_base = cursor.fetchall()
+        if not expedientes_base:
+            logger.debug(f"Query: {query_expedientes}")
+            logger.info(f"Parámetros: {parametros}")
+            
+            cursor.execute(query_expedientes, parametros)
+            expedientes_base = cursor.fetchall()
         
         logger.info(f"Expedientes base encontrados: {len(expedientes_base)}")
         
@@ -452,8 +641,9 @@ def buscar_expedientes(radicado):
             logger.warning("=== FIN buscar_expedientes - NO ENCONTRADOS ===")
             return []
         
-        # Procesar cada expediente y obtener toda su información relacionada
+        # Procesar cada expediente con su información relacionada (cargada en lote)
         expedientes_completos = []
+        relacionados = cargar_datos_relacionados(cursor, [exp_row[0] for exp_row in expedientes_base])
         
         for exp_row in expedientes_base:
             exp_id = exp_row[0]
@@ -479,15 +669,7 @@ def buscar_expedientes(radicado):
             
             # Obtener ingresos con manejo de errores
             try:
-                cursor.execute("""
-                    SELECT fecha_ingreso, observaciones, solicitud, fechas, 
-                           actuacion_id, ubicacion, fecha_estado_auto
-                    FROM ingresos 
-                    WHERE expediente_id = %s
-                    ORDER BY fecha_ingreso ASC
-                """, (exp_id,))
-                
-                ingresos_raw = cursor.fetchall()
+                ingresos_raw = relacionados['ingresos'].get(exp_id, [])
                 logger.info(f"Ingresos encontrados para expediente {exp_id}: {len(ingresos_raw)}")
                 
                 expediente['ingresos'] = [
@@ -509,15 +691,7 @@ def buscar_expedientes(radicado):
             
             # Obtener estados con manejo de errores
             try:
-                cursor.execute("""
-                    SELECT fecha_estado, clase, auto_anotacion, observaciones, 
-                           actuacion_id, ingresos_id, fecha_auto
-                    FROM estados 
-                    WHERE expediente_id = %s
-                    ORDER BY fecha_estado ASC
-                """, (exp_id,))
-                
-                estados_raw = cursor.fetchall()
+                estados_raw = relacionados['estados'].get(exp_id, [])
                 logger.info(f"Estados encontrados para expediente {exp_id}: {len(estados_raw)}")
                 
                 expediente['estados'] = [
@@ -568,16 +742,7 @@ def buscar_expedientes(radicado):
             
             # Obtener actuaciones con manejo de errores y logging detallado
             try:
-                logger.info(f"Buscando actuaciones para expediente {exp_id}...")
-                cursor.execute("""
-                    SELECT numero_actuacion, descripcion_actuacion, tipo_origen, 
-                           archivo_origen, fecha_actuacion
-                    FROM actuaciones 
-                    WHERE expediente_id = %s
-                    ORDER BY tipo_origen, numero_actuacion
-                """, (exp_id,))
-                
-                actuaciones_raw = cursor.fetchall()
+                actuaciones_raw = relacionados['actuaciones'].get(exp_id, [])
                 logger.info(f"Actuaciones encontradas para expediente {exp_id}: {len(actuaciones_raw)}")
                 
                 if actuaciones_raw:
@@ -688,265 +853,31 @@ def buscar_expedientes(radicado):
         return []
 
 
-def filtrar_por_estado(estado, orden_fecha='DESC', limite=50, fecha_desde=None, fecha_hasta=None, tipo_fecha='ingreso'):
-    """Filtra expedientes por estado - ULTRA OPTIMIZADO usando campo estado directo"""
-    try:
-        conn = obtener_conexion()
-        cursor = conn.cursor()
-        
-        # Construir la consulta base OPTIMIZADA
-        where_conditions = []
-        parametros = []
-        
-        # Filtro por estado DIRECTO desde campo estado (ULTRA RÁPIDO)
-        if estado == "ACTIVO PENDIENTE":
-            where_conditions.append("e.estado = %s")
-            parametros.append("Activo Pendiente")
-        elif estado == "ACTIVO RESUELTO":
-            where_conditions.append("e.estado = %s")
-            parametros.append("Activo Resuelto")
-        elif estado == "INACTIVO RESUELTO":
-            where_conditions.append("e.estado = %s")
-            parametros.append("Inactivo Resuelto")
-        elif estado == "PENDIENTE":
-            where_conditions.append("e.estado = %s")
-            parametros.append("Pendiente")
-        elif estado == "ACTIVO":
-            # Todos los activos (Pendiente + Resuelto)
-            where_conditions.append("e.estado IN (%s, %s)")
-            parametros.extend(["Activo Pendiente", "Activo Resuelto"])
-        elif estado == "INACTIVO":
-            # Todos los inactivos
-            where_conditions.append("e.estado = %s")
-            parametros.append("Inactivo Resuelto")
-        else:
-            # Estado específico exacto
-            where_conditions.append("e.estado = %s")
-            parametros.append(estado)
-        
-        # Construir la consulta completa OPTIMIZADA con ordenamiento especial para Activo Pendiente
-        where_clause = " AND ".join(where_conditions) if where_conditions else "1=1"
-        orden_sql = 'DESC' if orden_fecha == 'DESC' else 'ASC'
-        
-        # Ordenamiento especial para 'Activo Pendiente': por turno (más antiguo primero)
-        if estado == "ACTIVO PENDIENTE":
-            if orden_fecha == 'ASC':
-                # ASC = más antiguo primero = turno más bajo primero
-                order_clause = "ORDER BY e.turno ASC NULLS LAST, e.fecha_ingreso ASC"
-            else:
-                # DESC = más reciente primero = turno más alto primero  
-                order_clause = "ORDER BY e.turno DESC NULLS LAST, e.fecha_ingreso DESC"
-        else:
-            # Para otros estados, usar ordenamiento por fecha normal
-            order_clause = f"ORDER BY COALESCE(e.fecha_ingreso, CURRENT_DATE) {orden_sql}"
-        
-        # Consulta ULTRA OPTIMIZADA - con ordenamiento especial para Activo Pendiente
-        query = f"""
-            SELECT 
-                e.id, e.radicado_completo, e.radicado_corto, e.demandante, e.demandado,
-                e.juzgado_origen, e.fecha_ingreso, e.estado, e.turno,
-                COALESCE(e.fecha_ingreso, CURRENT_DATE) as fecha_orden
-            FROM expediente e
-            WHERE {where_clause}
-            {order_clause}
-            LIMIT %s
-        """
-        
-        parametros.append(limite)
-        cursor.execute(query, parametros)
-        resultados_principales = cursor.fetchall()
-        
-        # Para cada expediente, obtener toda su información relacionada
-        expedientes_completos = []
-        
-        for row in resultados_principales:
-            exp_id = row[0]
-            
-            expediente = {
-                'id': row[0],
-                'radicado_completo': row[1],
-                'radicado_corto': row[2],
-                'demandante': row[3],
-                'demandado': row[4],
-                'juzgado_origen': row[5],
-                'fecha_ingreso': row[6],
-                'estado': row[7],  # Estado directo de la tabla
-                'turno': row[8],   # Campo turno de la tabla
-                'fecha_actuacion': row[9],  # Fecha de ingreso como fecha de orden
-                'ingresos': [],
-                'estados': [],
-                'actuaciones': [],
-                'estadisticas': {}
-            }
-            
-            # Obtener ingresos
-            cursor.execute("""
-                SELECT fecha_ingreso, observaciones, solicitud, fechas, 
-                       actuacion_id, ubicacion, fecha_estado_auto
-                FROM ingresos 
-                WHERE expediente_id = %s
-                ORDER BY fecha_ingreso ASC
-            """, (exp_id,))
-            
-            expediente['ingresos'] = [
-                {
-                    'fecha_ingreso': row[0],
-                    'observaciones': row[1],
-                    'solicitud': row[2],
-                    'fechas': row[3],
-                    'actuacion_id': row[4],
-                    'ubicacion': row[5],
-                    'fecha_estado_auto': normalize_date(row[6]),  # Normalizar la fecha
-                    'juzgado_origen': expediente['juzgado_origen']
-                }
-                for row in cursor.fetchall()
-            ]
-            
-            # Obtener estados
-            cursor.execute("""
-                SELECT fecha_estado, clase, auto_anotacion, observaciones, 
-                       actuacion_id, ingresos_id, fecha_auto
-                FROM estados 
-                WHERE expediente_id = %s
-                ORDER BY fecha_estado ASC
-            """, (exp_id,))
-            
-            expediente['estados'] = [
-                {
-                    'fecha_estado': row[0],
-                    'clase': row[1],
-                    'auto_anotacion': row[2],
-                    'observaciones': row[3],
-                    'actuacion_id': row[4],
-                    'ingresos_id': row[5],
-                    'fecha_auto': row[6],
-                    'demandante': expediente['demandante'],
-                    'demandado': expediente['demandado']
-                }
-                for row in cursor.fetchall()
-            ]
-            
-            
-            # Calcular fecha de ingreso más antigua sin salida (para mostrar en la interfaz)
-            try:
-                # Obtener ingresos sin salida (que no tienen estado posterior)
-                ingresos_sin_salida_list = []
-                for ingreso in expediente['ingresos']:
-                    fecha_ing = ingreso['fecha_ingreso']
-                    if fecha_ing:
-                        # Verificar si existe un estado posterior a este ingreso
-                        tiene_salida = any(
-                            estado['fecha_estado'] >= fecha_ing 
-                            for estado in expediente['estados'] 
-                            if estado['fecha_estado']
-                        )
-                        if not tiene_salida:
-                            ingresos_sin_salida_list.append(fecha_ing)
-                
-                # Seleccionar la fecha más antigua sin salida
-                if ingresos_sin_salida_list:
-                    expediente['fecha_ingreso_mas_antigua_sin_salida'] = min(ingresos_sin_salida_list)
-                else:
-                    expediente['fecha_ingreso_mas_antigua_sin_salida'] = None
-            except Exception as e:
-                logger.error(f"ERROR calculando fecha sin salida para expediente {exp_id}: {e}")
-                expediente['fecha_ingreso_mas_antigua_sin_salida'] = None
+def _condicion_estado(estado):
+    """Condición SQL del filtro por estado (valores del formulario → valores de BD)"""
+    estados_bd = {
+        "ACTIVO PENDIENTE": "Activo Pendiente",
+        "ACTIVO RESUELTO": "Activo Resuelto",
+        "INACTIVO RESUELTO": "Inactivo Resuelto",
+        "PENDIENTE": "Pendiente",
+        "INACTIVO": "Inactivo Resuelto",
+    }
+    if estado == "ACTIVO":
+        # Todos los activos (Pendiente + Resuelto)
+        return "e.estado IN (%s, %s)", ["Activo Pendiente", "Activo Resuelto"]
+    # Estado conocido o estado específico exacto
+    return "e.estado = %s", [estados_bd.get(estado, estado)]
 
-            # Obtener actuaciones
-            cursor.execute("""
-                SELECT numero_actuacion, descripcion_actuacion, tipo_origen, 
-                       archivo_origen, fecha_actuacion
-                FROM actuaciones 
-                WHERE expediente_id = %s
-                ORDER BY tipo_origen, numero_actuacion
-            """, (exp_id,))
-            
-            expediente['actuaciones'] = [
-                {
-                    'numero_actuacion': row[0],
-                    'descripcion_actuacion': row[1],
-                    'tipo_origen': row[2],
-                    'archivo_origen': row[3],
-                    'fecha_actuacion': row[4]
-                }
-                for row in cursor.fetchall()
-            ]
-            
-            # Usar estado directo de la tabla (OPTIMIZADO)
-            expediente['estado_actual'] = expediente['estado'] or 'Sin Estado'
-            expediente['descripcion_estado'] = f"Estado: {expediente['estado'] or 'Sin Estado'}"
-            
-            # Estadísticas básicas
-            expediente['estadisticas'] = {
-                'total_ingresos': len(expediente['ingresos']),
-                'total_estados': len(expediente['estados']),
-                'total_actuaciones': len(expediente['actuaciones'])
-            }
-            
-            # LÓGICA CORREGIDA DE FECHAS:
-            # 1. Fecha de registro: Primera fecha de ingreso SOLO de tabla ingresos (archivo ingresos_al_despacho_act.xlsx)
-            # 2. Fecha de actuación: Última fecha de estado válida
-            # 3. Si no hay ingresos en la tabla → fecha_registro = None
-            # 4. Si no hay estados → fecha_actuacion = None (N/A, "para resolver")
-            
-            # Calcular fecha de registro (primera fecha de ingreso SOLO de tabla ingresos)
-            fechas_ingreso = []
-            for ingreso in expediente['ingresos']:
-                fecha_normalizada = normalize_date(ingreso['fecha_ingreso'])
-                if fecha_normalizada:
-                    fechas_ingreso.append(fecha_normalizada)
-            
-            if fechas_ingreso:
-                expediente['fecha_registro'] = min(fechas_ingreso)  # Primera fecha de ingreso
-            else:
-                # Si no hay ingresos en la tabla, fecha_registro = None
-                expediente['fecha_registro'] = None
-            
-            # Calcular fecha de actuación (última fecha de estado válida)
-            fechas_estado = []
-            for estado in expediente['estados']:
-                fecha_normalizada = normalize_date(estado['fecha_estado'])
-                if fecha_normalizada:
-                    fechas_estado.append(fecha_normalizada)
-            
-            if fechas_estado:
-                expediente['fecha_actuacion'] = max(fechas_estado)  # Última fecha de estado
-            else:
-                expediente['fecha_actuacion'] = None  # N/A - "para resolver"
-            
-            expedientes_completos.append(expediente)
-        
-        cursor.close()
-        conn.close()
-        
-        return expedientes_completos
-        
-    except Exception as e:
-        print(f"Error en filtrar_por_estado: {e}")
-        raise e
 
-
-def filtrar_por_solicitud(solicitud, estado_filtro='', orden_fecha='DESC', limite=50):
+def _consulta_solicitud(solicitud, estado_filtro=''):
     """
-    Filtra expedientes por solicitud desde la tabla ingresos Y opcionalmente por estado.
-    
+    FROM/WHERE del filtro por solicitud desde la tabla ingresos y opcionalmente por estado.
+
     IMPORTANTE: Solo considera solicitudes PENDIENTES que sean las MÁS RECIENTES.
     - Una solicitud está pendiente si su fecha_ingreso > última fecha_estado
     - Solo muestra expedientes donde la solicitud buscada es la MÁS RECIENTE de las pendientes
     """
-    try:
-        conn = obtener_conexion()
-        cursor = conn.cursor()
-        
-        # Construir la consulta para buscar en la tabla ingresos
-        orden_sql = 'DESC' if orden_fecha == 'DESC' else 'ASC'
-        
-        # Consulta CORREGIDA V2: Solo muestra si la solicitud es la MÁS RECIENTE pendiente
-        query = f"""
-            SELECT DISTINCT
-                e.id, e.radicado_completo, e.radicado_corto, e.demandante, e.demandado,
-                e.juzgado_origen, e.fecha_ingreso, e.estado, e.turno,
-                COALESCE(e.fecha_ingreso, CURRENT_DATE) as fecha_orden
+    consulta = """
             FROM expediente e
             INNER JOIN ingresos i ON e.id = i.expediente_id
             LEFT JOIN (
@@ -970,54 +901,28 @@ def filtrar_por_solicitud(solicitud, estado_filtro='', orden_fecha='DESC', limit
                     OR est.ultima_fecha_estado IS NULL
                   )
               )"""
-        
-        parametros = [f'%{solicitud}%']
-        
-        # Agregar filtro de estado si se proporciona
-        if estado_filtro:
-            # Mapear valores del filtro a valores de BD
-            if estado_filtro == "ACTIVO PENDIENTE":
-                query += " AND e.estado = %s"
-                parametros.append("Activo Pendiente")
-            elif estado_filtro == "ACTIVO RESUELTO":
-                query += " AND e.estado = %s"
-                parametros.append("Activo Resuelto")
-            elif estado_filtro == "INACTIVO RESUELTO":
-                query += " AND e.estado = %s"
-                parametros.append("Inactivo Resuelto")
-            elif estado_filtro == "PENDIENTE":
-                query += " AND e.estado = %s"
-                parametros.append("Pendiente")
-            else:
-                # Estado específico exacto
-                query += " AND e.estado = %s"
-                parametros.append(estado_filtro)
-        
-        # Ordenamiento especial para 'Activo Pendiente': por turno (más antiguo primero)
-        # IMPORTANTE: El turno se asigna por fecha_ingreso_sin_salida, no por fecha_ingreso del expediente
-        if estado_filtro == "ACTIVO PENDIENTE":
-            if orden_fecha == 'ASC':
-                # ASC = más antiguo primero = turno más bajo primero
-                order_clause = "ORDER BY CAST(e.turno AS INTEGER) ASC NULLS LAST"
-            else:
-                # DESC = más reciente primero = turno más alto primero  
-                order_clause = "ORDER BY CAST(e.turno AS INTEGER) DESC NULLS LAST"
-        else:
-            # Para otros estados, usar ordenamiento por fecha normal
-            order_clause = f"ORDER BY fecha_orden {orden_sql}"
-        
-        query += f" {order_clause} LIMIT %s"
-        parametros.append(limite)
-        cursor.execute(query, parametros)
-        resultados_principales = cursor.fetchall()
-        
-        # Para cada expediente, obtener toda su información relacionada
-        expedientes_completos = []
-        
-        for row in resultados_principales:
-            exp_id = row[0]
-            
-            expediente = {
+    parametros = [f'%{solicitud}%']
+
+    # Agregar filtro de estado si se proporciona
+    if estado_filtro:
+        condicion, params_estado = _condicion_estado(estado_filtro)
+        consulta += f" AND {condicion}"
+        parametros.extend(params_estado)
+
+    return consulta, parametros
+
+
+COLUMNAS_LISTADO = """
+                e.id, e.radicado_completo, e.radicado_corto, e.demandante, e.demandado,
+                e.juzgado_origen, e.fecha_ingreso, e.estado, e.turno,
+                COALESCE(e.fecha_ingreso, CURRENT_DATE) as fecha_orden"""
+
+
+def armar_expedientes(cursor, resultados_principales, con_relacionados=True):
+    """Convierte las filas del listado en diccionarios con ingresos, estados y actuaciones"""
+    if not con_relacionados:
+        return [
+            {
                 'id': row[0],
                 'radicado_completo': row[1],
                 'radicado_corto': row[2],
@@ -1026,156 +931,267 @@ def filtrar_por_solicitud(solicitud, estado_filtro='', orden_fecha='DESC', limit
                 'juzgado_origen': row[5],
                 'fecha_ingreso': row[6],
                 'estado': row[7],
-                'turno': row[8],   # Campo turno de la tabla
-                'fecha_actuacion': row[9],
-                'ingresos': [],
-                'estados': [],
-                'actuaciones': [],
-                'estadisticas': {}
+                'turno': row[8],
             }
-            
-            # Obtener ingresos
-            cursor.execute("""
-                SELECT fecha_ingreso, observaciones, solicitud, fechas, 
-                       actuacion_id, ubicacion, fecha_estado_auto
-                FROM ingresos 
-                WHERE expediente_id = %s
-                ORDER BY fecha_ingreso ASC
-            """, (exp_id,))
-            
-            expediente['ingresos'] = [
-                {
-                    'fecha_ingreso': row[0],
-                    'observaciones': row[1],
-                    'solicitud': row[2],
-                    'fechas': row[3],
-                    'actuacion_id': row[4],
-                    'ubicacion': row[5],
-                    'fecha_estado_auto': normalize_date(row[6]),
-                    'juzgado_origen': expediente['juzgado_origen']
-                }
-                for row in cursor.fetchall()
-            ]
-            
-            # Obtener estados
-            cursor.execute("""
-                SELECT fecha_estado, clase, auto_anotacion, observaciones, 
-                       actuacion_id, ingresos_id, fecha_auto
-                FROM estados 
-                WHERE expediente_id = %s
-                ORDER BY fecha_estado ASC
-            """, (exp_id,))
-            
-            expediente['estados'] = [
-                {
-                    'fecha_estado': row[0],
-                    'clase': row[1],
-                    'auto_anotacion': row[2],
-                    'observaciones': row[3],
-                    'actuacion_id': row[4],
-                    'ingresos_id': row[5],
-                    'fecha_auto': row[6],
-                    'demandante': expediente['demandante'],
-                    'demandado': expediente['demandado']
-                }
-                for row in cursor.fetchall()
-            ]
-            
-            
-            # Calcular fecha de ingreso más antigua sin salida (para mostrar en la interfaz)
-            try:
-                # Obtener ingresos sin salida (que no tienen estado posterior)
-                ingresos_sin_salida_list = []
-                for ingreso in expediente['ingresos']:
-                    fecha_ing = ingreso['fecha_ingreso']
-                    if fecha_ing:
-                        # Verificar si existe un estado posterior a este ingreso
-                        tiene_salida = any(
-                            estado['fecha_estado'] >= fecha_ing 
-                            for estado in expediente['estados'] 
-                            if estado['fecha_estado']
-                        )
-                        if not tiene_salida:
-                            ingresos_sin_salida_list.append(fecha_ing)
-                
-                # Seleccionar la fecha más antigua sin salida
-                if ingresos_sin_salida_list:
-                    expediente['fecha_ingreso_mas_antigua_sin_salida'] = min(ingresos_sin_salida_list)
-                else:
-                    expediente['fecha_ingreso_mas_antigua_sin_salida'] = None
-            except Exception as e:
-                logger.error(f"ERROR calculando fecha sin salida para expediente {exp_id}: {e}")
-                expediente['fecha_ingreso_mas_antigua_sin_salida'] = None
+            for row in resultados_principales
+        ]
 
-            # Obtener actuaciones
-            cursor.execute("""
-                SELECT numero_actuacion, descripcion_actuacion, tipo_origen, 
-                       archivo_origen, fecha_actuacion
-                FROM actuaciones 
-                WHERE expediente_id = %s
-                ORDER BY tipo_origen, numero_actuacion
-            """, (exp_id,))
-            
-            expediente['actuaciones'] = [
-                {
-                    'numero_actuacion': row[0],
-                    'descripcion_actuacion': row[1],
-                    'tipo_origen': row[2],
-                    'archivo_origen': row[3],
-                    'fecha_actuacion': row[4]
-                }
-                for row in cursor.fetchall()
-            ]
-            
-            # Usar estado directo de la tabla
-            expediente['estado_actual'] = expediente['estado'] or 'Sin Estado'
-            expediente['descripcion_estado'] = f"Estado: {expediente['estado'] or 'Sin Estado'}"
-            
-            # Estadísticas básicas
-            expediente['estadisticas'] = {
-                'total_ingresos': len(expediente['ingresos']),
-                'total_estados': len(expediente['estados']),
-                'total_actuaciones': len(expediente['actuaciones'])
+    # Para cada expediente, armar su información relacionada (cargada en lote)
+    expedientes_completos = []
+    relacionados = cargar_datos_relacionados(cursor, [row[0] for row in resultados_principales])
+    
+    for row in resultados_principales:
+        exp_id = row[0]
+        
+        expediente = {
+            'id': row[0],
+            'radicado_completo': row[1],
+            'radicado_corto': row[2],
+            'demandante': row[3],
+            'demandado': row[4],
+            'juzgado_origen': row[5],
+            'fecha_ingreso': row[6],
+            'estado': row[7],  # Estado directo de la tabla
+            'turno': row[8],   # Campo turno de la tabla
+            'fecha_actuacion': row[9],  # Fecha de ingreso como fecha de orden
+            'ingresos': [],
+            'estados': [],
+            'actuaciones': [],
+            'estadisticas': {}
+        }
+        
+        # Obtener ingresos
+        expediente['ingresos'] = [
+            {
+                'fecha_ingreso': row[0],
+                'observaciones': row[1],
+                'solicitud': row[2],
+                'fechas': row[3],
+                'actuacion_id': row[4],
+                'ubicacion': row[5],
+                'fecha_estado_auto': normalize_date(row[6]),  # Normalizar la fecha
+                'juzgado_origen': expediente['juzgado_origen']
             }
-            
-            # LÓGICA CORREGIDA DE FECHAS:
-            # 1. Fecha de registro: Primera fecha de ingreso SOLO de tabla ingresos (archivo ingresos_al_despacho_act.xlsx)
-            # 2. Fecha de actuación: Última fecha de estado válida
-            # 3. Si no hay ingresos en la tabla → fecha_registro = None
-            # 4. Si no hay estados → fecha_actuacion = None (N/A, "para resolver")
-            
-            # Calcular fecha de registro (primera fecha de ingreso SOLO de tabla ingresos)
-            fechas_ingreso = []
+            for row in relacionados['ingresos'].get(exp_id, [])
+        ]
+        
+        # Obtener estados
+        expediente['estados'] = [
+            {
+                'fecha_estado': row[0],
+                'clase': row[1],
+                'auto_anotacion': row[2],
+                'observaciones': row[3],
+                'actuacion_id': row[4],
+                'ingresos_id': row[5],
+                'fecha_auto': row[6],
+                'demandante': expediente['demandante'],
+                'demandado': expediente['demandado']
+            }
+            for row in relacionados['estados'].get(exp_id, [])
+        ]
+        
+        
+        # Calcular fecha de ingreso más antigua sin salida (para mostrar en la interfaz)
+        try:
+            # Obtener ingresos sin salida (que no tienen estado posterior)
+            ingresos_sin_salida_list = []
             for ingreso in expediente['ingresos']:
-                fecha_normalizada = normalize_date(ingreso['fecha_ingreso'])
-                if fecha_normalizada:
-                    fechas_ingreso.append(fecha_normalizada)
-            
-            if fechas_ingreso:
-                expediente['fecha_registro'] = min(fechas_ingreso)  # Primera fecha de ingreso
-            else:
-                # Si no hay ingresos en la tabla, fecha_registro = None
-                expediente['fecha_registro'] = None
-            
-            # Calcular fecha de actuación (última fecha de estado válida)
-            fechas_estado = []
-            for estado in expediente['estados']:
-                fecha_normalizada = normalize_date(estado['fecha_estado'])
-                if fecha_normalizada:
-                    fechas_estado.append(fecha_normalizada)
+                fecha_ing = ingreso['fecha_ingreso']
+                if fecha_ing:
+                    # Verificar si existe un estado posterior a este ingreso
+                    tiene_salida = any(
+                        estado['fecha_estado'] >= fecha_ing 
+                        for estado in expediente['estados'] 
+                        if estado['fecha_estado']
+                    )
+                    if not tiene_salida:
+                        ingresos_sin_salida_list.append(fecha_ing)
             
-            if fechas_estado:
-                expediente['fecha_actuacion'] = max(fechas_estado)  # Última fecha de estado
+            # Seleccionar la fecha más antigua sin salida
+            if ingresos_sin_salida_list:
+                expediente['fecha_ingreso_mas_antigua_sin_salida'] = min(ingresos_sin_salida_list)
             else:
-                expediente['fecha_actuacion'] = None  # N/A - "para resolver"
-            
-            expedientes_completos.append(expediente)
+                expediente['fecha_ingreso_mas_antigua_sin_salida'] = None
+        except Exception as e:
+            logger.error(f"ERROR calculando fecha sin salida para expediente {exp_id}: {e}")
+            expediente['fecha_ingreso_mas_antigua_sin_salida'] = None
+
+        # Obtener actuaciones
+        expediente['actuaciones'] = [
+            {
+                'numero_actuacion': row[0],
+                'descripcion_actuacion': row[1],
+                'tipo_origen': row[2],
+                'archivo_origen': row[3],
+                'fecha_actuacion': row[4]
+            }
+            for row in relacionados['actuaciones'].get(exp_id, [])
+        ]
         
-        cursor.close()
-        conn.close()
+        # Usar estado directo de la tabla (OPTIMIZADO)
+        expediente['estado_actual'] = expediente['estado'] or 'Sin Estado'
+        expediente['descripcion_estado'] = f"Estado: {expediente['estado'] or 'Sin Estado'}"
         
-        return expedientes_completos
+        # Estadísticas básicas
+        expediente['estadisticas'] = {
+            'total_ingresos': len(expediente['ingresos']),
+            'total_estados': len(expediente['estados']),
+            'total_actuaciones': len(expediente['actuaciones'])
+        }
         
+        # LÓGICA CORREGIDA DE FECHAS:
+        # 1. Fecha de registro: Primera fecha de ingreso SOLO de tabla ingresos (archivo ingresos_al_despacho_act.xlsx)
+        # 2. Fecha de actuación: Última fecha de estado válida
+        # 3. Si no hay ingresos en la tabla → fecha_registro = None
+        # 4. Si no hay estados → fecha_actuacion = None (N/A, "para resolver")
+        
+        # Calcular fecha de registro (primera fecha de ingreso SOLO de tabla ingresos)
+        fechas_ingreso = []
+        for ingreso in expediente['ingresos']:
+            fecha_normalizada = normalize_date(ingreso['fecha_ingreso'])
+            if fecha_normalizada:
+                fechas_ingreso.append(fecha_normalizada)
+        
+        if fechas_ingreso:
+            expediente['fecha_registro'] = min(fechas_ingreso)  # Primera fecha de ingreso
+        else:
+            # Si no hay ingresos en la tabla, fecha_registro = None
+            expediente['fecha_registro'] = None
+        
+        # Calcular fecha de actuación (última fecha de estado válida)
+        fechas_estado = []
+        for estado in expediente['estados']:
+            fecha_normalizada = normalize_date(estado['fecha_estado'])
+            if fecha_normalizada:
+                fechas_estado.append(fecha_normalizada)
+        
+        if fechas_estado:
+            expediente['fecha_actuacion'] = max(fechas_estado)  # Última fecha de estado
+        else:
+            expediente['fecha_actuacion'] = None  # N/A - "para resolver"
+        
+        expedientes_completos.append(expediente)
+
+    return expedientes_completos
+
+
+def _leer_pagina(query_base, parametros, clave, orden_fecha, despues, antes, por_pagina,
+                 con_relacionados, distinct=False):
+    """Ejecuta una página keyset del listado y arma sus expedientes"""
+    condicion, params_cursor, order_by, columna_clave, hacia_atras = clausulas_keyset(
+        clave, descendente=(orden_fecha == 'DESC'), despues=despues, antes=antes)
+
+    query = f"""
+            SELECT {'DISTINCT' if distinct else ''}{COLUMNAS_LISTADO},
+                {columna_clave}
+            {query_base}"""
+    if condicion:
+        query += f" AND {condicion}"
+    query += f" {order_by} LIMIT %s"
+
+    conn = obtener_conexion()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, list(parametros) + params_cursor + [por_pagina + 1])
+        filas, siguiente, anterior = recortar_pagina(
+            cursor.fetchall(), por_pagina, hacia_atras, con_cursor=bool(despues or antes))
+        expedientes = armar_expedientes(cursor, filas, con_relacionados)
+        cursor.close()
+    finally:
+        conn.close()
+
+    return {'expedientes': expedientes, 'siguiente': siguiente, 'anterior': anterior}
+
+
+def pagina_por_estado(estado, orden_fecha='DESC', despues=None, antes=None, por_pagina=POR_PAGINA,
+                      con_relacionados=True):
+    """
+    Una página de expedientes por estado con paginación por cursor (ver utils/paginacion.py).
+    'Activo Pendiente' se ordena por turno; los demás estados, por fecha de ingreso.
+
+    Returns:
+        dict: expedientes, siguiente y anterior (cursores o None)
+    """
+    condicion, parametros = _condicion_estado(estado)
+    clave = 'turno' if estado == "ACTIVO PENDIENTE" else 'fecha'
+    return _leer_pagina(f"""
+            FROM expediente e
+            WHERE {condicion}""", parametros, clave, orden_fecha, despues, antes, por_pagina, con_relacionados)
+
+
+def pagina_por_solicitud(solicitud, estado_filtro='', orden_fecha='DESC', despues=None, antes=None,
+                         por_pagina=POR_PAGINA, con_relacionados=True):
+    """
+    Una página de expedientes cuya solicitud pendiente más reciente coincide
+    con `solicitud`, con paginación por cursor. Con estado 'ACTIVO PENDIENTE'
+    se ordena por turno; si no, por fecha de ingreso.
+
+    Returns:
+        dict: expedientes, siguiente y anterior (cursores o None)
+    """
+    query_base, parametros = _consulta_solicitud(solicitud, estado_filtro)
+    clave = 'turno' if estado_filtro == "ACTIVO PENDIENTE" else 'fecha'
+    return _leer_pagina(query_base, parametros, clave, orden_fecha, despues, antes, por_pagina,
+                        con_relacionados, distinct=True)
+
+
+def contar_por_estado(estado, tope):
+    """Cantidad de expedientes del estado, hasta `tope` (no recorre más filas)"""
+    condicion, parametros = _condicion_estado(estado)
+    return _contar(f"FROM expediente e WHERE {condicion}", parametros, tope)
+
+
+def contar_por_solicitud(solicitud, estado_filtro, tope):
+    """Cantidad de expedientes del filtro por solicitud, hasta `tope`"""
+    query_base, parametros = _consulta_solicitud(solicitud, estado_filtro)
+    return _contar(query_base, parametros, tope, distinct=True)
+
+
+def _pagina_listado(estado, solicitud, orden_fecha, despues=None, antes=None):
+    """Página del listado de la vista: por solicitud si se indicó, si no por estado"""
+    if solicitud:
+        return pagina_por_solicitud(solicitud, estado_filtro=estado, orden_fecha=orden_fecha,
+                                    despues=despues, antes=antes)
+    return pagina_por_estado(estado, orden_fecha=orden_fecha, despues=despues, antes=antes)
+
+
+def _contar_listado(estado, solicitud, tope):
+    if solicitud:
+        return contar_por_solicitud(solicitud, estado, tope)
+    return contar_por_estado(estado, tope)
+
+
+def _contar(query_base, parametros, tope, distinct=False):
+    conn = obtener_conexion()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT COUNT(*) FROM (
+                SELECT {'DISTINCT e.id' if distinct else '1'} {query_base} LIMIT %s
+            ) t
+        """, list(parametros) + [tope])
+        total = cursor.fetchone()[0]
+        cursor.close()
+        return total
+    finally:
+        conn.close()
+
+
+def filtrar_por_estado(estado, orden_fecha='DESC', limite=50, fecha_desde=None, fecha_hasta=None, tipo_fecha='ingreso'):
+    """Filtra expedientes por estado (los primeros `limite`, en el orden de pagina_por_estado)"""
+    try:
+        return pagina_por_estado(estado, orden_fecha=orden_fecha, por_pagina=limite)['expedientes']
+    except Exception as e:
+        print(f"Error en filtrar_por_estado: {e}")
+        raise e
+
+
+def filtrar_por_solicitud(solicitud, estado_filtro='', orden_fecha='DESC', limite=50):
+    """Filtra expedientes por solicitud pendiente más reciente (los primeros `limite`)"""
+    try:
+        return pagina_por_solicitud(solicitud, estado_filtro=estado_filtro, orden_fecha=orden_fecha,
+                                    por_pagina=limite)['expedientes']
     except Exception as e:
         print(f"Error en filtrar_por_solicitud: {e}")
         raise e
@@ -8,30 +8,41 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils.auth import login_required, get_current_user
 from modelo.configBd import obtener_conexion
+from utils.esquema import primera_columna
+from utils.estadisticas_expediente import estadisticas_disponibles
+from utils.metricas_cache import obtener_snapshot, describir_edad
 
 # Crear un Blueprint
 vistahome = Blueprint('idvistahome', __name__, template_folder='templates')
 
-def _detectar_columna_tipo(cursor):
+def _detectar_columna_tipo():
     """Retorna el nombre de la columna existente entre 'tipo_solicitud' y 'tipo_tramite', o None"""
+    return primera_columna('expediente', ('tipo_solicitud', 'tipo_tramite'))
+
+def obtener_metricas_dashboard(forzar=False):
+    """Obtiene las métricas para el dashboard desde la instantánea compartida (ver utils/metricas_cache.py)"""
     try:
-        cursor.execute("""
-            SELECT column_name FROM information_schema.columns
-            WHERE table_name = 'expediente' AND column_name IN ('tipo_solicitud', 'tipo_tramite')
-        """)
-        cols = [r[0] for r in cursor.fetchall()]
-        if 'tipo_solicitud' in cols:
-            return 'tipo_solicitud'
-        if 'tipo_tramite' in cols:
-            return 'tipo_tramite'
-        return None
-    except:
-        return None
+        metricas, edad = obtener_snapshot('home', calcular_metricas_dashboard, forzar=forzar)
+        return dict(metricas, edad_snapshot=describir_edad(edad))
+    except Exception as e:
+        print(f"Error obteniendo métricas: {e}")
+        import traceback
+        traceback.print_exc()
+        return {
+            'total_expediente': 0,
+            'expediente_por_estado': [],
+            'expediente_por_responsable': [],
+            'expediente_recientes': [],
+            'total_actuaciones': 0,
+            'total_ingresos': 0,
+            'total_estados': 0,
+            'tipos_proceso': []
+        }
 
-def obtener_metricas_dashboard():
-    """Obtiene las métricas para el dashboard - ULTRA OPTIMIZADO usando campo estado"""
+def calcular_metricas_dashboard():
+    """Calcula las métricas para el dashboard - ULTRA OPTIMIZADO usando campo estado"""
+    conn = obtener_conexion()
     try:
-        conn = obtener_conexion()
         cursor = conn.cursor()
         
         metricas = {}
@@ -89,17 +100,28 @@ def obtener_metricas_dashboard():
         metricas['expediente_recientes'] = cursor.fetchall()
         
         # 5. Estadísticas rápidas de tablas relacionadas
-        cursor.execute("SELECT COUNT(*) FROM actuaciones")
-        metricas['total_actuaciones'] = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM ingresos")
-        metricas['total_ingresos'] = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM estados")
-        metricas['total_estados'] = cursor.fetchone()[0]
+        if estadisticas_disponibles():
+            # Totales desde expediente_stats (una fila por expediente) en una sola consulta
+            cursor.execute("""
+                SELECT COALESCE(SUM(total_actuaciones), 0),
+                       COALESCE(SUM(total_ingresos), 0),
+                       COALESCE(SUM(total_estados), 0)
+                FROM expediente_stats
+            """)
+            (metricas['total_actuaciones'], metricas['total_ingresos'],
+             metricas['total_estados']) = (int(v) for v in cursor.fetchone())
+        else:
+            cursor.execute("SELECT COUNT(*) FROM actuaciones")
+            metricas['total_actuaciones'] = cursor.fetchone()[0]
+            
+            cursor.execute("SELECT COUNT(*) FROM ingresos")
+            metricas['total_ingresos'] = cursor.fetchone()[0]
+            
+            cursor.execute("SELECT COUNT(*) FROM estados")
+            metricas['total_estados'] = cursor.fetchone()[0]
         
         # 6. Distribución por tipo de proceso - SIMPLIFICADO
-        tipo_col = _detectar_columna_tipo(cursor)
+        tipo_col = _detectar_columna_tipo()
         if tipo_col:
             cursor.execute(f"""
                 SELECT 
@@ -115,30 +137,17 @@ def obtener_metricas_dashboard():
             metricas['tipos_proceso'] = []
         
         cursor.close()
-        conn.close()
         
         return metricas
         
-    except Exception as e:
-        print(f"Error obteniendo métricas: {e}")
-        import traceback
-        traceback.print_exc()
-        return {
-            'total_expediente': 0,
-            'expediente_por_estado': [],
-            'expediente_por_responsable': [],
-            'expediente_recientes': [],
-            'total_actuaciones': 0,
-            'total_ingresos': 0,
-            'total_estados': 0,
-            'tipos_proceso': []
-        }
+    finally:
+        conn.close()
 
 @vistahome.route('/home', methods=['GET', 'POST'])
 @login_required
 def vista_home():
     user = get_current_user()
-    metricas = obtener_metricas_dashboard()
+    metricas = obtener_metricas_dashboard(forzar=request.args.get('refrescar') == '1')
     return render_template('home.html', user=user, metricas=metricas)
 
 
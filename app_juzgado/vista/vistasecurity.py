@@ -2,7 +2,8 @@
 Vista del dashboard de seguridad
 """
 
-from flask import Blueprint, render_template, jsonify
+from flask import Blueprint, render_template, jsonify, request, session, Response
+import hmac
 import sys
 import os
 from datetime import datetime, timedelta
@@ -13,6 +14,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.auth import login_required, admin_required
 from utils.security_logger import get_security_stats
 from utils.rate_limiter import rate_limiter
+from modelo.configBd import estadisticas_pool
+from utils.instrumentacion_sql import estadisticas_consultas
+from utils import metricas_prometheus
 
 # Crear un Blueprint
 vistasecurity = Blueprint('idvistasecurity', __name__, template_folder='templates')
@@ -28,12 +32,7 @@ def security_dashboard():
         security_stats = get_security_stats()
         
         # Obtener información del rate limiter
-        rate_limit_stats = {
-            'blocked_ips': len(rate_limiter.blocked_ips),
-            'blocked_users': len(rate_limiter.blocked_users),
-            'total_attempts': sum(len(attempts) for attempts in rate_limiter.attempts.values()),
-            'login_attempts': sum(len(attempts) for attempts in rate_limiter.login_attempts.values())
-        }
+        rate_limit_stats = rate_limiter.stats()
         
         # Calcular métricas de seguridad
         total_events = security_stats.get('total_events', 0)
@@ -64,10 +63,11 @@ def api_security_stats():
     try:
         security_stats = get_security_stats()
         
+        estadisticas_limiter = rate_limiter.stats()
         rate_limit_stats = {
-            'blocked_ips': len(rate_limiter.blocked_ips),
-            'blocked_users': len(rate_limiter.blocked_users),
-            'active_attempts': sum(len(attempts) for attempts in rate_limiter.attempts.values())
+            'blocked_ips': estadisticas_limiter['blocked_ips'],
+            'blocked_users': estadisticas_limiter['blocked_users'],
+            'active_attempts': estadisticas_limiter['total_attempts']
         }
         
         security_score = calculate_security_score(security_stats, rate_limit_stats)
@@ -88,6 +88,59 @@ def api_security_stats():
             'error': str(e)
         })
 
+@vistasecurity.route('/api/pool-stats')
+@login_required
+@admin_required
+def api_pool_stats():
+    """API con la saturación del pool de conexiones del worker que atiende"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': estadisticas_pool(),
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@vistasecurity.route('/api/consultas-sql')
+@login_required
+@admin_required
+def api_consultas_sql():
+    """API con las consultas SQL agregadas por huella en el worker que atiende"""
+    try:
+        limite = max(1, min(request.args.get('limite', 50, type=int), 500))
+        orden = request.args.get('orden', 'total_ms')
+        return jsonify({
+            'success': True,
+            'data': estadisticas_consultas(limite, orden),
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@vistasecurity.route('/metrics')
+def metricas_prometheus_endpoint():
+    """
+    Métricas en formato de Prometheus, sumadas entre workers.
+    Con METRICAS_TOKEN requiere 'Authorization: Bearer <token>' (para el
+    scraper); sin él, una sesión de administrador.
+    """
+    token = metricas_prometheus.TOKEN
+    if token:
+        autorizacion = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(autorizacion.encode(), f'Bearer {token}'.encode()):
+            return Response('No autorizado\n', status=401, mimetype='text/plain',
+                            headers={'WWW-Authenticate': 'Bearer'})
+    elif not (session.get('logged_in') and session.get('administrador', False)):
+        return Response('No autorizado\n', status=403, mimetype='text/plain')
+    return Response(metricas_prometheus.exponer(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 def calculate_security_score(security_stats, rate_limit_stats):
     """
     Calcula un score de seguridad basado en las estadísticas
@@ -162,22 +215,23 @@ def api_security_alerts():
     """API para obtener alertas de seguridad activas"""
     try:
         alerts = []
+        rate_limit_stats = rate_limiter.stats()
         
         # Verificar IPs bloqueadas
-        if len(rate_limiter.blocked_ips) > 0:
+        if rate_limit_stats['blocked_ips'] > 0:
             alerts.append({
                 'type': 'warning',
                 'title': 'IPs Bloqueadas',
-                'message': f'{len(rate_limiter.blocked_ips)} IP(s) están bloqueadas por intentos excesivos',
+                'message': f'{rate_limit_stats["blocked_ips"]} IP(s) están bloqueadas por intentos excesivos',
                 'timestamp': datetime.now().isoformat()
             })
         
         # Verificar usuarios bloqueados
-        if len(rate_limiter.blocked_users) > 0:
+        if rate_limit_stats['blocked_users'] > 0:
             alerts.append({
                 'type': 'warning',
                 'title': 'Usuarios Bloqueados',
-                'message': f'{len(rate_limiter.blocked_users)} usuario(s) están bloqueados por intentos fallidos',
+                'message': f'{rate_limit_stats["blocked_users"]} usuario(s) están bloqueados por intentos fallidos',
                 'timestamp': datetime.now().isoformat()
             })
         
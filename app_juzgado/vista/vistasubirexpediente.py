@@ -1,9 +1,10 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, send_file, send_from_directory, Response, jsonify
+from flask import Blueprint, render_template, request, flash, redirect, url_for, send_file, send_from_directory, Response, jsonify, session, has_request_context
 import pandas as pd
 import os, re
 from werkzeug.utils import secure_filename
 import sys
 import logging
+import time
 from datetime import datetime, date
 from io import BytesIO
 
@@ -26,8 +27,24 @@ else:
 # Agregar el directorio padre al path para importar módulos
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from modelo.configBd import obtener_conexion
+from modelo.configBd import obtener_conexion, conexion_bd
 from utils.auth import login_required
+from utils.esquema import columnas_tabla, existe_tabla
+from utils.turnos import recalcular_turnos, turno_entero
+from utils.metricas_cache import invalidar_metricas
+from utils.lector_excel import LibroExcel, abrir_libro
+from utils.indice_radicados import (
+    IndiceRadicados, UMBRAL_INDICE_MEMORIA, buscar_en_bd, buscar_exactos, buscar_sufijos_en_bd,
+    filtro_radicado_exacto, radicado_normalizado_disponible, valor_radicado_exacto
+)
+from utils.carga_masiva import (
+    TIPOS_ENTEROS, crear_tabla_carga, copiar_filas_carga, insertar_desde_carga
+)
+from utils.metricas_prometheus import registrar_carga
+from utils.trabajos_carga import (
+    encolar_carga, obtener_trabajo, limpiar_trabajos_antiguos,
+    con_progreso, lotes_con_progreso, iniciar_progreso, reportar_progreso, progreso_actual
+)
 
 # Crear un Blueprint
 vistasubirexpediente = Blueprint('idvistasubirexpediente', __name__, template_folder='templates')
@@ -295,6 +312,16 @@ def obtener_roles_activos():
         logger.error(f"Tipo de error: {type(e).__name__}")
         return []
 
+def usuario_actual():
+    """
+    ID del usuario que hizo la carga: el de la sesión, o el dueño del trabajo
+    cuando se procesa en segundo plano (sin petición HTTP)
+    """
+    progreso = progreso_actual()
+    if progreso is not None:
+        return progreso.usuario_id
+    return session.get('user_id') if has_request_context() else None
+
 @vistasubirexpediente.route('/subirexpediente', methods=['GET', 'POST'])
 @login_required
 def vista_subirexpediente():
@@ -639,261 +666,315 @@ def limpiar_reportes_antiguos(dias=30):
         return 0
 
 def procesar_archivo_excel():
-    """Procesa la subida de archivo Excel"""
+    """Recibe el archivo Excel y lo encola para procesarlo en segundo plano"""
     logger.info("=== INICIO procesar_archivo_excel ===")
-    
+
     # Detectar si es modo actualización
     modo_actualizacion = request.form.get('modo_actualizacion') == 'true'
     logger.info(f"Modo de operación: {'ACTUALIZACIÓN' if modo_actualizacion else 'CREACIÓN'}")
-    
+    es_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
     try:
         file = request.files['archivo_excel']
         logger.info(f"Archivo recibido: {file.filename}")
-        
+
         if file.filename == '':
             logger.warning("No se seleccionó ningún archivo")
+            if es_ajax:
+                return jsonify({'success': False, 'error': 'No se seleccionó ningún archivo'}), 400
             flash('No se seleccionó ningún archivo', 'error')
             return redirect(request.url)
-        
-        if file and allowed_file(file.filename):
-            logger.info(f"Archivo válido: {file.filename}")
-            
-            # Leer archivo directamente desde memoria (sin guardarlo en disco)
-            # Esto funciona tanto en local como en cloud (Railway, Heroku, etc.)
-            logger.info("Leyendo archivo desde memoria")
-            file_content = BytesIO(file.read())
-            filename = secure_filename(file.filename)
-            
-            # Procesar según el modo
-            if modo_actualizacion:
-                logger.info("Procesando archivo en MODO ACTUALIZACIÓN")
-                
-                # Verificar si el archivo tiene múltiples pestañas (ingreso y estados)
-                try:
-                    with pd.ExcelFile(file_content) as excel_file:
-                        hojas_disponibles = excel_file.sheet_names
-                        logger.info(f"Hojas disponibles en el archivo: {hojas_disponibles}")
-                    
-                    # Resetear el puntero del BytesIO para poder leerlo nuevamente
-                    file_content.seek(0)
-                    
-                    # Verificar si tiene pestañas específicas para ingreso y estados
-                    tiene_pestaña_ingreso = any(hoja.lower() in ['ingreso', 'ingresos'] for hoja in hojas_disponibles)
-                    tiene_pestaña_estados = any(hoja.lower() in ['estado', 'estados'] for hoja in hojas_disponibles)
-                    
-                    if tiene_pestaña_ingreso or tiene_pestaña_estados:
-                        logger.info("Detectado archivo Excel con pestañas múltiples en modo ACTUALIZACIÓN")
-                        resultados = procesar_excel_actualizacion_multiples_pestañas(file_content, hojas_disponibles)
-                    else:
-                        logger.info("Procesando archivo Excel con formato tradicional en modo ACTUALIZACIÓN")
-                        resultados = procesar_excel_actualizacion(file_content)
-                        
-                except Exception as e:
-                    logger.warning(f"Error verificando estructura del Excel: {e}")
-                    logger.info("Procesando como archivo Excel tradicional en modo ACTUALIZACIÓN")
-                    file_content.seek(0)
-                    resultados = procesar_excel_actualizacion(file_content)
-            else:
-                logger.info("Procesando archivo en MODO CREACIÓN")
-                # Verificar si el archivo tiene múltiples pestañas (ingreso y estados)
-                try:
-                    with pd.ExcelFile(file_content) as excel_file:
-                        hojas_disponibles = excel_file.sheet_names
-                        logger.info(f"Hojas disponibles en el archivo: {hojas_disponibles}")
-                    
-                    # Resetear el puntero del BytesIO
-                    file_content.seek(0)
-                    
-                    # Verificar si tiene pestañas específicas para ingreso y estados
-                    tiene_pestaña_ingreso = any(hoja.lower() in ['ingreso', 'ingresos'] for hoja in hojas_disponibles)
-                    tiene_pestaña_estados = any(hoja.lower() in ['estado', 'estados'] for hoja in hojas_disponibles)
-                    
-                    if tiene_pestaña_ingreso and tiene_pestaña_estados:
-                        logger.info("Detectado archivo Excel con pestañas múltiples (ingreso y estados)")
-                        resultados = procesar_excel_multiples_pestañas(file_content, hojas_disponibles)
-                    else:
-                        logger.info("Procesando archivo Excel con formato tradicional")
-                        resultados = procesar_excel_expedientes(file_content)
-                        
-                except Exception as e:
-                    logger.warning(f"Error verificando estructura del Excel: {e}")
-                    logger.info("Procesando como archivo Excel tradicional")
-                    file_content.seek(0)
-                    resultados = procesar_excel_expedientes(file_content)
-            
-            logger.info(f"Resultados del procesamiento: {resultados}")
-            
-            # Ya no es necesario eliminar archivo temporal porque se procesó desde memoria
-            logger.info("Archivo procesado desde memoria - no hay archivos temporales que eliminar")
-            
-            # 🧹 LIMPIEZA AUTOMÁTICA: Eliminar reportes antiguos (>30 días)
-            try:
-                reportes_eliminados = limpiar_reportes_antiguos(dias=90)
-                if reportes_eliminados > 0:
-                    logger.info(f"🧹 Limpieza automática: {reportes_eliminados} reportes antiguos eliminados")
-            except Exception as e:
-                logger.warning(f"Error en limpieza automática de reportes: {e}")
-            
-            # Crear mensaje de resultado más detallado
-            # Detectar tipo de resultado basado en las claves presentes
-            if 'actualizados' in resultados:
-                # Formato tradicional de actualización (hoja única)
-                mensaje_resultado = f'Archivo procesado en MODO ACTUALIZACIÓN. '
-                mensaje_resultado += f'{resultados["actualizados"]} expedientes actualizados exitosamente'
-                
-                if resultados.get("sin_cambios", 0) > 0:
-                    mensaje_resultado += f', {resultados["sin_cambios"]} sin cambios (valores idénticos)'
-                
-                if resultados.get("no_encontrados", 0) > 0:
-                    mensaje_resultado += f', {resultados["no_encontrados"]} radicados no encontrados'
-                
-                if resultados["errores"] > 0:
-                    mensaje_resultado += f', {resultados["errores"]} errores'
-                
-                mensaje_resultado += f' de {resultados["total_filas"]} filas procesadas.'
-                
-                # Información sobre reporte de errores
-                if resultados.get("tiene_errores") and resultados.get("reporte_path"):
-                    reporte_filename = os.path.basename(resultados["reporte_path"])
-                    mensaje_resultado += f' Se generó un reporte detallado de errores.'
-                
-                # Mostrar primeros errores detallados
-                if resultados.get("errores_detallados") and len(resultados["errores_detallados"]) > 0:
-                    flash(mensaje_resultado, 'warning' if resultados["errores"] > 0 else 'success')
-                    
-                    # Crear mensaje adicional con detalle de errores
-                    errores_msg = "DETALLE DE ERRORES:\n"
-                    for i, error in enumerate(resultados["errores_detallados"][:5], 1):  # Solo primeros 5
-                        errores_msg += f"\n{i}. Fila {error['fila']}: {error['radicado']} - {error['motivo']}"
-                    
-                    if len(resultados["errores_detallados"]) > 5:
-                        errores_msg += f"\n... y {len(resultados['errores_detallados']) - 5} errores más"
-                    
-                    flash(errores_msg, 'info')
-                    
-                    # Agregar mensaje con enlace de descarga
-                    # Reporte guardado en BD - disponible en botón "Descargar Reportes de Errores"
-                    if resultados.get("reporte_id"):
-                        logger.info(f"Reporte guardado con ID: {resultados['reporte_id']}")
-                else:
-                    flash(mensaje_resultado, 'warning' if resultados["errores"] > 0 else 'success')
-                
-            elif 'expedientes_actualizados' in resultados or 'ingresos_agregados' in resultados:
-                # Formato múltiples pestañas en modo actualización
-                mensaje_resultado = f'Archivo procesado con múltiples pestañas en modo ACTUALIZACIÓN. '
-                
-                if 'ingresos_agregados' in resultados:
-                    mensaje_resultado += f'{resultados["ingresos_agregados"]} ingresos agregados, '
-                
-                if 'estados_agregados' in resultados:
-                    mensaje_resultado += f'{resultados["estados_agregados"]} estados agregados, '
-                
-                if resultados.get("errores", 0) > 0:
-                    mensaje_resultado += f'{resultados["errores"]} errores encontrados'
-                else:
-                    mensaje_resultado += 'sin errores'
-                
-                mensaje_resultado += f' de {resultados.get("total_filas", 0)} filas procesadas.'
-                
-                flash(mensaje_resultado, 'success' if resultados.get("errores", 0) == 0 else 'warning')
-                
-                # Mostrar detalle de errores si existen
-                if resultados.get("errores_detallados") and len(resultados["errores_detallados"]) > 0:
-                    errores_msg = "DETALLE DE ERRORES:\n"
-                    for i, error in enumerate(resultados["errores_detallados"][:5], 1):  # Solo primeros 5
-                        errores_msg += f"\n{i}. Fila {error['fila']} (Hoja: {error.get('hoja', 'N/A')}): {error['radicado']} - {error['motivo']}"
-                    
-                    if len(resultados["errores_detallados"]) > 5:
-                        errores_msg += f"\n... y {len(resultados['errores_detallados']) - 5} errores más"
-                    
-                    flash(errores_msg, 'info')
-                
-                # Reporte guardado en BD - disponible en botón "Descargar Reportes de Errores"
-                if resultados.get("reporte_id"):
-                    logger.info(f"Reporte guardado con ID: {resultados['reporte_id']}")
-                
-            elif 'hoja_usada' in resultados:
-                # Formato tradicional - Excel Nuevos
-                mensaje_resultado = f'Archivo procesado usando hoja "{resultados["hoja_usada"]}". '
-                mensaje_resultado += f'{resultados["procesados"]} expedientes agregados exitosamente'
-                
-                if resultados["errores"] > 0:
-                    mensaje_resultado += f', {resultados["errores"]} filas omitidas por errores de validación'
-                
-                mensaje_resultado += f' de {resultados["total_filas"]} filas procesadas.'
-                
-                # Mostrar mensaje principal
-                flash(mensaje_resultado, 'success' if resultados["errores"] == 0 else 'warning')
-                
-                # Mostrar detalles de expedientes rechazados
-                if resultados.get("rechazados_detalle"):
-                    detalles = resultados["rechazados_detalle"]
-                    
-                    detalles_msg = "DETALLE DE RECHAZOS:\n"
-                    
-                    if detalles.get("duplicados"):
-                        detalles_msg += f'\nDUPLICADOS ({len(detalles["duplicados"])}): {", ".join(detalles["duplicados"][:5])}'
-                        if len(detalles["duplicados"]) > 5:
-                            detalles_msg += f' (y {len(detalles["duplicados"]) - 5} más)'
-                    
-                    if detalles.get("radicado_invalido"):
-                        detalles_msg += f'\nRADICADO INVÁLIDO ({len(detalles["radicado_invalido"])}): {", ".join(detalles["radicado_invalido"][:5])}'
-                        if len(detalles["radicado_invalido"]) > 5:
-                            detalles_msg += f' (y {len(detalles["radicado_invalido"]) - 5} más)'
-                    
-                    if detalles.get("campos_faltantes"):
-                        detalles_msg += f'\nCAMPOS FALTANTES ({len(detalles["campos_faltantes"])}): {", ".join(detalles["campos_faltantes"][:5])}'
-                        if len(detalles["campos_faltantes"]) > 5:
-                            detalles_msg += f' (y {len(detalles["campos_faltantes"]) - 5} más)'
-                    
-                    flash(detalles_msg, 'info')
-                
-                # Reporte guardado en BD - disponible en botón "Descargar Reportes de Errores"
-                if resultados.get("reporte_id"):
-                    logger.info(f"Reporte guardado con ID: {resultados['reporte_id']}")
-            else:
-                # Formato múltiples pestañas (creación)
-                mensaje_resultado = f'Archivo procesado con múltiples pestañas. '
-                mensaje_resultado += f'{resultados["expedientes_procesados"]} expedientes procesados, '
-                mensaje_resultado += f'{resultados["ingresos_procesados"]} ingresos agregados, '
-                mensaje_resultado += f'{resultados["estados_procesados"]} estados agregados.'
-                
-                if resultados["errores"] > 0:
-                    mensaje_resultado += f' {resultados["errores"]} duplicados/errores detectados (no se crearon registros duplicados).'
-                else:
-                    mensaje_resultado += ' Sin duplicados detectados.'
-                
-                flash(mensaje_resultado, 'success' if resultados["errores"] == 0 else 'warning')
-                
-                # Mostrar detalle de errores si existen
-                if resultados.get("errores_detallados") and len(resultados["errores_detallados"]) > 0:
-                    errores_msg = "DETALLE DE ERRORES:\n"
-                    for i, error in enumerate(resultados["errores_detallados"][:5], 1):  # Solo primeros 5
-                        errores_msg += f"\n{i}. Fila {error['fila']} (Hoja: {error.get('hoja', 'N/A')}): {error['radicado']} - {error['motivo']}"
-                    
-                    if len(resultados["errores_detallados"]) > 5:
-                        errores_msg += f"\n... y {len(resultados['errores_detallados']) - 5} errores más"
-                    
-                    flash(errores_msg, 'info')
-                
-                # Reporte guardado en BD - disponible en botón "Descargar Reportes de Errores"
-                if resultados.get("reporte_id"):
-                    logger.info(f"Reporte guardado con ID: {resultados['reporte_id']}")
-            
-            logger.info("=== FIN procesar_archivo_excel - ÉXITO ===")
-            return redirect(url_for('idvistasubirexpediente.vista_subirexpediente'))
-            
-        else:
+
+        if not allowed_file(file.filename):
             logger.warning(f"Tipo de archivo no permitido: {file.filename}")
+            if es_ajax:
+                return jsonify({'success': False, 'error': 'Tipo de archivo no permitido. Use archivos .xlsx o .xls'}), 400
             flash('Tipo de archivo no permitido. Use archivos .xlsx o .xls', 'error')
             return redirect(request.url)
-            
+
+        # El archivo se guarda con el trabajo: cualquier worker (o el consumidor
+        # externo) puede procesarlo, y la petición termina de inmediato
+        trabajo_id = encolar_carga(
+            file.read(),
+            secure_filename(file.filename),
+            modo_actualizacion,
+            session.get('user_id'),
+            procesar_trabajo_carga,
+        )
+        logger.info(f"=== FIN procesar_archivo_excel - trabajo {trabajo_id} encolado ===")
+
+        if es_ajax:
+            return jsonify({
+                'success': True,
+                'trabajo_id': trabajo_id,
+                'url_estado': url_for('idvistasubirexpediente.estado_trabajo_carga', trabajo_id=trabajo_id),
+            }), 202
+
+        flash('Archivo recibido. Se está procesando en segundo plano; el resultado aparecerá en esta página.', 'info')
+        return redirect(url_for('idvistasubirexpediente.vista_subirexpediente', trabajo=trabajo_id))
+
     except Exception as e:
         logger.error(f"ERROR en procesar_archivo_excel: {str(e)}")
         logger.error(f"Tipo de error: {type(e).__name__}")
+        if es_ajax:
+            return jsonify({'success': False, 'error': f'Error procesando archivo: {str(e)}'}), 500
         flash(f'Error procesando archivo: {str(e)}', 'error')
         return redirect(request.url)
 
+@vistasubirexpediente.route('/subirexpediente/trabajos/<int:trabajo_id>')
+@login_required
+def estado_trabajo_carga(trabajo_id):
+    """Avance de una carga en segundo plano (consultado periódicamente por subirexpediente.js)"""
+    try:
+        with conexion_bd() as conn:
+            cursor = conn.cursor()
+            trabajo = obtener_trabajo(cursor, trabajo_id)
+            cursor.close()
+    except Exception as e:
+        logger.error(f"Error consultando trabajo de carga {trabajo_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    # Solo el usuario que subió el archivo (o un administrador) ve su avance
+    if not trabajo or (trabajo['usuario_id'] != session.get('user_id') and not session.get('administrador')):
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+
+    del trabajo['usuario_id']
+    return jsonify(trabajo)
+
+def procesar_trabajo_carga(contenido, modo_actualizacion):
+    """
+    Procesa un archivo Excel encolado (se ejecuta fuera de la petición HTTP).
+
+    Returns:
+        dict: mensajes [(mensaje, categoria)] para mostrar al usuario y reporte_id
+    """
+    try:
+        resultados = procesar_carga_excel(BytesIO(contenido), modo_actualizacion)
+    finally:
+        # Las cargas confirman por partes: aun si fallan a medias pueden haber escrito
+        invalidar_metricas()
+    logger.info(f"Resultados del procesamiento: {resultados}")
+
+    # 🧹 LIMPIEZA AUTOMÁTICA: Eliminar reportes antiguos (>90 días) y trabajos terminados
+    try:
+        reportes_eliminados = limpiar_reportes_antiguos(dias=90)
+        if reportes_eliminados > 0:
+            logger.info(f"🧹 Limpieza automática: {reportes_eliminados} reportes antiguos eliminados")
+        with conexion_bd(commit=True) as conn:
+            cursor = conn.cursor()
+            limpiar_trabajos_antiguos(cursor)
+            cursor.close()
+    except Exception as e:
+        logger.warning(f"Error en limpieza automática de reportes: {e}")
+
+    if resultados.get("reporte_id"):
+        # Reporte guardado en BD - disponible en botón "Descargar Reportes de Errores"
+        logger.info(f"Reporte guardado con ID: {resultados['reporte_id']}")
+
+    return {
+        'mensajes': mensajes_resultado(resultados),
+        'reporte_id': resultados.get('reporte_id'),
+    }
+
+def procesar_carga_excel(file_content, modo_actualizacion):
+    """Elige el procesador según el modo y las pestañas del archivo, y devuelve sus resultados"""
+    libro = None
+    try:
+        # Procesar según el modo
+        if modo_actualizacion:
+            logger.info("Procesando archivo en MODO ACTUALIZACIÓN")
+
+            # Verificar si el archivo tiene múltiples pestañas (ingreso y estados)
+            try:
+                # Abrir el libro UNA sola vez en modo streaming
+                libro = LibroExcel(file_content)
+                hojas_disponibles = libro.sheet_names
+                logger.info(f"Hojas disponibles en el archivo: {hojas_disponibles}")
+
+                # Verificar si tiene pestañas específicas para ingreso y estados
+                tiene_pestaña_ingreso = any(hoja.lower() in ['ingreso', 'ingresos'] for hoja in hojas_disponibles)
+                tiene_pestaña_estados = any(hoja.lower() in ['estado', 'estados'] for hoja in hojas_disponibles)
+
+                if tiene_pestaña_ingreso or tiene_pestaña_estados:
+                    logger.info("Detectado archivo Excel con pestañas múltiples en modo ACTUALIZACIÓN")
+                    return procesar_excel_actualizacion_multiples_pestañas(libro, hojas_disponibles)
+                else:
+                    logger.info("Procesando archivo Excel con formato tradicional en modo ACTUALIZACIÓN")
+                    return procesar_excel_actualizacion(libro)
+
+            except Exception as e:
+                logger.warning(f"Error verificando estructura del Excel: {e}")
+                logger.info("Procesando como archivo Excel tradicional en modo ACTUALIZACIÓN")
+                return procesar_excel_actualizacion(libro or file_content)
+        else:
+            logger.info("Procesando archivo en MODO CREACIÓN")
+            # Verificar si el archivo tiene múltiples pestañas (ingreso y estados)
+            try:
+                # Abrir el libro UNA sola vez en modo streaming
+                libro = LibroExcel(file_content)
+                hojas_disponibles = libro.sheet_names
+                logger.info(f"Hojas disponibles en el archivo: {hojas_disponibles}")
+
+                # Verificar si tiene pestañas específicas para ingreso y estados
+                tiene_pestaña_ingreso = any(hoja.lower() in ['ingreso', 'ingresos'] for hoja in hojas_disponibles)
+                tiene_pestaña_estados = any(hoja.lower() in ['estado', 'estados'] for hoja in hojas_disponibles)
+
+                if tiene_pestaña_ingreso and tiene_pestaña_estados:
+                    logger.info("Detectado archivo Excel con pestañas múltiples (ingreso y estados)")
+                    return procesar_excel_multiples_pestañas(libro, hojas_disponibles)
+                else:
+                    logger.info("Procesando archivo Excel con formato tradicional")
+                    return procesar_excel_expedientes(libro)
+
+            except Exception as e:
+                logger.warning(f"Error verificando estructura del Excel: {e}")
+                logger.info("Procesando como archivo Excel tradicional")
+                return procesar_excel_expedientes(libro or file_content)
+    finally:
+        if libro:
+            libro.close()
+
+def mensajes_resultado(resultados):
+    """
+    Construye los mensajes para el usuario a partir de los resultados de un procesador.
+
+    Returns:
+        list: [(mensaje, categoria)] con categorías de flash ('success', 'warning', 'info')
+    """
+    mensajes = []
+
+    # Detectar tipo de resultado basado en las claves presentes
+    if 'actualizados' in resultados:
+        # Formato tradicional de actualización (hoja única)
+        mensaje_resultado = f'Archivo procesado en MODO ACTUALIZACIÓN. '
+        mensaje_resultado += f'{resultados["actualizados"]} expedientes actualizados exitosamente'
+
+        if resultados.get("sin_cambios", 0) > 0:
+            mensaje_resultado += f', {resultados["sin_cambios"]} sin cambios (valores idénticos)'
+
+        if resultados.get("no_encontrados", 0) > 0:
+            mensaje_resultado += f', {resultados["no_encontrados"]} radicados no encontrados'
+
+        if resultados["errores"] > 0:
+            mensaje_resultado += f', {resultados["errores"]} errores'
+
+        mensaje_resultado += f' de {resultados["total_filas"]} filas procesadas.'
+
+        # Información sobre reporte de errores
+        if resultados.get("tiene_errores") and resultados.get("reporte_path"):
+            mensaje_resultado += f' Se generó un reporte detallado de errores.'
+
+        mensajes.append((mensaje_resultado, 'warning' if resultados["errores"] > 0 else 'success'))
+
+        # Mostrar primeros errores detallados
+        if resultados.get("errores_detallados") and len(resultados["errores_detallados"]) > 0:
+            # Crear mensaje adicional con detalle de errores
+            errores_msg = "DETALLE DE ERRORES:\n"
+            for i, error in enumerate(resultados["errores_detallados"][:5], 1):  # Solo primeros 5
+                errores_msg += f"\n{i}. Fila {error['fila']}: {error['radicado']} - {error['motivo']}"
+
+            if len(resultados["errores_detallados"]) > 5:
+                errores_msg += f"\n... y {len(resultados['errores_detallados']) - 5} errores más"
+
+            mensajes.append((errores_msg, 'info'))
+
+    elif 'expedientes_actualizados' in resultados or 'ingresos_agregados' in resultados:
+        # Formato múltiples pestañas en modo actualización
+        mensaje_resultado = f'Archivo procesado con múltiples pestañas en modo ACTUALIZACIÓN. '
+
+        if 'ingresos_agregados' in resultados:
+            mensaje_resultado += f'{resultados["ingresos_agregados"]} ingresos agregados, '
+
+        if 'estados_agregados' in resultados:
+            mensaje_resultado += f'{resultados["estados_agregados"]} estados agregados, '
+
+        if resultados.get("errores", 0) > 0:
+            mensaje_resultado += f'{resultados["errores"]} errores encontrados'
+        else:
+            mensaje_resultado += 'sin errores'
+
+        mensaje_resultado += f' de {resultados.get("total_filas", 0)} filas procesadas.'
+
+        mensajes.append((mensaje_resultado, 'success' if resultados.get("errores", 0) == 0 else 'warning'))
+
+        # Mostrar detalle de errores si existen
+        if resultados.get("errores_detallados") and len(resultados["errores_detallados"]) > 0:
+            errores_msg = "DETALLE DE ERRORES:\n"
+            for i, error in enumerate(resultados["errores_detallados"][:5], 1):  # Solo primeros 5
+                errores_msg += f"\n{i}. Fila {error['fila']} (Hoja: {error.get('hoja', 'N/A')}): {error['radicado']} - {error['motivo']}"
+
+            if len(resultados["errores_detallados"]) > 5:
+                errores_msg += f"\n... y {len(resultados['errores_detallados']) - 5} errores más"
+
+            mensajes.append((errores_msg, 'info'))
+
+    elif 'hoja_usada' in resultados:
+        # Formato tradicional - Excel Nuevos
+        mensaje_resultado = f'Archivo procesado usando hoja "{resultados["hoja_usada"]}". '
+        mensaje_resultado += f'{resultados["procesados"]} expedientes agregados exitosamente'
+
+        if resultados["errores"] > 0:
+            mensaje_resultado += f', {resultados["errores"]} filas omitidas por errores de validación'
+
+        mensaje_resultado += f' de {resultados["total_filas"]} filas procesadas.'
+
+        # Mostrar mensaje principal
+        mensajes.append((mensaje_resultado, 'success' if resultados["errores"] == 0 else 'warning'))
+
+        # Mostrar detalles de expedientes rechazados
+        if resultados.get("rechazados_detalle"):
+            detalles = resultados["rechazados_detalle"]
+
+            detalles_msg = "DETALLE DE RECHAZOS:\n"
+
+            if detalles.get("duplicados"):
+                detalles_msg += f'\nDUPLICADOS ({len(detalles["duplicados"])}): {", ".join(detalles["duplicados"][:5])}'
+                if len(detalles["duplicados"]) > 5:
+                    detalles_msg += f' (y {len(detalles["duplicados"]) - 5} más)'
+
+            if detalles.get("radicado_invalido"):
+                detalles_msg += f'\nRADICADO INVÁLIDO ({len(detalles["radicado_invalido"])}): {", ".join(detalles["radicado_invalido"][:5])}'
+                if len(detalles["radicado_invalido"]) > 5:
+                    detalles_msg += f' (y {len(detalles["radicado_invalido"]) - 5} más)'
+
+            if detalles.get("campos_faltantes"):
+                detalles_msg += f'\nCAMPOS FALTANTES ({len(detalles["campos_faltantes"])}): {", ".join(detalles["campos_faltantes"][:5])}'
+                if len(detalles["campos_faltantes"]) > 5:
+                    detalles_msg += f' (y {len(detalles["campos_faltantes"]) - 5} más)'
+
+            if detalles.get("rechazado_bd"):
+                detalles_msg += f'\nRECHAZADOS POR LA BASE DE DATOS ({len(detalles["rechazado_bd"])}): {", ".join(detalles["rechazado_bd"][:5])}'
+                if len(detalles["rechazado_bd"]) > 5:
+                    detalles_msg += f' (y {len(detalles["rechazado_bd"]) - 5} más)'
+
+            mensajes.append((detalles_msg, 'info'))
+    else:
+        # Formato múltiples pestañas (creación)
+        mensaje_resultado = f'Archivo procesado con múltiples pestañas. '
+        mensaje_resultado += f'{resultados["expedientes_procesados"]} expedientes procesados, '
+        mensaje_resultado += f'{resultados["ingresos_procesados"]} ingresos agregados, '
+        mensaje_resultado += f'{resultados["estados_procesados"]} estados agregados.'
+
+        if resultados["errores"] > 0:
+            mensaje_resultado += f' {resultados["errores"]} duplicados/errores detectados (no se crearon registros duplicados).'
+        else:
+            mensaje_resultado += ' Sin duplicados detectados.'
+
+        mensajes.append((mensaje_resultado, 'success' if resultados["errores"] == 0 else 'warning'))
+
+        # Mostrar detalle de errores si existen
+        if resultados.get("errores_detallados") and len(resultados["errores_detallados"]) > 0:
+            errores_msg = "DETALLE DE ERRORES:\n"
+            for i, error in enumerate(resultados["errores_detallados"][:5], 1):  # Solo primeros 5
+                errores_msg += f"\n{i}. Fila {error['fila']} (Hoja: {error.get('hoja', 'N/A')}): {error['radicado']} - {error['motivo']}"
+
+            if len(resultados["errores_detallados"]) > 5:
+                errores_msg += f"\n... y {len(resultados['errores_detallados']) - 5} errores más"
+
+            mensajes.append((errores_msg, 'info'))
+
+    return mensajes
+
 def procesar_formulario_manual():
     """Procesa el formulario manual de expediente"""
     logger.info("=== INICIO procesar_formulario_manual ===")
@@ -966,11 +1047,12 @@ def procesar_formulario_manual():
         try:
             # VALIDACIÓN DE DUPLICADOS: Verificar si el radicado_completo ya existe
             if radicado_completo:
-                cursor.execute("""
+                filtro, valor = filtro_radicado_exacto(radicado_completo)
+                cursor.execute(f"""
                     SELECT id, radicado_completo, demandante, demandado 
                     FROM expediente 
-                    WHERE radicado_completo = %s
-                """, (radicado_completo,))
+                    WHERE {filtro}
+                """, (valor,))
                 
                 expediente_existente = cursor.fetchone()
                 
@@ -985,13 +1067,7 @@ def procesar_formulario_manual():
                     logger.info(f"✅ Radicado {radicado_completo} no existe - puede proceder con la inserción")
             
             # Verificar estructura actual de la tabla
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'expediente'
-            """)
-            
-            available_columns = [row[0] for row in cursor.fetchall()]
+            available_columns = list(columnas_tabla('expediente'))
             logger.info(f"Columnas disponibles en tabla expediente: {available_columns}")
             
             # Construir query dinámicamente basado en columnas disponibles
@@ -1079,7 +1155,7 @@ def procesar_formulario_manual():
                 RETURNING id
             """
             
-            logger.info(f"Query construido: {query}")
+            logger.debug(f"Query construido: {query}")
             logger.info(f"Valores: {values_to_insert}")
             
             cursor.execute(query, values_to_insert)
@@ -1089,13 +1165,7 @@ def procesar_formulario_manual():
             # Intentar insertar en tablas relacionadas si existen
             try:
                 # Verificar si existe tabla ingresos_expediente
-                cursor.execute("""
-                    SELECT table_name 
-                    FROM information_schema.tables 
-                    WHERE table_name = 'ingresos_expediente'
-                """)
-                
-                if cursor.fetchone():
+                if existe_tabla('ingresos_expediente'):
                     logger.info("Tabla ingresos_expediente existe - insertando registro")
                     cursor.execute("""
                         INSERT INTO ingresos_expediente 
@@ -1109,13 +1179,7 @@ def procesar_formulario_manual():
                     logger.info("Tabla ingresos_expediente no existe - saltando inserción")
                 
                 # Verificar si existe tabla estados_expediente
-                cursor.execute("""
-                    SELECT table_name 
-                    FROM information_schema.tables 
-                    WHERE table_name = 'estados_expediente'
-                """)
-                
-                if cursor.fetchone() and estado_actual:
+                if existe_tabla('estados_expediente') and estado_actual:
                     logger.info("Tabla estados_expediente existe - insertando estado inicial")
                     cursor.execute("""
                         INSERT INTO estados_expediente 
@@ -1135,11 +1199,10 @@ def procesar_formulario_manual():
                 logger.info("🎫 Expediente creado con estado 'Activo Pendiente' - asignando turno automáticamente")
                 
                 # Obtener el siguiente turno disponible
-                cursor.execute("""
-                    SELECT COALESCE(MAX(turno), 0) 
+                cursor.execute(f"""
+                    SELECT COALESCE(MAX({turno_entero()}), 0) 
                     FROM expediente 
-                    WHERE estado = 'Activo Pendiente' 
-                      AND turno IS NOT NULL
+                    WHERE estado = 'Activo Pendiente'
                 """)
                 
                 resultado = cursor.fetchone()
@@ -1166,6 +1229,7 @@ def procesar_formulario_manual():
                 flash(f'Expediente creado exitosamente con ID: {expediente_id}.', 'success')
             
             conn.commit()
+            invalidar_metricas()
             logger.info("Transacción confirmada (COMMIT)")
             logger.info("=== FIN procesar_formulario_manual - ÉXITO ===")
             return redirect(url_for('idvistasubirexpediente.vista_subirexpediente'))
@@ -1195,22 +1259,23 @@ def procesar_excel_actualizacion(file_content):
     No crea expedientes nuevos.
 
     Args:
-        file_content: BytesIO object con el contenido del archivo Excel
+        file_content: BytesIO, ruta o LibroExcel ya abierto con el archivo Excel
 
     Returns:
         dict: Estadísticas del procesamiento (actualizados, no_encontrados, errores)
     """
     logger.info("=== INICIO procesar_excel_actualizacion ===")
+    libro_propio = not isinstance(file_content, LibroExcel)
+    libro = None
 
     try:
         # Leer Excel - intentar diferentes nombres de hojas
         logger.info("Intentando leer archivo Excel...")
 
         try:
-            file_content.seek(0)
-            with pd.ExcelFile(file_content) as excel_file:
-                hojas_disponibles = excel_file.sheet_names
-                logger.info(f"Hojas disponibles en el archivo: {hojas_disponibles}")
+            libro = abrir_libro(file_content)
+            hojas_disponibles = libro.sheet_names
+            logger.info(f"Hojas disponibles en el archivo: {hojas_disponibles}")
         except Exception as e:
             logger.error(f"Error leyendo archivo Excel: {str(e)}")
             raise Exception(f"Error leyendo archivo Excel: {str(e)}")
@@ -1256,13 +1321,13 @@ def procesar_excel_actualizacion(file_content):
             if nombre_hoja in hojas_disponibles:
                 try:
                     logger.info(f"Intentando leer hoja prioritaria: '{nombre_hoja}'")
-                    file_content.seek(0)
-                    df_temp = pd.read_excel(file_content, sheet_name=nombre_hoja)
+                    # Solo se lee la fila de encabezados para decidir
+                    columnas_hoja = libro.encabezados(nombre_hoja)
 
                     # Verificar si tiene columna de radicado
                     for col_req in columnas_radicado:
-                        if col_req in df_temp.columns:
-                            df = df_temp
+                        if col_req in columnas_hoja:
+                            df = libro.hoja(nombre_hoja)
                             hoja_usada = nombre_hoja
                             col_radicado_usada = col_req
                             logger.info(f"✓ Hoja prioritaria '{nombre_hoja}' leída exitosamente con columna '{col_req}'")
@@ -1281,15 +1346,14 @@ def procesar_excel_actualizacion(file_content):
             for nombre_hoja in hojas_disponibles:
                 try:
                     logger.info(f"Intentando leer hoja: '{nombre_hoja}'")
-                    file_content.seek(0)
-                    df_temp = pd.read_excel(file_content, sheet_name=nombre_hoja)
+                    columnas_hoja = libro.encabezados(nombre_hoja)
                     if not IS_PRODUCTION:
-                        logger.debug(f"  Columnas en hoja '{nombre_hoja}': {list(df_temp.columns)}")
+                        logger.debug(f"  Columnas en hoja '{nombre_hoja}': {columnas_hoja}")
 
                     # Verificar si tiene columna de radicado
                     for col_req in columnas_radicado:
-                        if col_req in df_temp.columns:
-                            df = df_temp
+                        if col_req in columnas_hoja:
+                            df = libro.hoja(nombre_hoja)
                             hoja_usada = nombre_hoja
                             col_radicado_usada = col_req
                             logger.info(f"✓ Hoja '{nombre_hoja}' tiene columna '{col_req}' - usando esta hoja")
@@ -1304,7 +1368,7 @@ def procesar_excel_actualizacion(file_content):
         if df is None:
             raise Exception(f"No se encontró ninguna hoja con columna de radicado. Hojas disponibles: {hojas_disponibles}")
 
-        logger.info(f"Excel leído correctamente usando hoja '{hoja_usada}' con columna '{col_radicado_usada}'. Filas: {len(df)}, Columnas: {len(df.columns)}")
+        logger.info(f"Excel abierto usando hoja '{hoja_usada}' con columna '{col_radicado_usada}'. Filas (aprox.): {df.filas_estimadas}, Columnas: {len(df.columns)}")
         logger.info(f"Columnas disponibles: {list(df.columns)}")
 
         # Continuar con el resto de la lógica de actualización...
@@ -1331,14 +1395,8 @@ def procesar_excel_actualizacion(file_content):
         logger.info(f"📊 {len(radicados_excel)} radicados únicos a buscar")
         
         # UNA SOLA CONSULTA para todos los expedientes
-        cursor.execute("""
-            SELECT id, radicado_completo 
-            FROM expediente 
-            WHERE radicado_completo = ANY(%s)
-        """, (radicados_excel,))
-        
         # Crear diccionario en memoria: {radicado: expediente_id}
-        expedientes_cache = {row[1]: row[0] for row in cursor.fetchall()}
+        expedientes_cache = buscar_exactos(cursor, radicados_excel)
         
         # 🔍 BÚSQUEDA ADICIONAL: últimos 13 dígitos + LIKE sufijo para radicados cortos
         radicados_no_encontrados = [r for r in radicados_excel if r not in expedientes_cache]
@@ -1378,7 +1436,7 @@ def procesar_excel_actualizacion(file_content):
         }
 
         # Procesar cada fila
-        for index, row in df.iterrows():
+        for index, row in con_progreso(df, errores=lambda: errores + no_encontrados):
             try:
                 # Extraer radicado
                 radicado_completo = extraer_valor_flexible(row, df.columns,
@@ -1471,10 +1529,13 @@ def procesar_excel_actualizacion(file_content):
     except Exception as e:
         logger.error(f"ERROR en procesar_excel_actualizacion: {str(e)}")
         raise e
+    finally:
+        if libro_propio and libro:
+            libro.close()
 
 
 
-def procesar_excel_actualizacion_multiples_pestañas(file_content, hojas_disponibles):
+def procesar_excel_actualizacion_multiples_pestañas(libro, hojas_disponibles):
     """
     Procesa un archivo Excel con múltiples pestañas en MODO ACTUALIZACIÓN:
     - Pestaña 'ingreso': Actualiza información de expedientes y agrega nuevos ingresos
@@ -1483,7 +1544,7 @@ def procesar_excel_actualizacion_multiples_pestañas(file_content, hojas_disponi
     Usa transacciones individuales por fila para evitar que un error detenga todo el proceso.
     
     Args:
-        file_content: BytesIO object con el contenido del archivo Excel
+        libro: LibroExcel abierto con el contenido del archivo Excel
         hojas_disponibles: Lista de nombres de hojas disponibles
     """
     logger.info("=== INICIO procesar_excel_actualizacion_multiples_pestañas ===")
@@ -1504,6 +1565,9 @@ def procesar_excel_actualizacion_multiples_pestañas(file_content, hojas_disponi
         # 🎯 TRACK: Radicados únicos ya procesados (para evitar doble conteo entre pestañas)
         radicados_unicos_procesados = set()
         
+        # 🗂️ Índice de radicados para la búsqueda flexible: se construye una vez y sirve a ambas pestañas
+        indice_radicados = IndiceRadicados()
+        
         # Procesar pestaña de ingresos (si existe)
         pestaña_ingreso = None
         for hoja in hojas_disponibles:
@@ -1514,271 +1578,222 @@ def procesar_excel_actualizacion_multiples_pestañas(file_content, hojas_disponi
         if pestaña_ingreso:
             logger.info(f"Procesando pestaña de ingresos: {pestaña_ingreso}")
             try:
-                # Resetear puntero y leer desde BytesIO
-                file_content.seek(0)
-                with pd.ExcelFile(file_content) as excel_file:
-                    df_ingresos = pd.read_excel(excel_file, sheet_name=pestaña_ingreso)
-                logger.info(f"Pestaña '{pestaña_ingreso}' leída: {len(df_ingresos)} filas")
-
-                # Detectar fórmulas no calculadas
-                formulas_hoja_ingreso = detectar_formulas_en_archivo(file_content, pestaña_ingreso)
-                if formulas_hoja_ingreso:
-                    logger.warning(f"⚠️ {len(formulas_hoja_ingreso)} celdas con fórmulas no calculadas en '{pestaña_ingreso}'")
-                
-                # 🎯 Contar solo filas NUEVAS (no contadas antes)
-                for idx, row in df_ingresos.iterrows():
-                    rad = extraer_valor_flexible(row, df_ingresos.columns, 
-                        ['RADICADO COMPLETO', 'radicado_completo', 'RadicadoUnicoLimpio', 'RADICADO_MODIFICADO_OFI'])
-                    if rad:
-                        rad_norm = re.sub(r'[^0-9]', '', str(rad).strip())
-                        if rad_norm and rad_norm not in radicados_unicos_procesados:
-                            radicados_unicos_procesados.add(rad_norm)
-                            resultados['total_filas'] += 1
-                
-                # 🚀 OPTIMIZACIÓN: Cargar todos los expedientes en memoria UNA SOLA VEZ
-                logger.info("🚀 Cargando expedientes en memoria para búsqueda rápida...")
-                
-                # Extraer todos los radicados del Excel (normalizados)
-                radicados_excel = []
-                for index, row in df_ingresos.iterrows():
-                    radicado = extraer_valor_flexible(row, df_ingresos.columns, 
-                        ['RADICADO COMPLETO', 'radicado_completo', 'RadicadoUnicoLimpio', 'RADICADO_MODIFICADO_OFI'])
-                    if radicado:
-                        radicado_normalizado = re.sub(r'[^0-9]', '', str(radicado).strip())
-                        if radicado_normalizado:
-                            radicados_excel.append(radicado_normalizado)
-                
-                # Remover duplicados
-                radicados_excel = list(set(radicados_excel))
-                logger.info(f"📊 {len(radicados_excel)} radicados únicos a buscar")
-                
-                # UNA SOLA CONSULTA para todos los expedientes
-                conn_cache = obtener_conexion()
-                cursor_cache = conn_cache.cursor()
-                
-                # Buscar por radicado completo exacto
-                cursor_cache.execute("""
-                    SELECT id, radicado_completo 
-                    FROM expediente 
-                    WHERE radicado_completo = ANY(%s)
-                """, (radicados_excel,))
-                
-                # Crear diccionario en memoria: {radicado: expediente_id}
-                expedientes_cache = {row[1]: row[0] for row in cursor_cache.fetchall()}
-                
-                # 🔍 BÚSQUEDA ADICIONAL: últimos 13 dígitos + LIKE sufijo para radicados cortos
-                radicados_no_encontrados = [r for r in radicados_excel if r not in expedientes_cache]
-                radicados_dudosos_ingresos = {}
-                if radicados_no_encontrados:
-                    logger.info(f"🔍 Buscando {len(radicados_no_encontrados)} radicados no encontrados (13 dígitos / LIKE sufijo)...")
-                    encontrados_extra = buscar_expedientes_flexible(radicados_no_encontrados, conn_cache)
-                    for rad, (exp_id, metodo) in encontrados_extra.items():
-                        expedientes_cache[rad] = exp_id
-                        if metodo == 'like_sufijo':
-                            radicados_dudosos_ingresos[rad] = metodo
-                
-                cursor_cache.close()
-                conn_cache.close()
-                
-                logger.info(f"✅ {len(expedientes_cache)} expedientes cargados en memoria (incluyendo búsqueda por últimos 13 dígitos)")
-                logger.info(f"⚡ Ahora procesando filas con búsqueda instantánea...")
+                # Una sola pasada en streaming: cada lote trae sus fórmulas sin calcular
+                # y sus radicados se cuentan y resuelven antes de procesar sus filas
+                df_ingresos = libro.hoja(pestaña_ingreso)
+                logger.info(f"Pestaña '{pestaña_ingreso}' abierta, columnas: {list(df_ingresos.columns)}")
                 
                 # Usar UNA SOLA conexión para todas las filas
                 conn_ingresos = obtener_conexion()
                 cursor_ingresos = conn_ingresos.cursor()
                 
                 # Verificar si existe tabla ingresos (UNA SOLA VEZ)
-                cursor_ingresos.execute("""
-                    SELECT table_name FROM information_schema.tables 
-                    WHERE table_name = 'ingresos'
-                """)
-                
-                if not cursor_ingresos.fetchone():
+                if not existe_tabla('ingresos'):
                     logger.warning("Tabla 'ingresos' no existe en la BD")
                     resultados['errores'] += len(df_ingresos)
                     cursor_ingresos.close()
                     conn_ingresos.close()
                 else:
+                    # Radicados ya resueltos en la base: {radicado: expediente_id}
+                    expedientes_cache = {}
+                    radicados_dudosos_ingresos = {}
+                    radicados_buscados = set()
+                    formulas_detectadas = 0
+                    
                     # Caché en memoria para duplicados DENTRO DEL MISMO ARCHIVO
                     ingresos_insertados_cache = set()
                     
-                    # Procesar cada fila de ingresos con búsqueda en memoria (RÁPIDO)
-                    for index, row in df_ingresos.iterrows():
-                        try:
-                            # 🎯 TRACK: Clasificar cada fila
-                            clasificacion = None
-
-                            # Construir mapa de fórmulas para esta fila
-                            formulas_fila = {}
-                            if formulas_hoja_ingreso:
-                                for (row_idx, col_nombre), formula in formulas_hoja_ingreso.items():
-                                    if row_idx == index:
-                                        formulas_fila[col_nombre] = formula
-
-                            # Extraer radicado
-                            radicado_completo = extraer_valor_flexible(row, df_ingresos.columns, 
-                                ['RADICADO COMPLETO', 'radicado_completo', 'RadicadoUnicoLimpio', 'RADICADO_MODIFICADO_OFI'],
-                                formulas_fila)
+                    # Procesar cada lote de ingresos con búsqueda en memoria (RÁPIDO)
+                    for lote in lotes_con_progreso(df_ingresos, errores=lambda: resultados['errores'],
+                                                   detectar_formulas=True):
+                        formulas_lote = formulas_por_fila(lote)
+                        formulas_detectadas += len(lote.attrs.get('formulas', {}))
+                        
+                        # 🎯 Contar solo filas NUEVAS y buscar los radicados aún no resueltos
+                        pendientes = _radicados_nuevos_del_lote(
+                            lote, df_ingresos.columns,
+                            ['RADICADO COMPLETO', 'radicado_completo', 'RadicadoUnicoLimpio', 'RADICADO_MODIFICADO_OFI'],
+                            radicados_unicos_procesados, radicados_buscados, resultados)
+                        if pendientes:
+                            encontrados, dudosos = resolver_radicados(conn_ingresos, pendientes, indice_radicados)
+                            expedientes_cache.update(encontrados)
+                            radicados_dudosos_ingresos.update(dudosos)
+                        
+                        for index, row in lote.iterrows():
+                            try:
+                                # 🎯 TRACK: Clasificar cada fila
+                                clasificacion = None
+
+                                # Fórmulas sin calcular de esta fila
+                                formulas_fila = formulas_lote.get(index, {})
+
+                                # Extraer radicado
+                                radicado_completo = extraer_valor_flexible(row, df_ingresos.columns, 
+                                    ['RADICADO COMPLETO', 'radicado_completo', 'RadicadoUnicoLimpio', 'RADICADO_MODIFICADO_OFI'],
+                                    formulas_fila)
                             
-                            if not radicado_completo:
-                                clasificacion = 'ERROR: radicado vacío'
-                                if not IS_PRODUCTION:
-                                    logger.debug(f"Fila {index + 2} → {clasificacion}")
-                                resultados['errores'] += 1
-                                resultados['errores_detallados'].append({
-                                    'fila': index + 2,
-                                    'hoja': pestaña_ingreso,
-                                    'radicado': 'N/A',
-                                    'motivo': 'Radicado vacío'
-                                })
-                                continue
+                                if not radicado_completo:
+                                    clasificacion = 'ERROR: radicado vacío'
+                                    if not IS_PRODUCTION:
+                                        logger.debug(f"Fila {index + 2} → {clasificacion}")
+                                    resultados['errores'] += 1
+                                    resultados['errores_detallados'].append({
+                                        'fila': index + 2,
+                                        'hoja': pestaña_ingreso,
+                                        'radicado': 'N/A',
+                                        'motivo': 'Radicado vacío'
+                                    })
+                                    continue
+                            
+                                # Normalizar radicado
+                                radicado_completo = re.sub(r'[^0-9]', '', str(radicado_completo).strip())
+                            
+                                # 🚀 BÚSQUEDA EN MEMORIA (instantánea, sin query a BD)
+                                expediente_id = expedientes_cache.get(radicado_completo)
+                            
+                                if not expediente_id:
+                                    clasificacion = 'ERROR: expediente no encontrado'
+                                    if not IS_PRODUCTION:
+                                        logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
+                                    resultados['errores'] += 1
+                                    resultados['errores_detallados'].append({
+                                        'fila': index + 2,
+                                        'hoja': pestaña_ingreso,
+                                        'radicado': radicado_completo,
+                                        'motivo': 'Expediente no encontrado en BD'
+                                    })
+                                    continue
+                            
+                                # Extraer datos del ingreso
+                                fecha_ingreso = extraer_fecha_flexible(row, df_ingresos.columns, 
+                                    ['FECHA INGRESO', 'fecha_ingreso', 'FECHA_INGRESO', 'Fecha Ingreso'], formulas_fila)
+                                solicitud = extraer_valor_flexible(row, df_ingresos.columns, 
+                                    ['SOLICITUD', 'solicitud', 'Solicitud', 'TIPO_SOLICITUD'], formulas_fila)
+                                observaciones = extraer_valor_flexible(row, df_ingresos.columns, 
+                                    ['OBSERVACIONES', 'observaciones', 'Observaciones'], formulas_fila)
+                            
+                                if not fecha_ingreso:
+                                    clasificacion = 'ERROR: fecha inválida'
+                                    if not IS_PRODUCTION:
+                                        logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
+                                    resultados['errores'] += 1
+                                    resultados['errores_detallados'].append({
+                                        'fila': index + 2,
+                                        'hoja': pestaña_ingreso,
+                                        'radicado': radicado_completo,
+                                        'motivo': 'Fecha de ingreso inválida o vacía'
+                                    })
+                                    continue
                             
-                            # Normalizar radicado
-                            radicado_completo = re.sub(r'[^0-9]', '', str(radicado_completo).strip())
+                                if not solicitud:
+                                    solicitud = 'Sin especificar'
                             
-                            # 🚀 BÚSQUEDA EN MEMORIA (instantánea, sin query a BD)
-                            expediente_id = expedientes_cache.get(radicado_completo)
+                                # Estandarizar observaciones (usar NULL si está vacía)
+                                obs_normalized = observaciones if observaciones and str(observaciones).strip() else None
                             
-                            if not expediente_id:
-                                clasificacion = 'ERROR: expediente no encontrado'
+                                # Verificar duplicado en MEMORIA PRIMERO (dentro del mismo archivo)
+                                cache_key = (expediente_id, fecha_ingreso, solicitud, obs_normalized)
+                                if cache_key in ingresos_insertados_cache:
+                                    clasificacion = 'ERROR: duplicado en archivo'
+                                    if not IS_PRODUCTION:
+                                        logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
+                                    resultados['errores'] += 1
+                                    resultados['errores_detallados'].append({
+                                        'fila': index + 2,
+                                        'hoja': pestaña_ingreso,
+                                        'radicado': radicado_completo,
+                                        'motivo': 'Ingreso duplicado dentro del archivo (ya fue procesado)'
+                                    })
+                                    continue
+                            
+                                # Verificar si existe ingreso con misma clave (puede tener observaciones distintas)
+                                cursor_ingresos.execute("""
+                                    SELECT id, observaciones FROM ingresos 
+                                    WHERE expediente_id = %s 
+                                    AND fecha_ingreso = %s 
+                                    AND solicitud = %s
+                                """, (expediente_id, fecha_ingreso, solicitud))
+                                ingreso_bd = cursor_ingresos.fetchone()
+                            
+                                if ingreso_bd:
+                                    id_bd, obs_bd = ingreso_bd
+                                    obs_bd_norm = obs_bd.strip() if obs_bd and str(obs_bd).strip() else None
+
+                                    if obs_normalized and obs_bd_norm != obs_normalized:
+                                        # Actualizar solo observaciones nuevas
+                                        cursor_ingresos.execute("""
+                                            UPDATE ingresos SET observaciones = %s WHERE id = %s
+                                        """, (obs_normalized, id_bd))
+                                        conn_ingresos.commit()
+                                        ingresos_insertados_cache.add(cache_key)
+                                        resultados['ingresos_agregados'] += 1
+                                        clasificacion = 'EXITO: ingreso existente actualizado observaciones'
+                                        if not IS_PRODUCTION:
+                                            logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
+                                        resultados['ingresos_exitosos'].append({
+                                            'fila': index + 2,
+                                            'radicado': radicado_completo,
+                                            'fecha_ingreso': str(fecha_ingreso),
+                                            'solicitud': solicitud[:50] if solicitud and len(solicitud) > 50 else solicitud
+                                        })
+                                        continue
+
+                                    clasificacion = 'ERROR: duplicado en BD'
+                                    if not IS_PRODUCTION:
+                                        logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
+                                    resultados['errores'] += 1
+                                    resultados['errores_detallados'].append({
+                                        'fila': index + 2,
+                                        'hoja': pestaña_ingreso,
+                                        'radicado': radicado_completo,
+                                        'motivo': 'Ingreso duplicado (información ya existe en BD)'
+                                    })
+                                    continue
+                            
+                                # Insertar nuevo ingreso
+                                cursor_ingresos.execute("""
+                                    INSERT INTO ingresos (expediente_id, fecha_ingreso, solicitud, observaciones)
+                                    VALUES (%s, %s, %s, %s)
+                                """, (expediente_id, fecha_ingreso, solicitud, obs_normalized))
+                            
+                                conn_ingresos.commit()
+                                ingresos_insertados_cache.add(cache_key)  # Agregar al caché
+                                resultados['ingresos_agregados'] += 1
+                                clasificacion = 'EXITO: ingreso agregado'
                                 if not IS_PRODUCTION:
                                     logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
-                                resultados['errores'] += 1
-                                resultados['errores_detallados'].append({
+                            
+                                # Registrar ingreso exitoso para el reporte
+                                resultados['ingresos_exitosos'].append({
                                     'fila': index + 2,
-                                    'hoja': pestaña_ingreso,
                                     'radicado': radicado_completo,
-                                    'motivo': 'Expediente no encontrado en BD'
+                                    'fecha_ingreso': str(fecha_ingreso),
+                                    'solicitud': solicitud[:50] if solicitud and len(solicitud) > 50 else solicitud,
+                                    'dudoso': radicado_completo in radicados_dudosos_ingresos  # ⚠️ Asociado por LIKE
                                 })
-                                continue
                             
-                            # Extraer datos del ingreso
-                            fecha_ingreso = extraer_fecha_flexible(row, df_ingresos.columns, 
-                                ['FECHA INGRESO', 'fecha_ingreso', 'FECHA_INGRESO', 'Fecha Ingreso'], formulas_fila)
-                            solicitud = extraer_valor_flexible(row, df_ingresos.columns, 
-                                ['SOLICITUD', 'solicitud', 'Solicitud', 'TIPO_SOLICITUD'], formulas_fila)
-                            observaciones = extraer_valor_flexible(row, df_ingresos.columns, 
-                                ['OBSERVACIONES', 'observaciones', 'Observaciones'], formulas_fila)
-                            
-                            if not fecha_ingreso:
-                                clasificacion = 'ERROR: fecha inválida'
+                            except Exception as e:
+                                clasificacion = f'ERROR TECNICO: {str(e)[:60]}'
+                                logger.error(f"❌ Error procesando fila {index + 2} de ingresos: {e}")
                                 if not IS_PRODUCTION:
-                                    logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
+                                    logger.debug(f"Fila {index + 2} radicado {radicado_completo if 'radicado_completo' in locals() else 'N/A'} → {clasificacion}")
                                 resultados['errores'] += 1
                                 resultados['errores_detallados'].append({
                                     'fila': index + 2,
                                     'hoja': pestaña_ingreso,
-                                    'radicado': radicado_completo,
-                                    'motivo': 'Fecha de ingreso inválida o vacía'
+                                    'radicado': radicado_completo if 'radicado_completo' in locals() else 'N/A',
+                                    'motivo': f'Error técnico: {str(e)}'
                                 })
+                                conn_ingresos.rollback()  # Revierte solo esta fila
                                 continue
-                            
-                            if not solicitud:
-                                solicitud = 'Sin especificar'
-                            
-                            # Estandarizar observaciones (usar NULL si está vacía)
-                            obs_normalized = observaciones if observaciones and str(observaciones).strip() else None
-                            
-                            # Verificar duplicado en MEMORIA PRIMERO (dentro del mismo archivo)
-                            cache_key = (expediente_id, fecha_ingreso, solicitud, obs_normalized)
-                            if cache_key in ingresos_insertados_cache:
-                                clasificacion = 'ERROR: duplicado en archivo'
-                                if not IS_PRODUCTION:
-                                    logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
-                                resultados['errores'] += 1
-                                resultados['errores_detallados'].append({
-                                    'fila': index + 2,
-                                    'hoja': pestaña_ingreso,
-                                    'radicado': radicado_completo,
-                                    'motivo': 'Ingreso duplicado dentro del archivo (ya fue procesado)'
-                                })
-                                continue
-                            
-                            # Verificar si existe ingreso con misma clave (puede tener observaciones distintas)
-                            cursor_ingresos.execute("""
-                                SELECT id, observaciones FROM ingresos 
-                                WHERE expediente_id = %s 
-                                AND fecha_ingreso = %s 
-                                AND solicitud = %s
-                            """, (expediente_id, fecha_ingreso, solicitud))
-                            ingreso_bd = cursor_ingresos.fetchone()
-                            
-                            if ingreso_bd:
-                                id_bd, obs_bd = ingreso_bd
-                                obs_bd_norm = obs_bd.strip() if obs_bd and str(obs_bd).strip() else None
-
-                                if obs_normalized and obs_bd_norm != obs_normalized:
-                                    # Actualizar solo observaciones nuevas
-                                    cursor_ingresos.execute("""
-                                        UPDATE ingresos SET observaciones = %s WHERE id = %s
-                                    """, (obs_normalized, id_bd))
-                                    conn_ingresos.commit()
-                                    ingresos_insertados_cache.add(cache_key)
-                                    resultados['ingresos_agregados'] += 1
-                                    clasificacion = 'EXITO: ingreso existente actualizado observaciones'
-                                    if not IS_PRODUCTION:
-                                        logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
-                                    resultados['ingresos_exitosos'].append({
-                                        'fila': index + 2,
-                                        'radicado': radicado_completo,
-                                        'fecha_ingreso': str(fecha_ingreso),
-                                        'solicitud': solicitud[:50] if solicitud and len(solicitud) > 50 else solicitud
-                                    })
-                                    continue
-
-                                clasificacion = 'ERROR: duplicado en BD'
-                                if not IS_PRODUCTION:
-                                    logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
-                                resultados['errores'] += 1
-                                resultados['errores_detallados'].append({
-                                    'fila': index + 2,
-                                    'hoja': pestaña_ingreso,
-                                    'radicado': radicado_completo,
-                                    'motivo': 'Ingreso duplicado (información ya existe en BD)'
-                                })
-                                continue
-                            
-                            # Insertar nuevo ingreso
-                            cursor_ingresos.execute("""
-                                INSERT INTO ingresos (expediente_id, fecha_ingreso, solicitud, observaciones)
-                                VALUES (%s, %s, %s, %s)
-                            """, (expediente_id, fecha_ingreso, solicitud, obs_normalized))
-                            
-                            conn_ingresos.commit()
-                            ingresos_insertados_cache.add(cache_key)  # Agregar al caché
-                            resultados['ingresos_agregados'] += 1
-                            clasificacion = 'EXITO: ingreso agregado'
-                            if not IS_PRODUCTION:
-                                logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
-                            
-                            # Registrar ingreso exitoso para el reporte
-                            resultados['ingresos_exitosos'].append({
-                                'fila': index + 2,
-                                'radicado': radicado_completo,
-                                'fecha_ingreso': str(fecha_ingreso),
-                                'solicitud': solicitud[:50] if solicitud and len(solicitud) > 50 else solicitud,
-                                'dudoso': radicado_completo in radicados_dudosos_ingresos  # ⚠️ Asociado por LIKE
-                            })
-                            
-                        except Exception as e:
-                            clasificacion = f'ERROR TECNICO: {str(e)[:60]}'
-                            logger.error(f"❌ Error procesando fila {index + 2} de ingresos: {e}")
-                            if not IS_PRODUCTION:
-                                logger.debug(f"Fila {index + 2} radicado {radicado_completo if 'radicado_completo' in locals() else 'N/A'} → {clasificacion}")
-                            resultados['errores'] += 1
-                            resultados['errores_detallados'].append({
-                                'fila': index + 2,
-                                'hoja': pestaña_ingreso,
-                                'radicado': radicado_completo if 'radicado_completo' in locals() else 'N/A',
-                                'motivo': f'Error técnico: {str(e)}'
-                            })
-                            conn_ingresos.rollback()  # Revierte solo esta fila
-                            continue
                     
                     # Cerrar conexión de ingresos al final (después de procesar TODAS las filas)
                     cursor_ingresos.close()
                     conn_ingresos.close()
                     
+                    if formulas_detectadas:
+                        logger.warning(f"⚠️ {formulas_detectadas} celdas con fórmulas no calculadas en '{pestaña_ingreso}'")
+                    
                     # 📊 Log de resumen de ingresos
                     logger.info(f"✅ Procesamiento de INGRESOS completado: {resultados['ingresos_agregados']} agregados, {len([e for e in resultados['errores_detallados'] if e.get('hoja') == pestaña_ingreso])} errores")
                 
@@ -1796,409 +1811,361 @@ def procesar_excel_actualizacion_multiples_pestañas(file_content, hojas_disponi
         if pestaña_estados:
             logger.info(f"Procesando pestaña de estados: {pestaña_estados}")
             try:
-                # Resetear puntero y leer desde BytesIO
-                file_content.seek(0)
-                with pd.ExcelFile(file_content) as excel_file:
-                    df_estados = pd.read_excel(excel_file, sheet_name=pestaña_estados)
-                logger.info(f"Pestaña '{pestaña_estados}' leída: {len(df_estados)} filas")
-                
-                # 🎯 Contar solo filas NUEVAS (no contadas antes)
-                for idx, row in df_estados.iterrows():
-                    rad = extraer_valor_flexible(row, df_estados.columns, 
-                        ['RADICADO COMPLETO', 'radicado_completo', 'RadicadoUnicoLimpio', 'RADICADO_MODIFICADO_OFI'])
-                    if rad:
-                        rad_norm = re.sub(r'[^0-9]', '', str(rad).strip())
-                        if rad_norm and rad_norm not in radicados_unicos_procesados:
-                            radicados_unicos_procesados.add(rad_norm)
-                            resultados['total_filas'] += 1
-                
-                # 🚀 OPTIMIZACIÓN: Cargar todos los expedientes en memoria UNA SOLA VEZ
-                logger.info("🚀 Cargando expedientes en memoria para búsqueda rápida...")
-                
-                # Extraer todos los radicados del Excel (normalizados)
-                radicados_excel_estados = []
-                for index, row in df_estados.iterrows():
-                    radicado = extraer_valor_flexible(row, df_estados.columns, 
-                        ['RADICADO COMPLETO', 'radicado_completo', 'RadicadoUnicoLimpio', 'RADICADO_MODIFICADO_OFI'])
-                    if radicado:
-                        radicado_normalizado = re.sub(r'[^0-9]', '', str(radicado).strip())
-                        if radicado_normalizado:
-                            radicados_excel_estados.append(radicado_normalizado)
-                
-                # Remover duplicados
-                radicados_excel_estados = list(set(radicados_excel_estados))
-                logger.info(f"📊 {len(radicados_excel_estados)} radicados únicos a buscar")
-                
-                # UNA SOLA CONSULTA para todos los expedientes
-                conn_cache_estados = obtener_conexion()
-                cursor_cache_estados = conn_cache_estados.cursor()
-                
-                # Buscar por radicado completo exacto
-                cursor_cache_estados.execute("""
-                    SELECT id, radicado_completo 
-                    FROM expediente 
-                    WHERE radicado_completo = ANY(%s)
-                """, (radicados_excel_estados,))
-                
-                # Crear diccionario en memoria: {radicado: expediente_id}
-                expedientes_cache_estados = {row[1]: row[0] for row in cursor_cache_estados.fetchall()}
-                
-                # 🔍 BÚSQUEDA ADICIONAL: últimos 13 dígitos + LIKE sufijo para radicados cortos
-                radicados_no_encontrados = [r for r in radicados_excel_estados if r not in expedientes_cache_estados]
-                radicados_dudosos_estados = {}
-                if radicados_no_encontrados:
-                    logger.info(f"🔍 Buscando {len(radicados_no_encontrados)} radicados no encontrados (13 dígitos / LIKE sufijo)...")
-                    encontrados_extra = buscar_expedientes_flexible(radicados_no_encontrados, conn_cache_estados)
-                    for rad, (exp_id, metodo) in encontrados_extra.items():
-                        expedientes_cache_estados[rad] = exp_id
-                        if metodo == 'like_sufijo':
-                            radicados_dudosos_estados[rad] = metodo
-                
-                cursor_cache_estados.close()
-                conn_cache_estados.close()
-                
-                logger.info(f"✅ {len(expedientes_cache_estados)} expedientes cargados en memoria (incluyendo búsqueda por últimos 13 dígitos)")
-                logger.info(f"⚡ Ahora procesando filas con búsqueda instantánea...")
+                # Una sola pasada en streaming: los radicados de cada lote se cuentan y
+                # resuelven antes de procesar sus filas
+                df_estados = libro.hoja(pestaña_estados)
+                logger.info(f"Pestaña '{pestaña_estados}' abierta, columnas: {list(df_estados.columns)}")
                 
                 # Usar UNA SOLA conexión para todas las filas DE ESTADOS
                 conn_estados = obtener_conexion()
                 cursor_estados = conn_estados.cursor()
                 
                 # Verificar si existe tabla estados (UNA SOLA VEZ)
-                cursor_estados.execute("""
-                    SELECT table_name FROM information_schema.tables 
-                    WHERE table_name = 'estados'
-                """)
-                
-                if not cursor_estados.fetchone():
+                if not existe_tabla('estados'):
                     logger.warning("Tabla 'estados' no existe en la BD")
                     resultados['errores'] += len(df_estados)
                     cursor_estados.close()
                     conn_estados.close()
                 else:
+                    # Radicados ya resueltos en la base: {radicado: expediente_id}
+                    expedientes_cache_estados = {}
+                    radicados_dudosos_estados = {}
+                    radicados_buscados = set()
+                    
                     # Caché en memoria para duplicados DENTRO DEL MISMO ARCHIVO
                     estados_insertados_cache = set()
                     
                     # 🎫 Flag para indicar si se necesita recalcular turnos al final
                     necesita_recalculo_turnos = False
                     
-                    # Procesar cada fila de estados con búsqueda en memoria (RÁPIDO)
-                    for index, row in df_estados.iterrows():
-                        try:
-                            # 🎯 TRACK: Clasificar cada fila
-                            clasificacion = None
+                    # Procesar cada lote de estados con búsqueda en memoria (RÁPIDO)
+                    for lote in lotes_con_progreso(df_estados, errores=lambda: resultados['errores']):
+                        # 🎯 Contar solo filas NUEVAS y buscar los radicados aún no resueltos
+                        pendientes = _radicados_nuevos_del_lote(
+                            lote, df_estados.columns,
+                            ['RADICADO COMPLETO', 'radicado_completo', 'RadicadoUnicoLimpio', 'RADICADO_MODIFICADO_OFI'],
+                            radicados_unicos_procesados, radicados_buscados, resultados)
+                        if pendientes:
+                            encontrados, dudosos = resolver_radicados(conn_estados, pendientes, indice_radicados)
+                            expedientes_cache_estados.update(encontrados)
+                            radicados_dudosos_estados.update(dudosos)
+                        
+                        for index, row in lote.iterrows():
+                            try:
+                                # 🎯 TRACK: Clasificar cada fila
+                                clasificacion = None
                             
-                            radicado_completo = extraer_valor_flexible(row, df_estados.columns, 
-                                ['RADICADO COMPLETO', 'radicado_completo', 'RadicadoUnicoLimpio', 'RADICADO_MODIFICADO_OFI'])
+                                radicado_completo = extraer_valor_flexible(row, df_estados.columns, 
+                                    ['RADICADO COMPLETO', 'radicado_completo', 'RadicadoUnicoLimpio', 'RADICADO_MODIFICADO_OFI'])
                         
-                            if not radicado_completo:
-                                clasificacion = 'ERROR: radicado vacío'
-                                if not IS_PRODUCTION:
-                                    logger.debug(f"Fila {index + 2} → {clasificacion}")
-                                resultados['errores'] += 1
-                                resultados['errores_detallados'].append({
-                                    'fila': index + 2,
-                                    'hoja': pestaña_estados,
-                                    'radicado': 'N/A',
-                                    'motivo': 'Radicado vacío'
-                                })
-                                continue
+                                if not radicado_completo:
+                                    clasificacion = 'ERROR: radicado vacío'
+                                    if not IS_PRODUCTION:
+                                        logger.debug(f"Fila {index + 2} → {clasificacion}")
+                                    resultados['errores'] += 1
+                                    resultados['errores_detallados'].append({
+                                        'fila': index + 2,
+                                        'hoja': pestaña_estados,
+                                        'radicado': 'N/A',
+                                        'motivo': 'Radicado vacío'
+                                    })
+                                    continue
                             
-                            # Normalizar radicado
-                            radicado_completo = re.sub(r'[^0-9]', '', str(radicado_completo).strip())
+                                # Normalizar radicado
+                                radicado_completo = re.sub(r'[^0-9]', '', str(radicado_completo).strip())
                             
-                            # 🚀 BÚSQUEDA EN MEMORIA (instantánea, sin query a BD)
-                            expediente_id = expedientes_cache_estados.get(radicado_completo)
+                                # 🚀 BÚSQUEDA EN MEMORIA (instantánea, sin query a BD)
+                                expediente_id = expedientes_cache_estados.get(radicado_completo)
                             
-                            if not expediente_id:
-                                clasificacion = 'ERROR: expediente no encontrado'
-                                if not IS_PRODUCTION:
-                                    logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
-                                resultados['errores'] += 1
-                                resultados['errores_detallados'].append({
-                                    'fila': index + 2,
-                                    'hoja': pestaña_estados,
-                                    'radicado': radicado_completo,
-                                    'motivo': 'Expediente no encontrado en BD'
-                                })
-                                continue
+                                if not expediente_id:
+                                    clasificacion = 'ERROR: expediente no encontrado'
+                                    if not IS_PRODUCTION:
+                                        logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
+                                    resultados['errores'] += 1
+                                    resultados['errores_detallados'].append({
+                                        'fila': index + 2,
+                                        'hoja': pestaña_estados,
+                                        'radicado': radicado_completo,
+                                        'motivo': 'Expediente no encontrado en BD'
+                                    })
+                                    continue
                             
-                            # Extraer datos del estado
-                            clase = extraer_valor_flexible(row, df_estados.columns, 
-                                ['CLASE', 'clase', 'Clase', 'ESTADO_TRAMITE', 'Estado_Tramite',
-                                 'TIPO', 'tipo', 'Tipo', 'TIPO_ACTUACION', 'tipo_actuacion',
-                                 'ACTUACION', 'actuacion', 'Actuacion', 'ACTO', 'acto',
-                                 'DESCRIPCION', 'descripcion', 'Descripcion', 'DESCRIPTION'])
-                            fecha_estado = extraer_fecha_flexible(row, df_estados.columns, 
-                                ['FECHA ESTADO', 'fecha_estado', 'FECHA_ESTADO', 'Fecha Estado'])
-                            auto_anotacion = extraer_valor_flexible(row, df_estados.columns, 
-                                ['AUTO / ANOTACION', 'auto_anotacion', 'AUTO_ANOTACION', 'AUTO', 'ANOTACION'])
-                            observaciones = extraer_valor_flexible(row, df_estados.columns, 
-                                ['OBSERVACIONES', 'observaciones', 'Observaciones'])
+                                # Extraer datos del estado
+                                clase = extraer_valor_flexible(row, df_estados.columns, 
+                                    ['CLASE', 'clase', 'Clase', 'ESTADO_TRAMITE', 'Estado_Tramite',
+                                     'TIPO', 'tipo', 'Tipo', 'TIPO_ACTUACION', 'tipo_actuacion',
+                                     'ACTUACION', 'actuacion', 'Actuacion', 'ACTO', 'acto',
+                                     'DESCRIPCION', 'descripcion', 'Descripcion', 'DESCRIPTION'])
+                                fecha_estado = extraer_fecha_flexible(row, df_estados.columns, 
+                                    ['FECHA ESTADO', 'fecha_estado', 'FECHA_ESTADO', 'Fecha Estado'])
+                                auto_anotacion = extraer_valor_flexible(row, df_estados.columns, 
+                                    ['AUTO / ANOTACION', 'auto_anotacion', 'AUTO_ANOTACION', 'AUTO', 'ANOTACION'])
+                                observaciones = extraer_valor_flexible(row, df_estados.columns, 
+                                    ['OBSERVACIONES', 'observaciones', 'Observaciones'])
                             
-                            # Validar campos requeridos
-                            if not clase:
-                                clasificacion = 'ERROR: clase vacía'
-                                if not IS_PRODUCTION:
-                                    logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
-                                resultados['errores'] += 1
-                                resultados['errores_detallados'].append({
-                                    'fila': index + 2,
-                                    'hoja': pestaña_estados,
-                                    'radicado': radicado_completo,
-                                    'motivo': 'Clase vacía'
-                                })
-                                continue
+                                # Validar campos requeridos
+                                if not clase:
+                                    clasificacion = 'ERROR: clase vacía'
+                                    if not IS_PRODUCTION:
+                                        logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
+                                    resultados['errores'] += 1
+                                    resultados['errores_detallados'].append({
+                                        'fila': index + 2,
+                                        'hoja': pestaña_estados,
+                                        'radicado': radicado_completo,
+                                        'motivo': 'Clase vacía'
+                                    })
+                                    continue
                             
-                            if not fecha_estado:
-                                clasificacion = 'ERROR: fecha inválida'
-                                if not IS_PRODUCTION:
-                                    logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
-                                resultados['errores'] += 1
-                                resultados['errores_detallados'].append({
-                                    'fila': index + 2,
-                                    'hoja': pestaña_estados,
-                                    'radicado': radicado_completo,
-                                    'motivo': 'Fecha de estado inválida o vacía'
-                                })
-                                continue
+                                if not fecha_estado:
+                                    clasificacion = 'ERROR: fecha inválida'
+                                    if not IS_PRODUCTION:
+                                        logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
+                                    resultados['errores'] += 1
+                                    resultados['errores_detallados'].append({
+                                        'fila': index + 2,
+                                        'hoja': pestaña_estados,
+                                        'radicado': radicado_completo,
+                                        'motivo': 'Fecha de estado inválida o vacía'
+                                    })
+                                    continue
                             
-                            if not auto_anotacion:
-                                clasificacion = 'ERROR: auto/anotación vacía'
-                                if not IS_PRODUCTION:
-                                    logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
-                                resultados['errores'] += 1
-                                resultados['errores_detallados'].append({
-                                    'fila': index + 2,
-                                    'hoja': pestaña_estados,
-                                    'radicado': radicado_completo,
-                                    'motivo': 'Auto/Anotación vacía'
-                                })
-                                continue
+                                if not auto_anotacion:
+                                    clasificacion = 'ERROR: auto/anotación vacía'
+                                    if not IS_PRODUCTION:
+                                        logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
+                                    resultados['errores'] += 1
+                                    resultados['errores_detallados'].append({
+                                        'fila': index + 2,
+                                        'hoja': pestaña_estados,
+                                        'radicado': radicado_completo,
+                                        'motivo': 'Auto/Anotación vacía'
+                                    })
+                                    continue
                             
-                            # Verificar duplicado en MEMORIA PRIMERO (dentro del mismo archivo)
-                            # Normalizar valores para comparación consistente
-                            clase_norm = clase.strip() if clase else clase
-                            auto_anotacion_norm = auto_anotacion.strip() if auto_anotacion else auto_anotacion
-                            cache_key = (expediente_id, fecha_estado, clase_norm, auto_anotacion_norm)
-                            if cache_key in estados_insertados_cache:
-                                clasificacion = 'ERROR: duplicado en archivo'
-                                if not IS_PRODUCTION:
-                                    logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
-                                resultados['errores'] += 1
-                                resultados['errores_detallados'].append({
-                                    'fila': index + 2,
-                                    'hoja': pestaña_estados,
-                                    'radicado': radicado_completo,
-                                    'motivo': 'Estado duplicado dentro del archivo (ya fue procesado)'
-                                })
-                                continue
+                                # Verificar duplicado en MEMORIA PRIMERO (dentro del mismo archivo)
+                                # Normalizar valores para comparación consistente
+                                clase_norm = clase.strip() if clase else clase
+                                auto_anotacion_norm = auto_anotacion.strip() if auto_anotacion else auto_anotacion
+                                cache_key = (expediente_id, fecha_estado, clase_norm, auto_anotacion_norm)
+                                if cache_key in estados_insertados_cache:
+                                    clasificacion = 'ERROR: duplicado en archivo'
+                                    if not IS_PRODUCTION:
+                                        logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
+                                    resultados['errores'] += 1
+                                    resultados['errores_detallados'].append({
+                                        'fila': index + 2,
+                                        'hoja': pestaña_estados,
+                                        'radicado': radicado_completo,
+                                        'motivo': 'Estado duplicado dentro del archivo (ya fue procesado)'
+                                    })
+                                    continue
                             
-                            # Estandarizar observaciones para estados (usar NULL si está vacía)
-                            obs_estado_normalized = observaciones if observaciones and str(observaciones).strip() else None
+                                # Estandarizar observaciones para estados (usar NULL si está vacía)
+                                obs_estado_normalized = observaciones if observaciones and str(observaciones).strip() else None
                             
-                            # Verificar si ya existe estado (ignora observaciones como clave)
-                            # Normalizar para comparación consistente
-                            clase_norm = clase.strip() if clase else clase
-                            auto_anotacion_norm = auto_anotacion.strip() if auto_anotacion else auto_anotacion
+                                # Verificar si ya existe estado (ignora observaciones como clave)
+                                # Normalizar para comparación consistente
+                                clase_norm = clase.strip() if clase else clase
+                                auto_anotacion_norm = auto_anotacion.strip() if auto_anotacion else auto_anotacion
                             
-                            cursor_estados.execute("""
-                                SELECT id, observaciones FROM estados 
-                                WHERE expediente_id = %s 
-                                AND fecha_estado = %s 
-                                AND TRIM(clase) = TRIM(%s)
-                                AND TRIM(auto_anotacion) = TRIM(%s)
-                            """, (expediente_id, fecha_estado, clase_norm, auto_anotacion_norm))
-                            estado_bd = cursor_estados.fetchone()
+                                cursor_estados.execute("""
+                                    SELECT id, observaciones FROM estados 
+                                    WHERE expediente_id = %s 
+                                    AND fecha_estado = %s 
+                                    AND TRIM(clase) = TRIM(%s)
+                                    AND TRIM(auto_anotacion) = TRIM(%s)
+                                """, (expediente_id, fecha_estado, clase_norm, auto_anotacion_norm))
+                                estado_bd = cursor_estados.fetchone()
                             
-                            if estado_bd:
-                                id_estado_bd, obs_estado_bd = estado_bd
-                                obs_estado_bd_norm = obs_estado_bd.strip() if obs_estado_bd and str(obs_estado_bd).strip() else None
+                                if estado_bd:
+                                    id_estado_bd, obs_estado_bd = estado_bd
+                                    obs_estado_bd_norm = obs_estado_bd.strip() if obs_estado_bd and str(obs_estado_bd).strip() else None
+
+                                    if obs_estado_normalized and obs_estado_bd_norm != obs_estado_normalized:
+                                        # Actualizar observaciones si vienen nuevas
+                                        cursor_estados.execute("""
+                                            UPDATE estados SET observaciones = %s WHERE id = %s
+                                        """, (obs_estado_normalized, id_estado_bd))
+                                        conn_estados.commit()
+                                        estados_insertados_cache.add(cache_key)
+                                        resultados['estados_agregados'] += 1
+                                        clasificacion = 'EXITO: estado existente actualizado observaciones'
+                                        if not IS_PRODUCTION:
+                                            logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
+                                        resultados['estados_exitosos'].append({
+                                            'fila': index + 2,
+                                            'radicado': radicado_completo,
+                                            'fecha_estado': str(fecha_estado),
+                                            'clase': clase[:50] if clase and len(clase) > 50 else clase,
+                                            'auto_anotacion': auto_anotacion[:50] if auto_anotacion and len(auto_anotacion) > 50 else auto_anotacion
+                                        })
+                                        # continuar para evitar insertar duplicado
+                                        continue
 
-                                if obs_estado_normalized and obs_estado_bd_norm != obs_estado_normalized:
-                                    # Actualizar observaciones si vienen nuevas
-                                    cursor_estados.execute("""
-                                        UPDATE estados SET observaciones = %s WHERE id = %s
-                                    """, (obs_estado_normalized, id_estado_bd))
-                                    conn_estados.commit()
-                                    estados_insertados_cache.add(cache_key)
-                                    resultados['estados_agregados'] += 1
-                                    clasificacion = 'EXITO: estado existente actualizado observaciones'
+                                    clasificacion = 'ERROR: duplicado en BD'
                                     if not IS_PRODUCTION:
                                         logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
-                                    resultados['estados_exitosos'].append({
+                                    resultados['errores'] += 1
+                                    resultados['errores_detallados'].append({
                                         'fila': index + 2,
+                                        'hoja': pestaña_estados,
                                         'radicado': radicado_completo,
-                                        'fecha_estado': str(fecha_estado),
-                                        'clase': clase[:50] if clase and len(clase) > 50 else clase,
-                                        'auto_anotacion': auto_anotacion[:50] if auto_anotacion and len(auto_anotacion) > 50 else auto_anotacion
+                                        'motivo': 'Estado duplicado (información ya existe en BD)'
                                     })
-                                    # continuar para evitar insertar duplicado
                                     continue
-
-                                clasificacion = 'ERROR: duplicado en BD'
+                            
+                                # Insertar nuevo estado
+                                cursor_estados.execute("""
+                                    INSERT INTO estados (expediente_id, clase, fecha_estado, auto_anotacion, observaciones)
+                                    VALUES (%s, %s, %s, %s, %s)
+                                """, (expediente_id, clase_norm, fecha_estado, auto_anotacion_norm, obs_estado_normalized))
+                            
+                                conn_estados.commit()
+                                estados_insertados_cache.add(cache_key)  # Agregar al caché
+                                resultados['estados_agregados'] += 1
+                                clasificacion = 'EXITO: estado agregado'
                                 if not IS_PRODUCTION:
                                     logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
-                                resultados['errores'] += 1
-                                resultados['errores_detallados'].append({
+                            
+                                # Registrar estado exitoso para el reporte
+                                resultados['estados_exitosos'].append({
                                     'fila': index + 2,
-                                    'hoja': pestaña_estados,
                                     'radicado': radicado_completo,
-                                    'motivo': 'Estado duplicado (información ya existe en BD)'
+                                    'fecha_estado': str(fecha_estado),
+                                    'clase': clase[:50] if clase and len(clase) > 50 else clase,
+                                    'auto_anotacion': auto_anotacion[:50] if auto_anotacion and len(auto_anotacion) > 50 else auto_anotacion,
+                                    'dudoso': radicado_completo in radicados_dudosos_estados  # ⚠️ Asociado por LIKE
                                 })
-                                continue
-                            
-                            # Insertar nuevo estado
-                            cursor_estados.execute("""
-                                INSERT INTO estados (expediente_id, clase, fecha_estado, auto_anotacion, observaciones)
-                                VALUES (%s, %s, %s, %s, %s)
-                            """, (expediente_id, clase_norm, fecha_estado, auto_anotacion_norm, obs_estado_normalized))
-                            
-                            conn_estados.commit()
-                            estados_insertados_cache.add(cache_key)  # Agregar al caché
-                            resultados['estados_agregados'] += 1
-                            clasificacion = 'EXITO: estado agregado'
-                            if not IS_PRODUCTION:
-                                logger.debug(f"Fila {index + 2} radicado {radicado_completo} → {clasificacion}")
-                            
-                            # Registrar estado exitoso para el reporte
-                            resultados['estados_exitosos'].append({
-                                'fila': index + 2,
-                                'radicado': radicado_completo,
-                                'fecha_estado': str(fecha_estado),
-                                'clase': clase[:50] if clase and len(clase) > 50 else clase,
-                                'auto_anotacion': auto_anotacion[:50] if auto_anotacion and len(auto_anotacion) > 50 else auto_anotacion,
-                                'dudoso': radicado_completo in radicados_dudosos_estados  # ⚠️ Asociado por LIKE
-                            })
                             
-                            # 🔄 ACTUALIZAR AUTOMÁTICAMENTE EL CAMPO 'estado' EN TABLA EXPEDIENTE
-                            # Basado en la lógica de actualizar_estados_expedientes.py
-                            try:
-                                # Obtener última fecha de ingreso
-                                cursor_estados.execute("""
-                                    SELECT MAX(fecha_ingreso) 
-                                    FROM ingresos 
-                                    WHERE expediente_id = %s
-                                """, (expediente_id,))
+                                # 🔄 ACTUALIZAR AUTOMÁTICAMENTE EL CAMPO 'estado' EN TABLA EXPEDIENTE
+                                # Basado en la lógica de actualizar_estados_expedientes.py
+                                try:
+                                    # Obtener última fecha de ingreso
+                                    cursor_estados.execute("""
+                                        SELECT MAX(fecha_ingreso) 
+                                        FROM ingresos 
+                                        WHERE expediente_id = %s
+                                    """, (expediente_id,))
                                 
-                                result_ingreso = cursor_estados.fetchone()
-                                ultima_fecha_ingreso = result_ingreso[0] if result_ingreso else None
+                                    result_ingreso = cursor_estados.fetchone()
+                                    ultima_fecha_ingreso = result_ingreso[0] if result_ingreso else None
                                 
-                                # Obtener última fecha de estado (incluyendo el que acabamos de insertar)
-                                cursor_estados.execute("""
-                                    SELECT MAX(fecha_estado) 
-                                    FROM estados 
-                                    WHERE expediente_id = %s
-                                """, (expediente_id,))
+                                    # Obtener última fecha de estado (incluyendo el que acabamos de insertar)
+                                    cursor_estados.execute("""
+                                        SELECT MAX(fecha_estado) 
+                                        FROM estados 
+                                        WHERE expediente_id = %s
+                                    """, (expediente_id,))
                                 
-                                result_estado = cursor_estados.fetchone()
-                                ultima_fecha_estado = result_estado[0] if result_estado else None
+                                    result_estado = cursor_estados.fetchone()
+                                    ultima_fecha_estado = result_estado[0] if result_estado else None
                                 
-                                # Calcular estado correcto
-                                estado_nuevo = None
+                                    # Calcular estado correcto
+                                    estado_nuevo = None
                                 
-                                if ultima_fecha_ingreso and ultima_fecha_estado:
-                                    # Normalizar fechas para comparación
-                                    if isinstance(ultima_fecha_ingreso, str):
-                                        ultima_fecha_ingreso = datetime.strptime(ultima_fecha_ingreso, '%Y-%m-%d').date()
-                                    elif isinstance(ultima_fecha_ingreso, datetime):
-                                        ultima_fecha_ingreso = ultima_fecha_ingreso.date()
+                                    if ultima_fecha_ingreso and ultima_fecha_estado:
+                                        # Normalizar fechas para comparación
+                                        if isinstance(ultima_fecha_ingreso, str):
+                                            ultima_fecha_ingreso = datetime.strptime(ultima_fecha_ingreso, '%Y-%m-%d').date()
+                                        elif isinstance(ultima_fecha_ingreso, datetime):
+                                            ultima_fecha_ingreso = ultima_fecha_ingreso.date()
                                     
-                                    if isinstance(ultima_fecha_estado, str):
-                                        ultima_fecha_estado = datetime.strptime(ultima_fecha_estado, '%Y-%m-%d').date()
-                                    elif isinstance(ultima_fecha_estado, datetime):
-                                        ultima_fecha_estado = ultima_fecha_estado.date()
+                                        if isinstance(ultima_fecha_estado, str):
+                                            ultima_fecha_estado = datetime.strptime(ultima_fecha_estado, '%Y-%m-%d').date()
+                                        elif isinstance(ultima_fecha_estado, datetime):
+                                            ultima_fecha_estado = ultima_fecha_estado.date()
                                     
-                                    if ultima_fecha_ingreso > ultima_fecha_estado:
-                                        # Ingreso más reciente → Activo Pendiente
-                                        estado_nuevo = "Activo Pendiente"
-                                    else:
-                                        # Estado más reciente → Verificar antigüedad
-                                        dias_desde_ultimo_estado = (date.today() - ultima_fecha_estado).days
+                                        if ultima_fecha_ingreso > ultima_fecha_estado:
+                                            # Ingreso más reciente → Activo Pendiente
+                                            estado_nuevo = "Activo Pendiente"
+                                        else:
+                                            # Estado más reciente → Verificar antigüedad
+                                            dias_desde_ultimo_estado = (date.today() - ultima_fecha_estado).days
                                         
+                                            if dias_desde_ultimo_estado <= 365:
+                                                estado_nuevo = "Activo Resuelto"
+                                            else:
+                                                estado_nuevo = "Inactivo Resuelto"
+                                
+                                    elif ultima_fecha_estado:
+                                        # Solo hay estados → Verificar antigüedad
+                                        if isinstance(ultima_fecha_estado, str):
+                                            ultima_fecha_estado = datetime.strptime(ultima_fecha_estado, '%Y-%m-%d').date()
+                                        elif isinstance(ultima_fecha_estado, datetime):
+                                            ultima_fecha_estado = ultima_fecha_estado.date()
+                                    
+                                        dias_desde_ultimo_estado = (date.today() - ultima_fecha_estado).days
+                                    
                                         if dias_desde_ultimo_estado <= 365:
                                             estado_nuevo = "Activo Resuelto"
                                         else:
                                             estado_nuevo = "Inactivo Resuelto"
                                 
-                                elif ultima_fecha_estado:
-                                    # Solo hay estados → Verificar antigüedad
-                                    if isinstance(ultima_fecha_estado, str):
-                                        ultima_fecha_estado = datetime.strptime(ultima_fecha_estado, '%Y-%m-%d').date()
-                                    elif isinstance(ultima_fecha_estado, datetime):
-                                        ultima_fecha_estado = ultima_fecha_estado.date()
-                                    
-                                    dias_desde_ultimo_estado = (date.today() - ultima_fecha_estado).days
-                                    
-                                    if dias_desde_ultimo_estado <= 365:
-                                        estado_nuevo = "Activo Resuelto"
-                                    else:
-                                        estado_nuevo = "Inactivo Resuelto"
-                                
-                                elif ultima_fecha_ingreso:
-                                    # Solo hay ingresos → Activo Pendiente
-                                    estado_nuevo = "Activo Pendiente"
+                                    elif ultima_fecha_ingreso:
+                                        # Solo hay ingresos → Activo Pendiente
+                                        estado_nuevo = "Activo Pendiente"
                                 
-                                # Actualizar el campo estado en expediente
-                                if estado_nuevo:
-                                    cursor_estados.execute("""
-                                        UPDATE expediente 
-                                        SET estado = %s 
-                                        WHERE id = %s
-                                    """, (estado_nuevo, expediente_id))
+                                    # Actualizar el campo estado en expediente
+                                    if estado_nuevo:
+                                        cursor_estados.execute("""
+                                            UPDATE expediente 
+                                            SET estado = %s 
+                                            WHERE id = %s
+                                        """, (estado_nuevo, expediente_id))
                                     
-                                    conn_estados.commit()
-                                    if not IS_PRODUCTION:
-                                        logger.debug(f"🔄 Estado del expediente actualizado a: {estado_nuevo}")
+                                        conn_estados.commit()
+                                        if not IS_PRODUCTION:
+                                            logger.debug(f"🔄 Estado del expediente actualizado a: {estado_nuevo}")
                                     
-                                    # 🎫 GESTIÓN DE TURNOS: Si el estado cambió a Resuelto, marcar para recálculo
-                                    if estado_nuevo in ["Activo Resuelto", "Inactivo Resuelto"]:
-                                        try:
-                                            # Verificar si el expediente tenía turno asignado
-                                            cursor_estados.execute("""
-                                                SELECT turno FROM expediente WHERE id = %s
-                                            """, (expediente_id,))
+                                        # 🎫 GESTIÓN DE TURNOS: Si el estado cambió a Resuelto, marcar para recálculo
+                                        if estado_nuevo in ["Activo Resuelto", "Inactivo Resuelto"]:
+                                            try:
+                                                # Verificar si el expediente tenía turno asignado
+                                                cursor_estados.execute("""
+                                                    SELECT turno FROM expediente WHERE id = %s
+                                                """, (expediente_id,))
                                             
-                                            result_turno = cursor_estados.fetchone()
-                                            turno_anterior = result_turno[0] if result_turno else None
+                                                result_turno = cursor_estados.fetchone()
+                                                turno_anterior = result_turno[0] if result_turno else None
                                             
-                                            if turno_anterior:
-                                                if not IS_PRODUCTION:
-                                                    logger.debug(f"🎫 Expediente tenía turno {turno_anterior} - marcando para recálculo")
+                                                if turno_anterior:
+                                                    if not IS_PRODUCTION:
+                                                        logger.debug(f"🎫 Expediente tenía turno {turno_anterior} - marcando para recálculo")
                                                 
-                                                # Eliminar turno del expediente resuelto
-                                                cursor_estados.execute("""
-                                                    UPDATE expediente 
-                                                    SET turno = NULL 
-                                                    WHERE id = %s
-                                                """, (expediente_id,))
+                                                    # Eliminar turno del expediente resuelto
+                                                    cursor_estados.execute("""
+                                                        UPDATE expediente 
+                                                        SET turno = NULL 
+                                                        WHERE id = %s
+                                                    """, (expediente_id,))
                                                 
-                                                # Marcar que se necesita recalcular turnos al final
-                                                necesita_recalculo_turnos = True
-                                            else:
-                                                if not IS_PRODUCTION:
-                                                    logger.debug(f"ℹ️ Expediente no tenía turno asignado - no se requiere recálculo")
+                                                    # Marcar que se necesita recalcular turnos al final
+                                                    necesita_recalculo_turnos = True
+                                                else:
+                                                    if not IS_PRODUCTION:
+                                                        logger.debug(f"ℹ️ Expediente no tenía turno asignado - no se requiere recálculo")
                                         
-                                        except Exception as turno_error:
-                                            logger.warning(f"⚠️ Error gestionando turnos para expediente {expediente_id}: {turno_error}")
-                                            # No detener el proceso, el estado ya fue actualizado correctamente
+                                            except Exception as turno_error:
+                                                logger.warning(f"⚠️ Error gestionando turnos para expediente {expediente_id}: {turno_error}")
+                                                # No detener el proceso, el estado ya fue actualizado correctamente
                                 
-                            except Exception as update_error:
-                                logger.warning(f"⚠️ Error actualizando estado del expediente {expediente_id}: {update_error}")
-                                # No detener el proceso, el estado ya fue insertado correctamente
+                                except Exception as update_error:
+                                    logger.warning(f"⚠️ Error actualizando estado del expediente {expediente_id}: {update_error}")
+                                    # No detener el proceso, el estado ya fue insertado correctamente
                             
                             
-                        except Exception as e:
-                            logger.error(f"❌ Error procesando fila {index + 2} de estados: {e}")
-                            resultados['errores'] += 1
-                            resultados['errores_detallados'].append({
-                                'fila': index + 2,
-                                'hoja': pestaña_estados,
-                                'radicado': radicado_completo if 'radicado_completo' in locals() else 'N/A',
-                                'motivo': f'Error técnico: {str(e)}'
-                            })
-                            conn_estados.rollback()  # Revierte solo esta fila
-                            continue
+                            except Exception as e:
+                                logger.error(f"❌ Error procesando fila {index + 2} de estados: {e}")
+                                resultados['errores'] += 1
+                                resultados['errores_detallados'].append({
+                                    'fila': index + 2,
+                                    'hoja': pestaña_estados,
+                                    'radicado': radicado_completo if 'radicado_completo' in locals() else 'N/A',
+                                    'motivo': f'Error técnico: {str(e)}'
+                                })
+                                conn_estados.rollback()  # Revierte solo esta fila
+                                continue
                     
                     # 🎫 RECALCULAR TURNOS UNA SOLA VEZ (si es necesario) - LÓGICA COMPLEJA
                     if necesita_recalculo_turnos:
@@ -2206,102 +2173,9 @@ def procesar_excel_actualizacion_multiples_pestañas(file_content, hojas_disponi
                             logger.info("🔄 RECALCULANDO TODOS LOS TURNOS (LÓGICA COMPLEJA)...")
                             logger.info("📋 Criterios: fecha sin salida → antigüedad expediente → última actuación → ID")
                             
-                            # Paso 1: Limpiar todos los turnos de expedientes 'Activo Pendiente'
-                            cursor_estados.execute("""
-                                UPDATE expediente 
-                                SET turno = NULL 
-                                WHERE estado = 'Activo Pendiente'
-                            """)
-                            
-                            limpiados = cursor_estados.rowcount
-                            logger.info(f"🧹 Turnos limpiados: {limpiados}")
-                            
-                            # Paso 2: Obtener TODOS los expedientes 'Activo Pendiente' con lógica compleja
-                            # Esta es la MISMA lógica que usa vistaactualizarexpediente.py
-                            cursor_estados.execute("""
-                                WITH expedientes_activos AS (
-                                    SELECT 
-                                        e.id,
-                                        e.radicado_completo,
-                                        e.fecha_ingreso as fecha_ingreso_expediente
-                                    FROM expediente e
-                                    WHERE e.estado = 'Activo Pendiente'
-                                ),
-                                ingresos_expedientes AS (
-                                    SELECT 
-                                        i.expediente_id,
-                                        i.fecha_ingreso
-                                    FROM ingresos i
-                                    WHERE i.fecha_ingreso IS NOT NULL
-                                ),
-                                ingresos_sin_salida AS (
-                                    -- Identificar qué ingresos NO tienen estado posterior
-                                    SELECT 
-                                        ie.expediente_id,
-                                        ie.fecha_ingreso
-                                    FROM ingresos_expedientes ie
-                                    WHERE NOT EXISTS (
-                                        SELECT 1 FROM estados est 
-                                        WHERE est.expediente_id = ie.expediente_id 
-                                          AND est.fecha_estado >= ie.fecha_ingreso
-                                    )
-                                ),
-                                fecha_ingreso_mas_antigua_sin_salida AS (
-                                    -- Para cada expediente, obtener la fecha de ingreso MÁS ANTIGUA sin salida
-                                    SELECT 
-                                        expediente_id,
-                                        MIN(fecha_ingreso) as fecha_ingreso_sin_salida
-                                    FROM ingresos_sin_salida
-                                    GROUP BY expediente_id
-                                ),
-                                ultima_actuacion_expediente AS (
-                                    -- Para cada expediente, obtener la fecha de la última actuación
-                                    SELECT 
-                                        expediente_id,
-                                        MAX(fecha_estado) as ultima_actuacion
-                                    FROM estados
-                                    WHERE fecha_estado IS NOT NULL
-                                    GROUP BY expediente_id
-                                )
-                                SELECT 
-                                    ea.id,
-                                    ea.radicado_completo,
-                                    COALESCE(fimass.fecha_ingreso_sin_salida, ea.fecha_ingreso_expediente) as fecha_para_turno,
-                                    ea.fecha_ingreso_expediente,
-                                    uae.ultima_actuacion
-                                FROM expedientes_activos ea
-                                LEFT JOIN fecha_ingreso_mas_antigua_sin_salida fimass ON ea.id = fimass.expediente_id
-                                LEFT JOIN ultima_actuacion_expediente uae ON ea.id = uae.expediente_id
-                                WHERE COALESCE(fimass.fecha_ingreso_sin_salida, ea.fecha_ingreso_expediente) IS NOT NULL
-                                ORDER BY 
-                                    COALESCE(fimass.fecha_ingreso_sin_salida, ea.fecha_ingreso_expediente) ASC,
-                                    ea.fecha_ingreso_expediente ASC,
-                                    uae.ultima_actuacion ASC NULLS LAST,
-                                    ea.id ASC
-                            """)
-                            
-                            expedientes = cursor_estados.fetchall()
-                            logger.info(f"📋 Expedientes que deben tener turno: {len(expedientes)}")
-                            
-                            if expedientes:
-                                # Paso 3: Asignar turnos secuenciales
-                                turnos_asignados = 0
-                                
-                                for turno, (exp_id, radicado, fecha_para_turno, fecha_ing_exp, ultima_act) in enumerate(expedientes, 1):
-                                    cursor_estados.execute("""
-                                        UPDATE expediente 
-                                        SET turno = %s 
-                                        WHERE id = %s
-                                    """, (turno, exp_id))
-                                    
-                                    if cursor_estados.rowcount == 1:
-                                        turnos_asignados += 1
-                                
-                                conn_estados.commit()
-                                logger.info(f"✅ Turnos recalculados: {turnos_asignados} expedientes actualizados")
-                                logger.info(f"   Criterios aplicados: fecha sin salida → antigüedad → última actuación → ID")
-                            else:
-                                logger.info("ℹ️ No hay expedientes que cumplan los criterios para asignar turnos")
+                            resultado_turnos = recalcular_turnos(cursor_estados)
+                            conn_estados.commit()
+                            logger.info(f"✅ Turnos recalculados: {resultado_turnos['actualizados']} expedientes actualizados")
                         
                         except Exception as turno_error:
                             logger.error(f"❌ Error recalculando turnos: {turno_error}")
@@ -2386,9 +2260,8 @@ def procesar_excel_actualizacion_multiples_pestañas(file_content, hojas_disponi
                 
                 contenido_reporte += "=" * 80 + "\n"
                 
-                # Obtener usuario_id de la sesión
-                from flask import session
-                usuario_id = session.get('usuario_id') if 'session' in dir() else None
+                # Usuario que hizo la carga (sesión o dueño del trabajo)
+                usuario_id = usuario_actual()
                 
                 # Insertar reporte en la base de datos
                 conn_reporte = obtener_conexion()
@@ -2435,14 +2308,119 @@ def procesar_excel_actualizacion_multiples_pestañas(file_content, hojas_disponi
         logger.error(f"ERROR en procesar_excel_actualizacion_multiples_pestañas: {str(e)}")
         raise e
 
+def _primer_valor(row, columnas, posibles_nombres):
+    """Primer valor no vacío de la fila entre las columnas posibles (texto sin espacios)"""
+    for col_name in posibles_nombres:
+        if col_name in columnas and pd.notna(row.get(col_name)):
+            return str(row.get(col_name)).strip()
+    return None
+
+
+def extraer_expediente_nuevo(row, columnas, columnas_bd, numero_fila=None):
+    """
+    Extrae y valida en memoria una fila de la carga de expedientes nuevos.
+    Los duplicados no se revisan aquí: se detectan en SQL (utils/carga_masiva).
+
+    Args:
+        row: fila del Excel
+        columnas: columnas del Excel
+        columnas_bd: dict de columnas_tabla('expediente') (utils/esquema.py)
+        numero_fila: número de fila para los mensajes (por defecto row.name + 1)
+
+    Returns:
+        tuple: (datos para la tabla de carga, categoría de rechazo o None, detalle)
+    """
+    if numero_fila is None:
+        numero_fila = row.name + 1 if isinstance(row.name, int) else row.name
+
+    datos = {
+        'radicado_completo': _primer_valor(row, columnas, ['RadicadoUnicoLimpio', 'RADICADO COMPLETO', 'radicado_completo', 'RADICADO_COMPLETO', 'Radicado Completo']),
+        'radicado_corto': _primer_valor(row, columnas, ['RadicadoUnicoCompleto', 'RADICADO_MODIFICADO_OFI', 'radicado_corto', 'RADICADO_CORTO', 'Radicado Corto']),
+        'demandante': _primer_valor(row, columnas, ['DEMANDANTE_HOMOLOGADO', 'DEMANDANTE', 'demandante', 'Demandante']),
+        'demandado': _primer_valor(row, columnas, ['DEMANDADO_HOMOLOGADO', 'DEMANDADO', 'demandado', 'Demandado']),
+        'tipo_solicitud': _primer_valor(row, columnas, ['SOLICITUD', 'solicitud', 'Solicitud', 'TIPO_SOLICITUD', 'tipo_solicitud']),
+        'responsable': _primer_valor(row, columnas, ['RESPONSABLE', 'responsable', 'Responsable']),
+        'ubicacion': _primer_valor(row, columnas, ['UBICACION', 'ubicacion', 'Ubicacion']),
+        'observaciones': _primer_valor(row, columnas, ['OBSERVACIONES', 'observaciones', 'Observaciones']),
+        'juzgado_origen': _primer_valor(row, columnas, ['JuzgadoOrigen', 'juzgado_origen', 'JUZGADO_ORIGEN', 'Juzgado Origen', 'J. ORIGEN']),
+    }
+
+    # Si el estado no viene en el Excel, 'Activo Pendiente' por defecto
+    if 'estado' in columnas_bd:
+        datos['estado'] = _primer_valor(row, columnas, ['ESTADO_EXPEDIENTE', 'estado', 'ESTADO', 'Estado']) or 'Activo Pendiente'
+
+    # Procesar FECHA INGRESO (requerida)
+    fecha_ingreso = None
+    fecha_invalida = False
+    for col_name in ['FECHA INGRESO', 'FECHA_INGRESO', 'fecha_ingreso', 'Fecha Ingreso', 'FECHA DE INGRESO']:
+        if col_name in columnas and pd.notna(row.get(col_name)):
+            fecha_valor = row.get(col_name)
+            if isinstance(fecha_valor, str):
+                for formato in ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y']:
+                    try:
+                        fecha_ingreso = datetime.strptime(fecha_valor.strip(), formato).date()
+                        break
+                    except ValueError:
+                        continue
+            elif isinstance(fecha_valor, datetime):
+                fecha_ingreso = fecha_valor.date()
+            elif isinstance(fecha_valor, date):
+                fecha_ingreso = fecha_valor
+            else:
+                fecha_invalida = True
+            break
+    datos['fecha_ingreso'] = fecha_ingreso
+
+    def rechazar(categoria, detalle):
+        datos['motivo'] = categoria
+        return datos, categoria, detalle
+
+    radicado_completo = datos['radicado_completo']
+    if not radicado_completo and not datos['radicado_corto']:
+        return rechazar('campos_faltantes', f"Fila {numero_fila}: Sin radicado")
+
+    # Validación específica del radicado completo (debe tener exactamente 23 dígitos)
+    if radicado_completo:
+        es_valido, _ = validar_radicado_completo(radicado_completo)
+        if not es_valido:
+            return rechazar('radicado_invalido', f"{radicado_completo} ({len(radicado_completo)} dígitos)")
+
+    if not datos['demandante']:
+        return rechazar('campos_faltantes', f"Fila {numero_fila}: Sin demandante")
+    if not datos['demandado']:
+        return rechazar('campos_faltantes', f"Fila {numero_fila}: Sin demandado")
+    if fecha_invalida:
+        return rechazar('tecnico', f"Fecha de ingreso no reconocida en fila {numero_fila}")
+    if not fecha_ingreso:
+        return rechazar('campos_faltantes', f"Fila {numero_fila}: Sin fecha de ingreso")
+    if not datos['tipo_solicitud']:
+        return rechazar('campos_faltantes', f"Fila {numero_fila}: Sin solicitud")
+
+    # Valores que la base rechazaría (antes fallaba solo el INSERT de esa fila)
+    juzgado = datos['juzgado_origen']
+    if juzgado and columnas_bd.get('juzgado_origen', ('',))[0] in TIPOS_ENTEROS:
+        try:
+            datos['juzgado_origen'] = int(juzgado)
+        except ValueError:
+            return rechazar('tecnico', f"Juzgado de origen no numérico en fila {numero_fila}: {juzgado}")
+    for columna, valor in datos.items():
+        longitud_maxima = columnas_bd.get(columna, (None, None))[1]
+        if longitud_maxima and isinstance(valor, str) and len(valor) > longitud_maxima:
+            return rechazar('tecnico', f"El campo {columna} supera {longitud_maxima} caracteres en fila {numero_fila}")
+
+    return datos, None, None
+
+
 def procesar_excel_expedientes(file_content):
     """
     Procesa un archivo Excel con expedientes
     
     Args:
-        file_content: BytesIO object con el contenido del archivo Excel
+        file_content: BytesIO, ruta o LibroExcel ya abierto con el archivo Excel
     """
     logger.info("=== INICIO procesar_excel_expedientes ===")
+    libro_propio = not isinstance(file_content, LibroExcel)
+    libro = None
     
     try:
         # Leer Excel - intentar diferentes nombres de hojas
@@ -2450,10 +2428,9 @@ def procesar_excel_expedientes(file_content):
         
         # Primero, obtener la lista de hojas disponibles
         try:
-            file_content.seek(0)
-            with pd.ExcelFile(file_content) as excel_file:
-                hojas_disponibles = excel_file.sheet_names
-                logger.info(f"Hojas disponibles en el archivo: {hojas_disponibles}")
+            libro = abrir_libro(file_content)
+            hojas_disponibles = libro.sheet_names
+            logger.info(f"Hojas disponibles en el archivo: {hojas_disponibles}")
         except Exception as e:
             logger.error(f"Error leyendo archivo Excel: {str(e)}")
             raise Exception(f"Error leyendo archivo Excel: {str(e)}")
@@ -2481,8 +2458,7 @@ def procesar_excel_expedientes(file_content):
             if nombre_hoja and nombre_hoja in hojas_disponibles:
                 try:
                     logger.info(f"Intentando leer hoja: '{nombre_hoja}'")
-                    file_content.seek(0)
-                    df = pd.read_excel(file_content, sheet_name=nombre_hoja)
+                    df = libro.hoja(nombre_hoja)
                     hoja_usada = nombre_hoja
                     logger.info(f"✓ Hoja '{nombre_hoja}' leída exitosamente")
                     break
@@ -2493,7 +2469,7 @@ def procesar_excel_expedientes(file_content):
         if df is None:
             raise Exception(f"No se pudo leer ninguna hoja del archivo. Hojas disponibles: {hojas_disponibles}")
         
-        logger.info(f"Excel leído correctamente usando hoja '{hoja_usada}'. Filas: {len(df)}, Columnas: {len(df.columns)}")
+        logger.info(f"Excel abierto usando hoja '{hoja_usada}'. Filas (aprox.): {df.filas_estimadas}, Columnas: {len(df.columns)}")
         logger.info(f"Columnas disponibles: {list(df.columns)}")
         
         # Verificar si tiene las columnas mínimas necesarias
@@ -2554,8 +2530,8 @@ def procesar_excel_expedientes(file_content):
         
         if columnas_faltantes:
             logger.error(f"Faltan columnas requeridas: {columnas_faltantes}")
-            flash(f'El archivo Excel debe contener las siguientes columnas requeridas: {", ".join(columnas_faltantes)}. Columnas disponibles: {", ".join(df.columns)}', 'error')
-            return redirect(url_for('idvistasubirexpediente.vista_subirexpediente'))
+            # Se procesa fuera de la petición: el motivo llega al usuario como error del trabajo
+            raise Exception(f'El archivo Excel debe contener las siguientes columnas requeridas: {", ".join(columnas_faltantes)}. Columnas disponibles: {", ".join(df.columns)}')
         
         logger.info("✅ Todas las columnas requeridas están presentes")
         columnas_encontradas = ["Validación exitosa"]  # Para mantener compatibilidad con el código siguiente
@@ -2564,30 +2540,12 @@ def procesar_excel_expedientes(file_content):
         logger.info("Conexión a BD establecida para procesamiento masivo")
         cursor = conn.cursor()
         
-        # Verificar estructura de la tabla
-        cursor.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'expediente'
-        """)
-        
-        available_columns = [row[0] for row in cursor.fetchall()]
+        # Verificar estructura de la tabla (nombre, tipo y longitud máxima)
+        columnas_bd = columnas_tabla('expediente')
+        available_columns = list(columnas_bd)
         logger.info(f"Columnas disponibles en tabla expediente: {available_columns}")
         
-        # 🚀 OPTIMIZACIÓN: Cargar radicados existentes en memoria UNA SOLA VEZ
-        logger.info("🚀 Cargando radicados existentes en memoria para verificación de duplicados...")
-        
-        # Cargar radicados completos (23 dígitos)
-        cursor.execute("SELECT radicado_completo FROM expediente WHERE radicado_completo IS NOT NULL")
-        radicados_existentes = set(row[0] for row in cursor.fetchall())
-        
-        # Cargar también los últimos 13 dígitos de cada radicado para verificación flexible
-        cursor.execute("SELECT radicado_completo FROM expediente WHERE radicado_completo IS NOT NULL AND LENGTH(radicado_completo) >= 13")
-        radicados_ultimos_13 = set(row[0][-13:] for row in cursor.fetchall())
-        
-        logger.info(f"✅ {len(radicados_existentes)} radicados completos cargados en memoria")
-        logger.info(f"✅ {len(radicados_ultimos_13)} radicados (últimos 13 dígitos) cargados para verificación flexible")
-        logger.info(f"⚡ Verificación de duplicados será instantánea...")
+        tablas_relacionadas = [t for t in ('ingresos', 'estados') if existe_tabla(t)]
         
         procesados = 0
         errores = 0
@@ -2596,7 +2554,8 @@ def procesar_excel_expedientes(file_content):
         rechazados_detalle = {
             'duplicados': [],
             'radicado_invalido': [],
-            'campos_faltantes': []
+            'campos_faltantes': [],
+            'rechazado_bd': []
         }
         
         # 📊 Tracking de expedientes creados exitosamente
@@ -2604,388 +2563,91 @@ def procesar_excel_expedientes(file_content):
         
         # 🎫 Flag para recálculo de turnos al final
         necesita_recalculo_turnos = False
-        logger.info("Iniciando procesamiento fila por fila...")
-        for index, row in df.iterrows():
-            try:
-                if not IS_PRODUCTION:
-                    logger.debug(f"Procesando fila {index + 1}")
-                
-                # Mapear columnas del Excel de forma más flexible
-                radicado_completo = None
-                radicado_corto = None
-                
-                # Intentar diferentes nombres de columnas para radicado completo
-                for col_name in ['RadicadoUnicoLimpio', 'RADICADO COMPLETO', 'radicado_completo', 'RADICADO_COMPLETO', 'Radicado Completo']:
-                    if col_name in df.columns and pd.notna(row.get(col_name)):
-                        radicado_completo = str(row.get(col_name)).strip()
-                        break
-                
-                # Intentar diferentes nombres de columnas para radicado corto
-                for col_name in ['RadicadoUnicoCompleto', 'RADICADO_MODIFICADO_OFI', 'radicado_corto', 'RADICADO_CORTO', 'Radicado Corto']:
-                    if col_name in df.columns and pd.notna(row.get(col_name)):
-                        radicado_corto = str(row.get(col_name)).strip()
-                        break
-                
-                # Intentar diferentes nombres para demandante
-                demandante = None
-                for col_name in ['DEMANDANTE_HOMOLOGADO', 'DEMANDANTE', 'demandante', 'Demandante']:
-                    if col_name in df.columns and pd.notna(row.get(col_name)):
-                        demandante = str(row.get(col_name)).strip()
-                        break
-                
-                # Intentar diferentes nombres para demandado
-                demandado = None
-                for col_name in ['DEMANDADO_HOMOLOGADO', 'DEMANDADO', 'demandado', 'Demandado']:
-                    if col_name in df.columns and pd.notna(row.get(col_name)):
-                        demandado = str(row.get(col_name)).strip()
-                        break
-                
-                # Procesar FECHA INGRESO (requerida)
-                fecha_ingreso = None
-                for col_name in ['FECHA INGRESO', 'FECHA_INGRESO', 'fecha_ingreso', 'Fecha Ingreso', 'FECHA DE INGRESO']:
-                    if col_name in df.columns and pd.notna(row.get(col_name)):
-                        fecha_valor = row.get(col_name)
-                        # Intentar convertir a fecha si es necesario
-                        try:
-                            if isinstance(fecha_valor, str):
-                                # Intentar diferentes formatos de fecha
-                                for formato in ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y']:
-                                    try:
-                                        fecha_ingreso = datetime.strptime(fecha_valor.strip(), formato).date()
-                                        break
-                                    except ValueError:
-                                        continue
-                            else:
-                                # Si ya es un objeto datetime o date
-                                fecha_ingreso = fecha_valor
-                        except Exception as e:
-                            logger.warning(f"Error procesando fecha en fila {index + 1}: {e}")
-                        break
-                
-                # Procesar SOLICITUD (requerida)
-                solicitud = None
-                for col_name in ['SOLICITUD', 'solicitud', 'Solicitud', 'TIPO_SOLICITUD', 'tipo_solicitud']:
-                    if col_name in df.columns and pd.notna(row.get(col_name)):
-                        solicitud = str(row.get(col_name)).strip()
-                        break
-                
-                if not IS_PRODUCTION:
-                    logger.debug(f"  Radicado completo: '{radicado_completo}'")
-                    logger.debug(f"  Radicado corto: '{radicado_corto}'")
-                    logger.debug(f"  Demandante: '{demandante}'")
-                    logger.debug(f"  Demandado: '{demandado}'")
-                    logger.debug(f"  Fecha ingreso: '{fecha_ingreso}'")
-                    logger.debug(f"  Solicitud: '{solicitud}'")
-                
-                # Validar campos requeridos
-                if not radicado_completo and not radicado_corto:
+        
+        # 🚀 CARGA MASIVA: validación en memoria por lotes, COPY a una tabla temporal
+        # e inserción set-based; los duplicados se detectan en SQL
+        logger.info("Validando filas en memoria y copiando a tabla temporal (COPY)...")
+        crear_tabla_carga(cursor)
+        
+        # fila -> (categoría, detalle) de los rechazos detectados en memoria
+        rechazos_memoria = {}
+        iniciar_progreso(df.filas_estimadas)
+        inicio_lotes = time.perf_counter()
+        filas_leidas = 0
+        for lote in df.iterar_lotes():
+            filas_lote = []
+            for index, row in lote.iterrows():
+                fila, categoria, detalle = extraer_expediente_nuevo(row, df.columns, columnas_bd, index + 1)
+                fila['fila'] = index + 1
+                if categoria:
+                    rechazos_memoria[fila['fila']] = (categoria, detalle)
                     if not IS_PRODUCTION:
-                        logger.debug(f"  Saltando fila {index + 1} - sin radicado")
-                    rechazados_detalle['campos_faltantes'].append(f"Fila {index + 1}: Sin radicado")
-                    errores += 1
-                    continue
-                
-                # 🚀 VERIFICACIÓN DE DUPLICADOS EN MEMORIA (instantánea, sin query a BD)
-                # Primero verificar por radicado completo (23 dígitos)
-                if radicado_completo:
-                    if radicado_completo in radicados_existentes:
-                        if not IS_PRODUCTION:
-                            logger.debug(f"  Saltando fila {index + 1} - radicado duplicado (23 dígitos): {radicado_completo}")
-                        rechazados_detalle['duplicados'].append(radicado_completo)
-                        errores += 1
-                        continue
-                    
-                    # Si no se encontró por 23 dígitos, verificar por últimos 13 dígitos
-                    if len(radicado_completo) >= 13:
-                        ultimos_13 = radicado_completo[-13:]
-                        if ultimos_13 in radicados_ultimos_13:
-                            if not IS_PRODUCTION:
-                                logger.debug(f"  Saltando fila {index + 1} - radicado duplicado (últimos 13 dígitos): {radicado_completo} -> {ultimos_13}")
-                            rechazados_detalle['duplicados'].append(f"{radicado_completo} (coincide con últimos 13: {ultimos_13})")
-                            errores += 1
-                            continue
-                
-                # Validación específica del radicado completo (debe tener exactamente 23 dígitos)
-                if radicado_completo:
-                    es_valido, mensaje_error = validar_radicado_completo(radicado_completo)
-                    if not es_valido:
-                        if not IS_PRODUCTION:
-                            logger.debug(f"  Saltando fila {index + 1} - {mensaje_error}")
-                        rechazados_detalle['radicado_invalido'].append(f"{radicado_completo} ({len(radicado_completo)} dígitos)")
-                        errores += 1
-                        continue
-                    
-                    logger.debug(f"  ✅ Radicado completo válido: {radicado_completo} (23 dígitos)")
-                
-                if not demandante:
-                    logger.debug(f"  Saltando fila {index + 1} - sin demandante")
-                    rechazados_detalle['campos_faltantes'].append(f"Fila {index + 1}: Sin demandante")
-                    errores += 1
-                    continue
-                
-                if not demandado:
-                    logger.debug(f"  Saltando fila {index + 1} - sin demandado")
-                    rechazados_detalle['campos_faltantes'].append(f"Fila {index + 1}: Sin demandado")
-                    errores += 1
-                    continue
-                
-                if not fecha_ingreso:
-                    logger.debug(f"  Saltando fila {index + 1} - sin fecha de ingreso")
-                    rechazados_detalle['campos_faltantes'].append(f"Fila {index + 1}: Sin fecha de ingreso")
-                    errores += 1
-                    continue
-                
-                if not solicitud:
-                    logger.debug(f"  Saltando fila {index + 1} - sin solicitud")
-                    rechazados_detalle['campos_faltantes'].append(f"Fila {index + 1}: Sin solicitud")
-                    errores += 1
-                    continue
-                
-                # Construir query dinámicamente basado en columnas disponibles
-                columns_to_insert = []
-                values_to_insert = []
-                placeholders = []
-                
-                # Columnas base requeridas (siempre insertar)
-                base_data = {
-                    'radicado_completo': radicado_completo,
-                    'radicado_corto': radicado_corto,
-                    'demandante': demandante,
-                    'demandado': demandado,
-                    'fecha_ingreso': fecha_ingreso
-                }
-                
-                for col, value in base_data.items():
-                    if col in available_columns and value:
-                        columns_to_insert.append(col)
-                        placeholders.append('%s')
-                        values_to_insert.append(value)
-                
-                # Insertar solicitud en tipo_solicitud si existe esa columna
-                if 'tipo_solicitud' in available_columns and solicitud:
-                    columns_to_insert.append('tipo_solicitud')
-                    placeholders.append('%s')
-                    values_to_insert.append(solicitud)
-                
-                # Columnas opcionales con mapeo flexible (excluyendo tipo_solicitud que ya se procesó)
-                optional_mappings = {
-                    'estado': ['ESTADO_EXPEDIENTE', 'estado', 'ESTADO', 'Estado'],
-                    'responsable': ['RESPONSABLE', 'responsable', 'Responsable'],
-                    'ubicacion': ['UBICACION', 'ubicacion', 'Ubicacion'],
-                    'observaciones': ['OBSERVACIONES', 'observaciones', 'Observaciones']
-                }
-                
-                for db_col, excel_cols in optional_mappings.items():
-                    if db_col in available_columns:
-                        for excel_col in excel_cols:
-                            if excel_col in df.columns and pd.notna(row.get(excel_col)):
-                                value = str(row.get(excel_col)).strip()
-                                if value:
-                                    columns_to_insert.append(db_col)
-                                    placeholders.append('%s')
-                                    values_to_insert.append(value)
-                                    break
-                
-                # Si el estado no fue extraído del Excel, usar 'Activo Pendiente' por defecto
-                if 'estado' in available_columns and 'estado' not in columns_to_insert:
-                    columns_to_insert.append('estado')
-                    placeholders.append('%s')
-                    values_to_insert.append('Activo Pendiente')
-                
-                # Manejar juzgado_origen (puede ser integer en la BD)
-                juzgado_origen_cols = ['JuzgadoOrigen', 'juzgado_origen', 'JUZGADO_ORIGEN', 'Juzgado Origen', 'J. ORIGEN']
-                for col_name in juzgado_origen_cols:
-                    if col_name in df.columns and pd.notna(row.get(col_name)) and 'juzgado_origen' in available_columns:
-                        juzgado_value = str(row.get(col_name)).strip()
-                        if juzgado_value:
-                            columns_to_insert.append('juzgado_origen')
-                            placeholders.append('%s')
-                            
-                            # Intentar convertir a integer si es posible
-                            try:
-                                juzgado_origen_int = int(juzgado_value)
-                                values_to_insert.append(juzgado_origen_int)
-                            except ValueError:
-                                values_to_insert.append(juzgado_value)
-                            break
-                
-                # Construir y ejecutar query
-                if columns_to_insert:  # Solo insertar si hay columnas válidas
-                    query = f"""
-                        INSERT INTO expediente 
-                        ({', '.join(columns_to_insert)})
-                        VALUES ({', '.join(placeholders)})
-                        RETURNING id
-                    """
-                    
-                    logger.debug(f"  Ejecutando inserción con columnas: {columns_to_insert}")
-                    cursor.execute(query, values_to_insert)
-                    
-                    # Obtener el ID del expediente insertado
-                    expediente_id = cursor.fetchone()[0]
-                    
-                    # Manejar asignación de turno si el estado es 'Activo Pendiente'
-                    estado_expediente = None
-                    for i, col in enumerate(columns_to_insert):
-                        if col == 'estado':
-                            estado_expediente = values_to_insert[i]
-                            break
-                    
-                    if estado_expediente == 'Activo Pendiente' and 'turno' in available_columns:
-                        # Marcar para recálculo al final (no asignar turno aquí)
-                        necesita_recalculo_turnos = True
-                    
-                    # 📥 INSERTAR AUTOMÁTICAMENTE EN TABLA INGRESOS
-                    # Verificar si existe la tabla ingresos
-                    cursor.execute("""
-                        SELECT table_name 
-                        FROM information_schema.tables 
-                        WHERE table_name = 'ingresos'
-                    """)
-                    
-                    if cursor.fetchone():
-                        logger.debug(f"  📥 Insertando ingreso automático para expediente {expediente_id}")
-                        
-                        # Preparar datos para inserción en ingresos
-                        # fecha_ingreso ya está disponible de la fila del Excel
-                        # solicitud ya está disponible de la fila del Excel
-                        # observaciones ya está disponible de la fila del Excel (si existe)
-                        
-                        # Extraer observaciones si no se hizo antes
-                        observaciones_ingreso = None
-                        for col_name in ['OBSERVACIONES', 'observaciones', 'Observaciones']:
-                            if col_name in df.columns and pd.notna(row.get(col_name)):
-                                observaciones_ingreso = str(row.get(col_name)).strip()
-                                break
-                        
-                        # Si no hay observaciones, usar un valor por defecto
-                        if not observaciones_ingreso:
-                            observaciones_ingreso = 'Ingreso desde Excel - Carga masiva'
-                        
-                        try:
-                            cursor.execute("""
-                                INSERT INTO ingresos (expediente_id, fecha_ingreso, solicitud, observaciones)
-                                VALUES (%s, %s, %s, %s)
-                            """, (expediente_id, fecha_ingreso, solicitud, observaciones_ingreso))
-                            
-                            logger.debug(f"  ✅ Ingreso creado para expediente {expediente_id}")
-                        except Exception as ingreso_error:
-                            logger.warning(f"  ⚠️ Error insertando ingreso para expediente {expediente_id}: {ingreso_error}")
-                            # No detener el proceso, solo registrar el error
-                    else:
-                        logger.debug(f"  ℹ️ Tabla 'ingresos' no existe - saltando inserción de ingreso")
-                    
-                    # 📤 INSERTAR AUTOMÁTICAMENTE EN TABLA ESTADOS (si hay estado)
-                    if estado_expediente:
-                        cursor.execute("""
-                            SELECT table_name 
-                            FROM information_schema.tables 
-                            WHERE table_name = 'estados'
-                        """)
-                        
-                        if cursor.fetchone():
-                            logger.debug(f"  📤 Insertando estado inicial para expediente {expediente_id}")
-                            
-                            try:
-                                cursor.execute("""
-                                    INSERT INTO estados (expediente_id, clase, fecha_estado, auto_anotacion, observaciones)
-                                    VALUES (%s, %s, %s, %s, %s)
-                                """, (
-                                    expediente_id, 
-                                    estado_expediente,  # clase = estado del expediente
-                                    fecha_ingreso,  # fecha_estado = fecha de ingreso
-                                    f'Estado inicial: {estado_expediente}',  # auto_anotacion
-                                    'Estado inicial desde Excel - Carga masiva'  # observaciones
-                                ))
-                                
-                                logger.debug(f"  ✅ Estado inicial creado para expediente {expediente_id}")
-                            except Exception as estado_error:
-                                logger.warning(f"  ⚠️ Error insertando estado para expediente {expediente_id}: {estado_error}")
-                                # No detener el proceso, solo registrar el error
-                        else:
-                            logger.debug(f"  ℹ️ Tabla 'estados' no existe - saltando inserción de estado")
-                    
-                    # Agregar radicado al cache para evitar duplicados en el mismo archivo
-                    if radicado_completo:
-                        radicados_existentes.add(radicado_completo)
-                    
-                    procesados += 1
-                    
-                    # 📊 Registrar expediente exitoso para el reporte
-                    expedientes_exitosos.append({
-                        'fila': index + 1,
-                        'radicado_completo': radicado_completo if radicado_completo else 'N/A',
-                        'radicado_corto': radicado_corto if radicado_corto else 'N/A',
-                        'demandante': demandante[:50] if demandante and len(demandante) > 50 else demandante,
-                        'demandado': demandado[:50] if demandado and len(demandado) > 50 else demandado,
-                        'fecha_ingreso': str(fecha_ingreso) if fecha_ingreso else 'N/A',
-                        'estado': estado_expediente if estado_expediente else 'N/A'
-                    })
-                    
-                    if procesados % 100 == 0:  # Log cada 100 registros procesados
-                        logger.info(f"Procesados {procesados} expedientes...")
-                else:
-                    logger.debug(f"  Saltando fila {index + 1} - sin datos válidos para insertar")
-                
-            except Exception as row_error:
-                errores += 1
-                logger.error(f"Error procesando fila {index + 1}: {str(row_error)}")
-                logger.error(f"Datos de la fila: {dict(row)}")
-                continue
+                        logger.debug(f"  Fila {index + 1} rechazada en validación: {detalle}")
+                # Sin ningún radicado no hay nada que comparar en SQL
+                if fila.get('radicado_completo') or fila.get('radicado_corto'):
+                    filas_lote.append(fila)
+            copiar_filas_carga(cursor, filas_lote)
+            reportar_progreso(len(lote), errores=len(rechazos_memoria))
+            filas_leidas += len(lote)
+        
+        resultado_carga = insertar_desde_carga(
+            cursor, columnas_bd,
+            insertar_ingresos='ingresos' in tablas_relacionadas,
+            insertar_estados='estados' in tablas_relacionadas
+        )
+        registrar_carga('expedientes', filas_leidas, time.perf_counter() - inicio_lotes)
+        
+        # Consolidar rechazos en el orden del archivo
+        rechazos = []
+        for fila, radicado, tipo in resultado_carga['duplicados']:
+            if tipo == 'ultimos_13':
+                detalle = f"{radicado} (coincide con últimos 13: {radicado[-13:]})"
+            else:
+                detalle = radicado
+            rechazos.append((fila, 'duplicados', detalle))
+        filas_duplicadas = {fila for fila, _, _ in resultado_carga['duplicados']}
+        for fila, (categoria, detalle) in rechazos_memoria.items():
+            if fila not in filas_duplicadas:
+                rechazos.append((fila, categoria, detalle))
+        # Filas que la base rechazó al insertar (longitud, restricciones)
+        for fila, radicado, error in resultado_carga['fallidos']:
+            rechazos.append((fila, 'rechazado_bd', f"Fila {fila} - {radicado or 'sin radicado'}: {error}"))
+        
+        for fila, categoria, detalle in sorted(rechazos):
+            errores += 1
+            if categoria == 'tecnico':
+                logger.error(f"Error procesando fila {fila}: {detalle}")
+            else:
+                rechazados_detalle[categoria].append(detalle)
+        
+        for fila, _, radicado_completo, radicado_corto, demandante, demandado, fecha_ingreso, estado_expediente in resultado_carga['insertados']:
+            procesados += 1
+            if estado_expediente == 'Activo Pendiente' and 'turno' in available_columns:
+                # Marcar para recálculo al final (no asignar turno aquí)
+                necesita_recalculo_turnos = True
+            
+            # 📊 Registrar expediente exitoso para el reporte
+            expedientes_exitosos.append({
+                'fila': fila,
+                'radicado_completo': radicado_completo if radicado_completo else 'N/A',
+                'radicado_corto': radicado_corto if radicado_corto else 'N/A',
+                'demandante': demandante[:50] if demandante and len(demandante) > 50 else demandante,
+                'demandado': demandado[:50] if demandado and len(demandado) > 50 else demandado,
+                'fecha_ingreso': str(fecha_ingreso) if fecha_ingreso else 'N/A',
+                'estado': estado_expediente if estado_expediente else 'N/A'
+            })
         
         conn.commit()
-        logger.info("Transacción masiva confirmada (COMMIT)")
+        logger.info(f"Transacción masiva confirmada (COMMIT): {procesados} expedientes creados en {resultado_carga['duracion_ms']} ms")
         
         # 🎫 RECALCULAR TURNOS UNA SOLA VEZ con lógica compleja (si es necesario)
         if necesita_recalculo_turnos:
             try:
                 logger.info("🔄 RECALCULANDO TODOS LOS TURNOS (LÓGICA COMPLEJA)...")
                 
-                cursor.execute("""
-                    UPDATE expediente SET turno = NULL WHERE estado = 'Activo Pendiente'
-                """)
-                
-                cursor.execute("""
-                    WITH expedientes_activos AS (
-                        SELECT e.id, e.radicado_completo, e.fecha_ingreso as fecha_ingreso_expediente
-                        FROM expediente e WHERE e.estado = 'Activo Pendiente'
-                    ),
-                    ingresos_sin_salida AS (
-                        SELECT ie.expediente_id, ie.fecha_ingreso
-                        FROM ingresos ie
-                        WHERE ie.fecha_ingreso IS NOT NULL
-                          AND NOT EXISTS (
-                            SELECT 1 FROM estados est 
-                            WHERE est.expediente_id = ie.expediente_id 
-                              AND est.fecha_estado > ie.fecha_ingreso
-                          )
-                    ),
-                    fecha_mas_antigua_sin_salida AS (
-                        SELECT expediente_id, MIN(fecha_ingreso) as fecha_ingreso_sin_salida
-                        FROM ingresos_sin_salida GROUP BY expediente_id
-                    ),
-                    ultima_actuacion AS (
-                        SELECT expediente_id, MAX(fecha_estado) as ultima_actuacion
-                        FROM estados WHERE fecha_estado IS NOT NULL GROUP BY expediente_id
-                    )
-                    SELECT ea.id
-                    FROM expedientes_activos ea
-                    LEFT JOIN fecha_mas_antigua_sin_salida fmass ON ea.id = fmass.expediente_id
-                    LEFT JOIN ultima_actuacion ua ON ea.id = ua.expediente_id
-                    WHERE COALESCE(fmass.fecha_ingreso_sin_salida, ea.fecha_ingreso_expediente) IS NOT NULL
-                    ORDER BY
-                        COALESCE(fmass.fecha_ingreso_sin_salida, ea.fecha_ingreso_expediente) ASC,
-                        ea.fecha_ingreso_expediente ASC,
-                        ua.ultima_actuacion ASC NULLS LAST,
-                        ea.id ASC
-                """)
-                
-                expedientes = cursor.fetchall()
-                for turno, (exp_id,) in enumerate(expedientes, 1):
-                    cursor.execute("UPDATE expediente SET turno = %s WHERE id = %s", (turno, exp_id))
-                
+                resultado_turnos = recalcular_turnos(cursor)
                 conn.commit()
-                logger.info(f"✅ Turnos recalculados: {len(expedientes)} expedientes actualizados")
+                logger.info(f"✅ Turnos recalculados: {resultado_turnos['actualizados']} expedientes actualizados")
             
             except Exception as turno_error:
                 logger.error(f"❌ Error recalculando turnos: {turno_error}")
@@ -3064,14 +2726,20 @@ def procesar_excel_expedientes(file_content):
                         contenido_reporte += "-" * 40 + "\n"
                         for i, detalle in enumerate(rechazados_detalle['campos_faltantes'], 1):
                             contenido_reporte += f"{i}. {detalle}\n"
+                    
+                    # Rechazados por la base de datos
+                    if rechazados_detalle.get('rechazado_bd'):
+                        contenido_reporte += f"\nRECHAZADOS POR LA BASE DE DATOS ({len(rechazados_detalle['rechazado_bd'])}):\n"
+                        contenido_reporte += "-" * 40 + "\n"
+                        for i, detalle in enumerate(rechazados_detalle['rechazado_bd'], 1):
+                            contenido_reporte += f"{i}. {detalle}\n"
                 
                 contenido_reporte += "\n" + "=" * 80 + "\n"
                 contenido_reporte += "FIN DEL REPORTE\n"
                 contenido_reporte += "=" * 80 + "\n"
                 
-                # Obtener usuario_id de la sesión si está disponible
-                from flask import session
-                usuario_id = session.get('usuario_id') if 'session' in dir() else None
+                # Usuario que hizo la carga (sesión o dueño del trabajo)
+                usuario_id = usuario_actual()
                 
                 # Calcular errores por tipo
                 errores_duplicados = len(rechazados_detalle.get('duplicados', []))
@@ -3131,15 +2799,18 @@ def procesar_excel_expedientes(file_content):
         logger.error(f"ERROR GENERAL en procesar_excel_expedientes: {str(e)}")
         logger.error(f"Tipo de error: {type(e).__name__}")
         raise Exception(f"Error leyendo archivo Excel: {str(e)}")
+    finally:
+        if libro_propio and libro:
+            libro.close()
 
-def procesar_excel_multiples_pestañas(file_content, hojas_disponibles):
+def procesar_excel_multiples_pestañas(libro, hojas_disponibles):
     """
     Procesa un archivo Excel con múltiples pestañas:
     - Pestaña 'ingreso': Información actual de expedientes
     - Pestaña 'estados': RADICADO COMPLETO, CLASE, DEMANDANTE, DEMANDADO, FECHA ESTADO, AUTO / ANOTACION
     
     Args:
-        file_content: BytesIO object con el contenido del archivo Excel
+        libro: LibroExcel abierto con el contenido del archivo Excel
         hojas_disponibles: Lista de nombres de hojas disponibles
     """
     logger.info("=== INICIO procesar_excel_multiples_pestañas ===")
@@ -3150,19 +2821,8 @@ def procesar_excel_multiples_pestañas(file_content, hojas_disponibles):
         cursor = conn.cursor()
         
         # Verificar estructura de las tablas
-        cursor.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'expediente'
-        """)
-        expediente_columns = [row[0] for row in cursor.fetchall()]
-        
-        cursor.execute("""
-            SELECT table_name 
-            FROM information_schema.tables 
-            WHERE table_name IN ('ingresos', 'estados')
-        """)
-        tablas_relacionadas = [row[0] for row in cursor.fetchall()]
+        expediente_columns = list(columnas_tabla('expediente'))
+        tablas_relacionadas = [t for t in ('ingresos', 'estados') if existe_tabla(t)]
         
         logger.info(f"Columnas en tabla expediente: {expediente_columns}")
         logger.info(f"Tablas relacionadas disponibles: {tablas_relacionadas}")
@@ -3185,19 +2845,13 @@ def procesar_excel_multiples_pestañas(file_content, hojas_disponibles):
         if pestaña_ingreso:
             logger.info(f"Procesando pestaña de ingresos: {pestaña_ingreso}")
             try:
-                # Resetear puntero y leer desde BytesIO
-                file_content.seek(0)
-                with pd.ExcelFile(file_content) as excel_file:
-                    df_ingresos = pd.read_excel(excel_file, sheet_name=pestaña_ingreso)
-                logger.info(f"Pestaña '{pestaña_ingreso}' leída: {len(df_ingresos)} filas, columnas: {list(df_ingresos.columns)}")
-                
-                # Detectar fórmulas no calculadas antes de procesar
-                formulas_hoja_ingreso = detectar_formulas_en_archivo(file_content, pestaña_ingreso)
-                if formulas_hoja_ingreso:
-                    logger.warning(f"⚠️ Se detectaron {len(formulas_hoja_ingreso)} celdas con fórmulas no calculadas en '{pestaña_ingreso}'")
+                # Leer en streaming; las fórmulas sin calcular llegan con cada lote
+                # en la misma pasada que procesa las filas
+                df_ingresos = libro.hoja(pestaña_ingreso)
+                logger.info(f"Pestaña '{pestaña_ingreso}' abierta, columnas: {list(df_ingresos.columns)}")
 
                 # Procesar expedientes desde la pestaña de ingresos
-                resultado_ingresos = procesar_pestaña_ingresos(df_ingresos, expediente_columns, formulas_hoja_ingreso)
+                resultado_ingresos = procesar_pestaña_ingresos(df_ingresos, expediente_columns)
                 resultados['expedientes_procesados'] += resultado_ingresos['procesados']
                 resultados['ingresos_procesados'] += resultado_ingresos['ingresos_creados']
                 resultados['errores'] += resultado_ingresos['errores']
@@ -3220,10 +2874,7 @@ def procesar_excel_multiples_pestañas(file_content, hojas_disponibles):
         if pestaña_estados and 'estados' in tablas_relacionadas:
             logger.info(f"Procesando pestaña de estados: {pestaña_estados}")
             try:
-                # Resetear puntero y leer desde BytesIO
-                file_content.seek(0)
-                with pd.ExcelFile(file_content) as excel_file:
-                    df_estados = pd.read_excel(excel_file, sheet_name=pestaña_estados)
+                df_estados = libro.hoja(pestaña_estados)
                 logger.info(f"Pestaña '{pestaña_estados}' leída: {len(df_estados)} filas, columnas: {list(df_estados.columns)}")
                 
                 # Procesar estados
@@ -3296,9 +2947,8 @@ def procesar_excel_multiples_pestañas(file_content, hojas_disponibles):
             
             contenido_reporte += "=" * 80 + "\n"
             
-            # Obtener usuario_id de la sesión
-            from flask import session
-            usuario_id = session.get('usuario_id') if 'session' in dir() else None
+            # Usuario que hizo la carga (sesión o dueño del trabajo)
+            usuario_id = usuario_actual()
             
             # Insertar reporte en la base de datos
             conn_reporte = obtener_conexion()
@@ -3346,11 +2996,13 @@ def procesar_excel_multiples_pestañas(file_content, hojas_disponibles):
         logger.error(f"ERROR GENERAL en procesar_excel_multiples_pestañas: {str(e)}")
         raise Exception(f"Error procesando archivo Excel con múltiples pestañas: {str(e)}")
 
-def procesar_pestaña_ingresos(df, expediente_columns, formulas_detectadas=None):
-    """Procesa la pestaña de ingresos con información actual de expedientes"""
+def procesar_pestaña_ingresos(df, expediente_columns):
+    """
+    Procesa la pestaña de ingresos con información actual de expedientes.
+    Las celdas con fórmulas sin calcular (detectadas lote a lote en la misma
+    pasada) se reportan como error.
+    """
     logger.info("=== INICIO procesar_pestaña_ingresos ===")
-    if formulas_detectadas:
-        logger.warning(f"⚠️ {len(formulas_detectadas)} celdas con fórmulas no calculadas serán reportadas como error")
     resultado = {
         'procesados': 0,
         'ingresos_creados': 0,
@@ -3380,196 +3032,200 @@ def procesar_pestaña_ingresos(df, expediente_columns, formulas_detectadas=None)
         
         logger.info("✅ Todas las columnas requeridas están presentes en pestaña ingresos")
         
-        # 🚀 OPTIMIZACIÓN: Cargar expedientes existentes en memoria UNA SOLA VEZ
-        logger.info("🚀 Cargando expedientes existentes en memoria...")
-        conn_cache = obtener_conexion()
-        cursor_cache = conn_cache.cursor()
-        cursor_cache.execute("SELECT id, radicado_completo FROM expediente WHERE radicado_completo IS NOT NULL")
-        expedientes_cache = {row[1]: row[0] for row in cursor_cache.fetchall()}
-        cursor_cache.close()
-        conn_cache.close()
-        logger.info(f"✅ {len(expedientes_cache)} expedientes cargados en memoria")
-        
-        # Procesar cada fila con búsqueda en memoria (RÁPIDO)
-        for index, row in df.iterrows():
-            # Usar una conexión separada por fila para evitar abortar toda la transacción
-            conn_fila = obtener_conexion()
-            cursor_fila = conn_fila.cursor()
-            
-            try:
-                # Construir mapa de fórmulas para esta fila específica
-                formulas_fila = {}
-                if formulas_detectadas:
-                    for (row_idx, col_nombre), formula in formulas_detectadas.items():
-                        if row_idx == index:
-                            formulas_fila[col_nombre] = formula
-
-                # Extraer datos con mapeo flexible
-                radicado_completo = extraer_valor_flexible(row, df.columns, ['RADICADO COMPLETO', 'radicado_completo', 'RadicadoUnicoLimpio'], formulas_fila)
-                demandante = extraer_valor_flexible(row, df.columns, ['DEMANDANTE', 'demandante', 'DEMANDANTE_HOMOLOGADO'], formulas_fila)
-                demandado = extraer_valor_flexible(row, df.columns, ['DEMANDADO', 'demandado', 'DEMANDADO_HOMOLOGADO'], formulas_fila)
-                fecha_ingreso = extraer_fecha_flexible(row, df.columns, ['FECHA INGRESO', 'fecha_ingreso', 'FECHA_INGRESO'], formulas_fila)
-                solicitud = extraer_valor_flexible(row, df.columns, ['SOLICITUD', 'solicitud', 'TIPO_SOLICITUD'], formulas_fila)
-                
-                # Validaciones básicas
-                if not radicado_completo or not demandante or not demandado or not fecha_ingreso or not solicitud:
-                    logger.debug(f"Saltando fila {index + 2} - faltan datos requeridos")
-                    resultado['errores'] += 1
-                    resultado['errores_detallados'].append({
-                        'fila': index + 2,
-                        'hoja': 'ingreso',
-                        'radicado': radicado_completo or 'N/A',
-                        'motivo': 'Faltan datos requeridos (demandante, demandado, fecha o solicitud)'
-                    })
-                    continue
-                
-                # Validar radicado completo
-                es_valido, mensaje_error = validar_radicado_completo(radicado_completo)
-                if not es_valido:
-                    logger.debug(f"Saltando fila {index + 2} - {mensaje_error}")
-                    resultado['errores'] += 1
-                    resultado['errores_detallados'].append({
-                        'fila': index + 2,
-                        'hoja': 'ingreso',
-                        'radicado': radicado_completo,
-                        'motivo': mensaje_error
-                    })
-                    continue
-                
-                # 🚀 BÚSQUEDA EN MEMORIA (instantánea, sin query a BD)
-                expediente_id = expedientes_cache.get(radicado_completo)
-                
-                if expediente_id:
-                    logger.debug(f"Expediente {radicado_completo} ya existe (ID: {expediente_id})")
-                else:
-                    # Crear nuevo expediente
-                    expediente_id = crear_expediente_desde_ingreso(cursor_fila, expediente_columns, {
-                        'radicado_completo': radicado_completo,
-                        'demandante': demandante,
-                        'demandado': demandado,
-                        'fecha_ingreso': fecha_ingreso,
-                        'tipo_solicitud': solicitud,
-                        'estado': extraer_valor_flexible(row, df.columns, ['ESTADO', 'estado', 'ESTADO_EXPEDIENTE']),
-                        'responsable': extraer_valor_flexible(row, df.columns, ['RESPONSABLE', 'responsable']),
-                        'ubicacion': extraer_valor_flexible(row, df.columns, ['UBICACION', 'ubicacion']),
-                        'observaciones': extraer_valor_flexible(row, df.columns, ['OBSERVACIONES', 'observaciones'])
-                    })
-                    
-                    if expediente_id:
-                        # Agregar al caché para evitar duplicados en el mismo archivo
-                        expedientes_cache[radicado_completo] = expediente_id
-                        resultado['procesados'] += 1
-                        logger.debug(f"Expediente creado: {radicado_completo} (ID: {expediente_id})")
-                    else:
-                        resultado['errores'] += 1
-                        resultado['errores_detallados'].append({
-                            'fila': index + 2,
-                            'hoja': 'ingreso',
-                            'radicado': radicado_completo,
-                            'motivo': 'Error al crear expediente en BD'
-                        })
-                        continue
-                
-                # Crear registro en tabla ingresos si existe
-                cursor_fila.execute("""
-                    SELECT table_name FROM information_schema.tables WHERE table_name = 'ingresos'
-                """)
-                
-                if cursor_fila.fetchone():
-                    # Extraer observaciones para verificación de duplicados
-                    observaciones = extraer_valor_flexible(row, df.columns, ['OBSERVACIONES', 'observaciones'])
-                    obs_normalized = observaciones if observaciones and str(observaciones).strip() else None
-                    
-                    # 🔍 VERIFICAR EXISTENCIA POR CLAVE IGNORANDO OBSERVACIONES
-                    cursor_fila.execute("""
-                        SELECT id, observaciones FROM ingresos 
-                        WHERE expediente_id = %s 
-                        AND fecha_ingreso = %s 
-                        AND solicitud = %s
-                    """, (expediente_id, fecha_ingreso, solicitud))
-                    
-                    ingreso_existente = cursor_fila.fetchone()
-                    
-                    if ingreso_existente:
-                        ingreso_id, ingreso_obs_bd = ingreso_existente
-                        ingreso_obs_bd_norm = ingreso_obs_bd.strip() if ingreso_obs_bd and str(ingreso_obs_bd).strip() else None
+        # 🚀 Los radicados se resuelven por lote con una consulta (misma igualdad
+        # que filtro_radicado_exacto: por radicado_normalizado si existe)
+        columnas_radicado = ['RADICADO COMPLETO', 'radicado_completo', 'RadicadoUnicoLimpio']
+        expedientes_cache = {}  # {valor_radicado_exacto: expediente_id}, también los creados en este archivo
+        buscados = set()
+        formulas_detectadas = 0
+        
+        # Una sola conexión para la pestaña; cada fila se confirma (o revierte) por separado
+        conn_ingresos = obtener_conexion()
+        cursor_ingresos = conn_ingresos.cursor()
+        try:
+            for lote in lotes_con_progreso(df, errores=lambda: resultado['errores'], detectar_formulas=True):
+                formulas_lote = formulas_por_fila(lote)
+                formulas_detectadas += len(lote.attrs.get('formulas', {}))
+                pendientes = set()
+                for _, row in lote.iterrows():
+                    radicado = extraer_valor_flexible(row, df.columns, columnas_radicado)
+                    clave = valor_radicado_exacto(radicado) if radicado else None
+                    if clave and clave not in buscados:
+                        pendientes.add(clave)
+                if pendientes:
+                    expedientes_cache.update(buscar_exactos(cursor_ingresos, pendientes))
+                    buscados |= pendientes
+                conn_ingresos.commit()
+                
+                for index, row in lote.iterrows():
+                    radicado_completo = None
+                    try:
+                        # Fórmulas sin calcular de esta fila
+                        formulas_fila = formulas_lote.get(index, {})
+        
+                        # Extraer datos con mapeo flexible
+                        radicado_completo = extraer_valor_flexible(row, df.columns, columnas_radicado, formulas_fila)
+                        demandante = extraer_valor_flexible(row, df.columns, ['DEMANDANTE', 'demandante', 'DEMANDANTE_HOMOLOGADO'], formulas_fila)
+                        demandado = extraer_valor_flexible(row, df.columns, ['DEMANDADO', 'demandado', 'DEMANDADO_HOMOLOGADO'], formulas_fila)
+                        fecha_ingreso = extraer_fecha_flexible(row, df.columns, ['FECHA INGRESO', 'fecha_ingreso', 'FECHA_INGRESO'], formulas_fila)
+                        solicitud = extraer_valor_flexible(row, df.columns, ['SOLICITUD', 'solicitud', 'TIPO_SOLICITUD'], formulas_fila)
                         
-                        if obs_normalized and ingreso_obs_bd_norm != obs_normalized:
-                            # Si hay observaciones nuevas, actualizamos el registro existente y consideramos como actualización
-                            cursor_fila.execute("""
-                                UPDATE ingresos SET observaciones = %s WHERE id = %s
-                            """, (obs_normalized, ingreso_id))
-                            conn_fila.commit()
-                            resultado['ingresos_creados'] += 1
-                            resultado['ingresos_exitosos'].append({
+                        # Validaciones básicas
+                        if not radicado_completo or not demandante or not demandado or not fecha_ingreso or not solicitud:
+                            logger.debug(f"Saltando fila {index + 2} - faltan datos requeridos")
+                            resultado['errores'] += 1
+                            resultado['errores_detallados'].append({
                                 'fila': index + 2,
-                                'radicado': radicado_completo,
-                                'fecha_ingreso': fecha_ingreso.strftime('%Y-%m-%d') if hasattr(fecha_ingreso, 'strftime') else str(fecha_ingreso),
-                                'solicitud': solicitud
+                                'hoja': 'ingreso',
+                                'radicado': radicado_completo or 'N/A',
+                                'motivo': 'Faltan datos requeridos (demandante, demandado, fecha o solicitud)'
                             })
-                            logger.debug(f"Ingreso existente actualizado en observaciones para expediente {expediente_id}")
-                            conn_fila.close()
                             continue
-                        else:
-                            # Duplicado sin cambio relevante (o observaciones idénticas/vacías)
-                            logger.debug(f"Ingreso duplicado encontrado para expediente {expediente_id} - omitiendo inserción")
+                        
+                        # Validar radicado completo
+                        es_valido, mensaje_error = validar_radicado_completo(radicado_completo)
+                        if not es_valido:
+                            logger.debug(f"Saltando fila {index + 2} - {mensaje_error}")
                             resultado['errores'] += 1
                             resultado['errores_detallados'].append({
                                 'fila': index + 2,
                                 'hoja': 'ingreso',
                                 'radicado': radicado_completo,
-                                'motivo': f'Ingreso duplicado (ya existe con fecha {fecha_ingreso} y solicitud "{solicitud}")'
+                                'motivo': mensaje_error
                             })
-                            conn_fila.close()
                             continue
-                    
-                    try:
-                        cursor_fila.execute("""
-                            INSERT INTO ingresos (expediente_id, fecha_ingreso, solicitud, observaciones)
-                            VALUES (%s, %s, %s, %s)
-                        """, (expediente_id, fecha_ingreso, solicitud, observaciones))
                         
-                        resultado['ingresos_creados'] += 1
+                        # 🚀 BÚSQUEDA EN MEMORIA (resuelta para todo el lote)
+                        clave = valor_radicado_exacto(radicado_completo)
+                        expediente_id = expedientes_cache.get(clave)
                         
-                        # Guardar ingreso exitoso para el reporte
-                        resultado['ingresos_exitosos'].append({
-                            'fila': index + 2,
-                            'radicado': radicado_completo,
-                            'fecha_ingreso': fecha_ingreso.strftime('%Y-%m-%d') if hasattr(fecha_ingreso, 'strftime') else str(fecha_ingreso),
-                            'solicitud': solicitud
-                        })
+                        if expediente_id:
+                            logger.debug(f"Expediente {radicado_completo} ya existe (ID: {expediente_id})")
+                        else:
+                            # Crear nuevo expediente
+                            expediente_id = crear_expediente_desde_ingreso(cursor_ingresos, expediente_columns, {
+                                'radicado_completo': radicado_completo,
+                                'demandante': demandante,
+                                'demandado': demandado,
+                                'fecha_ingreso': fecha_ingreso,
+                                'tipo_solicitud': solicitud,
+                                'estado': extraer_valor_flexible(row, df.columns, ['ESTADO', 'estado', 'ESTADO_EXPEDIENTE']),
+                                'responsable': extraer_valor_flexible(row, df.columns, ['RESPONSABLE', 'responsable']),
+                                'ubicacion': extraer_valor_flexible(row, df.columns, ['UBICACION', 'ubicacion']),
+                                'observaciones': extraer_valor_flexible(row, df.columns, ['OBSERVACIONES', 'observaciones'])
+                            })
+                            
+                            if expediente_id:
+                                resultado['procesados'] += 1
+                                logger.debug(f"Expediente creado: {radicado_completo} (ID: {expediente_id})")
+                            else:
+                                conn_ingresos.rollback()
+                                resultado['errores'] += 1
+                                resultado['errores_detallados'].append({
+                                    'fila': index + 2,
+                                    'hoja': 'ingreso',
+                                    'radicado': radicado_completo,
+                                    'motivo': 'Error al crear expediente en BD'
+                                })
+                                continue
+                        
+                        # Crear registro en tabla ingresos si existe
+                        if existe_tabla('ingresos'):
+                            # Extraer observaciones para verificación de duplicados
+                            observaciones = extraer_valor_flexible(row, df.columns, ['OBSERVACIONES', 'observaciones'])
+                            obs_normalized = observaciones if observaciones and str(observaciones).strip() else None
+                            
+                            # 🔍 VERIFICAR EXISTENCIA POR CLAVE IGNORANDO OBSERVACIONES
+                            cursor_ingresos.execute("""
+                                SELECT id, observaciones FROM ingresos 
+                                WHERE expediente_id = %s 
+                                AND fecha_ingreso = %s 
+                                AND solicitud = %s
+                            """, (expediente_id, fecha_ingreso, solicitud))
+                            
+                            ingreso_existente = cursor_ingresos.fetchone()
+                            
+                            if ingreso_existente:
+                                ingreso_id, ingreso_obs_bd = ingreso_existente
+                                ingreso_obs_bd_norm = ingreso_obs_bd.strip() if ingreso_obs_bd and str(ingreso_obs_bd).strip() else None
+                                
+                                if obs_normalized and ingreso_obs_bd_norm != obs_normalized:
+                                    # Si hay observaciones nuevas, actualizamos el registro existente y consideramos como actualización
+                                    cursor_ingresos.execute("""
+                                        UPDATE ingresos SET observaciones = %s WHERE id = %s
+                                    """, (obs_normalized, ingreso_id))
+                                    conn_ingresos.commit()
+                                    resultado['ingresos_creados'] += 1
+                                    resultado['ingresos_exitosos'].append({
+                                        'fila': index + 2,
+                                        'radicado': radicado_completo,
+                                        'fecha_ingreso': fecha_ingreso.strftime('%Y-%m-%d') if hasattr(fecha_ingreso, 'strftime') else str(fecha_ingreso),
+                                        'solicitud': solicitud
+                                    })
+                                    logger.debug(f"Ingreso existente actualizado en observaciones para expediente {expediente_id}")
+                                    continue
+                                else:
+                                    # Duplicado sin cambio relevante (o observaciones idénticas/vacías)
+                                    logger.debug(f"Ingreso duplicado encontrado para expediente {expediente_id} - omitiendo inserción")
+                                    conn_ingresos.commit()
+                                    resultado['errores'] += 1
+                                    resultado['errores_detallados'].append({
+                                        'fila': index + 2,
+                                        'hoja': 'ingreso',
+                                        'radicado': radicado_completo,
+                                        'motivo': f'Ingreso duplicado (ya existe con fecha {fecha_ingreso} y solicitud "{solicitud}")'
+                                    })
+                                    continue
+                            
+                            try:
+                                cursor_ingresos.execute("""
+                                    INSERT INTO ingresos (expediente_id, fecha_ingreso, solicitud, observaciones)
+                                    VALUES (%s, %s, %s, %s)
+                                """, (expediente_id, fecha_ingreso, solicitud, observaciones))
+                                
+                                resultado['ingresos_creados'] += 1
+                                
+                                # Guardar ingreso exitoso para el reporte
+                                resultado['ingresos_exitosos'].append({
+                                    'fila': index + 2,
+                                    'radicado': radicado_completo,
+                                    'fecha_ingreso': fecha_ingreso.strftime('%Y-%m-%d') if hasattr(fecha_ingreso, 'strftime') else str(fecha_ingreso),
+                                    'solicitud': solicitud
+                                })
+                                
+                                logger.debug(f"Ingreso creado para expediente {expediente_id}")
+                                
+                            except Exception as ingreso_error:
+                                logger.warning(f"Error creando ingreso para expediente {expediente_id}: {ingreso_error}")
+                                conn_ingresos.rollback()
+                                continue
                         
-                        logger.debug(f"Ingreso creado para expediente {expediente_id}")
+                        # Commit de la fila exitosa; solo entonces el expediente creado
+                        # entra al caché (evita duplicados en el mismo archivo)
+                        conn_ingresos.commit()
+                        expedientes_cache[clave] = expediente_id
                         
-                    except Exception as ingreso_error:
-                        logger.warning(f"Error creando ingreso para expediente {expediente_id}: {ingreso_error}")
-                        conn_fila.rollback()
-                        cursor_fila.close()
-                        conn_fila.close()
+                    except Exception as row_error:
+                        logger.error(f"Error procesando fila {index + 2} en pestaña ingresos: {row_error}")
+                        resultado['errores'] += 1
+                        resultado['errores_detallados'].append({
+                            'fila': index + 2,
+                            'hoja': 'ingreso',
+                            'radicado': radicado_completo or 'N/A',
+                            'motivo': f'Error técnico: {str(row_error)}'
+                        })
+                        # Revertir solo esta fila
+                        try:
+                            conn_ingresos.rollback()
+                        except Exception:
+                            pass
                         continue
-                
-                # Commit de la fila exitosa
-                conn_fila.commit()
-                cursor_fila.close()
-                conn_fila.close()
-                
-            except Exception as row_error:
-                logger.error(f"Error procesando fila {index + 2} en pestaña ingresos: {row_error}")
-                resultado['errores'] += 1
-                resultado['errores_detallados'].append({
-                    'fila': index + 2,
-                    'hoja': 'ingreso',
-                    'radicado': radicado_completo if 'radicado_completo' in locals() else 'N/A',
-                    'motivo': f'Error técnico: {str(row_error)}'
-                })
-                # Rollback y cerrar conexión en caso de error
-                try:
-                    conn_fila.rollback()
-                    cursor_fila.close()
-                    conn_fila.close()
-                except:
-                    pass
-                continue
+        finally:
+            cursor_ingresos.close()
+            conn_ingresos.close()
+        
+        if formulas_detectadas:
+            logger.warning(f"⚠️ {formulas_detectadas} celdas con fórmulas no calculadas reportadas como error")
         
         logger.info(f"=== FIN procesar_pestaña_ingresos - Resultado: {resultado} ===")
         return resultado
@@ -3614,7 +3270,7 @@ def procesar_pestaña_estados(df):
         logger.info("✅ Todas las columnas requeridas están presentes en pestaña estados")
         
         # Procesar cada fila
-        for index, row in df.iterrows():
+        for index, row in con_progreso(df, errores=lambda: resultado['errores']):
             # Usar una conexión separada por fila para evitar abortar toda la transacción
             conn_fila = obtener_conexion()
             cursor_fila = conn_fila.cursor()
@@ -3640,9 +3296,10 @@ def procesar_pestaña_estados(df):
                     continue
                 
                 # Buscar el expediente por radicado completo
-                cursor_fila.execute("""
-                    SELECT id FROM expediente WHERE radicado_completo = %s
-                """, (radicado_completo,))
+                filtro, valor = filtro_radicado_exacto(radicado_completo)
+                cursor_fila.execute(f"""
+                    SELECT id FROM expediente WHERE {filtro}
+                """, (valor,))
                 
                 expediente_existente = cursor_fila.fetchone()
                 
@@ -3741,14 +3398,66 @@ def procesar_pestaña_estados(df):
         resultado['errores'] = len(df)
         return resultado
 
-def buscar_expedientes_flexible(radicados_no_encontrados, conn):
+def resolver_radicados(conn, radicados, indice=None):
+    """
+    Expedientes de `radicados` (solo dígitos): los exactos en una consulta
+    y, para los que faltan, la búsqueda flexible (13 dígitos / subcadena).
+
+    Returns:
+        tuple: ({radicado: expediente_id}, {radicado: metodo} de los asociados por subcadena)
+    """
+    cursor = conn.cursor()
+    try:
+        encontrados = buscar_exactos(cursor, radicados)
+    finally:
+        cursor.close()
+
+    dudosos = {}
+    no_encontrados = [r for r in radicados if r not in encontrados]
+    if no_encontrados:
+        for rad, (exp_id, metodo) in buscar_expedientes_flexible(no_encontrados, conn, indice).items():
+            encontrados[rad] = exp_id
+            if metodo == 'like_sufijo':
+                dudosos[rad] = metodo
+    return encontrados, dudosos
+
+
+def _radicados_nuevos_del_lote(lote, columnas, posibles_nombres, unicos, buscados, resultados):
+    """
+    Radicados normalizados del lote que aún no se buscaron en la base. De paso
+    cuenta en resultados['total_filas'] los que ninguna pestaña contó antes.
+    """
+    pendientes = set()
+    for _, row in lote.iterrows():
+        radicado = extraer_valor_flexible(row, columnas, posibles_nombres)
+        radicado = re.sub(r'[^0-9]', '', str(radicado).strip()) if radicado else ''
+        if not radicado:
+            continue
+        if radicado not in unicos:
+            unicos.add(radicado)
+            resultados['total_filas'] += 1
+        if radicado not in buscados:
+            buscados.add(radicado)
+            pendientes.add(radicado)
+    return pendientes
+
+
+def buscar_expedientes_flexible(radicados_no_encontrados, conn, indice=None):
     """
     Busca expedientes en BD usando tres estrategias en orden:
     1. Últimos 13 dígitos (si el radicado tiene >= 13 dígitos)
-    2. LIKE sufijo '%radicado' para radicados entre 8 y 12 dígitos
-       - Usa anclaje por sufijo para reducir falsos positivos
+    2. Subcadena '%radicado%' para radicados entre 8 y 12 dígitos
+       - Solo se asocia si hay un único candidato
        - Radicados < 8 dígitos se descartan (riesgo de ambigüedad muy alto)
-    
+
+    Con muchos radicados pendientes se usa el índice en memoria
+    (IndiceRadicados, una sola consulta); con pocos, dos consultas set-based.
+
+    Args:
+        radicados_no_encontrados: radicados normalizados (solo dígitos)
+        conn: conexión a la base de datos
+        indice: IndiceRadicados compartido entre búsquedas de la misma carga
+
     Returns:
         dict: {radicado_excel: (expediente_id, metodo)}
               metodo: 'exacto', '13_digitos', 'like_sufijo'
@@ -3757,7 +3466,7 @@ def buscar_expedientes_flexible(radicados_no_encontrados, conn):
     if not radicados_no_encontrados:
         return encontrados
 
-    cursor = conn.cursor()
+    inicio = time.perf_counter()
 
     # Separar por longitud
     con_13_o_mas = [r for r in radicados_no_encontrados if len(r) >= 13]
@@ -3767,109 +3476,91 @@ def buscar_expedientes_flexible(radicados_no_encontrados, conn):
     if muy_cortos and not IS_PRODUCTION:
         logger.debug(f"⚠️ {len(muy_cortos)} radicados con < 8 dígitos descartados (riesgo de falso positivo): {muy_cortos[:5]}")
 
-    # ── Paso 1: Últimos 13 dígitos ────────────────────────────────────────────
-    if con_13_o_mas:
-        cursor.execute("""
-            SELECT id, radicado_completo FROM expediente
-            WHERE radicado_completo IS NOT NULL
-              AND LENGTH(radicado_completo) >= 13
-        """)
-        todos_bd = cursor.fetchall()
-
-        for radicado_excel in con_13_o_mas:
-            ultimos_13 = radicado_excel[-13:]
-            for exp_id, radicado_bd in todos_bd:
-                if len(radicado_bd) >= 13 and radicado_bd[-13:] == ultimos_13:
-                    encontrados[radicado_excel] = (exp_id, '13_digitos')
-                    if not IS_PRODUCTION:
-                        logger.debug(f"✓ {radicado_excel} → encontrado por últimos 13 dígitos: {radicado_bd}")
-                    break
+    cursor = conn.cursor()
+    try:
+        # Con radicado_sufijo indexado el índice en memoria solo hace falta para las subcadenas
+        sufijos_en_bd = radicado_normalizado_disponible()
+        pendientes_memoria = len(entre_8_y_12) if sufijos_en_bd else len(con_13_o_mas) + len(entre_8_y_12)
+        usar_memoria = (indice is not None and indice.cargado) or pendientes_memoria >= UMBRAL_INDICE_MEMORIA
+
+        if usar_memoria:
+            if indice is None:
+                indice = IndiceRadicados()
+            if not indice.cargado:
+                indice.cargar(cursor)
+            usar_memoria = indice.disponible
+
+        if not usar_memoria:
+            # Pocos pendientes, o tabla demasiado grande para el índice en memoria
+            por_sufijo, por_subcadena = buscar_en_bd(cursor, con_13_o_mas, entre_8_y_12)
+        else:
+            if sufijos_en_bd:
+                por_sufijo = buscar_sufijos_en_bd(cursor, con_13_o_mas)
+            else:
+                por_sufijo = {}
+                for radicado_excel in con_13_o_mas:
+                    exp_id = indice.buscar_sufijo(radicado_excel)
+                    if exp_id is not None:
+                        por_sufijo[radicado_excel] = exp_id
+            por_subcadena = indice.buscar_subcadenas(entre_8_y_12)
+    finally:
+        cursor.close()
 
-    # ── Paso 2: LIKE para radicados entre 8 y 12 dígitos ──────────────────────
-    if entre_8_y_12:
+    # ── Paso 1: Últimos 13 dígitos ────────────────────────────────────────────
+    for radicado_excel, exp_id in por_sufijo.items():
+        encontrados[radicado_excel] = (exp_id, '13_digitos')
         if not IS_PRODUCTION:
-            logger.debug(f"🔍 Buscando {len(entre_8_y_12)} radicados cortos por LIKE...")
-        for radicado_excel in entre_8_y_12:
-            if radicado_excel in encontrados:
-                continue
-            # Usar %valor% ya que estos radicados aparecen en el medio del radicado completo
-            cursor.execute("""
-                SELECT id, radicado_completo FROM expediente
-                WHERE radicado_completo LIKE %s
-                LIMIT 2
-            """, (f'%{radicado_excel}%',))
-            candidatos = cursor.fetchall()
-
-            if len(candidatos) == 1:
-                # Solo un candidato → asociación segura
-                encontrados[radicado_excel] = (candidatos[0][0], 'like_sufijo')
-                if not IS_PRODUCTION:
-                    logger.debug(f"✓ {radicado_excel} → encontrado por LIKE: {candidatos[0][1]}")
-            elif len(candidatos) > 1:
-                # Múltiples candidatos → ambiguo, no asociar
-                if not IS_PRODUCTION:
-                    logger.debug(f"⚠️ {radicado_excel} → LIKE ambiguo ({len(candidatos)} candidatos), descartado")
-
-    cursor.close()
+            logger.debug(f"✓ {radicado_excel} → encontrado por últimos 13 dígitos (expediente {exp_id})")
+
+    # ── Paso 2: Subcadena para radicados entre 8 y 12 dígitos ─────────────────
+    for radicado_excel, (exp_id, candidatos) in por_subcadena.items():
+        if exp_id is not None:
+            # Solo un candidato → asociación segura
+            encontrados[radicado_excel] = (exp_id, 'like_sufijo')
+            if not IS_PRODUCTION:
+                logger.debug(f"✓ {radicado_excel} → encontrado por subcadena (expediente {exp_id})")
+        elif candidatos > 1 and not IS_PRODUCTION:
+            # Múltiples candidatos → ambiguo, no asociar
+            logger.debug(f"⚠️ {radicado_excel} → subcadena ambigua ({candidatos} candidatos), descartado")
+
+    logger.info(
+        f"🔍 Búsqueda flexible ({'índice en memoria' if usar_memoria else 'base de datos'}): "
+        f"{len(encontrados)} de {len(radicados_no_encontrados)} radicados asociados en "
+        f"{round((time.perf_counter() - inicio) * 1000, 1)} ms"
+    )
     return encontrados
 
 
 def detectar_formulas_en_archivo(file_content, nombre_hoja):
     """
-    Lee el archivo con openpyxl en modo fórmulas (data_only=False) y devuelve
-    un dict { (fila_idx, col_nombre): texto_formula } para celdas que contienen
-    fórmulas sin calcular o con valor cacheado sospechoso (0 / vacío).
+    Devuelve un dict { (fila_idx, col_nombre): texto_formula } para celdas que
+    contienen fórmulas sin calcular o con valor cacheado sospechoso (0 / vacío).
 
     fila_idx es el índice 0-based de pandas (0 = primera fila de datos, sin cabecera).
+    Usa el lector en streaming (LibroExcel); file_content puede ser un BytesIO,
+    una ruta o un LibroExcel ya abierto.
     """
+    libro = None
     try:
-        import openpyxl
-        file_content.seek(0)
-        # Leer con fórmulas visibles
-        wb_formulas = openpyxl.load_workbook(file_content, data_only=False)
-        file_content.seek(0)
-        # Leer con valores cacheados
-        wb_values   = openpyxl.load_workbook(file_content, data_only=True)
-        file_content.seek(0)
-
-        if nombre_hoja not in wb_formulas.sheetnames:
+        libro = abrir_libro(file_content)
+        if nombre_hoja not in libro.sheet_names:
             return {}
-
-        ws_f = wb_formulas[nombre_hoja]
-        ws_v = wb_values[nombre_hoja]
-
-        # Obtener cabeceras (fila 1)
-        headers = {}
-        for col_idx, cell in enumerate(next(ws_f.iter_rows(min_row=1, max_row=1)), 1):
-            if cell.value is not None:
-                headers[col_idx] = str(cell.value).strip()
-
-        formulas_detectadas = {}
-        # Iterar desde fila 2 (datos)
-        for row_idx, (row_f, row_v) in enumerate(
-            zip(ws_f.iter_rows(min_row=2), ws_v.iter_rows(min_row=2))
-        ):
-            for cell_f, cell_v in zip(row_f, row_v):
-                col_nombre = headers.get(cell_f.column, f'Col{cell_f.column}')
-                valor_formula  = cell_f.value
-                valor_cacheado = cell_v.value
-
-                # Detectar fórmula: el valor en modo fórmulas empieza con '='
-                if isinstance(valor_formula, str) and valor_formula.startswith('='):
-                    # Marcar si el valor cacheado es sospechoso (0, None, vacío)
-                    cacheado_sospechoso = (
-                        valor_cacheado is None
-                        or str(valor_cacheado).strip() == ''
-                        or valor_cacheado == 0
-                    )
-                    if cacheado_sospechoso:
-                        formulas_detectadas[(row_idx, col_nombre)] = valor_formula
-
-        return formulas_detectadas
+        return libro.hoja(nombre_hoja).formulas
 
     except Exception as e:
         logger.warning(f"No se pudo analizar fórmulas del archivo: {e}")
         return {}
+    finally:
+        if libro is not None and libro is not file_content:
+            libro.close()
+
+
+def formulas_por_fila(lote):
+    """{fila_idx: {columna: formula}} de las fórmulas sin calcular de un lote (lote.attrs['formulas'])"""
+    por_fila = {}
+    for (fila_idx, columna), formula in lote.attrs.get('formulas', {}).items():
+        por_fila.setdefault(fila_idx, {})[columna] = formula
+    return por_fila
 
 
 def extraer_valor_flexible(row, columnas_df, posibles_nombres, formulas_fila=None):
@@ -3977,10 +3668,10 @@ def crear_expediente_desde_ingreso(cursor, expediente_columns, datos):
         # Manejar asignación de turno si el estado es 'Activo Pendiente'
         if datos.get('estado') == 'Activo Pendiente' or (not datos.get('estado') and 'turno' in expediente_columns):
             # Obtener el siguiente turno disponible
-            cursor.execute("""
-                SELECT MAX(turno) 
+            cursor.execute(f"""
+                SELECT MAX({turno_entero()}) 
                 FROM expediente 
-                WHERE estado = 'Activo Pendiente' AND turno IS NOT NULL
+                WHERE estado = 'Activo Pendiente'
             """)
             
             resultado = cursor.fetchone()
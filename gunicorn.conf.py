@@ -13,6 +13,10 @@ timeout = 300
 keepalive = 2
 
 # Restart workers after this many requests, to help prevent memory leaks
+# (un worker reciclado descarta las cargas de Excel que esperaban en su cola
+# y, si la que procesa no termina en `timeout` segundos, el master lo mata y
+# la carga queda huérfana; los demás workers las recuperan, ver
+# iniciar_recuperacion en utils/trabajos_carga.py)
 max_requests = 1000
 max_requests_jitter = 100
 
@@ -34,4 +38,38 @@ tmp_upload_dir = None
 
 # SSL (if needed)
 keyfile = None
-certfile = None
\ No newline at end of file
+certfile = None
+
+# Server hooks
+def pre_fork(server, worker):
+    # Con preload_app el master importa la app: no debe pasar conexiones abiertas a los workers
+    from modelo.configBd import cerrar_pool
+    cerrar_pool()
+
+
+def post_fork(server, worker):
+    # Cada worker arranca con su propio pool de conexiones
+    from modelo.configBd import reiniciar_pool_tras_fork
+    reiniciar_pool_tras_fork()
+    server.log.info(f"Pool de conexiones inicializado en worker {worker.pid}")
+    # Columnas y tablas opcionales leídas una vez por worker (ver utils/esquema.py)
+    from utils.esquema import calentar_esquema
+    if calentar_esquema():
+        server.log.info(f"Esquema cargado en worker {worker.pid}")
+    # Cargas de Excel que dejaron otros workers (reciclados o muertos): ahora y periódicamente
+    from utils.trabajos_carga import iniciar_recuperacion
+    from vista.vistasubirexpediente import procesar_trabajo_carga
+    if iniciar_recuperacion(procesar_trabajo_carga):
+        server.log.info(f"Recuperación de cargas huérfanas activa en worker {worker.pid}")
+
+
+def on_starting(server):
+    # Métricas de Prometheus: los archivos de una ejecución anterior no se suman
+    from utils.metricas_prometheus import reiniciar_directorio
+    reiniciar_directorio()
+
+
+def worker_exit(server, worker):
+    # El worker que termina (p. ej. reciclado por max_requests) deja sus contadores al día
+    from utils.metricas_prometheus import volcar
+    volcar(forzar=True)